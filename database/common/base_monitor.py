@@ -0,0 +1,602 @@
+#!/usr/bin/env python3
+import os
+import sys
+import time
+import queue
+import threading
+
+from common.instance_state import InstanceState, get_state_dir
+from common.metric_cache import MetricCache
+from common.stats_codec import encode_stats
+from common.segment_store import SegmentWriter
+from common.circuit_breaker import CircuitBreaker, get_connect_timeout
+from common.rule_engine import RuleEngine
+from common.change_only import ChangeOnlyEncoder
+
+def get_metric_workers():
+    """获取单个实例内并发采集指标的线程数（即每个实例最多使用的数据库连接数）"""
+    return int(os.getenv('METRIC_WORKERS', 4))
+
+def get_stats_storage():
+    """获取监控结果的存储方式：segment为按实例追加写段文件，file为每个样本一个JSON文件"""
+    return os.getenv('STATS_STORAGE', 'segment').lower()
+
+def get_metric_timeout():
+    """获取单个指标的默认采集超时时间(秒)"""
+    return float(os.getenv('METRIC_TIMEOUT', 30))
+
+# 超时被放弃后仍在运行的采集线程：{(监控类名, 实例, 指标名): 线程}
+# 监控对象每个周期重建，因此放在模块级跨周期保留；上一个线程结束前同一指标不再采集，
+# 无法取消语句的驱动（如共享连接的MongoDB）每个实例被放弃的线程数也不会超过指标数
+_abandoned_threads = {}
+_abandoned_lock = threading.Lock()
+
+class BaseMonitor:
+    """数据库监控基类
+    
+    负责连接管理、指标并发采集、告警和结果保存，各数据库引擎只需实现：
+    - open_connection(): 建立一个新连接，返回(conn, cursor)
+    - METRICS中声明的各个get_*采集方法
+    - print_stats(stats): 输出引擎相关的监控结果
+    
+    METRICS中的每个指标单元可声明：
+    - func: 采集方法名
+    - depends: 依赖的指标单元，依赖全部完成后才开始采集
+    - timeout: 采集超时时间(秒)，默认为METRIC_TIMEOUT
+    - store: 是否写入监控结果，默认True；为False时仅作为其他指标的前置步骤
+    
+    互不依赖的指标在实例内的小连接池上并发执行，每个线程通过self.cursor访问自己借用的连接，
+    因此get_*方法无需关心并发。
+    """
+    
+    # 数据库名称，用于日志输出
+    DB_LABEL = '数据库'
+    
+    # 指标单元定义，按声明顺序提交采集
+    METRICS = {
+        'connection_stats': {'func': 'get_connection_stats'},
+        'qps': {'func': 'get_qps'},
+        'slow_queries': {'func': 'get_slow_queries'},
+        'cache_hit_rate': {'func': 'get_cache_hit_rate'},
+        'tablespace_usage': {'func': 'get_tablespace_usage'},
+        'process_list': {'func': 'get_process_list'},
+        'replication_status': {'func': 'get_replication_status'}
+    }
+    
+    # 指标采集频率档位(fast/normal/slow)，未声明的指标为fast
+    METRIC_TIERS = {
+        'tablespace_usage': 'slow'
+    }
+    
+    # 连接对象是否线程安全（如MongoClient），线程安全时所有指标共享同一连接
+    SHARED_CONNECTION = False
+    
+    # 检查连接状态使用的SQL
+    STATUS_QUERY = "SELECT 1"
+    
+    # 缓存命中率告警使用的字段名和描述
+    CACHE_HIT_RATE_METRIC = ('cache_hit_rate', '缓存命中率')
+    
+    # 表空间告警使用的名称字段和描述，名称字段为None时不检查表空间
+    TABLESPACE_KEY = None
+    TABLESPACE_LABEL = '表空间'
+    
+    # 告警阈值，由各引擎根据自己的配置文件设置，告警规则中的字符串阈值引用这里的配置名
+    THRESHOLDS = {}
+    ALERT_ENABLED = True
+    
+    def __init__(self, config=None, instance_name=None):
+        self._local = threading.local()
+        self._pool_lock = threading.Lock()
+        self._connections = []
+        self._idle_connections = queue.Queue()
+        # 正在采集的指标借用的连接：{指标名: [连接, 是否已因超时放弃]}
+        self._busy_connections = {}
+        # 使用传入的配置或环境变量
+        self.config = config or {}
+        self.instance_name = instance_name
+        # 实例所属分组，告警规则可按分组覆盖阈值
+        self.group = self.config.get('group')
+        self.monitor_dir = None
+        self.state = None
+        self.metric_cache = None
+        self.metric_timings = {}
+        self.metric_workers = max(1, int(self.config.get('metric_workers', get_metric_workers())))
+        # 建立连接的超时时间(秒)，由各引擎传给驱动，避免不可达的实例长时间阻塞
+        self.connect_timeout = float(self.config.get('connect_timeout', get_connect_timeout()))
+        self.connect_error = None
+    
+    @property
+    def conn(self):
+        """当前线程使用的数据库连接"""
+        return getattr(self._local, 'conn', None)
+    
+    @conn.setter
+    def conn(self, value):
+        self._local.conn = value
+    
+    @property
+    def metric_timeout(self):
+        """当前线程正在采集的指标的超时时间(秒)，引擎可传给驱动作为服务端的执行时间上限"""
+        return getattr(self._local, 'metric_timeout', get_metric_timeout())
+    
+    @property
+    def cursor(self):
+        """当前线程使用的游标"""
+        return getattr(self._local, 'cursor', None)
+    
+    @cursor.setter
+    def cursor(self, value):
+        self._local.cursor = value
+    
+    def get_endpoint(self):
+        """获取连接地址描述，用于日志输出"""
+        return f"{self.host}:{self.port}"
+    
+    def open_connection(self):
+        """建立一个新的数据库连接，返回(conn, cursor)，由各引擎实现"""
+        raise NotImplementedError
+    
+    def close_connection(self, conn, cursor):
+        """关闭一个数据库连接"""
+        try:
+            if cursor:
+                cursor.close()
+            if conn:
+                conn.close()
+        except Exception as e:
+            print(f"[WARNING] 关闭数据库连接失败: {e}")
+    
+    def connect(self):
+        """连接到数据库，该连接同时作为指标采集连接池中的第一个连接"""
+        try:
+            self.conn, self.cursor = self.open_connection()
+            self._connections = [(self.conn, self.cursor)]
+            self._idle_connections = queue.Queue()
+            self._idle_connections.put((self.conn, self.cursor))
+            self.connect_error = None
+            print(f"[INFO] 成功连接到{self.DB_LABEL}数据库: {self.get_endpoint()}")
+            return True
+        except Exception as e:
+            self.connect_error = str(e)
+            print(f"[ERROR] 连接{self.DB_LABEL}数据库失败: {e}")
+            return False
+    
+    def disconnect(self):
+        """断开数据库连接（包括采集过程中额外建立的连接）
+        
+        采集超时被放弃的连接已移出连接池，由仍在使用它的线程结束时关闭。
+        """
+        for connection in self._connections:
+            if connection:
+                self.close_connection(*connection)
+        self._connections = []
+        self.conn = None
+        self.cursor = None
+        print("[INFO] 数据库连接已断开")
+    
+    def _acquire_connection(self, timeout=None):
+        """从实例连接池借用连接，空闲连接不足且未达到上限时建立新连接，等待超过timeout秒时抛出TimeoutError"""
+        try:
+            return self._idle_connections.get_nowait()
+        except queue.Empty:
+            pass
+        
+        with self._pool_lock:
+            can_open = len(self._connections) < self.metric_workers
+            if can_open:
+                # 先占位，避免多个线程同时超过上限
+                self._connections.append(None)
+        if can_open:
+            try:
+                connection = self.open_connection()
+                with self._pool_lock:
+                    self._connections[self._connections.index(None)] = connection
+                return connection
+            except Exception as e:
+                with self._pool_lock:
+                    self._connections.remove(None)
+                print(f"[WARNING] 建立额外的采集连接失败，等待空闲连接: {e}")
+        try:
+            return self._idle_connections.get(timeout=timeout)
+        except queue.Empty:
+            raise TimeoutError(f"等待空闲的采集连接超过{timeout}秒") from None
+    
+    def _release_connection(self, connection):
+        """归还借用的连接"""
+        self._idle_connections.put(connection)
+    
+    def cancel_query(self, conn, cursor):
+        """取消连接上正在执行的语句，返回是否已发出取消请求
+        
+        默认使用驱动提供的cancel接口（psycopg2、oracledb的连接，pyodbc的游标），驱动不支持时由各引擎覆盖。
+        """
+        for target in (conn, cursor):
+            cancel = getattr(target, 'cancel', None)
+            if callable(cancel):
+                cancel()
+                return True
+        return False
+    
+    def _abandon_connection(self, name):
+        """放弃超时指标借用的连接：移出连接池（连接池可以另建连接补位）并取消正在执行的语句
+        
+        连接由采集线程结束时关闭，不再归还连接池，disconnect也不会关闭仍在使用中的连接。
+        """
+        with self._pool_lock:
+            busy = self._busy_connections.get(name)
+            if not busy:
+                return
+            busy[1] = True
+            if busy[0] in self._connections:
+                self._connections.remove(busy[0])
+        try:
+            if not self.cancel_query(*busy[0]):
+                print(f"[WARNING] 无法取消超时指标的语句，连接将在语句结束后关闭: {name}")
+        except Exception as e:
+            print(f"[WARNING] 取消超时指标的语句失败: {name} - {e}")
+    
+    def get_connection_status(self):
+        """获取连接状态"""
+        try:
+            self.cursor.execute(self.STATUS_QUERY)
+            result = self.cursor.fetchone()
+            return result is not None
+        except Exception as e:
+            print(f"[ERROR] 检查连接状态失败: {e}")
+            return False
+    
+    def reset_cycle(self):
+        """在每个监控周期开始时调用，用于清理周期内共享的快照"""
+        pass
+    
+    def _get_metric_timeout(self, name, unit):
+        """获取指标的采集超时时间，配置文件中的metric_timeouts优先"""
+        return float(self.config.get('metric_timeouts', {}).get(name, unit.get('timeout', get_metric_timeout())))
+    
+    def _abandoned_key(self, name):
+        """被放弃线程的登记键，同一实例的监控对象在各周期间共用"""
+        return (type(self).__name__, self.instance_name or self.get_endpoint(), name)
+    
+    def _previous_still_running(self, name):
+        """检查该指标上次超时被放弃的采集线程是否仍在运行，已结束的线程从登记中移除"""
+        key = self._abandoned_key(name)
+        with _abandoned_lock:
+            thread = _abandoned_threads.get(key)
+            if thread is None:
+                return False
+            if thread.is_alive():
+                return True
+            del _abandoned_threads[key]
+            return False
+    
+    def _run_metric(self, name, unit, events):
+        """在工作线程中采集单个指标，记录耗时
+        
+        借到连接、真正开始采集时向events发送('started', 指标名)，结束时发送('done', 指标名, 结果)。
+        """
+        value = None
+        connection = None
+        busy = None
+        start_time = time.time()
+        status = 'failed'
+        self._local.metric_timeout = self._get_metric_timeout(name, unit)
+        try:
+            if not self.SHARED_CONNECTION:
+                # 等待空闲连接的时间不超过指标的采集超时时间
+                connection = self._acquire_connection(self._get_metric_timeout(name, unit))
+                busy = [connection, False]
+                with self._pool_lock:
+                    self._busy_connections[name] = busy
+                self.conn, self.cursor = connection
+            
+            start_time = time.time()
+            events.put(('started', name))
+            value = self.metric_cache.collect(name, getattr(self, unit['func']))
+            status = 'ok' if value is not None else 'failed'
+        except TimeoutError as e:
+            status = 'timeout'
+            print(f"[ERROR] 采集指标失败: {name} - {e}")
+        except Exception as e:
+            print(f"[ERROR] 采集指标失败: {name} - {e}")
+        finally:
+            # 超时的指标已由调度线程记录，不再覆盖
+            if name not in self.metric_timings:
+                self.metric_timings[name] = {
+                    'elapsed_ms': round((time.time() - start_time) * 1000, 2),
+                    'status': 'cached' if self.metric_cache.as_of.get(name, {}).get('cached') else status
+                }
+            if connection:
+                with self._pool_lock:
+                    if self._busy_connections.get(name) is busy:
+                        del self._busy_connections[name]
+                # 超时被放弃的连接可能停在未完成的语句上，直接关闭
+                if busy and busy[1]:
+                    self.close_connection(*connection)
+                else:
+                    self._release_connection(connection)
+            events.put(('done', name, value))
+    
+    def collect_metrics(self, stats):
+        """按依赖关系并发采集METRICS中声明的指标，单个实例的耗时约等于最慢指标的耗时
+        
+        每个指标在独立的线程中采集，超时时间从借到连接、真正开始采集时算起。超时的指标取消正在执行的语句，
+        其连接移出连接池，线程不再等待；被放弃的线程不占用并发名额，后面的指标照常开始。
+        被放弃的线程结束前，同一指标在之后的周期中跳过（状态为skipped），避免无法取消的语句不断累积。
+        """
+        pending = dict(self.METRICS)
+        done = set()
+        # 已提交的指标 -> 截止时间，尚未借到连接时为None
+        running = {}
+        threads = {}
+        events = queue.Queue()
+        while pending or running:
+            # 提交依赖已满足的指标，正在执行的指标数不超过线程数
+            skipped = False
+            for name, unit in list(pending.items()):
+                if len(running) >= self.metric_workers:
+                    break
+                if all(dep in done for dep in unit.get('depends', ())):
+                    del pending[name]
+                    # 上次超时的线程仍在运行时跳过，依赖它的指标照常执行
+                    if self._previous_still_running(name):
+                        self.metric_timings[name] = {'elapsed_ms': 0, 'status': 'skipped'}
+                        print(f"[WARNING] 上次超时的采集线程仍在运行，跳过指标: {name}")
+                        done.add(name)
+                        skipped = True
+                        continue
+                    running[name] = None
+                    threads[name] = threading.Thread(target=self._run_metric, args=(name, unit, events), daemon=True)
+                    threads[name].start()
+            
+            if not running:
+                if skipped:
+                    continue
+                for name in pending:
+                    print(f"[ERROR] 指标依赖无法满足: {name} - {pending[name].get('depends')}")
+                break
+            
+            # 等待下一个事件或最早的截止时间；尚未借到连接的指标由_acquire_connection自行超时
+            deadlines = [deadline for deadline in running.values() if deadline is not None]
+            try:
+                received = [events.get(timeout=max(0, min(deadlines) - time.time()) if deadlines else None)]
+                while not events.empty():
+                    received.append(events.get_nowait())
+            except queue.Empty:
+                received = []
+            for event in received:
+                name = event[1]
+                if name not in running:
+                    continue
+                if event[0] == 'started':
+                    running[name] = time.time() + self._get_metric_timeout(name, self.METRICS[name])
+                else:
+                    del running[name]
+                    if self.METRICS[name].get('store', True):
+                        stats[name] = event[2]
+                    done.add(name)
+            
+            # 超时的指标记为None，依赖它的指标照常执行
+            now = time.time()
+            for name, deadline in list(running.items()):
+                if deadline is not None and deadline <= now:
+                    del running[name]
+                    timeout = self._get_metric_timeout(name, self.METRICS[name])
+                    self.metric_timings[name] = {'elapsed_ms': round(timeout * 1000, 2), 'status': 'timeout'}
+                    print(f"[ERROR] 采集指标超时: {name} (超过{timeout}秒)")
+                    self._abandon_connection(name)
+                    with _abandoned_lock:
+                        _abandoned_threads[self._abandoned_key(name)] = threads[name]
+                    done.add(name)
+    
+    def get_rule_values(self, stats):
+        """提取告警规则可引用的数值指标和消息模板使用的上下文，返回(values, context)"""
+        values = {}
+        context = {}
+        
+        if stats.get('connection_stats'):
+            values['connection_percent'] = stats['connection_stats'].get('connection_percent')
+        
+        if stats.get('qps'):
+            values['qps'] = stats['qps'].get('qps')
+        
+        if stats.get('slow_queries'):
+            values['slow_queries'] = stats['slow_queries'].get('slow_queries')
+        
+        cache_metric, cache_label = self.CACHE_HIT_RATE_METRIC
+        context['cache_metric'] = cache_metric
+        context['cache_label'] = cache_label
+        if stats.get('cache_hit_rate'):
+            values['cache_hit_rate'] = stats['cache_hit_rate'].get(cache_metric)
+        
+        # 每个表空间分别参与告警，消息中的{tablespace}为表空间名
+        context['tablespace_label'] = self.TABLESPACE_LABEL
+        if self.TABLESPACE_KEY and stats.get('tablespace_usage'):
+            values['tablespace_usage'] = {
+                str(tablespace[self.TABLESPACE_KEY]): tablespace['usage_percent'] for tablespace in stats['tablespace_usage']
+            }
+            context.setdefault('item_keys', {})['tablespace_usage'] = 'tablespace'
+        
+        # 阻塞链：等待会话总数和最大链深度，消息中给出阻塞最多会话的根阻塞会话
+        if stats.get('blocking_chains'):
+            values['blocked_sessions'] = stats['blocking_chains']['blocked_sessions']
+            values['max_chain_depth'] = stats['blocking_chains']['max_chain_depth']
+            if stats['blocking_chains']['chains']:
+                context['root_blocker'] = stats['blocking_chains']['chains'][0]['session']
+        
+        # 复制延迟：每个副本的延迟分别参与告警，以及所有副本中的最大延迟和最大延迟变化率
+        if stats.get('replication_lag') and stats['replication_lag']['replicas']:
+            values['replica_lag_seconds'] = {
+                str(replica['replica']): replica.get('lag_seconds') for replica in stats['replication_lag']['replicas']
+            }
+            context.setdefault('item_keys', {})['replica_lag_seconds'] = 'replica'
+            values['replication_lag_seconds'] = stats['replication_lag']['max_lag_seconds']
+            values['replication_lag_rate'] = stats['replication_lag']['max_lag_rate']
+            fastest = max(stats['replication_lag']['replicas'], key=lambda replica: replica['lag_rate'] or 0)
+            context['replica'] = fastest['replica']
+        
+        return values, context
+    
+    def get_rule_sample(self, stats):
+        """构建规则引擎求值使用的样本"""
+        values, context = self.get_rule_values(stats)
+        return {
+            'instance_name': self.instance_name,
+            'group': self.group,
+            'values': values,
+            'context': context,
+            'thresholds': self.THRESHOLDS
+        }
+    
+    def send_alert(self, alert):
+        """发送告警"""
+        if self.ALERT_ENABLED:
+            print(f"[ALERT] [{alert['level']}] {alert['message']}")
+            # 这里可以添加邮件发送逻辑
+            # import smtplib
+            # from email.mime.text import MIMEText
+            # ...
+    
+    def _get_module_file(self):
+        """获取引擎监控模块的文件路径，默认的监控目录和状态目录位于该模块所在目录下"""
+        return os.path.abspath(sys.modules[type(self).__module__].__file__)
+    
+    def save_stats_to_json(self, stats, alerts):
+        """保存监控结果为紧凑JSON（可选zstd压缩）
+        
+        默认追加写入实例的段文件，STATS_STORAGE=file时每个样本写一个JSON文件。
+        变化缓慢的片段只在内容变化或关键帧时写入，入库时沿用上次的值。
+        Decimal、日期时间等类型已由各引擎在驱动取数时转换，这里不再遍历整个结果。
+        """
+        try:
+            encoder = ChangeOnlyEncoder(self.state)
+            
+            # 构建完整的监控数据
+            monitor_data = {
+                'timestamp': time.strftime('%Y-%m-%d %H:%M:%S'),
+                'monitor_time': time.time(),
+                'instance_name': self.instance_name,
+                'stats': encoder.encode(stats),
+                'alerts': alerts,
+                'thresholds': self.THRESHOLDS
+            }
+            
+            raw, suffix = encode_stats(monitor_data)
+            
+            # 使用传递的监控目录或默认目录
+            monitor_dir = self.monitor_dir or os.path.join(os.path.dirname(self._get_module_file()), 'monitor')
+            
+            # 追加写入实例的段文件
+            if get_stats_storage() == 'segment':
+                file_path, offset = SegmentWriter(self.instance_name, monitor_dir, self.state).append(raw)
+                encoder.commit()
+                print(f"[INFO] 监控结果已追加到: {file_path}@{offset}")
+                return
+            
+            # 生成文件名，包含实例名称和时间戳
+            file_name = f"{self.instance_name}_{time.strftime('%Y%m%d_%H%M%S')}{suffix}"
+            file_path = os.path.join(monitor_dir, file_name)
+            
+            # 写入JSON文件
+            with open(file_path, 'wb') as f:
+                f.write(raw)
+            encoder.commit()
+            
+            print(f"[INFO] 监控结果已保存到: {file_path}")
+        except Exception as e:
+            print(f"[ERROR] 保存监控结果到JSON文件失败: {e}")
+    
+    def print_stats(self, stats):
+        """输出引擎相关的监控结果，由各引擎实现"""
+        pass
+    
+    def collect_sample(self, monitor_dir=None):
+        """连接数据库并采集一个周期的监控数据，返回stats
+        
+        熔断期间直接写入不可达标记并返回None。告警求值和结果保存由publish完成，
+        调度器在所有实例采集完成后统一求值告警规则。
+        """
+        print(f"\n[INFO] 开始监控 - {time.strftime('%Y-%m-%d %H:%M:%S')}")
+        self.monitor_dir = monitor_dir
+        self.metric_timings = {}
+        self.reset_cycle()
+        
+        # 加载实例状态，慢速指标按采集频率复用缓存结果
+        self.state = InstanceState(self.instance_name, get_state_dir(monitor_dir, self._get_module_file()))
+        
+        # 熔断期间不再尝试连接，只写入精简的不可达标记
+        breaker = CircuitBreaker(self.state)
+        if not breaker.allow_request():
+            marker = breaker.unreachable_marker()
+            print(f"[WARNING] 实例不可达(开始于 {marker['circuit']['unreachable_since']})，熔断中，下次探测时间: {marker['circuit']['next_probe']}")
+            self.save_stats_to_json(marker, [])
+            self.state.save()
+            return None
+        
+        self.metric_cache = MetricCache(self.state, {**self.METRIC_TIERS, **self.config.get('metric_tiers', {})})
+        
+        # 初始化监控数据
+        stats = {'connection_status': False}
+        for name, unit in self.METRICS.items():
+            if unit.get('store', True):
+                stats[name] = None
+        stats['connection_error'] = None
+        
+        # 连接数据库
+        if not self.connect():
+            error_msg = "无法连接数据库"
+            print(f"[ERROR] {error_msg}")
+            stats['connection_error'] = error_msg
+            breaker.record_failure(self.connect_error)
+            if breaker.is_open():
+                stats['circuit'] = breaker.unreachable_marker()['circuit']
+        else:
+            breaker.record_success()
+            # 收集监控数据
+            start_time = time.time()
+            stats['connection_status'] = self.get_connection_status()
+            self.collect_metrics(stats)
+            
+            # 记录缓存指标的采集时间和各指标的采集耗时
+            stats['metric_as_of'] = self.metric_cache.as_of
+            stats['metric_timings'] = self.metric_timings
+            stats['collect_elapsed_ms'] = round((time.time() - start_time) * 1000, 2)
+            
+            # 输出监控结果
+            print("\n=== 监控结果 ===")
+            
+            # 连接状态
+            print(f"连接状态: {'正常' if stats['connection_status'] else '异常'}")
+            self.print_stats(stats)
+        
+        # 断开连接
+        self.disconnect()
+        return stats
+    
+    def publish(self, stats, alerts):
+        """发送告警、保存监控结果和实例状态"""
+        if alerts:
+            print("\n=== 告警信息 ===")
+            for alert in alerts:
+                self.send_alert(alert)
+        else:
+            print("\n=== 告警信息 ===")
+            print("无告警")
+        
+        # 保存监控结果为JSON文件
+        self.save_stats_to_json(stats, alerts)
+        
+        # 保存实例状态
+        self.state.save()
+        
+        print(f"\n[INFO] 监控完成 - {time.strftime('%Y-%m-%d %H:%M:%S')}")
+    
+    def run_monitor(self, monitor_dir=None):
+        """运行监控（单实例）：采集、按告警规则求值并保存结果"""
+        stats = self.collect_sample(monitor_dir)
+        if stats is None:
+            return
+        
+        rule_engine = RuleEngine(get_state_dir(monitor_dir, self._get_module_file()))
+        alerts = rule_engine.evaluate([self.get_rule_sample(stats)])[self.instance_name]
+        self.publish(stats, alerts)
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+import os
+
+def get_blocking_options():
+    """获取阻塞链采集选项"""
+    return {
+        # 保留明细的阻塞链条数（按等待会话数排序）
+        'limit': int(os.getenv('BLOCKING_CHAIN_LIMIT', 10)),
+        # 根阻塞会话语句文本截断长度
+        'text_length': int(os.getenv('BLOCKING_TEXT_LENGTH', 200))
+    }
+
+def _walk(root, waiters_of, wait_seconds):
+    """从根阻塞会话逐层展开等待会话，返回(已访问会话, 等待会话数, 链深度, 最长等待秒数)"""
+    seen = {root}
+    frontier = [root]
+    count = 0
+    depth = 0
+    max_wait = 0.0
+    while frontier:
+        next_level = []
+        for session in frontier:
+            for waiter in waiters_of.get(session, ()):
+                if waiter not in seen:
+                    seen.add(waiter)
+                    next_level.append(waiter)
+        if not next_level:
+            break
+        depth += 1
+        count += len(next_level)
+        max_wait = max(max_wait, max(wait_seconds.get(waiter, 0.0) for waiter in next_level))
+        frontier = next_level
+    return seen, count, depth, max_wait
+
+def build_blocking_chains(waits, sessions=None, limit=None):
+    """根据等待关系构建阻塞树，返回根阻塞会话、链深度和等待会话总数
+    
+    waits中的每一项为(等待会话, 阻塞会话, 已等待秒数)，同一对会话可以出现多次（如等待多把锁）；
+    sessions为{会话: {'user', 'state', 'query'}}，用于补充根阻塞会话的信息。
+    没有被其他会话阻塞的阻塞会话为根；互相等待（死锁）的会话不可从任何根到达，
+    从其中任选一个作为根并标记deadlock。
+    """
+    sessions = sessions or {}
+    limit = get_blocking_options()['limit'] if limit is None else limit
+    waiters_of = {}
+    blocked = set()
+    wait_seconds = {}
+    for waiter, blocker, seconds in waits:
+        if waiter is None or blocker is None or waiter == blocker:
+            continue
+        waiters_of.setdefault(blocker, set()).add(waiter)
+        blocked.add(waiter)
+        wait_seconds[waiter] = max(wait_seconds.get(waiter, 0.0), float(seconds or 0))
+    
+    chains = []
+    covered = set()
+    roots = [(session, False) for session in sorted(waiters_of, key=str) if session not in blocked]
+    roots_iter = iter(roots)
+    while True:
+        root = next(roots_iter, None)
+        if root is None:
+            # 剩余未覆盖的等待会话处于等待环中
+            remaining = sorted((session for session in blocked if session not in covered), key=str)
+            if not remaining:
+                break
+            root = (remaining[0], True)
+        session, deadlock = root
+        seen, count, depth, max_wait = _walk(session, waiters_of, wait_seconds)
+        covered |= seen
+        chains.append({
+            'session': session,
+            **sessions.get(session, {}),
+            'waiters': count,
+            'chain_depth': depth,
+            'max_wait_seconds': round(max_wait, 3),
+            'deadlock': deadlock
+        })
+    
+    chains.sort(key=lambda chain: (chain['waiters'], chain['max_wait_seconds']), reverse=True)
+    return {
+        'blocked_sessions': len(blocked),
+        'root_blockers': len(chains),
+        'max_chain_depth': max((chain['chain_depth'] for chain in chains), default=0),
+        'max_wait_seconds': round(max(wait_seconds.values(), default=0.0), 3),
+        'deadlock': any(chain['deadlock'] for chain in chains),
+        'chains': chains[:limit]
+    }
+
+def print_blocking_chains(blocking):
+    """打印阻塞链汇总和根阻塞会话"""
+    if not blocking or not blocking.get('blocked_sessions'):
+        return
+    print(f"\n阻塞链: 等待会话 {blocking['blocked_sessions']} 个, 根阻塞会话 {blocking['root_blockers']} 个, "
+          f"最大链深度 {blocking['max_chain_depth']}, 最长等待 {blocking['max_wait_seconds']}秒")
+    for chain in blocking['chains']:
+        query = ' '.join((chain.get('query') or '').split())[:80]
+        deadlock = ' [死锁]' if chain['deadlock'] else ''
+        print(f"  会话 {chain['session']}({chain.get('user')}){deadlock}: 阻塞 {chain['waiters']} 个会话, "
+              f"深度 {chain['chain_depth']} - {query}")
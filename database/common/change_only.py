@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+import os
+import json
+import hashlib
+
+from common.stats_codec import json_default
+
+# 变化缓慢的监控结果片段（点号表示片段内的字段），只在内容变化或关键帧时写入
+CHANGE_ONLY_SECTIONS = (
+    'tablespace_usage',
+    'replication_status',
+    'connection_stats.max_connections',
+    'slow_queries.long_query_time',
+    'slow_queries.slow_query_log'
+)
+
+def get_keyframe_cycles():
+    """获取关键帧间隔：每隔多少个样本完整写入一次所有片段，0表示关闭按变化写入"""
+    return int(os.getenv('STATS_KEYFRAME_CYCLES', 60))
+
+def section_hash(value):
+    """计算片段内容的哈希值"""
+    raw = json.dumps(value, sort_keys=True, ensure_ascii=False, separators=(',', ':'), default=json_default)
+    return hashlib.blake2b(raw.encode('utf-8'), digest_size=16).hexdigest()
+
+def _split(path):
+    """拆分片段路径，返回(所在片段名, 字段名)，顶层片段的字段名为None"""
+    section, _, field = path.partition('.')
+    return section, field or None
+
+def get_section(stats, path):
+    """读取片段内容，片段不存在或所在片段为空时返回None"""
+    section, field = _split(path)
+    value = stats.get(section)
+    if field is None:
+        return value
+    return value.get(field) if isinstance(value, dict) else None
+
+class ChangeOnlyEncoder:
+    """按内容哈希省略未变化的片段，省略的片段路径记录在stats['unchanged']中
+    
+    各片段上次写入时的哈希和距上一个关键帧的样本数保存在实例状态中，监控结果写入成功后调用commit才更新，
+    写入失败时下次仍会完整写入。为None的片段（采集失败或超时）照常写入，并清除其哈希。
+    """
+    
+    def __init__(self, state, sections=CHANGE_ONLY_SECTIONS, keyframe_cycles=None):
+        self.state = state
+        self.sections = sections
+        self.keyframe_cycles = get_keyframe_cycles() if keyframe_cycles is None else keyframe_cycles
+        self.pending = None
+    
+    def encode(self, stats):
+        """返回省略了未变化片段的监控数据副本，不修改传入的stats"""
+        if self.keyframe_cycles <= 0:
+            return stats
+        
+        tracking = self.state.get('change_only', {})
+        hashes = dict(tracking.get('hashes', {}))
+        since_keyframe = tracking.get('since_keyframe', 0) + 1
+        keyframe = since_keyframe >= self.keyframe_cycles or not hashes
+        if keyframe:
+            since_keyframe = 0
+        
+        encoded = dict(stats)
+        unchanged = []
+        for path in self.sections:
+            section, field = _split(path)
+            if section not in stats or (field is not None and not isinstance(stats[section], dict)):
+                continue
+            value = get_section(stats, path)
+            if value is None:
+                hashes.pop(path, None)
+                continue
+            
+            digest = section_hash(value)
+            if not keyframe and hashes.get(path) == digest:
+                if field is None:
+                    del encoded[section]
+                else:
+                    # 只复制需要修改的片段，其余片段与原数据共享
+                    if encoded[section] is stats[section]:
+                        encoded[section] = dict(stats[section])
+                    del encoded[section][field]
+                unchanged.append(path)
+            hashes[path] = digest
+        
+        if unchanged:
+            encoded['unchanged'] = unchanged
+        if keyframe:
+            encoded['keyframe'] = True
+        self.pending = {'hashes': hashes, 'since_keyframe': since_keyframe}
+        return encoded
+    
+    def commit(self):
+        """监控结果写入成功后，将本次的片段哈希保存到实例状态"""
+        if self.pending is not None:
+            self.state.set('change_only', self.pending)
+            self.pending = None
+
+def carry_forward(stats, last_values, sections=CHANGE_ONLY_SECTIONS):
+    """用同一实例上次写入的值补全省略的片段，并记录本次写入的片段值
+    
+    last_values为该实例各片段最近一次的值，调用方需按监控时间顺序处理同一实例的记录。
+    返回未能补全的片段路径（尚未读到该片段的任何值时发生，等到下一个关键帧即可恢复）。
+    """
+    missing = []
+    unchanged = set(stats.pop('unchanged', None) or [])
+    stats.pop('keyframe', None)
+    for path in sections:
+        section, field = _split(path)
+        if path in unchanged:
+            if path not in last_values:
+                missing.append(path)
+                continue
+            if field is None:
+                stats[section] = last_values[path]
+            elif isinstance(stats.get(section), dict):
+                stats[section][field] = last_values[path]
+        else:
+            value = get_section(stats, path)
+            if value is not None:
+                last_values[path] = value
+    return missing
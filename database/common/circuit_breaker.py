@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+import os
+import time
+
+# 熔断器状态：closed正常连接，open跳过连接直到下次探测，half_open允许一次探测连接
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+def get_connect_timeout():
+    """获取建立数据库连接的超时时间(秒)"""
+    return float(os.getenv('CONNECT_TIMEOUT', 5))
+
+def get_breaker_options():
+    """获取熔断器选项"""
+    return {
+        'failure_threshold': int(os.getenv('CIRCUIT_FAILURE_THRESHOLD', 3)),
+        'backoff_base': float(os.getenv('CIRCUIT_BACKOFF_BASE', 60)),
+        'backoff_max': float(os.getenv('CIRCUIT_BACKOFF_MAX', 1800))
+    }
+
+class CircuitBreaker:
+    """实例级连接熔断器，状态保存在实例状态中，跨监控周期延续
+
+    连续连接失败达到阈值后熔断(open)，熔断期间不再尝试连接；到达探测时间后进入half_open，
+    允许一次探测连接，成功则恢复(closed)，失败则以指数退避延长下次探测时间。
+    """
+
+    def __init__(self, state, options=None):
+        self.state = state
+        self.options = options or get_breaker_options()
+        self.data = dict(state.get('circuit', {}))
+        self.data.setdefault('state', CLOSED)
+
+    def _save(self):
+        """将熔断器状态写回实例状态"""
+        self.state.set('circuit', self.data)
+
+    def allow_request(self):
+        """判断本周期是否尝试连接，熔断且未到探测时间时返回False"""
+        if self.data['state'] == OPEN:
+            if time.time() < self.data.get('next_probe', 0):
+                return False
+            self.data['state'] = HALF_OPEN
+            self._save()
+        return True
+
+    def record_success(self):
+        """连接成功，恢复为closed并清除失败记录"""
+        if self.data['state'] != CLOSED:
+            print(f"[INFO] 实例已恢复连接，熔断解除 (不可达开始于 {self.data.get('unreachable_since')})")
+        self.data = {'state': CLOSED}
+        self._save()
+
+    def record_failure(self, error=None):
+        """连接失败，累计失败次数，达到阈值或探测失败时熔断"""
+        now = time.time()
+        self.data['failures'] = self.data.get('failures', 0) + 1
+        self.data.setdefault('unreachable_since', time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(now)))
+        self.data['last_error'] = str(error) if error else None
+
+        if self.data['state'] == HALF_OPEN or self.data['failures'] >= self.options['failure_threshold']:
+            # 每次熔断（含探测失败）退避时间翻倍，不超过上限
+            opens = self.data.get('opens', 0) + 1
+            backoff = min(self.options['backoff_base'] * (2 ** (opens - 1)), self.options['backoff_max'])
+            self.data.update({
+                'state': OPEN,
+                'opens': opens,
+                'backoff': backoff,
+                'next_probe': now + backoff
+            })
+            print(f"[WARNING] 实例连续连接失败 {self.data['failures']} 次，熔断 {backoff:.0f} 秒后再探测")
+        self._save()
+
+    def is_open(self):
+        """是否处于熔断状态"""
+        return self.data['state'] == OPEN
+
+    def unreachable_marker(self):
+        """熔断期间写入的精简监控结果，仅记录不可达状态"""
+        circuit = {
+            'state': self.data['state'],
+            'unreachable_since': self.data.get('unreachable_since'),
+            'failures': self.data.get('failures')
+        }
+        if 'next_probe' in self.data:
+            circuit['next_probe'] = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.data['next_probe']))
+        return {
+            'connection_status': False,
+            'connection_error': self.data.get('last_error'),
+            'circuit': circuit
+        }
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+import os
+import json
+
+from common.stats_codec import json_default
+
+def get_state_dir(monitor_dir=None, module_file=None):
+    """获取实例状态存储目录（与按日期分的监控目录同级，不随日期切换）"""
+    if monitor_dir:
+        state_dir = os.path.join(os.path.dirname(os.path.abspath(monitor_dir)), 'state')
+    else:
+        base_dir = os.path.dirname(os.path.abspath(module_file or __file__))
+        state_dir = os.path.join(base_dir, 'monitor', 'state')
+    os.makedirs(state_dir, exist_ok=True)
+    return state_dir
+
+class InstanceState:
+    """实例级持久化状态，跨监控周期保存（每个实例一个状态文件）"""
+    
+    def __init__(self, instance_name, state_dir):
+        self.instance_name = instance_name or 'default'
+        self.file_path = os.path.join(state_dir, f"{self.instance_name}_state.json")
+        self.data = self._load()
+    
+    def _load(self):
+        """从状态文件加载状态"""
+        if not os.path.exists(self.file_path):
+            return {}
+        try:
+            with open(self.file_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"[WARNING] 加载实例状态失败，将重新初始化: {self.file_path} - {e}")
+            return {}
+    
+    def get(self, key, default=None):
+        """获取状态值"""
+        return self.data.get(key, default)
+    
+    def set(self, key, value):
+        """设置状态值"""
+        self.data[key] = value
+    
+    def save(self):
+        """保存状态到文件（先写临时文件再替换，避免写入中断导致文件损坏）"""
+        tmp_path = f"{self.file_path}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.data, f, ensure_ascii=False, separators=(',', ':'), default=json_default)
+            os.replace(tmp_path, self.file_path)
+        except Exception as e:
+            print(f"[ERROR] 保存实例状态失败: {self.file_path} - {e}")
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+import os
+import time
+
+def get_tier_cycles():
+    """获取各采集频率档位对应的周期数：fast每个周期采集，normal/slow每N个周期采集一次"""
+    return {
+        'fast': 1,
+        'normal': int(os.getenv('NORMAL_METRIC_CYCLES', 5)),
+        'slow': int(os.getenv('SLOW_METRIC_CYCLES', 10))
+    }
+
+class MetricCache:
+    """按指标声明的采集频率执行采集，慢速指标的结果缓存在实例状态中"""
+    
+    def __init__(self, state, tiers=None):
+        self.state = state
+        self.tiers = tiers or {}
+        self.tier_cycles = get_tier_cycles()
+        self.cycle = state.get('cycle', 0) + 1
+        state.set('cycle', self.cycle)
+        self.as_of = {}
+    
+    def get_tier(self, metric):
+        """获取指标的采集频率档位，未声明的指标默认为fast"""
+        tier = self.tiers.get(metric, 'fast')
+        if tier not in self.tier_cycles:
+            print(f"[WARNING] 未知的采集频率档位: {metric}={tier}，按fast处理")
+            return 'fast'
+        return tier
+    
+    def collect(self, metric, func):
+        """采集指标：到期则调用func重新采集，否则返回缓存结果"""
+        tier = self.get_tier(metric)
+        cycles = self.tier_cycles[tier]
+        if cycles <= 1:
+            return func()
+        
+        cached = self.state.get('metric_cache', {}).get(metric)
+        if cached and 0 <= self.cycle - cached['cycle'] < cycles:
+            self.as_of[metric] = {'as_of': cached['as_of'], 'tier': tier, 'cached': True}
+            print(f"[INFO] {metric} 使用缓存结果，采集时间: {cached['as_of']}")
+            return cached['value']
+        
+        value = func()
+        if value is not None:
+            as_of = time.strftime('%Y-%m-%d %H:%M:%S')
+            metric_cache = self.state.get('metric_cache', {})
+            metric_cache[metric] = {
+                'value': value,
+                'as_of': as_of,
+                'cycle': self.cycle
+            }
+            self.state.set('metric_cache', metric_cache)
+            self.as_of[metric] = {'as_of': as_of, 'tier': tier, 'cached': False}
+        return value
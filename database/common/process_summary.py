@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+
+def _top_counts(counts, limit):
+    """按计数倒序保留前limit项"""
+    return dict(sorted(counts.items(), key=lambda item: item[1], reverse=True)[:limit])
+
+def summarize_sessions(rows, limit=20):
+    """汇总服务端按(状态, 用户, 主机)分组后的会话计数
+    
+    rows中每行为 (state, user, host, sessions, long_running)，
+    返回按状态、用户、主机的会话数以及长时间运行的会话总数
+    """
+    by_state = {}
+    by_user = {}
+    by_host = {}
+    total_sessions = 0
+    long_running = 0
+    
+    for state, user, host, sessions, long_count in rows:
+        sessions = int(sessions or 0)
+        state = str(state) if state is not None else 'unknown'
+        user = str(user) if user is not None else ''
+        host = str(host) if host is not None else ''
+        
+        total_sessions += sessions
+        long_running += int(long_count or 0)
+        by_state[state] = by_state.get(state, 0) + sessions
+        by_user[user] = by_user.get(user, 0) + sessions
+        by_host[host] = by_host.get(host, 0) + sessions
+    
+    return {
+        'total_sessions': total_sessions,
+        'long_running': long_running,
+        'by_state': _top_counts(by_state, limit),
+        'by_user': _top_counts(by_user, limit),
+        'by_host': _top_counts(by_host, limit)
+    }
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+import os
+import re
+import time
+
+def get_replication_lag_options():
+    """获取复制延迟趋势检测选项"""
+    return {
+        # 计算延迟变化率使用的最近样本数
+        'window': int(os.getenv('REPLICATION_LAG_WINDOW', 10)),
+        # 延迟变化率超过该值(秒/秒)时判定为延迟持续增长，低于其相反数时判定为正在追赶
+        'rate_threshold': float(os.getenv('REPLICATION_LAG_RATE_THRESHOLD', 0.05))
+    }
+
+def parse_interval_seconds(value):
+    """解析Oracle INTERVAL DAY TO SECOND格式的字符串（如+00 00:00:05.250），返回秒数"""
+    if value is None:
+        return None
+    match = re.match(r'^\s*([+-])?(\d+)\s+(\d+):(\d+):(\d+(?:\.\d+)?)\s*$', str(value))
+    if not match:
+        return None
+    sign, days, hours, minutes, seconds = match.groups()
+    total = int(days) * 86400 + int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+    return -total if sign == '-' else total
+
+def _slope(points):
+    """最小二乘法计算延迟随时间的变化率(秒/秒)"""
+    count = len(points)
+    mean_t = sum(t for t, _ in points) / count
+    mean_lag = sum(lag for _, lag in points) / count
+    variance = sum((t - mean_t) ** 2 for t, _ in points)
+    if variance == 0:
+        return 0.0
+    return sum((t - mean_t) * (lag - mean_lag) for t, lag in points) / variance
+
+def summarize_replication_lag(state, replicas, options=None):
+    """为每个副本计算延迟变化率和趋势，返回结构化的复制延迟
+    
+    replicas中的每一项至少包含'replica'和'lag_seconds'（秒，可为小数或None）。
+    各副本最近window个(采集时间, 延迟)样本保存在实例状态中，样本不少于3个时用最小二乘法计算变化率：
+    increasing表示延迟持续增长，decreasing表示正在追赶，stable表示基本稳定。
+    """
+    options = options or get_replication_lag_options()
+    now = time.time()
+    history = state.get('replication_lag_history', {}) if state is not None else {}
+    updated = {}
+    
+    for replica in replicas:
+        points = list(history.get(replica['replica'], []))
+        if replica.get('lag_seconds') is not None:
+            points.append([now, float(replica['lag_seconds'])])
+        points = points[-options['window']:]
+        updated[replica['replica']] = points
+        
+        replica['lag_rate'] = None
+        replica['trend'] = None
+        if len(points) >= 3:
+            rate = _slope(points)
+            replica['lag_rate'] = round(rate, 4)
+            if rate > options['rate_threshold']:
+                replica['trend'] = 'increasing'
+            elif rate < -options['rate_threshold']:
+                replica['trend'] = 'decreasing'
+            else:
+                replica['trend'] = 'stable'
+    
+    # 只保留当前仍存在的副本的历史
+    if state is not None:
+        state.set('replication_lag_history', updated)
+    
+    lags = [replica['lag_seconds'] for replica in replicas if replica.get('lag_seconds') is not None]
+    rates = [replica['lag_rate'] for replica in replicas if replica['lag_rate'] is not None]
+    return {
+        'replicas': replicas,
+        'max_lag_seconds': max(lags) if lags else None,
+        'max_lag_rate': max(rates) if rates else None
+    }
+
+def print_replication_lag(replication_lag):
+    """打印各副本的复制延迟和趋势"""
+    if not replication_lag or not replication_lag.get('replicas'):
+        return
+    print("\n复制延迟:")
+    for replica in replication_lag['replicas']:
+        lag = f"{replica['lag_seconds']:.3f}秒" if replica.get('lag_seconds') is not None else '未知'
+        trend = f", 趋势: {replica['trend']} ({replica['lag_rate']}秒/秒)" if replica['trend'] else ''
+        print(f"  {replica['replica']}: 延迟 {lag}{trend}")
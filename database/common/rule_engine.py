@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+import os
+import re
+import json
+import time
+import numpy as np
+
+# 默认规则文件，可通过ALERT_RULES_FILE指定其他位置
+DEFAULT_RULES_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'scheduler', 'alert_rules.json')
+
+# 规则中可以被实例/分组覆盖的字段
+OVERRIDE_FIELDS = ('threshold', 'for', 'hysteresis', 'level', 'enabled')
+
+# 比较运算符，hysteresis_sign为解除告警时阈值的偏移方向
+OPERATORS = {
+    '>': (np.greater, -1),
+    '>=': (np.greater_equal, -1),
+    '<': (np.less, 1),
+    '<=': (np.less_equal, 1)
+}
+
+def get_rules_file():
+    """获取告警规则文件路径"""
+    return os.getenv('ALERT_RULES_FILE', DEFAULT_RULES_FILE)
+
+def parse_duration(value):
+    """解析持续时间，支持秒数或带单位的字符串（如30s、5m、1h）"""
+    if value is None or value == '':
+        return 0.0
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = re.match(r'^\s*(\d+(?:\.\d+)?)\s*([smhd]?)\s*$', str(value))
+    if not match:
+        raise ValueError(f"无法解析的持续时间: {value}")
+    return float(match.group(1)) * {'': 1, 's': 1, 'm': 60, 'h': 3600, 'd': 86400}[match.group(2)]
+
+class RuleEngine:
+    """声明式告警规则引擎，对一批实例的最新样本按规则向量化求值
+    
+    规则保存在JSON文件中，文件修改后下次求值时自动重新加载，无需重新部署。每条规则支持：
+    - metric/op/threshold: 指标、比较运算符和阈值，阈值为字符串时取实例THRESHOLDS中的同名配置
+    - for: 持续满足条件多长时间后才告警
+    - hysteresis: 告警后指标需回落超过该幅度才解除，避免在阈值附近反复告警
+    - instances/groups: 按实例名、分组覆盖threshold/for/hysteresis/level/enabled
+    指标值可以是{对象名: 数值}（如每个表空间的使用率），此时按对象分别求值、分别告警。
+    每个实例（或实例的每个对象）、每条规则的持续时间和告警状态保存在状态目录的alert_rules_state.json中。
+    """
+    
+    def __init__(self, state_dir, rules_file=None):
+        self.rules_file = rules_file or get_rules_file()
+        self.state_file = os.path.join(state_dir, 'alert_rules_state.json')
+        self.rules = []
+        self.rules_mtime = None
+    
+    def reload_if_changed(self):
+        """规则文件修改后重新加载，加载失败时继续使用原有规则"""
+        try:
+            mtime = os.path.getmtime(self.rules_file)
+        except OSError:
+            if self.rules_mtime is None:
+                print(f"[WARNING] 告警规则文件不存在: {self.rules_file}")
+                self.rules_mtime = 0
+            return
+        if mtime == self.rules_mtime:
+            return
+        
+        try:
+            with open(self.rules_file, 'r', encoding='utf-8') as f:
+                rules = json.load(f).get('rules', [])
+            for rule in rules:
+                if rule.get('op', '>') not in OPERATORS:
+                    raise ValueError(f"规则 {rule.get('name')} 的运算符不受支持: {rule.get('op')}")
+                parse_duration(rule.get('for'))
+            self.rules = rules
+            self.rules_mtime = mtime
+            print(f"[INFO] 已加载告警规则 {len(rules)} 条: {self.rules_file}")
+        except Exception as e:
+            print(f"[ERROR] 加载告警规则失败，继续使用原有规则: {self.rules_file} - {e}")
+            self.rules_mtime = mtime
+    
+    def _load_state(self):
+        """加载规则状态：{规则名: {实例名: [开始满足条件的时间, 是否告警中]}}"""
+        if not os.path.exists(self.state_file):
+            return {}
+        try:
+            with open(self.state_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"[WARNING] 加载告警规则状态失败，将重新初始化: {self.state_file} - {e}")
+            return {}
+    
+    def _save_state(self, state):
+        """保存规则状态（先写临时文件再替换）"""
+        tmp_path = f"{self.state_file}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(state, f, ensure_ascii=False, separators=(',', ':'))
+            os.replace(tmp_path, self.state_file)
+        except Exception as e:
+            print(f"[ERROR] 保存告警规则状态失败: {self.state_file} - {e}")
+    
+    def _resolve(self, rule, sample):
+        """合并分组和实例覆盖后的规则参数，实例覆盖优先"""
+        params = {field: rule.get(field) for field in OVERRIDE_FIELDS}
+        group_override = rule.get('groups', {}).get(sample.get('group')) if sample.get('group') else None
+        for override in (group_override, rule.get('instances', {}).get(sample['instance_name'])):
+            if override:
+                params.update({field: override[field] for field in OVERRIDE_FIELDS if field in override})
+        
+        threshold = params['threshold']
+        if isinstance(threshold, str):
+            threshold = sample.get('thresholds', {}).get(threshold)
+        params['threshold'] = np.nan if threshold is None else float(threshold)
+        return params
+    
+    def evaluate(self, samples, now=None):
+        """对一批实例的最新样本求值，返回{实例名: 告警列表}
+        
+        samples中的每一项为{'instance_name', 'group', 'values', 'context', 'thresholds'}，
+        values为规则可引用的数值指标，缺失或为None的指标不参与比较。指标值为{对象名: 数值}时，
+        消息模板中可用{item}引用对象名，context['item_keys']可为该指标指定对象名的别名（如tablespace）。
+        """
+        self.reload_if_changed()
+        now = time.time() if now is None else now
+        alerts = {sample['instance_name']: [] for sample in samples}
+        if not samples or not self.rules:
+            return alerts
+        
+        state = self._load_state()
+        
+        for rule in self.rules:
+            rule_name = rule.get('name') or rule['metric']
+            metric = rule['metric']
+            compare, hysteresis_sign = OPERATORS[rule.get('op', '>')]
+            
+            # 按实例展开指标值，按对象给出的指标每个对象一行，状态按"实例名:对象名"保存
+            rows = []
+            itemized = []
+            for sample in samples:
+                value = sample['values'].get(metric)
+                if isinstance(value, dict):
+                    itemized.append(f"{sample['instance_name']}:")
+                    rows.extend((sample, f"{sample['instance_name']}:{item}", item, item_value) for item, item_value in value.items())
+                else:
+                    rows.append((sample, sample['instance_name'], None, value))
+            names = [name for _, name, _, _ in rows]
+            
+            # 规则参数按实例解析一次，再按行展开
+            resolved = {id(sample): self._resolve(rule, sample) for sample in samples}
+            params = [resolved[id(sample)] for sample, _, _, _ in rows]
+            values = np.array([value for _, _, _, value in rows], dtype=float)
+            thresholds = np.array([p['threshold'] for p in params], dtype=float)
+            durations = np.array([parse_duration(p['for']) for p in params], dtype=float)
+            hysteresis = np.array([p['hysteresis'] or 0 for p in params], dtype=float)
+            enabled = np.array([p['enabled'] is not False for p in params], dtype=bool)
+            
+            # 不再出现的对象（如已删除的表空间）不保留状态
+            rule_state = state.get(rule_name, {})
+            current = set(names)
+            rule_state = {name: entry for name, entry in rule_state.items() if name in current or not name.startswith(tuple(itemized))}
+            since = np.array([rule_state.get(name, [None, False])[0] for name in names], dtype=float)
+            firing = np.array([rule_state.get(name, [None, False])[1] for name in names], dtype=bool)
+            
+            # NaN参与比较结果为False，缺失的指标不会触发也不会保持告警
+            with np.errstate(invalid='ignore'):
+                breach = compare(values, thresholds)
+                holding = firing & compare(values, thresholds + hysteresis_sign * hysteresis)
+            active = enabled & (breach | holding)
+            since = np.where(active, np.where(np.isnan(since), now, since), np.nan)
+            firing = active & (firing | (now - since >= durations))
+            
+            state[rule_name] = {
+                **rule_state,
+                **{name: [None if np.isnan(s) else float(s), bool(f)] for name, s, f in zip(names, since, firing)}
+            }
+            
+            for index in np.flatnonzero(firing):
+                sample, _, item, _ = rows[index]
+                context = sample.get('context', {})
+                fields = {
+                    **context,
+                    'item': item,
+                    'value': float(values[index]),
+                    'threshold': params[index]['threshold'],
+                    'since': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(since[index]))
+                }
+                if item is not None and context.get('item_keys', {}).get(metric):
+                    fields[context['item_keys'][metric]] = item
+                try:
+                    message = rule.get('message', '{metric} = {value} (阈值: {threshold})').format(metric=metric, **fields)
+                    alert_metric = rule.get('alert_metric', metric).format(**fields)
+                except (KeyError, ValueError, IndexError) as e:
+                    message = f"{rule_name}: {metric} = {fields['value']} (阈值: {fields['threshold']})"
+                    alert_metric = metric
+                    print(f"[WARNING] 告警规则 {rule_name} 的消息模板格式错误: {e}")
+                alerts[sample['instance_name']].append({
+                    'level': params[index]['level'] or 'WARNING',
+                    'message': message,
+                    'metric': alert_metric,
+                    'value': fields['value'],
+                    'threshold': fields['threshold'],
+                    'rule': rule_name
+                })
+        
+        self._save_state(state)
+        return alerts
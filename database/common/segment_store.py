@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+import os
+import re
+import time
+import zlib
+import struct
+
+# 段文件扩展名，每个实例按日期目录写入 {实例名}_{序号}.seg
+SEGMENT_SUFFIX = '.seg'
+
+# 记录格式：4字节长度 + 4字节CRC32（大端）+ 数据 + 提交标记
+RECORD_HEADER = struct.Struct('>II')
+COMMIT_MARKER = b'\x00OK\n'
+
+def get_segment_options():
+    """获取段文件的轮转和刷盘选项"""
+    return {
+        'max_bytes': int(float(os.getenv('SEGMENT_MAX_MB', 64)) * 1024 * 1024),
+        'fsync_batch': int(os.getenv('SEGMENT_FSYNC_BATCH', 10)),
+        'fsync_interval': float(os.getenv('SEGMENT_FSYNC_INTERVAL', 300))
+    }
+
+def encode_record(payload):
+    """将一条记录编码为带长度前缀、校验和和提交标记的字节串"""
+    return RECORD_HEADER.pack(len(payload), zlib.crc32(payload)) + payload + COMMIT_MARKER
+
+def _parse_record(data, position):
+    """解析data中position处的记录，完整且校验通过时返回(数据, 结束位置)，否则返回None"""
+    if position + RECORD_HEADER.size > len(data):
+        return None
+    length, checksum = RECORD_HEADER.unpack_from(data, position)
+    body_end = position + RECORD_HEADER.size + length
+    record_end = body_end + len(COMMIT_MARKER)
+    if record_end > len(data) or data[body_end:record_end] != COMMIT_MARKER:
+        return None
+    payload = data[position + RECORD_HEADER.size:body_end]
+    if zlib.crc32(payload) != checksum:
+        return None
+    return payload, record_end
+
+def _find_next_record(data, start):
+    """从start开始逐字节查找下一条完整有效（长度、校验和、提交标记都正确）的记录，找不到时返回None"""
+    for position in range(start, len(data) - RECORD_HEADER.size - len(COMMIT_MARKER) + 1):
+        if _parse_record(data, position) is not None:
+            return position
+    return None
+
+def iter_segment_records(file_path, offset=0):
+    """从指定偏移量开始读取段文件中已提交的记录，返回(数据, 起始偏移量, 结束偏移量)
+    
+    遇到不完整或校验失败的记录时向后查找下一条有效记录：找到说明这里是崩溃留下的残缺记录，
+    跳过后继续读取；找不到说明可能是正在写入的记录，停止读取，下次从该记录的起始偏移量继续。
+    """
+    with open(file_path, 'rb') as f:
+        f.seek(offset)
+        data = f.read()
+    position = 0
+    while position < len(data):
+        record = _parse_record(data, position)
+        if record is None:
+            next_position = _find_next_record(data, position + 1)
+            if next_position is None:
+                return
+            print(f"[WARNING] 段文件记录损坏，已跳过{next_position - position}字节: {file_path}@{offset + position}")
+            position = next_position
+            continue
+        payload, record_end = record
+        yield payload, offset + position, offset + record_end
+        position = record_end
+
+def _scan_valid_end(file_path, offset):
+    """从offset开始逐条校验记录，返回(最后一条连续有效记录的结束偏移量, 之后是否还有有效记录)"""
+    with open(file_path, 'rb') as f:
+        f.seek(offset)
+        data = f.read()
+    position = 0
+    while True:
+        record = _parse_record(data, position)
+        if record is None:
+            break
+        position = record[1]
+    has_more = position < len(data) and _find_next_record(data, position + 1) is not None
+    return offset + position, has_more
+
+def list_segments(directory):
+    """列出目录下的段文件（按文件名排序，同一实例的段按序号先后排列）"""
+    if not os.path.isdir(directory):
+        return []
+    return sorted(os.path.join(directory, name) for name in os.listdir(directory) if name.endswith(SEGMENT_SUFFIX))
+
+class SegmentWriter:
+    """实例级追加写段文件：每个样本追加一条记录，按大小轮转，按记录数/时间批量fsync
+    
+    写入位置和未刷盘的记录数保存在实例状态中，跨监控周期延续。
+    """
+    
+    def __init__(self, instance_name, directory, state, options=None):
+        self.instance_name = instance_name or 'default'
+        self.directory = directory
+        self.state = state
+        self.options = options or get_segment_options()
+    
+    def _next_segment_path(self):
+        """生成当前目录下该实例的下一个段文件路径"""
+        pattern = re.compile(rf'^{re.escape(self.instance_name)}_(\d+){re.escape(SEGMENT_SUFFIX)}$')
+        sequences = [int(m.group(1)) for m in (pattern.match(name) for name in os.listdir(self.directory)) if m]
+        sequence = max(sequences) + 1 if sequences else 1
+        return os.path.join(self.directory, f"{self.instance_name}_{sequence:06d}{SEGMENT_SUFFIX}")
+    
+    def _fsync_path(self, file_path):
+        """刷盘指定文件"""
+        if not os.path.exists(file_path):
+            return
+        fd = os.open(file_path, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+    
+    def _current_segment(self, segment_state):
+        """获取当前写入的段文件，日期目录变化或超过大小上限时轮转"""
+        file_path = segment_state.get('path')
+        if file_path and os.path.dirname(file_path) == os.path.abspath(self.directory) \
+                and os.path.exists(file_path) and os.path.getsize(file_path) < self.options['max_bytes']:
+            return file_path
+        
+        # 轮转前先将旧段文件中未刷盘的记录落盘
+        if file_path and segment_state.get('unsynced'):
+            self._fsync_path(file_path)
+        segment_state['unsynced'] = 0
+        segment_state['path'] = os.path.abspath(self._next_segment_path())
+        segment_state['end'] = 0
+        return segment_state['path']
+    
+    def _check_tail(self, file_path, segment_state):
+        """写入前核对段文件大小与上次写入后记录的结束偏移量
+        
+        一致时直接追加。文件更长说明上次写入后状态未保存或写入中断：其后都是完整记录时只推进结束偏移量，
+        末尾是残缺记录时截掉；文件更短、没有记录结束偏移量（旧版本状态）或残缺记录之后还有有效记录时，
+        轮转到新的段文件，不在残缺记录之后继续写入。
+        """
+        size = os.path.getsize(file_path) if os.path.exists(file_path) else 0
+        end = segment_state.get('end')
+        if end == size:
+            return file_path
+        if end is not None and end < size:
+            valid_end, has_more = _scan_valid_end(file_path, end)
+            if valid_end == size:
+                segment_state['end'] = size
+                return file_path
+            if not has_more:
+                print(f"[WARNING] 段文件末尾有未写完的记录，已截断: {file_path}@{valid_end}")
+                os.truncate(file_path, valid_end)
+                segment_state['end'] = valid_end
+                return file_path
+        
+        print(f"[WARNING] 段文件大小与写入状态不一致，轮转到新的段文件: {file_path}")
+        if segment_state.get('unsynced'):
+            self._fsync_path(file_path)
+        segment_state['unsynced'] = 0
+        segment_state['path'] = os.path.abspath(self._next_segment_path())
+        segment_state['end'] = 0
+        return segment_state['path']
+    
+    def append(self, payload):
+        """追加一条记录，返回(段文件路径, 记录起始偏移量)"""
+        os.makedirs(self.directory, exist_ok=True)
+        segment_state = dict(self.state.get('segment', {}))
+        file_path = self._check_tail(self._current_segment(segment_state), segment_state)
+        
+        fd = os.open(file_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            offset = os.lseek(fd, 0, os.SEEK_END)
+            # 整条记录一次写入，读取方通过长度、校验和及提交标记识别未写完的记录
+            record = encode_record(payload)
+            written = os.write(fd, record)
+            if written != len(record):
+                raise OSError(f"段文件记录只写入了{written}/{len(record)}字节: {file_path}")
+            segment_state['end'] = offset + written
+            
+            segment_state['unsynced'] = segment_state.get('unsynced', 0) + 1
+            now = time.time()
+            if segment_state['unsynced'] >= self.options['fsync_batch'] \
+                    or now - segment_state.get('last_fsync', 0) >= self.options['fsync_interval']:
+                os.fsync(fd)
+                segment_state['unsynced'] = 0
+                segment_state['last_fsync'] = now
+        finally:
+            os.close(fd)
+        
+        self.state.set('segment', segment_state)
+        return file_path, offset
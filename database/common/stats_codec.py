@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+import os
+import json
+
+# 可选依赖：orjson序列化更快，zstandard用于压缩监控结果
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# zstd帧的魔数，读取时据此识别压缩文件
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+
+# 监控结果文件的扩展名
+STATS_FILE_SUFFIXES = ('.json', '.json.zst')
+
+def get_codec_options():
+    """获取监控结果的序列化选项"""
+    return {
+        'use_orjson': os.getenv('STATS_USE_ORJSON', 'true').lower() == 'true',
+        'compression': os.getenv('STATS_COMPRESSION', 'none').lower(),
+        'zstd_level': int(os.getenv('STATS_ZSTD_LEVEL', 3))
+    }
+
+def json_default(data):
+    """将驱动未转换的Decimal、datetime等非JSON类型转换为float，无法转换时转为字符串"""
+    try:
+        return float(data)
+    except (TypeError, ValueError):
+        return str(data)
+
+def dumps(data, use_orjson=True):
+    """序列化为紧凑的UTF-8 JSON字节串，安装了orjson时优先使用orjson"""
+    if use_orjson and orjson is not None:
+        try:
+            # datetime交给json_default处理，与json模块的输出保持一致
+            return orjson.dumps(data, default=json_default, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME)
+        except TypeError:
+            # orjson不支持超过64位的整数等情况，退回json模块
+            pass
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':'), default=json_default).encode('utf-8')
+
+def encode_stats(data, options=None):
+    """编码监控结果，返回(字节串, 文件扩展名)"""
+    options = options or get_codec_options()
+    raw = dumps(data, options['use_orjson'])
+    if options['compression'] == 'zstd':
+        if zstandard is None:
+            print("[WARNING] 未安装zstandard，监控结果不压缩")
+        else:
+            return zstandard.ZstdCompressor(level=options['zstd_level']).compress(raw), '.json.zst'
+    return raw, '.json'
+
+def decode_stats(raw):
+    """解码监控结果，自动识别zstd压缩"""
+    if raw[:4] == ZSTD_MAGIC:
+        if zstandard is None:
+            raise RuntimeError("文件为zstd压缩格式，需要安装zstandard")
+        raw = zstandard.ZstdDecompressor().decompress(raw)
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw.decode('utf-8'))
+
+def is_stats_file(file_name):
+    """判断是否为监控结果文件"""
+    return file_name.endswith(STATS_FILE_SUFFIXES)
+
+def read_stats_file(file_path):
+    """读取监控结果文件（支持紧凑JSON、缩进JSON和zstd压缩的JSON）"""
+    with open(file_path, 'rb') as f:
+        return decode_stats(f.read())
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+import os
+import time
+import heapq
+
+def get_top_sql_options():
+    """获取Top SQL采集选项"""
+    return {
+        # 每个排序维度保留的语句数
+        'limit': int(os.getenv('TOP_SQL_LIMIT', 10)),
+        # 每次快照读取的语句数上限（按累计耗时），同时也是状态中保存的基线条数上限
+        'snapshot_limit': int(os.getenv('TOP_SQL_SNAPSHOT_LIMIT', 500)),
+        # 语句文本截断长度
+        'text_length': int(os.getenv('TOP_SQL_TEXT_LENGTH', 200))
+    }
+
+def _delta(current, previous):
+    """计算累计值的增量，累计值变小（统计被重置）时以当前值作为增量"""
+    if previous is None or current < previous:
+        return current
+    return current - previous
+
+def diff_top_sql(state, rows, options=None):
+    """将语句统计快照与上一次快照比较，返回本周期按耗时、执行次数、行数排序的Top-N语句
+    
+    rows中的每一项为{'id', 'query', 'calls', 'total_time_ms', 'rows'}，数值为累计值；
+    上一次快照只保存{id: [calls, total_time_ms, rows]}，条数不超过snapshot_limit。
+    上次快照中没有的语句，若上次快照未被截断则视为新语句，以累计值作为增量。
+    第一次采集没有基线，只保存快照，返回的语句列表为空；state为None时返回None。
+    """
+    if state is None:
+        # 没有实例状态时无法保存基线，也就无法计算增量
+        return None
+    options = options or get_top_sql_options()
+    now = time.time()
+    previous = state.get('top_sql_snapshot')
+    snapshot = {}
+    deltas = []
+    
+    for row in rows:
+        key = str(row['id'])
+        calls = float(row['calls'] or 0)
+        total_time = float(row['total_time_ms'] or 0)
+        row_count = float(row['rows'] or 0)
+        snapshot[key] = [calls, total_time, row_count]
+        if previous is None:
+            continue
+        
+        last = previous['statements'].get(key)
+        if last is None:
+            if previous.get('truncated'):
+                # 上次快照被截断时，新出现的语句可能只是累计耗时刚进入前snapshot_limit条，先建立基线
+                continue
+            last = [None, None, None]
+        delta_calls = _delta(calls, last[0])
+        if delta_calls <= 0:
+            continue
+        delta_time = _delta(total_time, last[1])
+        deltas.append({
+            'id': key,
+            'query': (row.get('query') or '')[:options['text_length']],
+            'calls': delta_calls,
+            'total_time_ms': round(delta_time, 3),
+            'avg_time_ms': round(delta_time / delta_calls, 3),
+            'rows': _delta(row_count, last[2])
+        })
+    
+    state.set('top_sql_snapshot', {
+        'time': now,
+        'truncated': len(rows) >= options['snapshot_limit'],
+        'statements': snapshot
+    })
+    
+    result = {
+        'interval_seconds': round(now - previous['time'], 2) if previous else None,
+        'statements_tracked': len(snapshot),
+        'statements_active': len(deltas)
+    }
+    # 三个维度分别取Top-N，堆选择避免对全部语句排序，增量为0的语句不参与该维度排名
+    for name, key in (('by_time', 'total_time_ms'), ('by_calls', 'calls'), ('by_rows', 'rows')):
+        result[name] = heapq.nlargest(options['limit'], (item for item in deltas if item[key] > 0), key=lambda item: item[key])
+    return result
+
+def print_top_sql(top_sql, count=5):
+    """打印本周期耗时最多的语句"""
+    if not top_sql or not top_sql.get('by_time'):
+        return
+    print(f"\nTop SQL(本周期{top_sql['interval_seconds']}秒，活跃语句{top_sql['statements_active']}条):")
+    for item in top_sql['by_time'][:count]:
+        query = ' '.join(item['query'].split())[:80]
+        print(f"  {item['total_time_ms']:.1f}ms / {item['calls']:.0f}次 / 平均{item['avg_time_ms']:.2f}ms - {query}")
@@ -1,10 +1,15 @@
 #!/usr/bin/env python3
 import os
-import time
-import json
+import sys
 import dmPython
 from dotenv import load_dotenv
 
+# 添加数据库目录到Python路径，以便导入公共模块
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from common.base_monitor import BaseMonitor
+from common.process_summary import summarize_sessions
+from common.blocking import get_blocking_options, build_blocking_chains, print_blocking_chains
+
 # 加载配置文件
 load_dotenv()
 
@@ -22,6 +27,10 @@ SLOW_QUERY_THRESHOLD = float(os.getenv('SLOW_QUERY_THRESHOLD', 1))
 CACHE_HIT_RATE_THRESHOLD = float(os.getenv('CACHE_HIT_RATE_THRESHOLD', 90))
 TABLESPACE_USAGE_THRESHOLD = float(os.getenv('TABLESPACE_USAGE_THRESHOLD', 80))
 
+# 会话明细阈值：仅当存在运行时间超过阈值(秒)的会话时，返回最多PROCESS_LIST_LIMIT条明细
+PROCESS_TIME_THRESHOLD = float(os.getenv('PROCESS_TIME_THRESHOLD', SLOW_QUERY_THRESHOLD))
+PROCESS_LIST_LIMIT = int(os.getenv('PROCESS_LIST_LIMIT', 20))
+
 # 监控间隔
 MONITOR_INTERVAL = int(os.getenv('MONITOR_INTERVAL', 60))
 
@@ -29,53 +38,42 @@ MONITOR_INTERVAL = int(os.getenv('MONITOR_INTERVAL', 60))
 ALERT_ENABLED = os.getenv('ALERT_ENABLED', 'true').lower() == 'true'
 ALERT_EMAIL = os.getenv('ALERT_EMAIL', 'admin@example.com')
 
-class DMMonitor:
+class DMMonitor(BaseMonitor):
+    METRICS = {**BaseMonitor.METRICS, 'blocking_chains': {'func': 'get_blocking_chains'}}
+    
+    DB_LABEL = '达梦'
+    TABLESPACE_KEY = 'tablespace'
+    
+    # 告警阈值
+    THRESHOLDS = {
+        'max_connections_threshold': MAX_CONNECTIONS_THRESHOLD,
+        'max_qps_threshold': MAX_QPS_THRESHOLD,
+        'slow_query_threshold': SLOW_QUERY_THRESHOLD,
+        'cache_hit_rate_threshold': CACHE_HIT_RATE_THRESHOLD,
+        'tablespace_usage_threshold': TABLESPACE_USAGE_THRESHOLD
+    }
+    ALERT_ENABLED = ALERT_ENABLED
+    
     def __init__(self, config=None, instance_name=None):
-        self.conn = None
-        self.cursor = None
+        super().__init__(config, instance_name)
         # 使用传入的配置或环境变量
-        self.config = config or {}
-        self.instance_name = instance_name
         self.host = self.config.get('host', DM_HOST)
         self.port = self.config.get('port', DM_PORT)
         self.user = self.config.get('user', DM_USER)
         self.password = self.config.get('password', DM_PASSWORD)
         self.database = self.config.get('database', DM_DATABASE)
     
-    def connect(self):
-        """连接到达梦数据库"""
-        try:
-            self.conn = dmPython.connect(
-                user=self.user,
-                password=self.password,
-                server=self.host,
-                port=self.port,
-                database=self.database
-            )
-            self.cursor = self.conn.cursor()
-            print(f"[INFO] 成功连接到达梦数据库: {self.host}:{self.port}")
-            return True
-        except Exception as e:
-            print(f"[ERROR] 连接达梦数据库失败: {e}")
-            return False
-    
-    def disconnect(self):
-        """断开数据库连接"""
-        if self.cursor:
-            self.cursor.close()
-        if self.conn:
-            self.conn.close()
-        print("[INFO] 数据库连接已断开")
-    
-    def get_connection_status(self):
-        """获取连接状态"""
-        try:
-            self.cursor.execute("SELECT 1")
-            result = self.cursor.fetchone()
-            return result is not None
-        except Exception as e:
-            print(f"[ERROR] 检查连接状态失败: {e}")
-            return False
+    def open_connection(self):
+        """建立达梦数据库连接"""
+        conn = dmPython.connect(
+            user=self.user,
+            password=self.password,
+            server=self.host,
+            port=self.port,
+            database=self.database,
+            login_timeout=int(self.connect_timeout)
+        )
+        return conn, conn.cursor()
     
     def get_connection_stats(self):
         """获取连接统计信息"""
@@ -209,34 +207,55 @@ class DMMonitor:
             return None
     
     def get_process_list(self):
-        """获取数据库进程列表"""
+        """获取数据库会话汇总，仅在存在长时间运行的会话时返回Top-N明细"""
         try:
+            # 在服务端按状态、用户、主机聚合，避免拉取全部会话
             self.cursor.execute("""
                 SELECT 
-                    SESS_ID,
+                    STATE,
                     USERNAME,
-                    APPNAME,
                     CLIENT_IP,
-                    STATE,
-                    SQL_TEXT,
-                    LOGIN_TIME
+                    COUNT(*) as SESSIONS,
+                    SUM(CASE WHEN STATE = 'ACTIVE' AND DATEDIFF(SECOND, LAST_RECV_TIME, SYSDATE) >= ? THEN 1 ELSE 0 END) as LONG_RUNNING
                 FROM V$SESSION
                 WHERE SESS_ID != SYS_CONTEXT('USERENV', 'SESSIONID')
-            """)
-            
-            processes = []
-            for row in self.cursor.fetchall():
-                processes.append({
-                    'sess_id': row[0],
-                    'username': row[1],
-                    'appname': row[2],
-                    'client_ip': row[3],
-                    'state': row[4],
-                    'sql_text': row[5],
-                    'login_time': str(row[6]) if row[6] else None
-                })
+                GROUP BY STATE, USERNAME, CLIENT_IP
+            """, (PROCESS_TIME_THRESHOLD,))
+            summary = summarize_sessions(self.cursor.fetchall())
+            summary['time_threshold'] = PROCESS_TIME_THRESHOLD
+            summary['top_sessions'] = []
             
-            return processes
+            # 仅在存在超过阈值的会话时获取明细
+            if summary['long_running'] > 0:
+                self.cursor.execute("""
+                    SELECT 
+                        SESS_ID,
+                        USERNAME,
+                        APPNAME,
+                        CLIENT_IP,
+                        STATE,
+                        SUBSTR(SQL_TEXT, 1, 1000) as SQL_TEXT,
+                        LOGIN_TIME,
+                        DATEDIFF(SECOND, LAST_RECV_TIME, SYSDATE) as ELAPSED_SECONDS
+                    FROM V$SESSION
+                    WHERE SESS_ID != SYS_CONTEXT('USERENV', 'SESSIONID')
+                    AND STATE = 'ACTIVE'
+                    AND DATEDIFF(SECOND, LAST_RECV_TIME, SYSDATE) >= ?
+                    ORDER BY LAST_RECV_TIME
+                    LIMIT ?
+                """, (PROCESS_TIME_THRESHOLD, PROCESS_LIST_LIMIT))
+                for row in self.cursor.fetchall():
+                    summary['top_sessions'].append({
+                        'sess_id': row[0],
+                        'username': row[1],
+                        'appname': row[2],
+                        'client_ip': row[3],
+                        'state': row[4],
+                        'sql_text': row[5],
+                        'login_time': str(row[6]) if row[6] else None,
+                        'elapsed_seconds': row[7]
+                    })
+            return summary
         except Exception as e:
             print(f"[ERROR] 获取进程列表失败: {e}")
             return None
@@ -280,221 +299,79 @@ class DMMonitor:
             print(f"[ERROR] 获取复制状态失败: {e}")
             return {'status': 'Error', 'error': str(e)}
     
-    def check_thresholds(self, stats):
-        """检查阈值并生成告警"""
-        alerts = []
-        
-        # 检查连接数
-        if stats.get('connection_stats'):
-            conn_percent = stats['connection_stats']['connection_percent']
-            if conn_percent > MAX_CONNECTIONS_THRESHOLD:
-                alerts.append({
-                    'level': 'WARNING',
-                    'message': f'连接数使用率过高: {conn_percent:.2f}% (阈值: {MAX_CONNECTIONS_THRESHOLD}%)',
-                    'metric': 'connection_percent',
-                    'value': conn_percent,
-                    'threshold': MAX_CONNECTIONS_THRESHOLD
-                })
-        
-        # 检查QPS
-        if stats.get('qps'):
-            qps_value = stats['qps']['qps']
-            if qps_value > MAX_QPS_THRESHOLD:
-                alerts.append({
-                    'level': 'WARNING',
-                    'message': f'QPS过高: {qps_value:.2f} (阈值: {MAX_QPS_THRESHOLD})',
-                    'metric': 'qps',
-                    'value': qps_value,
-                    'threshold': MAX_QPS_THRESHOLD
-                })
-        
-        # 检查慢查询
-        if stats.get('slow_queries'):
-            slow_query_count = stats['slow_queries']['slow_queries']
-            if slow_query_count > 0:
-                alerts.append({
-                    'level': 'WARNING',
-                    'message': f'存在慢查询: {slow_query_count} 条',
-                    'metric': 'slow_queries',
-                    'value': slow_query_count,
-                    'threshold': 0
-                })
-        
-        # 检查缓存命中率
-        if stats.get('cache_hit_rate'):
-            cache_rate = stats['cache_hit_rate']['cache_hit_rate']
-            if cache_rate < CACHE_HIT_RATE_THRESHOLD:
-                alerts.append({
-                    'level': 'WARNING',
-                    'message': f'缓存命中率过低: {cache_rate:.2f}% (阈值: {CACHE_HIT_RATE_THRESHOLD}%)',
-                    'metric': 'cache_hit_rate',
-                    'value': cache_rate,
-                    'threshold': CACHE_HIT_RATE_THRESHOLD
-                })
-        
-        # 检查表空间使用情况
-        if stats.get('tablespace_usage'):
-            for tablespace in stats['tablespace_usage']:
-                if tablespace['usage_percent'] > TABLESPACE_USAGE_THRESHOLD:
-                    alerts.append({
-                        'level': 'WARNING',
-                        'message': f'表空间 {tablespace["tablespace"]} 使用率过高: {tablespace["usage_percent"]:.2f}% (阈值: {TABLESPACE_USAGE_THRESHOLD}%)',
-                        'metric': 'tablespace_usage',
-                        'value': tablespace['usage_percent'],
-                        'threshold': TABLESPACE_USAGE_THRESHOLD,
-                        'tablespace': tablespace['tablespace']
-                    })
-        
-        return alerts
-    
-    def send_alert(self, alert):
-        """发送告警"""
-        if ALERT_ENABLED:
-            print(f"[ALERT] [{alert['level']}] {alert['message']}")
-            # 这里可以添加邮件发送逻辑
-            # import smtplib
-            # from email.mime.text import MIMEText
-            # ...
-    
-    def _convert_decimal_to_float(self, data):
-        """将数据中的Decimal类型转换为float类型"""
-        if isinstance(data, dict):
-            return {k: self._convert_decimal_to_float(v) for k, v in data.items()}
-        elif isinstance(data, list):
-            return [self._convert_decimal_to_float(item) for item in data]
-        elif isinstance(data, (int, float, str, bool, type(None))):
-            return data
-        else:
-            try:
-                return float(data)
-            except:
-                return str(data)
-    
-    def save_stats_to_json(self, stats, alerts):
-        """保存监控结果为JSON文件"""
+    def get_blocking_chains(self):
+        """获取锁等待阻塞链（基于V$LOCK，等待中的锁BLOCKED=1，ROW_IDX为阻塞事务ID）"""
+        options = get_blocking_options()
         try:
-            # 构建完整的监控数据
-            monitor_data = {
-                'timestamp': time.strftime('%Y-%m-%d %H:%M:%S'),
-                'monitor_time': time.time(),
-                'instance_name': self.instance_name,
-                'stats': self._convert_decimal_to_float(stats),
-                'alerts': self._convert_decimal_to_float(alerts),
-                'thresholds': {
-                    'max_connections_threshold': MAX_CONNECTIONS_THRESHOLD,
-                    'max_qps_threshold': MAX_QPS_THRESHOLD,
-                    'slow_query_threshold': SLOW_QUERY_THRESHOLD,
-                    'cache_hit_rate_threshold': CACHE_HIT_RATE_THRESHOLD,
-                    'tablespace_usage_threshold': TABLESPACE_USAGE_THRESHOLD
-                }
-            }
-            
-            # 生成文件名，包含实例名称和时间戳
-            file_name = f"{self.instance_name}_{time.strftime('%Y%m%d_%H%M%S')}.json"
-            # 使用传递的监控目录或默认目录
-            if self.monitor_dir:
-                file_path = os.path.join(self.monitor_dir, file_name)
-            else:
-                file_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'monitor', file_name)
-            
-            # 写入JSON文件
-            with open(file_path, 'w', encoding='utf-8') as f:
-                json.dump(monitor_data, f, ensure_ascii=False, indent=2)
+            self.cursor.execute("""
+                SELECT DISTINCT
+                    W.SESS_ID,
+                    W.USERNAME,
+                    W.STATE,
+                    SUBSTR(W.SQL_TEXT, 1, ?) as WAITING_SQL,
+                    DATEDIFF(SECOND, W.LAST_RECV_TIME, SYSDATE) as WAIT_SECONDS,
+                    B.SESS_ID,
+                    B.USERNAME,
+                    B.STATE,
+                    SUBSTR(B.SQL_TEXT, 1, ?) as BLOCKING_SQL
+                FROM V$LOCK L
+                JOIN V$SESSION W ON W.TRX_ID = L.TRX_ID
+                JOIN V$SESSION B ON B.TRX_ID = L.ROW_IDX
+                WHERE L.BLOCKED = 1
+            """, (options['text_length'], options['text_length']))
             
-            print(f"[INFO] 监控结果已保存到: {file_path}")
+            waits = []
+            sessions = {}
+            for row in self.cursor.fetchall():
+                sessions[row[0]] = {'user': row[1], 'state': row[2], 'query': row[3]}
+                sessions.setdefault(row[5], {'user': row[6], 'state': row[7], 'query': row[8]})
+                waits.append((row[0], row[5], row[4]))
+            return build_blocking_chains(waits, sessions, options['limit'])
         except Exception as e:
-            print(f"[ERROR] 保存监控结果到JSON文件失败: {e}")
+            print(f"[ERROR] 获取阻塞链失败: {e}")
+            return None
     
-    def run_monitor(self, monitor_dir=None):
-        """运行监控"""
-        print(f"\n[INFO] 开始监控 - {time.strftime('%Y-%m-%d %H:%M:%S')}")
-        self.monitor_dir = monitor_dir
+    def print_stats(self, stats):
+        """输出监控结果"""
+        # 连接统计
+        if stats['connection_stats']:
+            conn_stats = stats['connection_stats']
+            print(f"连接数: {conn_stats['current_connections']}/{conn_stats['max_connections']} ({conn_stats['connection_percent']:.2f}%)")
+            print(f"活跃连接数: {conn_stats['active_connections']}")
         
-        # 初始化监控数据
-        stats = {
-            'connection_status': False,
-            'connection_stats': None,
-            'qps': None,
-            'slow_queries': None,
-            'cache_hit_rate': None,
-            'tablespace_usage': None,
-            'process_list': None,
-            'replication_status': None,
-            'connection_error': None
-        }
+        # QPS
+        if stats['qps']:
+            print(f"QPS: {stats['qps']['qps']:.2f}")
         
-        # 连接数据库
-        if not self.connect():
-            error_msg = "无法连接数据库"
-            print(f"[ERROR] {error_msg}")
-            stats['connection_error'] = error_msg
-        else:
-            # 收集监控数据
-            stats['connection_status'] = self.get_connection_status()
-            stats['connection_stats'] = self.get_connection_stats()
-            stats['qps'] = self.get_qps()
-            stats['slow_queries'] = self.get_slow_queries()
-            stats['cache_hit_rate'] = self.get_cache_hit_rate()
-            stats['tablespace_usage'] = self.get_tablespace_usage()
-            stats['process_list'] = self.get_process_list()
-            stats['replication_status'] = self.get_replication_status()
-            
-            # 输出监控结果
-            print("\n=== 监控结果 ===")
-            
-            # 连接状态
-            print(f"连接状态: {'正常' if stats['connection_status'] else '异常'}")
-            
-            # 连接统计
-            if stats['connection_stats']:
-                conn_stats = stats['connection_stats']
-                print(f"连接数: {conn_stats['current_connections']}/{conn_stats['max_connections']} ({conn_stats['connection_percent']:.2f}%)")
-                print(f"活跃连接数: {conn_stats['active_connections']}")
-            
-            # QPS
-            if stats['qps']:
-                print(f"QPS: {stats['qps']['qps']:.2f}")
-            
-            # 慢查询
-            if stats['slow_queries']:
-                print(f"慢查询数: {stats['slow_queries']['slow_queries']}")
-                print(f"慢查询阈值: {stats['slow_queries']['slow_query_time']}秒")
-            
-            # 缓存命中率
-            if stats['cache_hit_rate']:
-                print(f"缓存命中率: {stats['cache_hit_rate']['cache_hit_rate']:.2f}%")
-            
-            # 表空间使用情况
-            if stats['tablespace_usage']:
-                print("\n表空间使用情况:")
-                for ts in stats['tablespace_usage']:
-                    print(f"  {ts['tablespace']}: {ts['used_mb']:.2f}MB/{ts['total_mb']:.2f}MB ({ts['usage_percent']:.2f}%)")
-            
-            # 复制状态
-            if stats['replication_status']:
-                print(f"\n复制状态: {stats['replication_status']['status']}")
-                if 'role' in stats['replication_status']:
-                    print(f"  角色: {stats['replication_status']['role']}")
-                if 'replication_state' in stats['replication_status']:
-                    print(f"  复制状态: {stats['replication_status']['replication_state']}")
+        # 慢查询
+        if stats['slow_queries']:
+            print(f"慢查询数: {stats['slow_queries']['slow_queries']}")
+            print(f"慢查询阈值: {stats['slow_queries']['slow_query_time']}秒")
+        
+        # 缓存命中率
+        if stats['cache_hit_rate']:
+            print(f"缓存命中率: {stats['cache_hit_rate']['cache_hit_rate']:.2f}%")
         
-        # 检查阈值并生成告警
-        alerts = self.check_thresholds(stats)
-        if alerts:
-            print("\n=== 告警信息 ===")
-            for alert in alerts:
-                self.send_alert(alert)
-        else:
-            print("\n=== 告警信息 ===")
-            print("无告警")
+        # 表空间使用情况
+        if stats['tablespace_usage']:
+            print("\n表空间使用情况:")
+            for ts in stats['tablespace_usage']:
+                print(f"  {ts['tablespace']}: {ts['used_mb']:.2f}MB/{ts['total_mb']:.2f}MB ({ts['usage_percent']:.2f}%)")
         
-        # 保存监控结果为JSON文件
-        self.save_stats_to_json(stats, alerts)
+        # 会话汇总
+        if stats['process_list']:
+            print(f"\n会话数: {stats['process_list']['total_sessions']} (运行超过{PROCESS_TIME_THRESHOLD}秒: {stats['process_list']['long_running']})")
         
-        # 断开连接
-        self.disconnect()
+        # 复制状态
+        if stats['replication_status']:
+            print(f"\n复制状态: {stats['replication_status']['status']}")
+            if 'role' in stats['replication_status']:
+                print(f"  角色: {stats['replication_status']['role']}")
+            if 'replication_state' in stats['replication_status']:
+                print(f"  复制状态: {stats['replication_status']['replication_state']}")
         
-        print(f"\n[INFO] 监控完成 - {time.strftime('%Y-%m-%d %H:%M:%S')}")
+        # 阻塞链
+        print_blocking_chains(stats.get('blocking_chains'))
 
 if __name__ == "__main__":
     monitor = DMMonitor()
@@ -1,10 +1,18 @@
 #!/usr/bin/env python3
 import os
-import time
-import json
+import sys
 import psycopg2
+import psycopg2.extensions
 from dotenv import load_dotenv
 
+# 添加数据库目录到Python路径，以便导入公共模块
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from common.base_monitor import BaseMonitor
+from common.process_summary import summarize_sessions
+from common.replication_lag import summarize_replication_lag, print_replication_lag
+from common.blocking import get_blocking_options, build_blocking_chains, print_blocking_chains
+from common.top_sql import get_top_sql_options, diff_top_sql, print_top_sql
+
 # 加载配置文件
 load_dotenv()
 
@@ -22,6 +30,18 @@ SLOW_QUERY_THRESHOLD = float(os.getenv('SLOW_QUERY_THRESHOLD', 1))
 CACHE_HIT_RATE_THRESHOLD = float(os.getenv('CACHE_HIT_RATE_THRESHOLD', 90))
 TABLESPACE_USAGE_THRESHOLD = float(os.getenv('TABLESPACE_USAGE_THRESHOLD', 80))
 
+# 会话明细阈值：仅当存在运行时间超过阈值(秒)的会话时，返回最多PROCESS_LIST_LIMIT条明细
+PROCESS_TIME_THRESHOLD = float(os.getenv('PROCESS_TIME_THRESHOLD', SLOW_QUERY_THRESHOLD))
+PROCESS_LIST_LIMIT = int(os.getenv('PROCESS_LIST_LIMIT', 20))
+
+# Top SQL来源（视图, 累计耗时列），按顺序尝试
+TOP_SQL_SOURCES = (
+    ('sys_stat_statements', 'total_exec_time'),
+    ('sys_stat_statements', 'total_time'),
+    ('pg_stat_statements', 'total_exec_time'),
+    ('pg_stat_statements', 'total_time')
+)
+
 # 监控间隔
 MONITOR_INTERVAL = int(os.getenv('MONITOR_INTERVAL', 60))
 
@@ -29,53 +49,66 @@ MONITOR_INTERVAL = int(os.getenv('MONITOR_INTERVAL', 60))
 ALERT_ENABLED = os.getenv('ALERT_ENABLED', 'true').lower() == 'true'
 ALERT_EMAIL = os.getenv('ALERT_EMAIL', 'admin@example.com')
 
-class KingbaseMonitor:
+# 驱动取数时完成类型转换：NUMERIC转为float，日期时间和时间间隔保留数据库返回的字符串
+DEC2FLOAT = psycopg2.extensions.new_type(
+    psycopg2.extensions.DECIMAL.values,
+    'DEC2FLOAT',
+    lambda value, cursor: float(value) if value is not None else None
+)
+DATETIME2STR = psycopg2.extensions.new_type(
+    psycopg2.extensions.PYDATETIME.values + psycopg2.extensions.PYDATETIMETZ.values
+    + psycopg2.extensions.PYDATE.values + psycopg2.extensions.PYTIME.values
+    + psycopg2.extensions.PYINTERVAL.values,
+    'DATETIME2STR',
+    lambda value, cursor: value
+)
+
+class KingbaseMonitor(BaseMonitor):
+    METRICS = {
+        **BaseMonitor.METRICS,
+        'top_sql': {'func': 'get_top_sql'},
+        'blocking_chains': {'func': 'get_blocking_chains'},
+        'replication_lag': {'func': 'get_replication_lag'}
+    }
+    
+    DB_LABEL = 'Kingbase'
+    
+    # 告警阈值
+    THRESHOLDS = {
+        'max_connections_threshold': MAX_CONNECTIONS_THRESHOLD,
+        'max_qps_threshold': MAX_QPS_THRESHOLD,
+        'slow_query_threshold': SLOW_QUERY_THRESHOLD,
+        'cache_hit_rate_threshold': CACHE_HIT_RATE_THRESHOLD,
+        'tablespace_usage_threshold': TABLESPACE_USAGE_THRESHOLD
+    }
+    ALERT_ENABLED = ALERT_ENABLED
+    
     def __init__(self, config=None, instance_name=None):
-        self.conn = None
-        self.cursor = None
+        super().__init__(config, instance_name)
         # 使用传入的配置或环境变量
-        self.config = config or {}
-        self.instance_name = instance_name
         self.host = self.config.get('host', KB_HOST)
         self.port = self.config.get('port', KB_PORT)
         self.user = self.config.get('user', KB_USER)
         self.password = self.config.get('password', KB_PASSWORD)
         self.database = self.config.get('database', KB_DATABASE)
     
-    def connect(self):
-        """连接到Kingbase数据库"""
-        try:
-            self.conn = psycopg2.connect(
-                host=self.host,
-                port=self.port,
-                user=self.user,
-                password=self.password,
-                database=self.database
-            )
-            self.cursor = self.conn.cursor()
-            print(f"[INFO] 成功连接到Kingbase数据库: {self.host}:{self.port}")
-            return True
-        except Exception as e:
-            print(f"[ERROR] 连接Kingbase数据库失败: {e}")
-            return False
-    
-    def disconnect(self):
-        """断开数据库连接"""
-        if self.cursor:
-            self.cursor.close()
-        if self.conn:
-            self.conn.close()
-        print("[INFO] 数据库连接已断开")
-    
-    def get_connection_status(self):
-        """获取连接状态"""
-        try:
-            self.cursor.execute("SELECT 1")
-            result = self.cursor.fetchone()
-            return result is not None
-        except Exception as e:
-            print(f"[ERROR] 检查连接状态失败: {e}")
-            return False
+    def open_connection(self):
+        """建立Kingbase数据库连接"""
+        conn = psycopg2.connect(
+            host=self.host,
+            port=self.port,
+            user=self.user,
+            password=self.password,
+            database=self.database,
+            # libpq只接受整数秒，且最小为2秒
+            connect_timeout=max(2, int(self.connect_timeout))
+        )
+        # 只执行查询，使用自动提交，避免单个查询失败导致连接处于中止事务状态
+        conn.autocommit = True
+        # 驱动取数时完成类型转换
+        psycopg2.extensions.register_type(DEC2FLOAT, conn)
+        psycopg2.extensions.register_type(DATETIME2STR, conn)
+        return conn, conn.cursor()
     
     def get_connection_stats(self):
         """获取连接统计信息"""
@@ -221,38 +254,59 @@ class KingbaseMonitor:
             return None
     
     def get_process_list(self):
-        """获取数据库进程列表"""
+        """获取数据库会话汇总，仅在存在长时间运行的会话时返回Top-N明细"""
         try:
+            # 在服务端按状态、用户、主机聚合，避免拉取全部会话
             self.cursor.execute("""
                 SELECT 
-                    pid,
+                    coalesce(state, 'unknown') as state,
                     usename,
-                    datname,
-                    application_name,
-                    client_addr,
-                    client_port,
-                    backend_start,
-                    state,
-                    query
+                    coalesce(host(client_addr), 'local') as host,
+                    count(*) as sessions,
+                    sum(CASE WHEN state <> 'idle' AND now() - query_start > %s * interval '1 second' THEN 1 ELSE 0 END) as long_running
                 FROM pg_stat_activity
                 WHERE pid != pg_backend_pid()
-            """)
-            
-            processes = []
-            for row in self.cursor.fetchall():
-                processes.append({
-                    'pid': row[0],
-                    'usename': row[1],
-                    'datname': row[2],
-                    'application_name': row[3],
-                    'client_addr': str(row[4]) if row[4] else None,
-                    'client_port': row[5],
-                    'backend_start': str(row[6]) if row[6] else None,
-                    'state': row[7],
-                    'query': row[8]
-                })
+                GROUP BY 1, 2, 3
+            """, (PROCESS_TIME_THRESHOLD,))
+            summary = summarize_sessions(self.cursor.fetchall())
+            summary['time_threshold'] = PROCESS_TIME_THRESHOLD
+            summary['top_sessions'] = []
             
-            return processes
+            # 仅在存在超过阈值的会话时获取明细
+            if summary['long_running'] > 0:
+                self.cursor.execute("""
+                    SELECT 
+                        pid,
+                        usename,
+                        datname,
+                        application_name,
+                        client_addr,
+                        client_port,
+                        backend_start,
+                        state,
+                        extract(epoch from now() - query_start) as duration,
+                        left(query, 1000) as query
+                    FROM pg_stat_activity
+                    WHERE pid != pg_backend_pid()
+                    AND state <> 'idle'
+                    AND now() - query_start > %s * interval '1 second'
+                    ORDER BY query_start
+                    LIMIT %s
+                """, (PROCESS_TIME_THRESHOLD, PROCESS_LIST_LIMIT))
+                for row in self.cursor.fetchall():
+                    summary['top_sessions'].append({
+                        'pid': row[0],
+                        'usename': row[1],
+                        'datname': row[2],
+                        'application_name': row[3],
+                        'client_addr': str(row[4]) if row[4] else None,
+                        'client_port': row[5],
+                        'backend_start': str(row[6]) if row[6] else None,
+                        'state': row[7],
+                        'duration': row[8],
+                        'query': row[9]
+                    })
+            return summary
         except Exception as e:
             print(f"[ERROR] 获取进程列表失败: {e}")
             return None
@@ -289,207 +343,152 @@ class KingbaseMonitor:
             print(f"[ERROR] 获取复制状态失败: {e}")
             return {'status': 'Error', 'error': str(e)}
     
-    def check_thresholds(self, stats):
-        """检查阈值并生成告警"""
-        alerts = []
-        
-        # 检查连接数
-        if stats.get('connection_stats'):
-            conn_percent = stats['connection_stats']['connection_percent']
-            if conn_percent > MAX_CONNECTIONS_THRESHOLD:
-                alerts.append({
-                    'level': 'WARNING',
-                    'message': f'连接数使用率过高: {conn_percent:.2f}% (阈值: {MAX_CONNECTIONS_THRESHOLD}%)',
-                    'metric': 'connection_percent',
-                    'value': conn_percent,
-                    'threshold': MAX_CONNECTIONS_THRESHOLD
-                })
-        
-        # 检查QPS
-        if stats.get('qps'):
-            qps_value = stats['qps']['qps']
-            if qps_value > MAX_QPS_THRESHOLD:
-                alerts.append({
-                    'level': 'WARNING',
-                    'message': f'QPS过高: {qps_value:.2f} (阈值: {MAX_QPS_THRESHOLD})',
-                    'metric': 'qps',
-                    'value': qps_value,
-                    'threshold': MAX_QPS_THRESHOLD
-                })
-        
-        # 检查慢查询
-        if stats.get('slow_queries'):
-            slow_query_count = stats['slow_queries']['slow_queries']
-            if slow_query_count > 0:
-                alerts.append({
-                    'level': 'WARNING',
-                    'message': f'存在慢查询: {slow_query_count} 条',
-                    'metric': 'slow_queries',
-                    'value': slow_query_count,
-                    'threshold': 0
-                })
-        
-        # 检查缓存命中率
-        if stats.get('cache_hit_rate'):
-            cache_rate = stats['cache_hit_rate']['cache_hit_rate']
-            if cache_rate < CACHE_HIT_RATE_THRESHOLD:
-                alerts.append({
-                    'level': 'WARNING',
-                    'message': f'缓存命中率过低: {cache_rate:.2f}% (阈值: {CACHE_HIT_RATE_THRESHOLD}%)',
-                    'metric': 'cache_hit_rate',
-                    'value': cache_rate,
-                    'threshold': CACHE_HIT_RATE_THRESHOLD
-                })
-        
-        return alerts
-    
-    def send_alert(self, alert):
-        """发送告警"""
-        if ALERT_ENABLED:
-            print(f"[ALERT] [{alert['level']}] {alert['message']}")
-            # 这里可以添加邮件发送逻辑
-            # import smtplib
-            # from email.mime.text import MIMEText
-            # ...
-    
-    def _convert_decimal_to_float(self, data):
-        """将数据中的Decimal类型转换为float类型"""
-        if isinstance(data, dict):
-            return {k: self._convert_decimal_to_float(v) for k, v in data.items()}
-        elif isinstance(data, list):
-            return [self._convert_decimal_to_float(item) for item in data]
-        elif isinstance(data, (int, float, str, bool, type(None))):
-            return data
-        else:
+    def get_top_sql(self):
+        """获取本周期耗时、执行次数、返回行数最多的语句（需要安装sys_stat_statements或pg_stat_statements扩展）"""
+        options = get_top_sql_options()
+        last_error = None
+        # PostgreSQL 13起累计耗时列为total_exec_time，之前的版本为total_time；
+        # Kingbase的扩展视图名为sys_stat_statements，兼容模式下也可能为pg_stat_statements
+        for view, time_column in TOP_SQL_SOURCES:
             try:
-                return float(data)
-            except:
-                return str(data)
+                self.cursor.execute(f"""
+                    SELECT 
+                        concat_ws(':', userid, dbid, coalesce(queryid::text, md5(query))) as id,
+                        left(query, %s) as query,
+                        calls,
+                        {time_column} as total_time_ms,
+                        rows
+                    FROM {view}
+                    ORDER BY {time_column} DESC
+                    LIMIT %s
+                """, (options['text_length'], options['snapshot_limit']))
+            except psycopg2.Error as e:
+                last_error = e
+                continue
+            
+            columns = [desc[0] for desc in self.cursor.description]
+            rows = [dict(zip(columns, row)) for row in self.cursor.fetchall()]
+            return diff_top_sql(self.state, rows, options)
+        
+        print(f"[ERROR] 获取Top SQL失败: {last_error}")
+        return None
     
-    def save_stats_to_json(self, stats, alerts):
-        """保存监控结果为JSON文件"""
+    def get_blocking_chains(self):
+        """获取锁等待阻塞链（基于pg_blocking_pids）"""
+        options = get_blocking_options()
         try:
-            # 构建完整的监控数据
-            monitor_data = {
-                'timestamp': time.strftime('%Y-%m-%d %H:%M:%S'),
-                'monitor_time': time.time(),
-                'instance_name': self.instance_name,
-                'stats': self._convert_decimal_to_float(stats),
-                'alerts': self._convert_decimal_to_float(alerts),
-                'thresholds': {
-                    'max_connections_threshold': MAX_CONNECTIONS_THRESHOLD,
-                    'max_qps_threshold': MAX_QPS_THRESHOLD,
-                    'slow_query_threshold': SLOW_QUERY_THRESHOLD,
-                    'cache_hit_rate_threshold': CACHE_HIT_RATE_THRESHOLD,
-                    'tablespace_usage_threshold': TABLESPACE_USAGE_THRESHOLD
-                }
-            }
+            # 只对正在等待锁的会话调用pg_blocking_pids，同时取出这些会话的阻塞者
+            self.cursor.execute("""
+                WITH waits AS (
+                    SELECT pid, pg_blocking_pids(pid) as blockers
+                    FROM pg_stat_activity
+                    WHERE wait_event_type = 'Lock'
+                )
+                SELECT 
+                    a.pid,
+                    a.usename,
+                    a.state,
+                    left(a.query, %s) as query,
+                    EXTRACT(EPOCH FROM now() - coalesce(a.state_change, a.backend_start)) as wait_seconds,
+                    coalesce(w.blockers, '{}') as blockers
+                FROM pg_stat_activity a
+                LEFT JOIN waits w ON w.pid = a.pid
+                WHERE cardinality(w.blockers) > 0
+                OR a.pid IN (SELECT unnest(blockers) FROM waits)
+            """, (options['text_length'],))
             
-            # 生成文件名，包含实例名称和时间戳
-            file_name = f"{self.instance_name}_{time.strftime('%Y%m%d_%H%M%S')}.json"
-            # 使用传递的监控目录或默认目录
-            if self.monitor_dir:
-                file_path = os.path.join(self.monitor_dir, file_name)
-            else:
-                file_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'monitor', file_name)
+            waits = []
+            sessions = {}
+            for row in self.cursor.fetchall():
+                sessions[row[0]] = {'user': row[1], 'state': row[2], 'query': row[3]}
+                waits.extend((row[0], blocker, row[4]) for blocker in row[5])
+            return build_blocking_chains(waits, sessions, options['limit'])
+        except Exception as e:
+            print(f"[ERROR] 获取阻塞链失败: {e}")
+            return None
+    
+    def get_replication_lag(self):
+        """获取各副本的写入、刷盘、回放延迟（秒）和回放落后的WAL字节数"""
+        try:
+            self.cursor.execute("""
+                SELECT 
+                    application_name,
+                    client_addr,
+                    state,
+                    EXTRACT(EPOCH FROM write_lag) as write_lag,
+                    EXTRACT(EPOCH FROM flush_lag) as flush_lag,
+                    EXTRACT(EPOCH FROM replay_lag) as replay_lag,
+                    pg_wal_lsn_diff(pg_current_wal_lsn(), replay_lsn) as lag_bytes
+                FROM pg_stat_replication
+            """)
             
-            # 写入JSON文件
-            with open(file_path, 'w', encoding='utf-8') as f:
-                json.dump(monitor_data, f, ensure_ascii=False, indent=2)
+            replicas = []
+            for row in self.cursor.fetchall():
+                # 副本追上主库且没有新的WAL时延迟列为NULL，此时视为没有延迟
+                lag_seconds = row[5]
+                if lag_seconds is None and row[6] == 0:
+                    lag_seconds = 0.0
+                replicas.append({
+                    'replica': f"{row[0]}@{row[1]}" if row[1] else row[0],
+                    'state': row[2],
+                    'write_lag': row[3],
+                    'flush_lag': row[4],
+                    'replay_lag': row[5],
+                    'lag_bytes': row[6],
+                    'lag_seconds': lag_seconds
+                })
             
-            print(f"[INFO] 监控结果已保存到: {file_path}")
+            return summarize_replication_lag(self.state, replicas)
         except Exception as e:
-            print(f"[ERROR] 保存监控结果到JSON文件失败: {e}")
+            print(f"[ERROR] 获取复制延迟失败: {e}")
+            return None
     
-    def run_monitor(self, monitor_dir=None):
-        """运行监控"""
-        print(f"\n[INFO] 开始监控 - {time.strftime('%Y-%m-%d %H:%M:%S')}")
-        self.monitor_dir = monitor_dir
+    def print_stats(self, stats):
+        """输出监控结果"""
+        # 连接统计
+        if stats['connection_stats']:
+            conn_stats = stats['connection_stats']
+            print(f"连接数: {conn_stats['current_connections']}/{conn_stats['max_connections']} ({conn_stats['connection_percent']:.2f}%)")
+            print(f"活跃连接数: {conn_stats['active_connections']}")
         
-        # 初始化监控数据
-        stats = {
-            'connection_status': False,
-            'connection_stats': None,
-            'qps': None,
-            'slow_queries': None,
-            'cache_hit_rate': None,
-            'tablespace_usage': None,
-            'process_list': None,
-            'replication_status': None,
-            'connection_error': None
-        }
+        # QPS
+        if stats['qps']:
+            print(f"QPS: {stats['qps']['qps']:.2f}")
         
-        # 连接数据库
-        if not self.connect():
-            error_msg = "无法连接数据库"
-            print(f"[ERROR] {error_msg}")
-            stats['connection_error'] = error_msg
-        else:
-            # 收集监控数据
-            stats['connection_status'] = self.get_connection_status()
-            stats['connection_stats'] = self.get_connection_stats()
-            stats['qps'] = self.get_qps()
-            stats['slow_queries'] = self.get_slow_queries()
-            stats['cache_hit_rate'] = self.get_cache_hit_rate()
-            stats['tablespace_usage'] = self.get_tablespace_usage()
-            stats['process_list'] = self.get_process_list()
-            stats['replication_status'] = self.get_replication_status()
-            
-            # 输出监控结果
-            print("\n=== 监控结果 ===")
-            
-            # 连接状态
-            print(f"连接状态: {'正常' if stats['connection_status'] else '异常'}")
-            
-            # 连接统计
-            if stats['connection_stats']:
-                conn_stats = stats['connection_stats']
-                print(f"连接数: {conn_stats['current_connections']}/{conn_stats['max_connections']} ({conn_stats['connection_percent']:.2f}%)")
-                print(f"活跃连接数: {conn_stats['active_connections']}")
-            
-            # QPS
-            if stats['qps']:
-                print(f"QPS: {stats['qps']['qps']:.2f}")
-            
-            # 慢查询
-            if stats['slow_queries']:
-                print(f"慢查询数: {stats['slow_queries']['slow_queries']}")
-                print(f"慢查询阈值: {stats['slow_queries']['log_min_duration_statement']}")
-            
-            # 缓存命中率
-            if stats['cache_hit_rate']:
-                print(f"缓存命中率: {stats['cache_hit_rate']['cache_hit_rate']:.2f}%")
-            
-            # 表空间使用情况
-            if stats['tablespace_usage']:
-                print("\n表空间使用情况:")
-                for ts in stats['tablespace_usage']:
-                    print(f"  {ts['tablespace']}: {ts['size']}")
-            
-            # 复制状态
-            if stats['replication_status']:
-                print(f"\n复制状态: {stats['replication_status']['status']}")
-                if 'replicas' in stats['replication_status']:
-                    for replica in stats['replication_status']['replicas']:
-                        print(f"  副本: {replica['application_name']}, 状态: {replica['state']}, 延迟: {replica['lag_bytes']} bytes")
+        # 慢查询
+        if stats['slow_queries']:
+            print(f"慢查询数: {stats['slow_queries']['slow_queries']}")
+            print(f"慢查询阈值: {stats['slow_queries']['log_min_duration_statement']}")
+        
+        # 缓存命中率
+        if stats['cache_hit_rate']:
+            print(f"缓存命中率: {stats['cache_hit_rate']['cache_hit_rate']:.2f}%")
+        
+        # 表空间使用情况
+        if stats['tablespace_usage']:
+            print("\n表空间使用情况:")
+            for ts in stats['tablespace_usage']:
+                print(f"  {ts['tablespace']}: {ts['size']}")
+        
+        # 会话汇总
+        if stats['process_list']:
+            print(f"\n会话数: {stats['process_list']['total_sessions']} (运行超过{PROCESS_TIME_THRESHOLD}秒: {stats['process_list']['long_running']})")
         
-        # 检查阈值并生成告警
-        alerts = self.check_thresholds(stats)
-        if alerts:
-            print("\n=== 告警信息 ===")
-            for alert in alerts:
-                self.send_alert(alert)
-        else:
-            print("\n=== 告警信息 ===")
-            print("无告警")
+        # 复制状态
+        if stats['replication_status']:
+            print(f"\n复制状态: {stats['replication_status']['status']}")
+            if 'replicas' in stats['replication_status']:
+                for replica in stats['replication_status']['replicas']:
+                    print(f"  副本: {replica['application_name']}, 状态: {replica['state']}, 延迟: {replica['lag_bytes']} bytes")
         
-        # 保存监控结果为JSON文件
-        self.save_stats_to_json(stats, alerts)
+        # Top SQL
+        print_top_sql(stats.get('top_sql'))
         
-        # 断开连接
-        self.disconnect()
+        # 阻塞链
+        print_blocking_chains(stats.get('blocking_chains'))
         
-        print(f"\n[INFO] 监控完成 - {time.strftime('%Y-%m-%d %H:%M:%S')}")
+        # 复制延迟
+        print_replication_lag(stats.get('replication_lag'))
 
 if __name__ == "__main__":
     monitor = KingbaseMonitor()
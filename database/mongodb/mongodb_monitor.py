@@ -1,11 +1,18 @@
 #!/usr/bin/env python3
 import os
+import sys
 import time
-import json
+import concurrent.futures
 import pymongo
 from pymongo import MongoClient
 from dotenv import load_dotenv
 
+# 添加数据库目录到Python路径，以便导入公共模块
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from common.base_monitor import BaseMonitor
+from common.process_summary import summarize_sessions
+from common.replication_lag import summarize_replication_lag, print_replication_lag
+
 # 加载配置文件
 load_dotenv()
 
@@ -23,6 +30,14 @@ SLOW_QUERY_THRESHOLD = float(os.getenv('SLOW_QUERY_THRESHOLD', 1))
 CACHE_HIT_RATE_THRESHOLD = float(os.getenv('CACHE_HIT_RATE_THRESHOLD', 90))
 TABLESPACE_USAGE_THRESHOLD = float(os.getenv('TABLESPACE_USAGE_THRESHOLD', 80))
 
+# 会话明细阈值：仅当存在运行时间超过阈值(秒)的会话时，返回最多PROCESS_LIST_LIMIT条明细
+PROCESS_TIME_THRESHOLD = float(os.getenv('PROCESS_TIME_THRESHOLD', SLOW_QUERY_THRESHOLD))
+PROCESS_LIST_LIMIT = int(os.getenv('PROCESS_LIST_LIMIT', 20))
+
+# 集合统计：并发采样线程数，以及按存储大小保留的集合数
+COLLSTATS_WORKERS = int(os.getenv('MONGO_COLLSTATS_WORKERS', 8))
+COLLSTATS_TOP_N = int(os.getenv('MONGO_COLLSTATS_TOP_N', 50))
+
 # 监控间隔
 MONITOR_INTERVAL = int(os.getenv('MONITOR_INTERVAL', 60))
 
@@ -30,45 +45,65 @@ MONITOR_INTERVAL = int(os.getenv('MONITOR_INTERVAL', 60))
 ALERT_ENABLED = os.getenv('ALERT_ENABLED', 'true').lower() == 'true'
 ALERT_EMAIL = os.getenv('ALERT_EMAIL', 'admin@example.com')
 
-class MongoDBMonitor:
+class MongoDBMonitor(BaseMonitor):
+    DB_LABEL = 'MongoDB'
+    SHARED_CONNECTION = True
+    
+    # 连接统计、QPS和缓存命中率共享同一个serverStatus快照，复制状态和复制延迟共享同一个replSetGetStatus快照
+    METRICS = {
+        'server_status': {'func': 'get_server_status', 'store': False},
+        'repl_status': {'func': 'get_repl_status', 'store': False},
+        'connection_stats': {'func': 'get_connection_stats', 'depends': ['server_status']},
+        'qps': {'func': 'get_qps', 'depends': ['server_status']},
+        'slow_queries': {'func': 'get_slow_queries'},
+        'cache_hit_rate': {'func': 'get_cache_hit_rate', 'depends': ['server_status']},
+        'tablespace_usage': {'func': 'get_tablespace_usage'},
+        'process_list': {'func': 'get_process_list'},
+        'replication_status': {'func': 'get_replication_status', 'depends': ['repl_status']},
+        'replication_lag': {'func': 'get_replication_lag', 'depends': ['repl_status']}
+    }
+    
+    # 告警阈值
+    THRESHOLDS = {
+        'max_connections_threshold': MAX_CONNECTIONS_THRESHOLD,
+        'max_qps_threshold': MAX_QPS_THRESHOLD,
+        'slow_query_threshold': SLOW_QUERY_THRESHOLD,
+        'cache_hit_rate_threshold': CACHE_HIT_RATE_THRESHOLD,
+        'tablespace_usage_threshold': TABLESPACE_USAGE_THRESHOLD
+    }
+    ALERT_ENABLED = ALERT_ENABLED
+    
     def __init__(self, config=None, instance_name=None):
+        super().__init__(config, instance_name)
         self.client = None
         self.db = None
+        # 每个监控周期共享的serverStatus和replSetGetStatus快照
+        self.server_status = None
+        self.repl_status = None
         # 使用传入的配置或环境变量
-        self.config = config or {}
-        self.instance_name = instance_name
         self.host = self.config.get('host', MONGO_HOST)
         self.port = self.config.get('port', MONGO_PORT)
         self.user = self.config.get('user', MONGO_USER)
         self.password = self.config.get('password', MONGO_PASSWORD)
         self.database = self.config.get('database', MONGO_DATABASE)
     
-    def connect(self):
-        """连接到MongoDB数据库"""
-        try:
-            if self.user and self.password:
-                # 带认证的连接
-                mongo_uri = f"mongodb://{self.user}:{self.password}@{self.host}:{self.port}/{self.database}?authSource=admin"
-            else:
-                # 无认证的连接
-                mongo_uri = f"mongodb://{self.host}:{self.port}/{self.database}"
-            
-            self.client = pymongo.MongoClient(mongo_uri)
-            self.db = self.client[self.database]
-            
-            # 测试连接
-            self.client.admin.command('ping')
-            print(f"[INFO] 成功连接到MongoDB数据库: {self.host}:{self.port}")
-            return True
-        except Exception as e:
-            print(f"[ERROR] 连接MongoDB数据库失败: {e}")
-            return False
-    
-    def disconnect(self):
-        """断开数据库连接"""
-        if self.client:
-            self.client.close()
-        print("[INFO] 数据库连接已断开")
+    def open_connection(self):
+        """建立MongoDB客户端连接，MongoClient线程安全且自带连接池，所有指标共享同一个客户端"""
+        if self.user and self.password:
+            # 带认证的连接
+            mongo_uri = f"mongodb://{self.user}:{self.password}@{self.host}:{self.port}/{self.database}?authSource=admin"
+        else:
+            # 无认证的连接
+            mongo_uri = f"mongodb://{self.host}:{self.port}/{self.database}"
+        
+        timeout_ms = int(self.connect_timeout * 1000)
+        client = pymongo.MongoClient(mongo_uri, connectTimeoutMS=timeout_ms, serverSelectionTimeoutMS=timeout_ms)
+        
+        # 测试连接
+        client.admin.command('ping')
+        self.client = client
+        self.db = client[self.database]
+        return client, None
     
     def get_connection_status(self):
         """获取连接状态"""
@@ -79,11 +114,27 @@ class MongoDBMonitor:
             print(f"[ERROR] 检查连接状态失败: {e}")
             return False
     
+    def max_time_ms(self):
+        """当前指标的服务端执行时间上限(毫秒)，超时后由服务端终止操作，被放弃的采集线程随之结束"""
+        return int(self.metric_timeout * 1000)
+    
+    def get_server_status(self):
+        """获取serverStatus快照，每个监控周期只执行一次，供各指标共享"""
+        if self.server_status is None:
+            self.server_status = self.db.command('serverStatus', maxTimeMS=self.max_time_ms())
+        return self.server_status
+    
+    def get_repl_status(self):
+        """获取replSetGetStatus快照，每个监控周期只执行一次，供复制状态和复制延迟共享"""
+        if self.repl_status is None:
+            self.repl_status = self.db.command('replSetGetStatus', check=False, maxTimeMS=self.max_time_ms())
+        return self.repl_status
+    
     def get_connection_stats(self):
         """获取连接统计信息"""
         try:
             # 获取连接统计信息
-            server_status = self.db.command('serverStatus')
+            server_status = self.get_server_status()
             
             # 获取当前连接数
             current_connections = server_status.get('connections', {}).get('current', 0)
@@ -106,7 +157,7 @@ class MongoDBMonitor:
         """获取QPS(每秒查询数)"""
         try:
             # 获取操作统计信息
-            server_status = self.db.command('serverStatus')
+            server_status = self.get_server_status()
             
             # 获取操作计数器
             opcounters = server_status.get('opcounters', {})
@@ -134,17 +185,19 @@ class MongoDBMonitor:
             get_param_result = self.db.command('getParameter', 1, slowms=1)
             slowms = get_param_result.get('slowms', 100)
             
+            # 检查是否存在system.profile集合
+            profiling_enabled = bool(self.db.list_collection_names(filter={'name': 'system.profile'}))
+            
             # 尝试从system.profile集合查询慢查询
             slow_query_count = 0
             try:
-                # 检查是否存在system.profile集合
-                if 'system.profile' in self.db.list_collection_names():
+                if profiling_enabled:
                     # 查询最近60秒内的慢查询
                     start_time = time.time() - 60
                     slow_query_count = self.db.system.profile.count_documents({
                         'millis': {'$gt': slowms},
                         'ts': {'$gt': start_time}
-                    })
+                    }, maxTimeMS=self.max_time_ms())
                 else:
                     print("[INFO] system.profile集合不存在，请启用慢查询日志: db.setProfilingLevel(1, {slowms})")
             except Exception as profile_error:
@@ -153,7 +206,7 @@ class MongoDBMonitor:
             return {
                 'slow_queries': slow_query_count,
                 'slow_query_threshold': slowms / 1000,  # 转换为秒
-                'profiling_enabled': 'system.profile' in self.db.list_collection_names()
+                'profiling_enabled': profiling_enabled
             }
         except Exception as e:
             print(f"[ERROR] 获取慢查询信息失败: {e}")
@@ -163,7 +216,7 @@ class MongoDBMonitor:
         """获取缓存命中率"""
         try:
             # 获取内存使用情况
-            server_status = self.db.command('serverStatus')
+            server_status = self.get_server_status()
             
             # 获取缓存命中信息
             wiredtiger = server_status.get('wiredTiger', {})
@@ -186,11 +239,36 @@ class MongoDBMonitor:
             print(f"[ERROR] 获取缓存命中率失败: {e}")
             return None
     
+    def get_collection_stats(self, coll_name, max_time_ms):
+        """通过$collStats聚合获取单个集合的存储统计（分片集合按分片汇总）"""
+        try:
+            size = storage_size = index_size = count = 0
+            for shard_stats in self.db[coll_name].aggregate([{'$collStats': {'storageStats': {}}}], maxTimeMS=max_time_ms):
+                storage_stats = shard_stats.get('storageStats', {})
+                size += storage_stats.get('size', 0)
+                storage_size += storage_stats.get('storageSize', 0)
+                index_size += storage_stats.get('totalIndexSize', 0)
+                count += storage_stats.get('count', 0)
+            
+            coll_size_mb = size / (1024 * 1024)
+            coll_storage_mb = storage_size / (1024 * 1024)
+            return {
+                'collection': coll_name,
+                'size_mb': coll_size_mb,
+                'storage_size_mb': coll_storage_mb,
+                'usage_percent': (coll_size_mb / coll_storage_mb * 100) if coll_storage_mb > 0 else 0,
+                'index_size_mb': index_size / (1024 * 1024),
+                'count': count
+            }
+        except Exception as e:
+            print(f"[ERROR] 获取集合统计失败: {coll_name} - {e}")
+            return None
+    
     def get_tablespace_usage(self):
         """获取存储空间使用情况"""
         try:
             # 获取数据库大小信息
-            db_stats = self.db.command('dbStats')
+            db_stats = self.db.command('dbStats', maxTimeMS=self.max_time_ms())
             
             total_size_mb = db_stats.get('dataSize', 0) / (1024 * 1024)
             storage_size_mb = db_stats.get('storageSize', 0) / (1024 * 1024)
@@ -199,21 +277,16 @@ class MongoDBMonitor:
             # 计算使用百分比（数据大小/存储大小）
             usage_percent = (total_size_mb / storage_size_mb * 100) if storage_size_mb > 0 else 0
             
-            # 获取所有集合的大小
+            # 并发采样所有集合的存储统计，按存储大小保留前COLLSTATS_TOP_N个集合
+            coll_names = self.db.list_collection_names(filter={'type': 'collection'})
             collections = []
-            for coll_name in self.db.list_collection_names():
-                coll_stats = self.db.command('collStats', coll_name)
-                coll_size_mb = coll_stats.get('size', 0) / (1024 * 1024)
-                coll_storage_mb = coll_stats.get('storageSize', 0) / (1024 * 1024)
-                coll_usage_percent = (coll_size_mb / coll_storage_mb * 100) if coll_storage_mb > 0 else 0
-                
-                collections.append({
-                    'collection': coll_name,
-                    'size_mb': coll_size_mb,
-                    'storage_size_mb': coll_storage_mb,
-                    'usage_percent': coll_usage_percent,
-                    'index_size_mb': coll_stats.get('totalIndexSize', 0) / (1024 * 1024)
-                })
+            # 采样线程中没有当前指标的超时时间，在这里取出后传入
+            max_time_ms = self.max_time_ms()
+            with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, min(COLLSTATS_WORKERS, len(coll_names)))) as executor:
+                for coll_stats in executor.map(lambda coll_name: self.get_collection_stats(coll_name, max_time_ms), coll_names):
+                    if coll_stats:
+                        collections.append(coll_stats)
+            collections.sort(key=lambda c: c['storage_size_mb'], reverse=True)
             
             return {
                 'database': self.database,
@@ -221,32 +294,58 @@ class MongoDBMonitor:
                 'storage_size_mb': storage_size_mb,
                 'usage_percent': usage_percent,
                 'index_size_mb': index_size_mb,
-                'collections': collections
+                'collection_count': len(coll_names),
+                'collections': collections[:COLLSTATS_TOP_N]
             }
         except Exception as e:
             print(f"[ERROR] 获取存储空间使用情况失败: {e}")
             return None
     
     def get_process_list(self):
-        """获取数据库进程列表"""
+        """获取数据库会话汇总，仅在存在长时间运行的操作时返回Top-N明细"""
         try:
-            # 获取当前操作
-            current_ops = self.db.command('currentOp', { 'active': True })
+            # 在服务端按状态、用户、客户端主机聚合，避免拉取全部操作
+            summary_pipeline = [
+                {'$currentOp': {'allUsers': True, 'idleConnections': True}},
+                {'$group': {
+                    '_id': {
+                        'state': {'$cond': ['$active', 'active', 'idle']},
+                        'user': {'$ifNull': [{'$arrayElemAt': ['$effectiveUsers.user', 0]}, '']},
+                        'host': {'$arrayElemAt': [{'$split': [{'$ifNull': ['$client', '']}, ':']}, 0]}
+                    },
+                    'sessions': {'$sum': 1},
+                    'long_running': {'$sum': {'$cond': [
+                        {'$and': ['$active', {'$gte': ['$secs_running', PROCESS_TIME_THRESHOLD]}]}, 1, 0
+                    ]}}
+                }}
+            ]
+            summary = summarize_sessions(
+                (group['_id']['state'], group['_id']['user'], group['_id']['host'], group['sessions'], group['long_running'])
+                for group in self.client.admin.aggregate(summary_pipeline, maxTimeMS=self.max_time_ms())
+            )
+            summary['time_threshold'] = PROCESS_TIME_THRESHOLD
+            summary['top_sessions'] = []
             
-            operations = []
-            for op in current_ops.get('inprog', []):
-                operations.append({
-                    'opid': op.get('opid'),
-                    'op': op.get('op'),
-                    'ns': op.get('ns'),
-                    'query': op.get('query'),
-                    'client': op.get('client'),
-                    'connectionId': op.get('connectionId'),
-                    'active': op.get('active'),
-                    'secs_running': op.get('secs_running')
-                })
-            
-            return operations
+            # 仅在存在超过阈值的操作时获取明细
+            if summary['long_running'] > 0:
+                detail_pipeline = [
+                    {'$currentOp': {'allUsers': True}},
+                    {'$match': {'active': True, 'secs_running': {'$gte': PROCESS_TIME_THRESHOLD}}},
+                    {'$sort': {'secs_running': -1}},
+                    {'$limit': PROCESS_LIST_LIMIT}
+                ]
+                for op in self.client.admin.aggregate(detail_pipeline, maxTimeMS=self.max_time_ms()):
+                    summary['top_sessions'].append({
+                        'opid': op.get('opid'),
+                        'op': op.get('op'),
+                        'ns': op.get('ns'),
+                        'query': op.get('command'),
+                        'client': op.get('client'),
+                        'connectionId': op.get('connectionId'),
+                        'active': op.get('active'),
+                        'secs_running': op.get('secs_running')
+                    })
+            return summary
         except Exception as e:
             print(f"[ERROR] 获取进程列表失败: {e}")
             return None
@@ -255,7 +354,7 @@ class MongoDBMonitor:
         """获取复制状态"""
         try:
             # 检查复制状态
-            repl_status = self.db.command('replSetGetStatus', check=False)
+            repl_status = self.get_repl_status()
             
             if repl_status.get('ok') == 1:
                 # 复制集状态
@@ -283,211 +382,92 @@ class MongoDBMonitor:
             print(f"[ERROR] 获取复制状态失败: {e}")
             return {'status': 'Error', 'error': str(e)}
     
-    def check_thresholds(self, stats):
-        """检查阈值并生成告警"""
-        alerts = []
-        
-        # 检查连接数
-        if stats.get('connection_stats'):
-            conn_percent = stats['connection_stats']['connection_percent']
-            if conn_percent > MAX_CONNECTIONS_THRESHOLD:
-                alerts.append({
-                    'level': 'WARNING',
-                    'message': f'连接数使用率过高: {conn_percent:.2f}% (阈值: {MAX_CONNECTIONS_THRESHOLD}%)',
-                    'metric': 'connection_percent',
-                    'value': conn_percent,
-                    'threshold': MAX_CONNECTIONS_THRESHOLD
-                })
-        
-        # 检查QPS
-        if stats.get('qps'):
-            qps_value = stats['qps']['qps']
-            if qps_value > MAX_QPS_THRESHOLD:
-                alerts.append({
-                    'level': 'WARNING',
-                    'message': f'QPS过高: {qps_value:.2f} (阈值: {MAX_QPS_THRESHOLD})',
-                    'metric': 'qps',
-                    'value': qps_value,
-                    'threshold': MAX_QPS_THRESHOLD
-                })
-        
-        # 检查慢查询
-        if stats.get('slow_queries'):
-            slow_query_count = stats['slow_queries']['slow_queries']
-            if slow_query_count > 0:
-                alerts.append({
-                    'level': 'WARNING',
-                    'message': f'存在慢查询: {slow_query_count} 条',
-                    'metric': 'slow_queries',
-                    'value': slow_query_count,
-                    'threshold': 0
-                })
-        
-        # 检查缓存命中率
-        if stats.get('cache_hit_rate'):
-            cache_rate = stats['cache_hit_rate']['cache_hit_rate']
-            if cache_rate < CACHE_HIT_RATE_THRESHOLD:
-                alerts.append({
-                    'level': 'WARNING',
-                    'message': f'缓存命中率过低: {cache_rate:.2f}% (阈值: {CACHE_HIT_RATE_THRESHOLD}%)',
-                    'metric': 'cache_hit_rate',
-                    'value': cache_rate,
-                    'threshold': CACHE_HIT_RATE_THRESHOLD
-                })
-        
-        return alerts
-    
-    def send_alert(self, alert):
-        """发送告警"""
-        if ALERT_ENABLED:
-            print(f"[ALERT] [{alert['level']}] {alert['message']}")
-            # 这里可以添加邮件发送逻辑
-            # import smtplib
-            # from email.mime.text import MIMEText
-            # ...
+    def reset_cycle(self):
+        """重置本周期的serverStatus和replSetGetStatus快照"""
+        self.server_status = None
+        self.repl_status = None
     
-    def _convert_decimal_to_float(self, data):
-        """将数据中的Decimal类型转换为float类型"""
-        if isinstance(data, dict):
-            return {k: self._convert_decimal_to_float(v) for k, v in data.items()}
-        elif isinstance(data, list):
-            return [self._convert_decimal_to_float(item) for item in data]
-        elif isinstance(data, (int, float, str, bool, type(None))):
-            return data
-        else:
-            try:
-                return float(data)
-            except:
-                return str(data)
-    
-    def save_stats_to_json(self, stats, alerts):
-        """保存监控结果为JSON文件"""
+    def get_replication_lag(self):
+        """获取各从节点相对主节点的optime延迟（秒，精确到毫秒）"""
         try:
-            # 构建完整的监控数据
-            monitor_data = {
-                'timestamp': time.strftime('%Y-%m-%d %H:%M:%S'),
-                'monitor_time': time.time(),
-                'instance_name': self.instance_name,
-                'stats': self._convert_decimal_to_float(stats),
-                'alerts': self._convert_decimal_to_float(alerts),
-                'thresholds': {
-                    'max_connections_threshold': MAX_CONNECTIONS_THRESHOLD,
-                    'max_qps_threshold': MAX_QPS_THRESHOLD,
-                    'slow_query_threshold': SLOW_QUERY_THRESHOLD,
-                    'cache_hit_rate_threshold': CACHE_HIT_RATE_THRESHOLD,
-                    'tablespace_usage_threshold': TABLESPACE_USAGE_THRESHOLD
-                }
-            }
+            repl_status = self.get_repl_status()
+            if repl_status.get('ok') != 1:
+                return summarize_replication_lag(self.state, [])
             
-            # 生成文件名，包含实例名称和时间戳
-            file_name = f"{self.instance_name}_{time.strftime('%Y%m%d_%H%M%S')}.json"
-            # 使用传递的监控目录或默认目录
-            if self.monitor_dir:
-                file_path = os.path.join(self.monitor_dir, file_name)
-            else:
-                file_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'monitor', file_name)
+            members = repl_status.get('members', [])
+            primary = next((member for member in members if member.get('stateStr') == 'PRIMARY' and member.get('optimeDate')), None)
+            # DOWN或不可达的节点optimeDate为1970年，只有健康的SECONDARY/RECOVERING节点参与计算延迟
+            syncing = [
+                member for member in members
+                if member.get('health') == 1 and member.get('stateStr') in ('SECONDARY', 'RECOVERING') and member.get('optimeDate')
+            ]
+            # 没有主节点时以最新的optime为基准
+            newest = primary['optimeDate'] if primary else max((member['optimeDate'] for member in syncing), default=None)
             
-            # 写入JSON文件
-            with open(file_path, 'w', encoding='utf-8') as f:
-                json.dump(monitor_data, f, ensure_ascii=False, indent=2)
+            replicas = []
+            for member in members:
+                if member.get('stateStr') in ('PRIMARY', 'ARBITER'):
+                    continue
+                # 其他节点照常输出，延迟为None，不参与最大延迟和变化率
+                lag_seconds = None
+                if member in syncing and newest is not None:
+                    lag_seconds = (newest - member['optimeDate']).total_seconds()
+                replicas.append({
+                    'replica': member.get('name'),
+                    'state': member.get('stateStr'),
+                    'replay_lag': lag_seconds,
+                    'lag_seconds': lag_seconds
+                })
             
-            print(f"[INFO] 监控结果已保存到: {file_path}")
+            return summarize_replication_lag(self.state, replicas)
         except Exception as e:
-            print(f"[ERROR] 保存监控结果到JSON文件失败: {e}")
+            print(f"[ERROR] 获取复制延迟失败: {e}")
+            return None
     
-    def run_monitor(self, monitor_dir=None):
-        """运行监控"""
-        print(f"\n[INFO] 开始监控 - {time.strftime('%Y-%m-%d %H:%M:%S')}")
-        self.monitor_dir = monitor_dir
+    def print_stats(self, stats):
+        """输出监控结果"""
+        # 连接统计
+        if stats['connection_stats']:
+            conn_stats = stats['connection_stats']
+            print(f"连接数: {conn_stats['current_connections']}/{conn_stats['max_connections']} ({conn_stats['connection_percent']:.2f}%)")
+            print(f"可用连接数: {conn_stats['available_connections']}")
         
-        # 初始化监控数据
-        stats = {
-            'connection_status': False,
-            'connection_stats': None,
-            'qps': None,
-            'slow_queries': None,
-            'cache_hit_rate': None,
-            'tablespace_usage': None,
-            'process_list': None,
-            'replication_status': None,
-            'connection_error': None
-        }
+        # QPS
+        if stats['qps']:
+            print(f"QPS: {stats['qps']['qps']:.2f}")
         
-        # 连接数据库
-        if not self.connect():
-            error_msg = "无法连接数据库"
-            print(f"[ERROR] {error_msg}")
-            stats['connection_error'] = error_msg
-        else:
-            # 收集监控数据
-            stats['connection_status'] = self.get_connection_status()
-            stats['connection_stats'] = self.get_connection_stats()
-            stats['qps'] = self.get_qps()
-            stats['slow_queries'] = self.get_slow_queries()
-            stats['cache_hit_rate'] = self.get_cache_hit_rate()
-            stats['tablespace_usage'] = self.get_tablespace_usage()
-            stats['process_list'] = self.get_process_list()
-            stats['replication_status'] = self.get_replication_status()
-            
-            # 输出监控结果
-            print("\n=== 监控结果 ===")
-            
-            # 连接状态
-            print(f"连接状态: {'正常' if stats['connection_status'] else '异常'}")
-            
-            # 连接统计
-            if stats['connection_stats']:
-                conn_stats = stats['connection_stats']
-                print(f"连接数: {conn_stats['current_connections']}/{conn_stats['max_connections']} ({conn_stats['connection_percent']:.2f}%)")
-                print(f"可用连接数: {conn_stats['available_connections']}")
-            
-            # QPS
-            if stats['qps']:
-                print(f"QPS: {stats['qps']['qps']:.2f}")
-            
-            # 慢查询
-            if stats['slow_queries']:
-                print(f"慢查询数: {stats['slow_queries']['slow_queries']}")
-                print(f"慢查询阈值: {stats['slow_queries']['slow_query_threshold']}秒")
-            
-            # 缓存命中率
-            if stats['cache_hit_rate']:
-                print(f"缓存命中率: {stats['cache_hit_rate']['cache_hit_rate']:.2f}%")
-            
-            # 存储空间使用情况
-            if stats['tablespace_usage']:
-                ts_usage = stats['tablespace_usage']
-                print("\n存储空间使用情况:")
-                print(f"  数据库: {ts_usage['database']}")
-                print(f"  数据大小: {ts_usage['total_size_mb']:.2f}MB")
-                print(f"  存储大小: {ts_usage['storage_size_mb']:.2f}MB")
-                print(f"  索引大小: {ts_usage['index_size_mb']:.2f}MB")
-            
-            # 复制状态
-            if stats['replication_status']:
-                print(f"\n复制状态: {stats['replication_status']['status']}")
-                if 'primary' in stats['replication_status']:
-                    print(f"  主节点: {stats['replication_status']['primary']}")
-                if 'secondaries' in stats['replication_status']:
-                    print(f"  从节点数: {len(stats['replication_status']['secondaries'])}")
+        # 慢查询
+        if stats['slow_queries']:
+            print(f"慢查询数: {stats['slow_queries']['slow_queries']}")
+            print(f"慢查询阈值: {stats['slow_queries']['slow_query_threshold']}秒")
         
-        # 检查阈值并生成告警
-        alerts = self.check_thresholds(stats)
-        if alerts:
-            print("\n=== 告警信息 ===")
-            for alert in alerts:
-                self.send_alert(alert)
-        else:
-            print("\n=== 告警信息 ===")
-            print("无告警")
+        # 缓存命中率
+        if stats['cache_hit_rate']:
+            print(f"缓存命中率: {stats['cache_hit_rate']['cache_hit_rate']:.2f}%")
+        
+        # 存储空间使用情况
+        if stats['tablespace_usage']:
+            ts_usage = stats['tablespace_usage']
+            print("\n存储空间使用情况:")
+            print(f"  数据库: {ts_usage['database']}")
+            print(f"  数据大小: {ts_usage['total_size_mb']:.2f}MB")
+            print(f"  存储大小: {ts_usage['storage_size_mb']:.2f}MB")
+            print(f"  索引大小: {ts_usage['index_size_mb']:.2f}MB")
         
-        # 保存监控结果为JSON文件
-        self.save_stats_to_json(stats, alerts)
+        # 会话汇总
+        if stats['process_list']:
+            print(f"\n会话数: {stats['process_list']['total_sessions']} (运行超过{PROCESS_TIME_THRESHOLD}秒: {stats['process_list']['long_running']})")
         
-        # 断开连接
-        self.disconnect()
+        # 复制状态
+        if stats['replication_status']:
+            print(f"\n复制状态: {stats['replication_status']['status']}")
+            if 'primary' in stats['replication_status']:
+                print(f"  主节点: {stats['replication_status']['primary']}")
+            if 'secondaries' in stats['replication_status']:
+                print(f"  从节点数: {len(stats['replication_status']['secondaries'])}")
         
-        print(f"\n[INFO] 监控完成 - {time.strftime('%Y-%m-%d %H:%M:%S')}")
+        # 复制延迟
+        print_replication_lag(stats.get('replication_lag'))
 
 if __name__ == "__main__":
     monitor = MongoDBMonitor()
@@ -1,10 +1,17 @@
 #!/usr/bin/env python3
 import os
+import sys
 import time
-import json
 import pyodbc
 from dotenv import load_dotenv
 
+# 添加数据库目录到Python路径，以便导入公共模块
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from common.base_monitor import BaseMonitor
+from common.process_summary import summarize_sessions
+from common.blocking import get_blocking_options, build_blocking_chains, print_blocking_chains
+from common.top_sql import get_top_sql_options, diff_top_sql, print_top_sql
+
 # 加载配置文件
 load_dotenv()
 
@@ -22,6 +29,28 @@ SLOW_QUERY_THRESHOLD = float(os.getenv('SLOW_QUERY_THRESHOLD', 1))
 CACHE_HIT_RATE_THRESHOLD = float(os.getenv('CACHE_HIT_RATE_THRESHOLD', 90))
 TABLESPACE_USAGE_THRESHOLD = float(os.getenv('TABLESPACE_USAGE_THRESHOLD', 80))
 
+# 会话明细阈值：仅当存在运行时间超过阈值(秒)的会话时，返回最多PROCESS_LIST_LIMIT条明细
+PROCESS_TIME_THRESHOLD = float(os.getenv('PROCESS_TIME_THRESHOLD', SLOW_QUERY_THRESHOLD))
+PROCESS_LIST_LIMIT = int(os.getenv('PROCESS_LIST_LIMIT', 20))
+
+# 等待统计：每周期按等待时间增量保留的等待类型数
+WAIT_STATS_LIMIT = int(os.getenv('WAIT_STATS_LIMIT', 10))
+
+# 不计入等待统计的空闲/后台等待类型(名称包含SLEEP的等待类型也会被排除)
+BENIGN_WAIT_TYPES = (
+    'BROKER_EVENTHANDLER', 'BROKER_RECEIVE_WAITFOR', 'BROKER_TASK_STOP', 'BROKER_TO_FLUSH',
+    'BROKER_TRANSMITTER', 'CHECKPOINT_QUEUE', 'CLR_AUTO_EVENT', 'CLR_MANUAL_EVENT',
+    'DIRTY_PAGE_POLL', 'DISPATCHER_QUEUE_SEMAPHORE', 'FT_IFTS_SCHEDULER_IDLE_WAIT',
+    'FT_IFTSHC_MUTEX', 'HADR_CLUSAPI_CALL', 'HADR_FILESTREAM_IOMGR_IOCOMPLETION',
+    'HADR_LOGCAPTURE_WAIT', 'HADR_NOTIFICATION_DEQUEUE', 'HADR_TIMER_TASK', 'HADR_WORK_QUEUE',
+    'LOGMGR_QUEUE', 'ONDEMAND_TASK_QUEUE', 'PWAIT_ALL_COMPONENTS_INITIALIZED',
+    'QDS_ASYNC_QUEUE', 'QDS_CLEANUP_STALE_QUERIES_TASK_MAIN_LOOP_SLEEP',
+    'QDS_PERSIST_TASK_MAIN_LOOP_SLEEP', 'REQUEST_FOR_DEADLOCK_SEARCH', 'RESOURCE_QUEUE',
+    'SP_SERVER_DIAGNOSTICS_SLEEP', 'SQLTRACE_INCREMENTAL_FLUSH_SLEEP', 'WAITFOR',
+    'WAIT_XTP_CKPT_CLOSE', 'WAIT_XTP_HOST_WAIT', 'WAIT_XTP_OFFLINE_CKPT_NEW_LOG',
+    'XE_DISPATCHER_JOIN', 'XE_DISPATCHER_WAIT', 'XE_TIMER_EVENT'
+)
+
 # 监控间隔
 MONITOR_INTERVAL = int(os.getenv('MONITOR_INTERVAL', 60))
 
@@ -29,105 +58,195 @@ MONITOR_INTERVAL = int(os.getenv('MONITOR_INTERVAL', 60))
 ALERT_ENABLED = os.getenv('ALERT_ENABLED', 'true').lower() == 'true'
 ALERT_EMAIL = os.getenv('ALERT_EMAIL', 'admin@example.com')
 
-class MSSQLMonitor:
+def decimal_to_float(value):
+    """pyodbc输出转换：DECIMAL/NUMERIC的原始值为数字字符串，取数时直接转为float"""
+    return float(value) if value is not None else None
+
+class MSSQLMonitor(BaseMonitor):
+    DB_LABEL = 'SQL Server'
+    TABLESPACE_KEY = 'database'
+    TABLESPACE_LABEL = '数据库'
+    
+    # 连接统计、QPS、缓存命中率和等待统计共享同一个DMV性能快照
+    METRICS = {
+        'perf_snapshot': {'func': 'get_performance_snapshot', 'store': False},
+        'connection_stats': {'func': 'get_connection_stats', 'depends': ['perf_snapshot']},
+        'qps': {'func': 'get_qps', 'depends': ['perf_snapshot']},
+        'slow_queries': {'func': 'get_slow_queries'},
+        'cache_hit_rate': {'func': 'get_cache_hit_rate', 'depends': ['perf_snapshot']},
+        'tablespace_usage': {'func': 'get_tablespace_usage'},
+        'process_list': {'func': 'get_process_list'},
+        'replication_status': {'func': 'get_replication_status'},
+        'wait_stats': {'func': 'get_wait_stats', 'depends': ['perf_snapshot']},
+        'top_sql': {'func': 'get_top_sql'},
+        'blocking_chains': {'func': 'get_blocking_chains'}
+    }
+    
+    # 告警阈值
+    THRESHOLDS = {
+        'max_connections_threshold': MAX_CONNECTIONS_THRESHOLD,
+        'max_qps_threshold': MAX_QPS_THRESHOLD,
+        'slow_query_threshold': SLOW_QUERY_THRESHOLD,
+        'cache_hit_rate_threshold': CACHE_HIT_RATE_THRESHOLD,
+        'tablespace_usage_threshold': TABLESPACE_USAGE_THRESHOLD
+    }
+    ALERT_ENABLED = ALERT_ENABLED
+    
     def __init__(self, config=None, instance_name=None):
-        self.conn = None
-        self.cursor = None
+        super().__init__(config, instance_name)
+        # 每个监控周期共享的DMV性能快照，计数器基线保存在实例状态中
+        self.perf_snapshot = None
         # 使用传入的配置或环境变量
-        self.config = config or {}
-        self.instance_name = instance_name
         self.host = self.config.get('host', MSSQL_HOST)
         self.port = self.config.get('port', MSSQL_PORT)
         self.user = self.config.get('user', MSSQL_USER)
         self.password = self.config.get('password', MSSQL_PASSWORD)
         self.database = self.config.get('database', MSSQL_DATABASE)
     
-    def connect(self):
-        """连接到SQL Server数据库"""
-        try:
-            conn_str = f"DRIVER={{ODBC Driver 17 for SQL Server}};SERVER={self.host},{self.port};DATABASE={self.database};UID={self.user};PWD={self.password}"
-            self.conn = pyodbc.connect(conn_str)
-            self.cursor = self.conn.cursor()
-            print(f"[INFO] 成功连接到SQL Server数据库: {self.host}:{self.port}")
-            return True
-        except Exception as e:
-            print(f"[ERROR] 连接SQL Server数据库失败: {e}")
-            return False
+    def open_connection(self):
+        """建立SQL Server数据库连接"""
+        conn_str = f"DRIVER={{ODBC Driver 17 for SQL Server}};SERVER={self.host},{self.port};DATABASE={self.database};UID={self.user};PWD={self.password}"
+        # timeout为登录超时(秒)
+        conn = pyodbc.connect(conn_str, timeout=int(self.connect_timeout))
+        # 驱动取数时完成类型转换
+        conn.add_output_converter(pyodbc.SQL_DECIMAL, decimal_to_float)
+        conn.add_output_converter(pyodbc.SQL_NUMERIC, decimal_to_float)
+        return conn, conn.cursor()
     
-    def disconnect(self):
-        """断开数据库连接"""
-        if self.cursor:
-            self.cursor.close()
-        if self.conn:
-            self.conn.close()
-        print("[INFO] 数据库连接已断开")
+    def get_performance_snapshot(self):
+        """一次批量查询读取配置、会话数、性能计数器和等待统计，每个监控周期只执行一次
+        
+        只读取sys.configurations及DMV，不执行sp_configure/RECONFIGURE。
+        累计型计数器与上一周期保存在实例状态中的值求差，得到本周期的增量。
+        """
+        if self.perf_snapshot is not None:
+            return self.perf_snapshot
+        
+        benign_waits = ', '.join(f"'{wait_type}'" for wait_type in BENIGN_WAIT_TYPES)
+        self.cursor.execute(f"""
+            SELECT 
+                CAST(value_in_use AS int) as max_connections,
+                (SELECT sqlserver_start_time FROM sys.dm_os_sys_info) as start_time,
+                DATEDIFF(SECOND, (SELECT sqlserver_start_time FROM sys.dm_os_sys_info), GETDATE()) as uptime_seconds,
+                (SELECT COUNT(*) FROM sys.dm_exec_sessions WHERE is_user_process = 1) as current_connections,
+                (SELECT COUNT(*) FROM sys.dm_exec_requests r JOIN sys.dm_exec_sessions s ON r.session_id = s.session_id
+                 WHERE s.is_user_process = 1) as active_connections
+            FROM sys.configurations
+            WHERE name = 'user connections';
+            
+            SELECT 
+                RTRIM(counter_name) as counter_name,
+                cntr_value
+            FROM sys.dm_os_performance_counters
+            WHERE (object_name LIKE '%SQL Statistics%' AND counter_name IN ('Batch Requests/sec', 'SQL Compilations/sec'))
+            OR (object_name LIKE '%Buffer Manager%' AND counter_name IN (
+                'Page life expectancy', 'Buffer cache hit ratio', 'Buffer cache hit ratio base',
+                'Page lookups/sec', 'Page reads/sec'));
+            
+            SELECT 
+                wait_type,
+                waiting_tasks_count,
+                wait_time_ms,
+                signal_wait_time_ms
+            FROM sys.dm_os_wait_stats
+            WHERE waiting_tasks_count > 0
+            AND wait_type NOT LIKE '%SLEEP%'
+            AND wait_type NOT IN ({benign_waits});
+        """)
+        
+        row = self.cursor.fetchone()
+        # user connections配置为0表示使用默认上限32767
+        max_connections = int(row[0]) or 32767
+        start_time = str(row[1])
+        uptime_seconds = row[2] or 0
+        current_connections = int(row[3])
+        active_connections = int(row[4])
+        
+        self.cursor.nextset()
+        counters = {name: int(value) for name, value in self.cursor.fetchall()}
+        
+        self.cursor.nextset()
+        waits = {row[0]: [int(row[1]), int(row[2]), int(row[3])] for row in self.cursor.fetchall()}
+        
+        # 与上一周期的计数器比较；实例重启或首次采集时没有可用的基线
+        sample_time = time.time()
+        previous = self.state.get('perf_counters') if self.state else None
+        if previous and previous.get('start_time') == start_time and sample_time > previous['sample_time']:
+            elapsed = sample_time - previous['sample_time']
+        else:
+            previous = None
+            elapsed = 0
+        
+        if self.state:
+            self.state.set('perf_counters', {
+                'sample_time': sample_time,
+                'start_time': start_time,
+                'counters': counters,
+                'waits': waits
+            })
+        
+        self.perf_snapshot = {
+            'max_connections': max_connections,
+            'uptime_seconds': uptime_seconds,
+            'current_connections': current_connections,
+            'active_connections': active_connections,
+            'counters': counters,
+            'waits': waits,
+            'elapsed': elapsed,
+            'previous': previous
+        }
+        return self.perf_snapshot
     
-    def get_connection_status(self):
-        """获取连接状态"""
-        try:
-            self.cursor.execute("SELECT 1")
-            result = self.cursor.fetchone()
-            return result is not None
-        except Exception as e:
-            print(f"[ERROR] 检查连接状态失败: {e}")
-            return False
+    def _counter_delta(self, snapshot, counter_name):
+        """计算累计型性能计数器在本周期内的增量，无基线时返回None"""
+        previous = snapshot['previous']
+        if not previous or counter_name not in snapshot['counters']:
+            return None
+        delta = snapshot['counters'][counter_name] - previous['counters'].get(counter_name, 0)
+        return delta if delta >= 0 else None
     
     def get_connection_stats(self):
         """获取连接统计信息"""
         try:
-            # 获取最大连接数
-            self.cursor.execute("EXEC sp_configure 'show advanced options', 1; RECONFIGURE; EXEC sp_configure 'user connections'")
-            while self.cursor.nextset():
-                pass
-            max_connections = int(self.cursor.fetchone()[1])
-            
-            # 获取当前连接数
-            self.cursor.execute("SELECT COUNT(*) FROM sys.dm_exec_sessions WHERE is_user_process = 1")
-            current_connections = int(self.cursor.fetchone()[0])
+            snapshot = self.get_performance_snapshot()
+            max_connections = snapshot['max_connections']
+            current_connections = snapshot['current_connections']
             
             connection_percent = (current_connections / max_connections) * 100 if max_connections > 0 else 0
             
-            # 获取运行中查询数
-            self.cursor.execute("SELECT COUNT(*) FROM sys.dm_exec_requests WHERE session_id > 50")
-            active_connections = int(self.cursor.fetchone()[0])
-            
             return {
                 'max_connections': max_connections,
                 'current_connections': current_connections,
                 'connection_percent': connection_percent,
-                'active_connections': active_connections
+                'active_connections': snapshot['active_connections']
             }
         except Exception as e:
             print(f"[ERROR] 获取连接统计信息失败: {e}")
             return None
     
     def get_qps(self):
-        """获取QPS(每秒查询数)"""
+        """获取QPS(每秒查询数)，基于Batch Requests/sec计数器在两个周期间的增量"""
         try:
-            # 获取查询统计信息
-            self.cursor.execute("""
-                SELECT 
-                    SUM(counter_value) as total_executions,
-                    DATEDIFF(SECOND, create_date, GETDATE()) as uptime_seconds
-                FROM sys.dm_os_performance_counters 
-                CROSS JOIN sys.databases
-                WHERE counter_name = 'Batch Requests/sec' 
-                AND database_id = 2
-            """)
+            snapshot = self.get_performance_snapshot()
+            total_executions = snapshot['counters'].get('Batch Requests/sec', 0)
+            uptime_seconds = snapshot['uptime_seconds']
             
-            result = self.cursor.fetchone()
-            if result:
-                total_executions = result[0] or 0
-                uptime_seconds = result[1] or 0
-                
+            delta = self._counter_delta(snapshot, 'Batch Requests/sec')
+            if delta is not None and snapshot['elapsed'] > 0:
+                qps = delta / snapshot['elapsed']
+            else:
+                # 首次采集或实例重启后，退化为启动以来的平均值
                 qps = total_executions / uptime_seconds if uptime_seconds > 0 else 0
-                
-                return {
-                    'total_executions': total_executions,
-                    'uptime_seconds': uptime_seconds,
-                    'qps': qps
-                }
-            return None
+            
+            compilations = self._counter_delta(snapshot, 'SQL Compilations/sec')
+            
+            return {
+                'total_executions': total_executions,
+                'uptime_seconds': uptime_seconds,
+                'qps': qps,
+                'compilations_per_sec': compilations / snapshot['elapsed'] if compilations is not None and snapshot['elapsed'] > 0 else None,
+                'is_delta': delta is not None
+            }
         except Exception as e:
             print(f"[ERROR] 获取QPS失败: {e}")
             return None
@@ -153,35 +272,61 @@ class MSSQLMonitor:
             return None
     
     def get_cache_hit_rate(self):
-        """获取缓存命中率"""
+        """获取缓冲区缓存命中率和页面预期寿命"""
         try:
-            # 获取缓冲区命中率
-            self.cursor.execute("""
-                SELECT 
-                    (1 - (CAST(counter_value AS float) / (SELECT counter_value FROM sys.dm_os_performance_counters WHERE counter_name = 'Page lookups/sec' AND instance_name = ''))) * 100 as cache_hit_rate,
-                    (SELECT counter_value FROM sys.dm_os_performance_counters WHERE counter_name = 'Page lookups/sec' AND instance_name = '') as logical_reads,
-                    counter_value as physical_reads
-                FROM sys.dm_os_performance_counters 
-                WHERE counter_name = 'Page reads/sec' 
-                AND instance_name = ''
-            """)
+            snapshot = self.get_performance_snapshot()
+            counters = snapshot['counters']
             
-            result = self.cursor.fetchone()
-            if result:
-                cache_hit_rate = result[0] or 0
-                logical_reads = result[1] or 0
-                physical_reads = result[2] or 0
-                
-                return {
-                    'cache_hit_rate': cache_hit_rate,
-                    'logical_reads': logical_reads,
-                    'physical_reads': physical_reads
-                }
-            return None
+            # Buffer cache hit ratio需除以对应的base计数器
+            hit_ratio_base = counters.get('Buffer cache hit ratio base', 0)
+            cache_hit_rate = counters.get('Buffer cache hit ratio', 0) * 100.0 / hit_ratio_base if hit_ratio_base > 0 else 0
+            
+            # 本周期内的逻辑读/物理读页数
+            logical_reads = self._counter_delta(snapshot, 'Page lookups/sec')
+            physical_reads = self._counter_delta(snapshot, 'Page reads/sec')
+            
+            return {
+                'cache_hit_rate': cache_hit_rate,
+                'logical_reads': logical_reads or 0,
+                'physical_reads': physical_reads or 0,
+                'page_life_expectancy': counters.get('Page life expectancy', 0)
+            }
         except Exception as e:
             print(f"[ERROR] 获取缓存命中率失败: {e}")
             return None
     
+    def get_wait_stats(self):
+        """获取本周期内等待时间增量最大的等待类型"""
+        try:
+            snapshot = self.get_performance_snapshot()
+            previous = snapshot['previous']
+            if not previous:
+                return None
+            
+            previous_waits = previous.get('waits', {})
+            waits = []
+            for wait_type, (tasks, wait_ms, signal_ms) in snapshot['waits'].items():
+                prev_tasks, prev_wait_ms, prev_signal_ms = previous_waits.get(wait_type, [0, 0, 0])
+                delta_wait_ms = wait_ms - prev_wait_ms
+                if delta_wait_ms <= 0:
+                    continue
+                waits.append({
+                    'wait_type': wait_type,
+                    'waiting_tasks': tasks - prev_tasks,
+                    'wait_time_ms': delta_wait_ms,
+                    'signal_wait_time_ms': signal_ms - prev_signal_ms
+                })
+            waits.sort(key=lambda w: w['wait_time_ms'], reverse=True)
+            
+            return {
+                'interval_seconds': snapshot['elapsed'],
+                'total_wait_time_ms': sum(w['wait_time_ms'] for w in waits),
+                'top_waits': waits[:WAIT_STATS_LIMIT]
+            }
+        except Exception as e:
+            print(f"[ERROR] 获取等待统计失败: {e}")
+            return None
+    
     def get_tablespace_usage(self):
         """获取表空间使用情况"""
         try:
@@ -212,36 +357,59 @@ class MSSQLMonitor:
             return None
     
     def get_process_list(self):
-        """获取数据库进程列表"""
+        """获取数据库会话汇总，仅在存在长时间运行的会话时返回Top-N明细"""
         try:
+            # 在服务端按状态、用户、主机聚合，避免拉取全部会话
+            time_threshold_ms = int(PROCESS_TIME_THRESHOLD * 1000)
             self.cursor.execute("""
                 SELECT 
-                    session_id,
-                    login_name,
-                    host_name,
-                    status,
-                    command,
-                    sql_text.text as sql_text,
-                    start_time
-                FROM sys.dm_exec_requests 
-                CROSS APPLY sys.dm_exec_sql_text(sql_handle)
-                WHERE session_id > 50
-                ORDER BY start_time DESC
-            """)
-            
-            processes = []
-            for row in self.cursor.fetchall():
-                processes.append({
-                    'session_id': row[0],
-                    'login_name': row[1],
-                    'host_name': row[2],
-                    'status': row[3],
-                    'command': row[4],
-                    'sql_text': row[5],
-                    'start_time': str(row[6]) if row[6] else None
-                })
+                    s.status,
+                    s.login_name,
+                    ISNULL(s.host_name, '') as host_name,
+                    COUNT(*) as sessions,
+                    SUM(CASE WHEN r.total_elapsed_time >= ? THEN 1 ELSE 0 END) as long_running
+                FROM sys.dm_exec_sessions s
+                LEFT JOIN sys.dm_exec_requests r ON s.session_id = r.session_id
+                WHERE s.is_user_process = 1
+                AND s.session_id <> @@SPID
+                GROUP BY s.status, s.login_name, ISNULL(s.host_name, '')
+            """, time_threshold_ms)
+            summary = summarize_sessions(tuple(row) for row in self.cursor.fetchall())
+            summary['time_threshold'] = PROCESS_TIME_THRESHOLD
+            summary['top_sessions'] = []
             
-            return processes
+            # 仅在存在超过阈值的会话时获取明细
+            if summary['long_running'] > 0:
+                self.cursor.execute("""
+                    SELECT TOP (?)
+                        r.session_id,
+                        s.login_name,
+                        s.host_name,
+                        r.status,
+                        r.command,
+                        SUBSTRING(sql_text.text, 1, 1000) as sql_text,
+                        r.start_time,
+                        r.total_elapsed_time / 1000.0 as elapsed_seconds
+                    FROM sys.dm_exec_requests r
+                    JOIN sys.dm_exec_sessions s ON r.session_id = s.session_id
+                    OUTER APPLY sys.dm_exec_sql_text(r.sql_handle) sql_text
+                    WHERE s.is_user_process = 1
+                    AND r.session_id <> @@SPID
+                    AND r.total_elapsed_time >= ?
+                    ORDER BY r.total_elapsed_time DESC
+                """, PROCESS_LIST_LIMIT, time_threshold_ms)
+                for row in self.cursor.fetchall():
+                    summary['top_sessions'].append({
+                        'session_id': row[0],
+                        'login_name': row[1],
+                        'host_name': row[2],
+                        'status': row[3],
+                        'command': row[4],
+                        'sql_text': row[5],
+                        'start_time': str(row[6]) if row[6] else None,
+                        'elapsed_seconds': row[7]
+                    })
+            return summary
         except Exception as e:
             print(f"[ERROR] 获取进程列表失败: {e}")
             return None
@@ -284,220 +452,120 @@ class MSSQLMonitor:
             print(f"[ERROR] 获取复制状态失败: {e}")
             return {'status': 'Error', 'error': str(e)}
     
-    def check_thresholds(self, stats):
-        """检查阈值并生成告警"""
-        alerts = []
-        
-        # 检查连接数
-        if stats.get('connection_stats'):
-            conn_percent = stats['connection_stats']['connection_percent']
-            if conn_percent > MAX_CONNECTIONS_THRESHOLD:
-                alerts.append({
-                    'level': 'WARNING',
-                    'message': f'连接数使用率过高: {conn_percent:.2f}% (阈值: {MAX_CONNECTIONS_THRESHOLD}%)',
-                    'metric': 'connection_percent',
-                    'value': conn_percent,
-                    'threshold': MAX_CONNECTIONS_THRESHOLD
-                })
-        
-        # 检查QPS
-        if stats.get('qps'):
-            qps_value = stats['qps']['qps']
-            if qps_value > MAX_QPS_THRESHOLD:
-                alerts.append({
-                    'level': 'WARNING',
-                    'message': f'QPS过高: {qps_value:.2f} (阈值: {MAX_QPS_THRESHOLD})',
-                    'metric': 'qps',
-                    'value': qps_value,
-                    'threshold': MAX_QPS_THRESHOLD
-                })
-        
-        # 检查慢查询
-        if stats.get('slow_queries'):
-            slow_query_count = stats['slow_queries']['slow_queries']
-            if slow_query_count > 0:
-                alerts.append({
-                    'level': 'WARNING',
-                    'message': f'存在慢查询: {slow_query_count} 条',
-                    'metric': 'slow_queries',
-                    'value': slow_query_count,
-                    'threshold': 0
-                })
-        
-        # 检查缓存命中率
-        if stats.get('cache_hit_rate'):
-            cache_rate = stats['cache_hit_rate']['cache_hit_rate']
-            if cache_rate < CACHE_HIT_RATE_THRESHOLD:
-                alerts.append({
-                    'level': 'WARNING',
-                    'message': f'缓存命中率过低: {cache_rate:.2f}% (阈值: {CACHE_HIT_RATE_THRESHOLD}%)',
-                    'metric': 'cache_hit_rate',
-                    'value': cache_rate,
-                    'threshold': CACHE_HIT_RATE_THRESHOLD
-                })
-        
-        # 检查表空间使用情况
-        if stats.get('tablespace_usage'):
-            for tablespace in stats['tablespace_usage']:
-                if tablespace['usage_percent'] > TABLESPACE_USAGE_THRESHOLD:
-                    alerts.append({
-                        'level': 'WARNING',
-                        'message': f'数据库 {tablespace["database"]} 使用率过高: {tablespace["usage_percent"]:.2f}% (阈值: {TABLESPACE_USAGE_THRESHOLD}%)',
-                        'metric': 'tablespace_usage',
-                        'value': tablespace['usage_percent'],
-                        'threshold': TABLESPACE_USAGE_THRESHOLD,
-                        'database': tablespace['database']
-                    })
-        
-        return alerts
-    
-    def send_alert(self, alert):
-        """发送告警"""
-        if ALERT_ENABLED:
-            print(f"[ALERT] [{alert['level']}] {alert['message']}")
-            # 这里可以添加邮件发送逻辑
-            # import smtplib
-            # from email.mime.text import MIMEText
-            # ...
+    def reset_cycle(self):
+        """重置本周期的DMV性能快照"""
+        self.perf_snapshot = None
     
-    def _convert_decimal_to_float(self, data):
-        """将数据中的Decimal类型转换为float类型"""
-        if isinstance(data, dict):
-            return {k: self._convert_decimal_to_float(v) for k, v in data.items()}
-        elif isinstance(data, list):
-            return [self._convert_decimal_to_float(item) for item in data]
-        elif isinstance(data, (int, float, str, bool, type(None))):
-            return data
-        else:
-            try:
-                return float(data)
-            except:
-                return str(data)
+    def get_top_sql(self):
+        """获取本周期耗时、执行次数、返回行数最多的语句（基于计划缓存统计sys.dm_exec_query_stats）"""
+        options = get_top_sql_options()
+        try:
+            # 按query_hash合并参数不同的同类语句，total_elapsed_time单位为微秒，换算为毫秒
+            self.cursor.execute("""
+                SELECT TOP (?)
+                    CONVERT(VARCHAR(18), qs.query_hash, 1) as id,
+                    MAX(LEFT(SUBSTRING(st.text, qs.statement_start_offset / 2 + 1,
+                        (CASE qs.statement_end_offset WHEN -1 THEN DATALENGTH(st.text)
+                            ELSE qs.statement_end_offset END - qs.statement_start_offset) / 2 + 1), ?)) as query,
+                    SUM(qs.execution_count) as calls,
+                    SUM(qs.total_elapsed_time) / 1000.0 as total_time_ms,
+                    SUM(qs.total_rows) as row_count
+                FROM sys.dm_exec_query_stats qs
+                CROSS APPLY sys.dm_exec_sql_text(qs.sql_handle) st
+                GROUP BY qs.query_hash
+                ORDER BY SUM(qs.total_elapsed_time) DESC
+            """, options['snapshot_limit'], options['text_length'])
+            rows = [
+                {'id': row[0], 'query': row[1], 'calls': row[2], 'total_time_ms': row[3], 'rows': row[4]}
+                for row in self.cursor.fetchall()
+            ]
+            return diff_top_sql(self.state, rows, options)
+        except Exception as e:
+            print(f"[ERROR] 获取Top SQL失败: {e}")
+            return None
     
-    def save_stats_to_json(self, stats, alerts):
-        """保存监控结果为JSON文件"""
+    def get_blocking_chains(self):
+        """获取锁等待阻塞链（基于sys.dm_exec_requests.blocking_session_id）"""
+        options = get_blocking_options()
         try:
-            # 构建完整的监控数据
-            monitor_data = {
-                'timestamp': time.strftime('%Y-%m-%d %H:%M:%S'),
-                'monitor_time': time.time(),
-                'instance_name': self.instance_name,
-                'stats': self._convert_decimal_to_float(stats),
-                'alerts': self._convert_decimal_to_float(alerts),
-                'thresholds': {
-                    'max_connections_threshold': MAX_CONNECTIONS_THRESHOLD,
-                    'max_qps_threshold': MAX_QPS_THRESHOLD,
-                    'slow_query_threshold': SLOW_QUERY_THRESHOLD,
-                    'cache_hit_rate_threshold': CACHE_HIT_RATE_THRESHOLD,
-                    'tablespace_usage_threshold': TABLESPACE_USAGE_THRESHOLD
-                }
-            }
-            
-            # 生成文件名，包含实例名称和时间戳
-            file_name = f"{self.instance_name}_{time.strftime('%Y%m%d_%H%M%S')}.json"
-            # 使用传递的监控目录或默认目录
-            if self.monitor_dir:
-                file_path = os.path.join(self.monitor_dir, file_name)
-            else:
-                file_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'monitor', file_name)
-            
-            # 写入JSON文件
-            with open(file_path, 'w', encoding='utf-8') as f:
-                json.dump(monitor_data, f, ensure_ascii=False, indent=2)
+            # 空闲但持有锁的阻塞会话没有请求，取其连接最近执行的语句
+            self.cursor.execute("""
+                SELECT 
+                    s.session_id,
+                    s.login_name,
+                    s.status,
+                    LEFT(t.text, ?) as query,
+                    ISNULL(r.wait_time, 0) / 1000.0 as wait_seconds,
+                    ISNULL(r.blocking_session_id, 0) as blocking_session_id
+                FROM sys.dm_exec_sessions s
+                LEFT JOIN sys.dm_exec_requests r ON r.session_id = s.session_id
+                LEFT JOIN sys.dm_exec_connections c ON c.session_id = s.session_id
+                OUTER APPLY sys.dm_exec_sql_text(ISNULL(r.sql_handle, c.most_recent_sql_handle)) t
+                WHERE r.blocking_session_id > 0
+                OR s.session_id IN (SELECT blocking_session_id FROM sys.dm_exec_requests WHERE blocking_session_id > 0)
+            """, options['text_length'])
             
-            print(f"[INFO] 监控结果已保存到: {file_path}")
+            waits = []
+            sessions = {}
+            for row in self.cursor.fetchall():
+                sessions[row[0]] = {'user': row[1], 'state': row[2], 'query': row[3]}
+                if row[5] > 0:
+                    waits.append((row[0], row[5], row[4]))
+            return build_blocking_chains(waits, sessions, options['limit'])
         except Exception as e:
-            print(f"[ERROR] 保存监控结果到JSON文件失败: {e}")
+            print(f"[ERROR] 获取阻塞链失败: {e}")
+            return None
     
-    def run_monitor(self, monitor_dir=None):
-        """运行监控"""
-        print(f"\n[INFO] 开始监控 - {time.strftime('%Y-%m-%d %H:%M:%S')}")
-        self.monitor_dir = monitor_dir
+    def print_stats(self, stats):
+        """输出监控结果"""
+        # 连接统计
+        if stats['connection_stats']:
+            conn_stats = stats['connection_stats']
+            print(f"连接数: {conn_stats['current_connections']}/{conn_stats['max_connections']} ({conn_stats['connection_percent']:.2f}%)")
+            print(f"活跃连接数: {conn_stats['active_connections']}")
         
-        # 初始化监控数据
-        stats = {
-            'connection_status': False,
-            'connection_stats': None,
-            'qps': None,
-            'slow_queries': None,
-            'cache_hit_rate': None,
-            'tablespace_usage': None,
-            'process_list': None,
-            'replication_status': None,
-            'connection_error': None
-        }
+        # QPS
+        if stats['qps']:
+            print(f"QPS: {stats['qps']['qps']:.2f}")
         
-        # 连接数据库
-        if not self.connect():
-            error_msg = "无法连接数据库"
-            print(f"[ERROR] {error_msg}")
-            stats['connection_error'] = error_msg
-        else:
-            # 收集监控数据
-            stats['connection_status'] = self.get_connection_status()
-            stats['connection_stats'] = self.get_connection_stats()
-            stats['qps'] = self.get_qps()
-            stats['slow_queries'] = self.get_slow_queries()
-            stats['cache_hit_rate'] = self.get_cache_hit_rate()
-            stats['tablespace_usage'] = self.get_tablespace_usage()
-            stats['process_list'] = self.get_process_list()
-            stats['replication_status'] = self.get_replication_status()
-            
-            # 输出监控结果
-            print("\n=== 监控结果 ===")
-            
-            # 连接状态
-            print(f"连接状态: {'正常' if stats['connection_status'] else '异常'}")
-            
-            # 连接统计
-            if stats['connection_stats']:
-                conn_stats = stats['connection_stats']
-                print(f"连接数: {conn_stats['current_connections']}/{conn_stats['max_connections']} ({conn_stats['connection_percent']:.2f}%)")
-                print(f"活跃连接数: {conn_stats['active_connections']}")
-            
-            # QPS
-            if stats['qps']:
-                print(f"QPS: {stats['qps']['qps']:.2f}")
-            
-            # 慢查询
-            if stats['slow_queries']:
-                print(f"慢查询数: {stats['slow_queries']['slow_queries']}")
-                print(f"慢查询阈值: {stats['slow_queries']['slow_query_threshold']}秒")
-            
-            # 缓存命中率
-            if stats['cache_hit_rate']:
-                print(f"缓存命中率: {stats['cache_hit_rate']['cache_hit_rate']:.2f}%")
-            
-            # 表空间使用情况
-            if stats['tablespace_usage']:
-                print("\n表空间使用情况:")
-                for ts in stats['tablespace_usage']:
-                    print(f"  {ts['database']}: {ts['used_mb']:.2f}MB/{ts['total_mb']:.2f}MB ({ts['usage_percent']:.2f}%)")
-            
-            # 复制状态
-            if stats['replication_status']:
-                print(f"\n复制状态: {stats['replication_status']['status']}")
-                if 'agents' in stats['replication_status']:
-                    for agent in stats['replication_status']['agents']:
-                        print(f"  代理: {agent['name']}, 状态: {agent['status']}")
+        # 慢查询
+        if stats['slow_queries']:
+            print(f"慢查询数: {stats['slow_queries']['slow_queries']}")
+            print(f"慢查询阈值: {stats['slow_queries']['slow_query_threshold']}秒")
         
-        # 检查阈值并生成告警
-        alerts = self.check_thresholds(stats)
-        if alerts:
-            print("\n=== 告警信息 ===")
-            for alert in alerts:
-                self.send_alert(alert)
-        else:
-            print("\n=== 告警信息 ===")
-            print("无告警")
+        # 缓存命中率
+        if stats['cache_hit_rate']:
+            print(f"缓存命中率: {stats['cache_hit_rate']['cache_hit_rate']:.2f}%")
+            print(f"页面预期寿命: {stats['cache_hit_rate']['page_life_expectancy']}秒")
+        
+        # 表空间使用情况
+        if stats['tablespace_usage']:
+            print("\n表空间使用情况:")
+            for ts in stats['tablespace_usage']:
+                print(f"  {ts['database']}: {ts['used_mb']:.2f}MB/{ts['total_mb']:.2f}MB ({ts['usage_percent']:.2f}%)")
+        
+        # 会话汇总
+        if stats['process_list']:
+            print(f"\n会话数: {stats['process_list']['total_sessions']} (运行超过{PROCESS_TIME_THRESHOLD}秒: {stats['process_list']['long_running']})")
+        
+        # 复制状态
+        if stats['replication_status']:
+            print(f"\n复制状态: {stats['replication_status']['status']}")
+            if 'agents' in stats['replication_status']:
+                for agent in stats['replication_status']['agents']:
+                    print(f"  代理: {agent['name']}, 状态: {agent['status']}")
         
-        # 保存监控结果为JSON文件
-        self.save_stats_to_json(stats, alerts)
+        # 等待统计
+        if stats['wait_stats'] and stats['wait_stats']['top_waits']:
+            print("\n等待统计(本周期):")
+            for wait in stats['wait_stats']['top_waits']:
+                print(f"  {wait['wait_type']}: {wait['wait_time_ms']}ms ({wait['waiting_tasks']}次)")
         
-        # 断开连接
-        self.disconnect()
+        # Top SQL
+        print_top_sql(stats.get('top_sql'))
         
-        print(f"\n[INFO] 监控完成 - {time.strftime('%Y-%m-%d %H:%M:%S')}")
+        # 阻塞链
+        print_blocking_chains(stats.get('blocking_chains'))
 
 if __name__ == "__main__":
     monitor = MSSQLMonitor()
@@ -1,10 +1,20 @@
 #!/usr/bin/env python3
 import os
-import time
-import json
+import re
+import sys
 import pymysql
+from pymysql.constants import FIELD_TYPE
+from pymysql.converters import conversions
 from dotenv import load_dotenv
 
+# 添加数据库目录到Python路径，以便导入公共模块
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from common.base_monitor import BaseMonitor
+from common.process_summary import summarize_sessions
+from common.replication_lag import summarize_replication_lag, print_replication_lag
+from common.blocking import get_blocking_options, build_blocking_chains, print_blocking_chains
+from common.top_sql import get_top_sql_options, diff_top_sql, print_top_sql
+
 # 加载配置文件
 load_dotenv()
 
@@ -22,6 +32,13 @@ SLOW_QUERY_THRESHOLD = float(os.getenv('SLOW_QUERY_THRESHOLD', 1))
 CACHE_HIT_RATE_THRESHOLD = float(os.getenv('CACHE_HIT_RATE_THRESHOLD', 90))
 TABLESPACE_USAGE_THRESHOLD = float(os.getenv('TABLESPACE_USAGE_THRESHOLD', 80))
 
+# 会话明细阈值：仅当存在运行时间超过阈值(秒)的会话时，返回最多PROCESS_LIST_LIMIT条明细
+PROCESS_TIME_THRESHOLD = float(os.getenv('PROCESS_TIME_THRESHOLD', SLOW_QUERY_THRESHOLD))
+PROCESS_LIST_LIMIT = int(os.getenv('PROCESS_LIST_LIMIT', 20))
+
+# 复制心跳表（如pt-heartbeat的heartbeat.heartbeat），为空时只使用Seconds_Behind_Master
+REPLICATION_HEARTBEAT_TABLE = os.getenv('REPLICATION_HEARTBEAT_TABLE', '')
+
 # 监控间隔
 MONITOR_INTERVAL = int(os.getenv('MONITOR_INTERVAL', 60))
 
@@ -29,55 +46,80 @@ MONITOR_INTERVAL = int(os.getenv('MONITOR_INTERVAL', 60))
 ALERT_ENABLED = os.getenv('ALERT_ENABLED', 'true').lower() == 'true'
 ALERT_EMAIL = os.getenv('ALERT_EMAIL', 'admin@example.com')
 
-class MySQLMonitor:
+# 驱动取数时完成类型转换：DECIMAL转为float，日期时间保留数据库返回的字符串
+MYSQL_CONVERSIONS = dict(conversions)
+MYSQL_CONVERSIONS.update({
+    FIELD_TYPE.DECIMAL: float,
+    FIELD_TYPE.NEWDECIMAL: float,
+    FIELD_TYPE.DATETIME: str,
+    FIELD_TYPE.TIMESTAMP: str,
+    FIELD_TYPE.DATE: str,
+    FIELD_TYPE.TIME: str
+})
+
+class MySQLMonitor(BaseMonitor):
+    # 主从复制状态和复制延迟共享同一个SHOW SLAVE STATUS快照
+    METRICS = {
+        'slave_status': {'func': 'get_slave_status', 'store': False},
+        **BaseMonitor.METRICS,
+        'replication_status': {'func': 'get_replication_status', 'depends': ['slave_status']},
+        'top_sql': {'func': 'get_top_sql'},
+        'blocking_chains': {'func': 'get_blocking_chains'},
+        'replication_lag': {'func': 'get_replication_lag', 'depends': ['slave_status']}
+    }
+    
+    DB_LABEL = 'MySQL'
+    CACHE_HIT_RATE_METRIC = ('innodb_cache_hit_rate', 'InnoDB缓存命中率')
+    TABLESPACE_KEY = 'schema'
+    
+    # 告警阈值
+    THRESHOLDS = {
+        'max_connections_threshold': MAX_CONNECTIONS_THRESHOLD,
+        'max_qps_threshold': MAX_QPS_THRESHOLD,
+        'slow_query_threshold': SLOW_QUERY_THRESHOLD,
+        'cache_hit_rate_threshold': CACHE_HIT_RATE_THRESHOLD,
+        'tablespace_usage_threshold': TABLESPACE_USAGE_THRESHOLD
+    }
+    ALERT_ENABLED = ALERT_ENABLED
+    
     def __init__(self, config=None, instance_name=None):
-        self.conn = None
-        self.cursor = None
+        super().__init__(config, instance_name)
+        # 每个监控周期共享的SHOW SLAVE STATUS快照（各复制通道一行）
+        self.slave_status = None
         # 使用传入的配置或环境变量
-        self.config = config or {}
-        self.instance_name = instance_name
         self.host = self.config.get('host', MYSQL_HOST)
         self.port = self.config.get('port', MYSQL_PORT)
         self.user = self.config.get('user', MYSQL_USER)
         self.password = self.config.get('password', MYSQL_PASSWORD)
         self.database = self.config.get('database', MYSQL_DATABASE)
+        self.heartbeat_table = self.config.get('heartbeat_table', REPLICATION_HEARTBEAT_TABLE)
+        if self.heartbeat_table and not re.match(r'^\w+(\.\w+)?$', self.heartbeat_table):
+            print(f"[WARNING] 心跳表名不合法，已忽略: {self.heartbeat_table}")
+            self.heartbeat_table = ''
     
-    def connect(self):
-        """连接到MySQL数据库"""
-        try:
-            self.conn = pymysql.connect(
-                host=self.host,
-                port=self.port,
-                user=self.user,
-                password=self.password,
-                database=self.database,
-                charset='utf8mb4',
-                cursorclass=pymysql.cursors.DictCursor
-            )
-            self.cursor = self.conn.cursor()
-            print(f"[INFO] 成功连接到MySQL数据库: {self.host}:{self.port}")
-            return True
-        except Exception as e:
-            print(f"[ERROR] 连接MySQL数据库失败: {e}")
-            return False
-    
-    def disconnect(self):
-        """断开数据库连接"""
-        if self.cursor:
-            self.cursor.close()
-        if self.conn:
-            self.conn.close()
-        print("[INFO] 数据库连接已断开")
+    def open_connection(self):
+        """建立MySQL数据库连接"""
+        conn = pymysql.connect(
+            host=self.host,
+            port=self.port,
+            user=self.user,
+            password=self.password,
+            database=self.database,
+            charset='utf8mb4',
+            cursorclass=pymysql.cursors.DictCursor,
+            conv=MYSQL_CONVERSIONS,
+            connect_timeout=self.connect_timeout
+        )
+        return conn, conn.cursor()
     
-    def get_connection_status(self):
-        """获取连接状态"""
+    def cancel_query(self, conn, cursor):
+        """pymysql没有取消接口，另建一个连接执行KILL QUERY终止该连接上正在执行的语句"""
+        killer, killer_cursor = self.open_connection()
         try:
-            self.cursor.execute("SELECT 1")
-            result = self.cursor.fetchone()
-            return result is not None
-        except Exception as e:
-            print(f"[ERROR] 检查连接状态失败: {e}")
-            return False
+            killer_cursor.execute(f"KILL QUERY {int(conn.thread_id())}")
+        finally:
+            self.close_connection(killer, killer_cursor)
+        return True
     
     def get_connection_stats(self):
         """获取连接统计信息"""
@@ -250,39 +292,83 @@ class MySQLMonitor:
             return None
     
     def get_process_list(self):
-        """获取数据库进程列表"""
+        """获取数据库会话汇总，仅在存在长时间运行的会话时返回Top-N明细"""
         try:
+            # 在服务端按状态、用户、主机聚合，避免拉取全部会话
             self.cursor.execute("""
-                SHOW PROCESSLIST;
-            """)
-            processes = []
-            for row in self.cursor.fetchall():
-                processes.append({
-                    'id': row['Id'],
-                    'user': row['User'],
-                    'host': row['Host'],
-                    'db': row['db'],
-                    'command': row['Command'],
-                    'time': row['Time'],
-                    'state': row['State'],
-                    'info': row['Info']
-                })
-            return processes
+                SELECT 
+                    COMMAND AS state,
+                    USER AS user,
+                    SUBSTRING_INDEX(HOST, ':', 1) AS host,
+                    COUNT(*) AS sessions,
+                    SUM(COMMAND NOT IN ('Sleep', 'Daemon', 'Binlog Dump', 'Binlog Dump GTID') AND TIME >= %s) AS long_running
+                FROM 
+                    information_schema.PROCESSLIST
+                WHERE 
+                    ID <> CONNECTION_ID()
+                GROUP BY 
+                    COMMAND, USER, SUBSTRING_INDEX(HOST, ':', 1);
+            """, (PROCESS_TIME_THRESHOLD,))
+            summary = summarize_sessions(
+                (row['state'], row['user'], row['host'], row['sessions'], row['long_running'])
+                for row in self.cursor.fetchall()
+            )
+            summary['time_threshold'] = PROCESS_TIME_THRESHOLD
+            summary['top_sessions'] = []
+            
+            # 仅在存在超过阈值的会话时获取明细
+            if summary['long_running'] > 0:
+                self.cursor.execute("""
+                    SELECT 
+                        ID, USER, HOST, DB, COMMAND, TIME, STATE, LEFT(INFO, 1000) AS INFO
+                    FROM 
+                        information_schema.PROCESSLIST
+                    WHERE 
+                        COMMAND NOT IN ('Sleep', 'Daemon', 'Binlog Dump', 'Binlog Dump GTID')
+                        AND TIME >= %s
+                        AND ID <> CONNECTION_ID()
+                    ORDER BY 
+                        TIME DESC
+                    LIMIT %s;
+                """, (PROCESS_TIME_THRESHOLD, PROCESS_LIST_LIMIT))
+                for row in self.cursor.fetchall():
+                    summary['top_sessions'].append({
+                        'id': row['ID'],
+                        'user': row['USER'],
+                        'host': row['HOST'],
+                        'db': row['DB'],
+                        'command': row['COMMAND'],
+                        'time': row['TIME'],
+                        'state': row['STATE'],
+                        'info': row['INFO']
+                    })
+            return summary
         except Exception as e:
             print(f"[ERROR] 获取进程列表失败: {e}")
             return None
     
-    def get_replication_status(self):
-        """获取主从复制状态"""
-        try:
+    def get_slave_status(self):
+        """执行SHOW SLAVE STATUS，每个监控周期只执行一次，供主从复制状态和复制延迟共享"""
+        if self.slave_status is None:
             self.cursor.execute("""
                 SHOW SLAVE STATUS;
             """)
-            slave_status = self.cursor.fetchone()
+            self.slave_status = self.cursor.fetchall()
+        return self.slave_status
+    
+    def reset_cycle(self):
+        """重置本周期的SHOW SLAVE STATUS快照"""
+        self.slave_status = None
+    
+    def get_replication_status(self):
+        """获取主从复制状态（第一个复制通道）"""
+        try:
+            channels = self.get_slave_status()
             
-            if not slave_status:
+            if not channels:
                 return {'status': 'Not a slave'}
             
+            slave_status = channels[0]
             return {
                 'status': 'Running' if slave_status['Slave_IO_Running'] == 'Yes' and slave_status['Slave_SQL_Running'] == 'Yes' else 'Error',
                 'master_host': slave_status['Master_Host'],
@@ -295,242 +381,177 @@ class MySQLMonitor:
             print(f"[ERROR] 获取主从复制状态失败: {e}")
             return {'status': 'Error', 'error': str(e)}
     
-    def check_thresholds(self, stats):
-        """检查阈值并生成告警"""
-        alerts = []
-        
-        # 检查连接数
-        if stats.get('connection_stats'):
-            conn_percent = stats['connection_stats']['connection_percent']
-            if conn_percent > MAX_CONNECTIONS_THRESHOLD:
-                alerts.append({
-                    'level': 'WARNING',
-                    'message': f'连接数使用率过高: {conn_percent:.2f}% (阈值: {MAX_CONNECTIONS_THRESHOLD}%)',
-                    'metric': 'connection_percent',
-                    'value': conn_percent,
-                    'threshold': MAX_CONNECTIONS_THRESHOLD
-                })
-        
-        # 检查QPS
-        if stats.get('qps'):
-            qps_value = stats['qps']['qps']
-            if qps_value > MAX_QPS_THRESHOLD:
-                alerts.append({
-                    'level': 'WARNING',
-                    'message': f'QPS过高: {qps_value:.2f} (阈值: {MAX_QPS_THRESHOLD})',
-                    'metric': 'qps',
-                    'value': qps_value,
-                    'threshold': MAX_QPS_THRESHOLD
-                })
-        
-        # 检查慢查询
-        if stats.get('slow_queries'):
-            slow_query_count = stats['slow_queries']['slow_queries']
-            if slow_query_count > 0:
-                alerts.append({
-                    'level': 'WARNING',
-                    'message': f'存在慢查询: {slow_query_count} 条',
-                    'metric': 'slow_queries',
-                    'value': slow_query_count,
-                    'threshold': 0
-                })
-        
-        # 检查缓存命中率
-        if stats.get('cache_hit_rate'):
-            innodb_cache_rate = stats['cache_hit_rate']['innodb_cache_hit_rate']
-            if innodb_cache_rate < CACHE_HIT_RATE_THRESHOLD:
-                alerts.append({
-                    'level': 'WARNING',
-                    'message': f'InnoDB缓存命中率过低: {innodb_cache_rate:.2f}% (阈值: {CACHE_HIT_RATE_THRESHOLD}%)',
-                    'metric': 'innodb_cache_hit_rate',
-                    'value': innodb_cache_rate,
-                    'threshold': CACHE_HIT_RATE_THRESHOLD
-                })
-        
-        # 检查表空间使用情况
-        if stats.get('tablespace_usage'):
-            for tablespace in stats['tablespace_usage']:
-                if tablespace['usage_percent'] > TABLESPACE_USAGE_THRESHOLD:
-                    alerts.append({
-                        'level': 'WARNING',
-                        'message': f'表空间 {tablespace["schema"]} 使用率过高: {tablespace["usage_percent"]:.2f}% (阈值: {TABLESPACE_USAGE_THRESHOLD}%)',
-                        'metric': 'tablespace_usage',
-                        'value': tablespace['usage_percent'],
-                        'threshold': TABLESPACE_USAGE_THRESHOLD,
-                        'schema': tablespace['schema']
-                    })
+    def get_rule_values(self, stats):
+        """提取告警规则使用的指标，并加入主从复制状态"""
+        values, context = super().get_rule_values(stats)
         
-        # 检查主从复制状态
-        if stats.get('replication_status') and stats['replication_status']['status'] != 'Not a slave':
-            if stats['replication_status']['status'] != 'Running':
-                alerts.append({
-                    'level': 'CRITICAL',
-                    'message': f'主从复制异常: {stats["replication_status"].get("error", "未知错误")}',
-                    'metric': 'replication_status',
-                    'value': stats['replication_status']['status'],
-                    'threshold': 'Running'
-                })
-            elif stats['replication_status'].get('seconds_behind_master') and stats['replication_status']['seconds_behind_master'] > 30:
-                alerts.append({
-                    'level': 'WARNING',
-                    'message': f'主从复制延迟过大: {stats["replication_status"]["seconds_behind_master"]} 秒',
-                    'metric': 'seconds_behind_master',
-                    'value': stats['replication_status']['seconds_behind_master'],
-                    'threshold': 30
-                })
+        # 主从复制：运行正常为1，异常为0，非从库不参与告警
+        replication = stats.get('replication_status')
+        if replication and replication['status'] != 'Not a slave':
+            values['replication_running'] = 1 if replication['status'] == 'Running' else 0
+            context['replication_error'] = replication.get('error', '未知错误')
+            if replication['status'] == 'Running':
+                values['seconds_behind_master'] = replication.get('seconds_behind_master')
         
-        return alerts
+        return values, context
     
-    def send_alert(self, alert):
-        """发送告警"""
-        if ALERT_ENABLED:
-            print(f"[ALERT] [{alert['level']}] {alert['message']}")
-            # 这里可以添加邮件发送逻辑
-            # import smtplib
-            # from email.mime.text import MIMEText
-            # ...
+    def get_top_sql(self):
+        """获取本周期耗时、执行次数、返回行数最多的语句（基于performance_schema语句摘要）"""
+        options = get_top_sql_options()
+        try:
+            # SUM_TIMER_WAIT单位为皮秒，换算为毫秒
+            self.cursor.execute("""
+                SELECT 
+                    CONCAT(IFNULL(SCHEMA_NAME, ''), ':', DIGEST) AS id,
+                    LEFT(DIGEST_TEXT, %s) AS query,
+                    COUNT_STAR AS calls,
+                    SUM_TIMER_WAIT / 1000000000 AS total_time_ms,
+                    SUM_ROWS_SENT + SUM_ROWS_AFFECTED AS row_count
+                FROM 
+                    performance_schema.events_statements_summary_by_digest
+                WHERE 
+                    DIGEST IS NOT NULL
+                ORDER BY 
+                    SUM_TIMER_WAIT DESC
+                LIMIT %s;
+            """, (options['text_length'], options['snapshot_limit']))
+            rows = [{**row, 'rows': row['row_count']} for row in self.cursor.fetchall()]
+            return diff_top_sql(self.state, rows, options)
+        except Exception as e:
+            print(f"[ERROR] 获取Top SQL失败: {e}")
+            return None
     
-    def _convert_decimal_to_float(self, data):
-        """将数据中的Decimal类型转换为float类型"""
-        if isinstance(data, dict):
-            return {k: self._convert_decimal_to_float(v) for k, v in data.items()}
-        elif isinstance(data, list):
-            return [self._convert_decimal_to_float(item) for item in data]
-        elif isinstance(data, (int, float, str, bool, type(None))):
-            return data
-        else:
+    def get_blocking_chains(self):
+        """获取InnoDB锁等待阻塞链（MySQL 8.0使用performance_schema.data_lock_waits，5.7使用sys.innodb_lock_waits）"""
+        options = get_blocking_options()
+        try:
             try:
-                return float(data)
-            except:
-                return str(data)
+                self.cursor.execute("""
+                    SELECT DISTINCT
+                        w.PROCESSLIST_ID AS waiting_pid,
+                        w.PROCESSLIST_USER AS waiting_user,
+                        w.PROCESSLIST_COMMAND AS waiting_state,
+                        LEFT(w.PROCESSLIST_INFO, %s) AS waiting_query,
+                        w.PROCESSLIST_TIME AS wait_age_secs,
+                        b.PROCESSLIST_ID AS blocking_pid,
+                        b.PROCESSLIST_USER AS blocking_user,
+                        b.PROCESSLIST_COMMAND AS blocking_state,
+                        LEFT(b.PROCESSLIST_INFO, %s) AS blocking_query
+                    FROM 
+                        performance_schema.data_lock_waits dlw
+                        JOIN performance_schema.threads w ON w.THREAD_ID = dlw.REQUESTING_THREAD_ID
+                        JOIN performance_schema.threads b ON b.THREAD_ID = dlw.BLOCKING_THREAD_ID;
+                """, (options['text_length'], options['text_length']))
+            except pymysql.err.ProgrammingError:
+                # MySQL 5.7没有data_lock_waits表
+                self.cursor.execute("""
+                    SELECT 
+                        waiting_pid,
+                        NULL AS waiting_user,
+                        NULL AS waiting_state,
+                        LEFT(waiting_query, %s) AS waiting_query,
+                        wait_age_secs,
+                        blocking_pid,
+                        NULL AS blocking_user,
+                        NULL AS blocking_state,
+                        LEFT(blocking_query, %s) AS blocking_query
+                    FROM 
+                        sys.innodb_lock_waits;
+                """, (options['text_length'], options['text_length']))
+            
+            waits = []
+            sessions = {}
+            for row in self.cursor.fetchall():
+                sessions[row['waiting_pid']] = {'user': row['waiting_user'], 'state': row['waiting_state'], 'query': row['waiting_query']}
+                sessions.setdefault(row['blocking_pid'], {'user': row['blocking_user'], 'state': row['blocking_state'], 'query': row['blocking_query']})
+                waits.append((row['waiting_pid'], row['blocking_pid'], row['wait_age_secs']))
+            return build_blocking_chains(waits, sessions, options['limit'])
+        except Exception as e:
+            print(f"[ERROR] 获取阻塞链失败: {e}")
+            return None
     
-    def save_stats_to_json(self, stats, alerts):
-        """保存监控结果为JSON文件"""
+    def get_replication_lag(self):
+        """获取各复制通道的延迟：Seconds_Behind_Master，配置了心跳表时以心跳延迟（精确到微秒）为准"""
         try:
-            # 构建完整的监控数据
-            monitor_data = {
-                'timestamp': time.strftime('%Y-%m-%d %H:%M:%S'),
-                'monitor_time': time.time(),
-                'instance_name': self.instance_name,
-                'stats': self._convert_decimal_to_float(stats),
-                'alerts': self._convert_decimal_to_float(alerts),
-                'thresholds': {
-                    'max_connections_threshold': MAX_CONNECTIONS_THRESHOLD,
-                    'max_qps_threshold': MAX_QPS_THRESHOLD,
-                    'slow_query_threshold': SLOW_QUERY_THRESHOLD,
-                    'cache_hit_rate_threshold': CACHE_HIT_RATE_THRESHOLD,
-                    'tablespace_usage_threshold': TABLESPACE_USAGE_THRESHOLD
-                }
-            }
-            
-            # 生成文件名，包含实例名称和时间戳
-            file_name = f"{self.instance_name}_{time.strftime('%Y%m%d_%H%M%S')}.json"
-            # 使用传递的监控目录或默认目录
-            if self.monitor_dir:
-                file_path = os.path.join(self.monitor_dir, file_name)
-            else:
-                file_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'monitor', file_name)
+            channels = self.get_slave_status()
             
-            # 写入JSON文件
-            with open(file_path, 'w', encoding='utf-8') as f:
-                json.dump(monitor_data, f, ensure_ascii=False, indent=2)
+            replicas = []
+            for channel in channels:
+                replica = {
+                    'replica': f"{channel['Master_Host']}:{channel['Master_Port']}",
+                    'state': 'Running' if channel['Slave_IO_Running'] == 'Yes' and channel['Slave_SQL_Running'] == 'Yes' else 'Error',
+                    'replay_lag': channel['Seconds_Behind_Master'],
+                    'lag_seconds': channel['Seconds_Behind_Master']
+                }
+                if channel.get('Channel_Name'):
+                    replica['replica'] += f"/{channel['Channel_Name']}"
+                
+                # 心跳表由主库定期写入当前时间（如pt-heartbeat），按主库server_id取最新一条
+                if self.heartbeat_table:
+                    self.cursor.execute(f"""
+                        SELECT TIMESTAMPDIFF(MICROSECOND, MAX(ts), NOW(6)) / 1000000 AS heartbeat_lag
+                        FROM {self.heartbeat_table}
+                        WHERE server_id = %s;
+                    """, (channel['Master_Server_Id'],))
+                    replica['heartbeat_lag'] = self.cursor.fetchone()['heartbeat_lag']
+                    if replica['heartbeat_lag'] is not None:
+                        replica['lag_seconds'] = replica['heartbeat_lag']
+                replicas.append(replica)
             
-            print(f"[INFO] 监控结果已保存到: {file_path}")
+            return summarize_replication_lag(self.state, replicas)
         except Exception as e:
-            print(f"[ERROR] 保存监控结果到JSON文件失败: {e}")
+            print(f"[ERROR] 获取复制延迟失败: {e}")
+            return None
     
-    def run_monitor(self, monitor_dir=None):
-        """运行监控"""
-        print(f"\n[INFO] 开始监控 - {time.strftime('%Y-%m-%d %H:%M:%S')}")
-        self.monitor_dir = monitor_dir
+    def print_stats(self, stats):
+        """输出监控结果"""
+        # 连接统计
+        if stats['connection_stats']:
+            conn_stats = stats['connection_stats']
+            print(f"连接数: {conn_stats['current_connections']}/{conn_stats['max_connections']} ({conn_stats['connection_percent']:.2f}%)")
+            print(f"运行中线程: {conn_stats['threads_running']}")
         
-        # 初始化监控数据
-        stats = {
-            'connection_status': False,
-            'connection_stats': None,
-            'qps': None,
-            'slow_queries': None,
-            'cache_hit_rate': None,
-            'tablespace_usage': None,
-            'process_list': None,
-            'replication_status': None,
-            'connection_error': None
-        }
+        # QPS
+        if stats['qps']:
+            print(f"QPS: {stats['qps']['qps']:.2f}")
         
-        # 连接数据库
-        if not self.connect():
-            error_msg = "无法连接数据库"
-            print(f"[ERROR] {error_msg}")
-            stats['connection_error'] = error_msg
-        else:
-            # 收集监控数据
-            stats['connection_status'] = self.get_connection_status()
-            stats['connection_stats'] = self.get_connection_stats()
-            stats['qps'] = self.get_qps()
-            stats['slow_queries'] = self.get_slow_queries()
-            stats['cache_hit_rate'] = self.get_cache_hit_rate()
-            stats['tablespace_usage'] = self.get_tablespace_usage()
-            stats['process_list'] = self.get_process_list()
-            stats['replication_status'] = self.get_replication_status()
-            
-            # 输出监控结果
-            print("\n=== 监控结果 ===")
-            
-            # 连接状态
-            print(f"连接状态: {'正常' if stats['connection_status'] else '异常'}")
-            
-            # 连接统计
-            if stats['connection_stats']:
-                conn_stats = stats['connection_stats']
-                print(f"连接数: {conn_stats['current_connections']}/{conn_stats['max_connections']} ({conn_stats['connection_percent']:.2f}%)")
-                print(f"运行中线程: {conn_stats['threads_running']}")
-            
-            # QPS
-            if stats['qps']:
-                print(f"QPS: {stats['qps']['qps']:.2f}")
-            
-            # 慢查询
-            if stats['slow_queries']:
-                print(f"慢查询数: {stats['slow_queries']['slow_queries']}")
-                print(f"慢查询阈值: {stats['slow_queries']['long_query_time']}秒")
-                print(f"慢查询日志: {stats['slow_queries']['slow_query_log']}")
-            
-            # 缓存命中率
-            if stats['cache_hit_rate']:
-                print(f"InnoDB缓存命中率: {stats['cache_hit_rate']['innodb_cache_hit_rate']:.2f}%")
-                print(f"查询缓存命中率: {stats['cache_hit_rate']['query_cache_hit_rate']:.2f}%")
-            
-            # 表空间使用情况
-            if stats['tablespace_usage']:
-                print("\n表空间使用情况:")
-                for ts in stats['tablespace_usage']:
-                    print(f"  {ts['schema']}: {ts['used_mb']:.2f}MB/{ts['total_mb']:.2f}MB ({ts['usage_percent']:.2f}%)")
-            
-            # 主从复制状态
-            if stats['replication_status']:
-                print(f"\n主从复制状态: {stats['replication_status']['status']}")
-                if stats['replication_status']['status'] != 'Not a slave':
-                    print(f"  主库: {stats['replication_status'].get('master_host')}:{stats['replication_status'].get('master_port')}")
-                    if 'seconds_behind_master' in stats['replication_status']:
-                        print(f"  延迟: {stats['replication_status']['seconds_behind_master']}秒")
+        # 慢查询
+        if stats['slow_queries']:
+            print(f"慢查询数: {stats['slow_queries']['slow_queries']}")
+            print(f"慢查询阈值: {stats['slow_queries']['long_query_time']}秒")
+            print(f"慢查询日志: {stats['slow_queries']['slow_query_log']}")
+        
+        # 缓存命中率
+        if stats['cache_hit_rate']:
+            print(f"InnoDB缓存命中率: {stats['cache_hit_rate']['innodb_cache_hit_rate']:.2f}%")
+            print(f"查询缓存命中率: {stats['cache_hit_rate']['query_cache_hit_rate']:.2f}%")
+        
+        # 表空间使用情况
+        if stats['tablespace_usage']:
+            print("\n表空间使用情况:")
+            for ts in stats['tablespace_usage']:
+                print(f"  {ts['schema']}: {ts['used_mb']:.2f}MB/{ts['total_mb']:.2f}MB ({ts['usage_percent']:.2f}%)")
+        
+        # 会话汇总
+        if stats['process_list']:
+            print(f"\n会话数: {stats['process_list']['total_sessions']} (运行超过{PROCESS_TIME_THRESHOLD}秒: {stats['process_list']['long_running']})")
         
-        # 检查阈值并生成告警
-        alerts = self.check_thresholds(stats)
-        if alerts:
-            print("\n=== 告警信息 ===")
-            for alert in alerts:
-                self.send_alert(alert)
-        else:
-            print("\n=== 告警信息 ===")
-            print("无告警")
+        # 主从复制状态
+        if stats['replication_status']:
+            print(f"\n主从复制状态: {stats['replication_status']['status']}")
+            if stats['replication_status']['status'] != 'Not a slave':
+                print(f"  主库: {stats['replication_status'].get('master_host')}:{stats['replication_status'].get('master_port')}")
+                if 'seconds_behind_master' in stats['replication_status']:
+                    print(f"  延迟: {stats['replication_status']['seconds_behind_master']}秒")
         
-        # 保存监控结果为JSON文件
-        self.save_stats_to_json(stats, alerts)
+        # Top SQL
+        print_top_sql(stats.get('top_sql'))
         
-        # 断开连接
-        self.disconnect()
+        # 阻塞链
+        print_blocking_chains(stats.get('blocking_chains'))
         
-        print(f"\n[INFO] 监控完成 - {time.strftime('%Y-%m-%d %H:%M:%S')}")
+        # 复制延迟
+        print_replication_lag(stats.get('replication_lag'))
 
 if __name__ == "__main__":
     monitor = MySQLMonitor()
@@ -1,10 +1,17 @@
 #!/usr/bin/env python3
 import os
-import time
-import json
+import sys
 import oracledb
 from dotenv import load_dotenv
 
+# 添加数据库目录到Python路径，以便导入公共模块
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from common.base_monitor import BaseMonitor
+from common.process_summary import summarize_sessions
+from common.replication_lag import parse_interval_seconds, summarize_replication_lag, print_replication_lag
+from common.blocking import get_blocking_options, build_blocking_chains, print_blocking_chains
+from common.top_sql import get_top_sql_options, diff_top_sql, print_top_sql
+
 # 加载配置文件
 load_dotenv()
 
@@ -22,6 +29,10 @@ SLOW_QUERY_THRESHOLD = float(os.getenv('SLOW_QUERY_THRESHOLD', 1))
 CACHE_HIT_RATE_THRESHOLD = float(os.getenv('CACHE_HIT_RATE_THRESHOLD', 90))
 TABLESPACE_USAGE_THRESHOLD = float(os.getenv('TABLESPACE_USAGE_THRESHOLD', 80))
 
+# 会话明细阈值：仅当存在运行时间超过阈值(秒)的会话时，返回最多PROCESS_LIST_LIMIT条明细
+PROCESS_TIME_THRESHOLD = float(os.getenv('PROCESS_TIME_THRESHOLD', SLOW_QUERY_THRESHOLD))
+PROCESS_LIST_LIMIT = int(os.getenv('PROCESS_LIST_LIMIT', 20))
+
 # 监控间隔
 MONITOR_INTERVAL = int(os.getenv('MONITOR_INTERVAL', 60))
 
@@ -29,52 +40,62 @@ MONITOR_INTERVAL = int(os.getenv('MONITOR_INTERVAL', 60))
 ALERT_ENABLED = os.getenv('ALERT_ENABLED', 'true').lower() == 'true'
 ALERT_EMAIL = os.getenv('ALERT_EMAIL', 'admin@example.com')
 
-class OracleMonitor:
+def output_type_handler(cursor, metadata):
+    """驱动取数时完成类型转换：CLOB/NCLOB直接取为字符串，日期时间转为字符串
+    
+    NUMBER默认即返回int/float，无需转换。
+    """
+    if metadata.type_code in (oracledb.DB_TYPE_CLOB, oracledb.DB_TYPE_NCLOB):
+        return cursor.var(oracledb.DB_TYPE_LONG, arraysize=cursor.arraysize)
+    if metadata.type_code in (oracledb.DB_TYPE_DATE, oracledb.DB_TYPE_TIMESTAMP):
+        return cursor.var(metadata.type_code, arraysize=cursor.arraysize, outconverter=str)
+
+class OracleMonitor(BaseMonitor):
+    METRICS = {
+        **BaseMonitor.METRICS,
+        'top_sql': {'func': 'get_top_sql'},
+        'blocking_chains': {'func': 'get_blocking_chains'},
+        'replication_lag': {'func': 'get_replication_lag'}
+    }
+    
+    DB_LABEL = 'Oracle'
+    STATUS_QUERY = "SELECT 1 FROM DUAL"
+    TABLESPACE_KEY = 'tablespace'
+    
+    # 告警阈值
+    THRESHOLDS = {
+        'max_connections_threshold': MAX_CONNECTIONS_THRESHOLD,
+        'max_qps_threshold': MAX_QPS_THRESHOLD,
+        'slow_query_threshold': SLOW_QUERY_THRESHOLD,
+        'cache_hit_rate_threshold': CACHE_HIT_RATE_THRESHOLD,
+        'tablespace_usage_threshold': TABLESPACE_USAGE_THRESHOLD
+    }
+    ALERT_ENABLED = ALERT_ENABLED
+    
     def __init__(self, config=None, instance_name=None):
-        self.conn = None
-        self.cursor = None
+        super().__init__(config, instance_name)
         # 使用传入的配置或环境变量
-        self.config = config or {}
-        self.instance_name = instance_name
         self.host = self.config.get('host', ORACLE_HOST)
         self.port = self.config.get('port', ORACLE_PORT)
         self.user = self.config.get('user', ORACLE_USER)
         self.password = self.config.get('password', ORACLE_PASSWORD)
         self.sid = self.config.get('sid', ORACLE_SID)
     
-    def connect(self):
-        """连接到Oracle数据库"""
-        try:
-            dsn = oracledb.makedsn(self.host, self.port, sid=self.sid)
-            self.conn = oracledb.connect(
-                user=self.user,
-                password=self.password,
-                dsn=dsn
-            )
-            self.cursor = self.conn.cursor()
-            print(f"[INFO] 成功连接到Oracle数据库: {self.host}:{self.port}/{self.sid}")
-            return True
-        except Exception as e:
-            print(f"[ERROR] 连接Oracle数据库失败: {e}")
-            return False
+    def get_endpoint(self):
+        """获取连接地址描述，用于日志输出"""
+        return f"{self.host}:{self.port}/{self.sid}"
     
-    def disconnect(self):
-        """断开数据库连接"""
-        if self.cursor:
-            self.cursor.close()
-        if self.conn:
-            self.conn.close()
-        print("[INFO] 数据库连接已断开")
-    
-    def get_connection_status(self):
-        """获取连接状态"""
-        try:
-            self.cursor.execute("SELECT 1 FROM DUAL")
-            result = self.cursor.fetchone()
-            return result is not None
-        except Exception as e:
-            print(f"[ERROR] 检查连接状态失败: {e}")
-            return False
+    def open_connection(self):
+        """建立Oracle数据库连接"""
+        dsn = oracledb.makedsn(self.host, self.port, sid=self.sid)
+        conn = oracledb.connect(
+            user=self.user,
+            password=self.password,
+            dsn=dsn,
+            tcp_connect_timeout=self.connect_timeout
+        )
+        conn.outputtypehandler = output_type_handler
+        return conn, conn.cursor()
     
     def get_connection_stats(self):
         """获取连接统计信息"""
@@ -224,36 +245,58 @@ class OracleMonitor:
             return None
     
     def get_process_list(self):
-        """获取数据库进程列表"""
+        """获取数据库会话汇总，仅在存在长时间运行的会话时返回Top-N明细"""
         try:
+            # 在服务端按状态、用户、主机聚合，避免拉取全部会话
             self.cursor.execute("""
                 SELECT 
-                    sid,
-                    serial#,
+                    status,
                     username,
                     machine,
-                    status,
-                    sql_text,
-                    logon_time
-                FROM v$session s
-                LEFT JOIN v$sql q ON s.sql_id = q.sql_id
+                    COUNT(*) as sessions,
+                    SUM(CASE WHEN status = 'ACTIVE' AND last_call_et >= :1 THEN 1 ELSE 0 END) as long_running
+                FROM v$session
                 WHERE username IS NOT NULL
-                ORDER BY status DESC
-            """)
+                AND sid <> SYS_CONTEXT('USERENV', 'SID')
+                GROUP BY status, username, machine
+            """, (PROCESS_TIME_THRESHOLD,))
+            summary = summarize_sessions(self.cursor.fetchall())
+            summary['time_threshold'] = PROCESS_TIME_THRESHOLD
+            summary['top_sessions'] = []
             
-            processes = []
-            for row in self.cursor.fetchall():
-                processes.append({
-                    'sid': row[0],
-                    'serial#': row[1],
-                    'username': row[2],
-                    'machine': row[3],
-                    'status': row[4],
-                    'sql_text': row[5],
-                    'logon_time': str(row[6]) if row[6] else None
-                })
-            
-            return processes
+            # 仅在存在超过阈值的会话时获取明细
+            if summary['long_running'] > 0:
+                self.cursor.execute("""
+                    SELECT 
+                        s.sid,
+                        s.serial#,
+                        s.username,
+                        s.machine,
+                        s.status,
+                        s.last_call_et,
+                        SUBSTR(q.sql_text, 1, 1000) as sql_text,
+                        s.logon_time
+                    FROM v$session s
+                    LEFT JOIN v$sqlarea q ON s.sql_id = q.sql_id
+                    WHERE s.username IS NOT NULL
+                    AND s.status = 'ACTIVE'
+                    AND s.last_call_et >= :1
+                    AND s.sid <> SYS_CONTEXT('USERENV', 'SID')
+                    ORDER BY s.last_call_et DESC
+                    FETCH FIRST :2 ROWS ONLY
+                """, (PROCESS_TIME_THRESHOLD, PROCESS_LIST_LIMIT))
+                for row in self.cursor.fetchall():
+                    summary['top_sessions'].append({
+                        'sid': row[0],
+                        'serial#': row[1],
+                        'username': row[2],
+                        'machine': row[3],
+                        'status': row[4],
+                        'last_call_et': row[5],
+                        'sql_text': row[6],
+                        'logon_time': str(row[7]) if row[7] else None
+                    })
+            return summary
         except Exception as e:
             print(f"[ERROR] 获取进程列表失败: {e}")
             return None
@@ -294,219 +337,130 @@ class OracleMonitor:
             print(f"[ERROR] 获取复制状态失败: {e}")
             return {'status': 'Error', 'error': str(e)}
     
-    def check_thresholds(self, stats):
-        """检查阈值并生成告警"""
-        alerts = []
-        
-        # 检查连接数
-        if stats.get('connection_stats'):
-            conn_percent = stats['connection_stats']['connection_percent']
-            if conn_percent > MAX_CONNECTIONS_THRESHOLD:
-                alerts.append({
-                    'level': 'WARNING',
-                    'message': f'连接数使用率过高: {conn_percent:.2f}% (阈值: {MAX_CONNECTIONS_THRESHOLD}%)',
-                    'metric': 'connection_percent',
-                    'value': conn_percent,
-                    'threshold': MAX_CONNECTIONS_THRESHOLD
-                })
-        
-        # 检查QPS
-        if stats.get('qps'):
-            qps_value = stats['qps']['qps']
-            if qps_value > MAX_QPS_THRESHOLD:
-                alerts.append({
-                    'level': 'WARNING',
-                    'message': f'QPS过高: {qps_value:.2f} (阈值: {MAX_QPS_THRESHOLD})',
-                    'metric': 'qps',
-                    'value': qps_value,
-                    'threshold': MAX_QPS_THRESHOLD
-                })
-        
-        # 检查慢查询
-        if stats.get('slow_queries'):
-            slow_query_count = stats['slow_queries']['slow_queries']
-            if slow_query_count > 0:
-                alerts.append({
-                    'level': 'WARNING',
-                    'message': f'存在慢查询: {slow_query_count} 条',
-                    'metric': 'slow_queries',
-                    'value': slow_query_count,
-                    'threshold': 0
-                })
-        
-        # 检查缓存命中率
-        if stats.get('cache_hit_rate'):
-            cache_rate = stats['cache_hit_rate']['cache_hit_rate']
-            if cache_rate < CACHE_HIT_RATE_THRESHOLD:
-                alerts.append({
-                    'level': 'WARNING',
-                    'message': f'缓存命中率过低: {cache_rate:.2f}% (阈值: {CACHE_HIT_RATE_THRESHOLD}%)',
-                    'metric': 'cache_hit_rate',
-                    'value': cache_rate,
-                    'threshold': CACHE_HIT_RATE_THRESHOLD
-                })
-        
-        # 检查表空间使用情况
-        if stats.get('tablespace_usage'):
-            for tablespace in stats['tablespace_usage']:
-                if tablespace['usage_percent'] > TABLESPACE_USAGE_THRESHOLD:
-                    alerts.append({
-                        'level': 'WARNING',
-                        'message': f'表空间 {tablespace["tablespace"]} 使用率过高: {tablespace["usage_percent"]:.2f}% (阈值: {TABLESPACE_USAGE_THRESHOLD}%)',
-                        'metric': 'tablespace_usage',
-                        'value': tablespace['usage_percent'],
-                        'threshold': TABLESPACE_USAGE_THRESHOLD,
-                        'tablespace': tablespace['tablespace']
-                    })
-        
-        return alerts
-    
-    def send_alert(self, alert):
-        """发送告警"""
-        if ALERT_ENABLED:
-            print(f"[ALERT] [{alert['level']}] {alert['message']}")
-            # 这里可以添加邮件发送逻辑
-            # import smtplib
-            # from email.mime.text import MIMEText
-            # ...
-    
-    def _convert_decimal_to_float(self, data):
-        """将数据中的Decimal类型转换为float类型"""
-        if isinstance(data, dict):
-            return {k: self._convert_decimal_to_float(v) for k, v in data.items()}
-        elif isinstance(data, list):
-            return [self._convert_decimal_to_float(item) for item in data]
-        elif isinstance(data, (int, float, str, bool, type(None))):
-            return data
-        else:
-            try:
-                return float(data)
-            except:
-                return str(data)
+    def get_top_sql(self):
+        """获取本周期耗时、执行次数、返回行数最多的语句（基于v$sqlstats）"""
+        options = get_top_sql_options()
+        try:
+            # elapsed_time单位为微秒，换算为毫秒
+            self.cursor.execute("""
+                SELECT 
+                    sql_id || ':' || plan_hash_value as id,
+                    SUBSTR(sql_text, 1, :1) as query,
+                    executions,
+                    elapsed_time / 1000 as total_time_ms,
+                    rows_processed
+                FROM v$sqlstats
+                ORDER BY elapsed_time DESC
+                FETCH FIRST :2 ROWS ONLY
+            """, (options['text_length'], options['snapshot_limit']))
+            rows = [
+                {'id': row[0], 'query': row[1], 'calls': row[2], 'total_time_ms': row[3], 'rows': row[4]}
+                for row in self.cursor.fetchall()
+            ]
+            return diff_top_sql(self.state, rows, options)
+        except Exception as e:
+            print(f"[ERROR] 获取Top SQL失败: {e}")
+            return None
     
-    def save_stats_to_json(self, stats, alerts):
-        """保存监控结果为JSON文件"""
+    def get_blocking_chains(self):
+        """获取锁等待阻塞链（基于v$session.blocking_session）"""
+        options = get_blocking_options()
         try:
-            # 构建完整的监控数据
-            monitor_data = {
-                'timestamp': time.strftime('%Y-%m-%d %H:%M:%S'),
-                'monitor_time': time.time(),
-                'instance_name': self.instance_name,
-                'stats': self._convert_decimal_to_float(stats),
-                'alerts': self._convert_decimal_to_float(alerts),
-                'thresholds': {
-                    'max_connections_threshold': MAX_CONNECTIONS_THRESHOLD,
-                    'max_qps_threshold': MAX_QPS_THRESHOLD,
-                    'slow_query_threshold': SLOW_QUERY_THRESHOLD,
-                    'cache_hit_rate_threshold': CACHE_HIT_RATE_THRESHOLD,
-                    'tablespace_usage_threshold': TABLESPACE_USAGE_THRESHOLD
-                }
-            }
-            
-            # 生成文件名，包含实例名称和时间戳
-            file_name = f"{self.instance_name}_{time.strftime('%Y%m%d_%H%M%S')}.json"
-            # 使用传递的监控目录或默认目录
-            if self.monitor_dir:
-                file_path = os.path.join(self.monitor_dir, file_name)
-            else:
-                file_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'monitor', file_name)
+            self.cursor.execute("""
+                SELECT 
+                    s.sid,
+                    s.username,
+                    s.status,
+                    (SELECT SUBSTR(q.sql_text, 1, :1) FROM v$sqlarea q WHERE q.sql_id = NVL(s.sql_id, s.prev_sql_id) AND ROWNUM = 1) as query,
+                    s.wait_time_micro / 1000000 as wait_seconds,
+                    s.blocking_session
+                FROM v$session s
+                WHERE s.blocking_session IS NOT NULL
+                OR s.sid IN (SELECT blocking_session FROM v$session WHERE blocking_session IS NOT NULL)
+            """, (options['text_length'],))
             
-            # 写入JSON文件
-            with open(file_path, 'w', encoding='utf-8') as f:
-                json.dump(monitor_data, f, ensure_ascii=False, indent=2)
+            waits = []
+            sessions = {}
+            for row in self.cursor.fetchall():
+                sessions[row[0]] = {'user': row[1], 'state': row[2], 'query': row[3]}
+                if row[5] is not None:
+                    waits.append((row[0], row[5], row[4]))
+            return build_blocking_chains(waits, sessions, options['limit'])
+        except Exception as e:
+            print(f"[ERROR] 获取阻塞链失败: {e}")
+            return None
+    
+    def get_replication_lag(self):
+        """获取Data Guard备库的传输延迟和应用延迟（v$dataguard_stats，仅在备库上可用）"""
+        try:
+            self.cursor.execute("SELECT database_role, db_unique_name FROM v$database")
+            role, db_unique_name = self.cursor.fetchone()
+            if role not in ('PHYSICAL STANDBY', 'LOGICAL STANDBY'):
+                return summarize_replication_lag(self.state, [])
             
-            print(f"[INFO] 监控结果已保存到: {file_path}")
+            self.cursor.execute("""
+                SELECT name, value
+                FROM v$dataguard_stats
+                WHERE name IN ('transport lag', 'apply lag')
+            """)
+            lags = {name: parse_interval_seconds(value) for name, value in self.cursor.fetchall()}
+            replica = {
+                'replica': db_unique_name,
+                'state': role,
+                'write_lag': lags.get('transport lag'),
+                'replay_lag': lags.get('apply lag'),
+                'lag_seconds': lags.get('apply lag')
+            }
+            return summarize_replication_lag(self.state, [replica])
         except Exception as e:
-            print(f"[ERROR] 保存监控结果到JSON文件失败: {e}")
+            print(f"[ERROR] 获取复制延迟失败: {e}")
+            return None
     
-    def run_monitor(self, monitor_dir=None):
-        """运行监控"""
-        print(f"\n[INFO] 开始监控 - {time.strftime('%Y-%m-%d %H:%M:%S')}")
-        self.monitor_dir = monitor_dir
+    def print_stats(self, stats):
+        """输出监控结果"""
+        # 连接统计
+        if stats['connection_stats']:
+            conn_stats = stats['connection_stats']
+            print(f"连接数: {conn_stats['current_connections']}/{conn_stats['max_connections']} ({conn_stats['connection_percent']:.2f}%)")
+            print(f"活跃连接数: {conn_stats['active_connections']}")
         
-        # 初始化监控数据
-        stats = {
-            'connection_status': False,
-            'connection_stats': None,
-            'qps': None,
-            'slow_queries': None,
-            'cache_hit_rate': None,
-            'tablespace_usage': None,
-            'process_list': None,
-            'replication_status': None,
-            'connection_error': None
-        }
+        # QPS
+        if stats['qps']:
+            print(f"QPS: {stats['qps']['qps']:.2f}")
         
-        # 连接数据库
-        if not self.connect():
-            error_msg = "无法连接数据库"
-            print(f"[ERROR] {error_msg}")
-            stats['connection_error'] = error_msg
-        else:
-            # 收集监控数据
-            stats['connection_status'] = self.get_connection_status()
-            stats['connection_stats'] = self.get_connection_stats()
-            stats['qps'] = self.get_qps()
-            stats['slow_queries'] = self.get_slow_queries()
-            stats['cache_hit_rate'] = self.get_cache_hit_rate()
-            stats['tablespace_usage'] = self.get_tablespace_usage()
-            stats['process_list'] = self.get_process_list()
-            stats['replication_status'] = self.get_replication_status()
-            
-            # 输出监控结果
-            print("\n=== 监控结果 ===")
-            
-            # 连接状态
-            print(f"连接状态: {'正常' if stats['connection_status'] else '异常'}")
-            
-            # 连接统计
-            if stats['connection_stats']:
-                conn_stats = stats['connection_stats']
-                print(f"连接数: {conn_stats['current_connections']}/{conn_stats['max_connections']} ({conn_stats['connection_percent']:.2f}%)")
-                print(f"活跃连接数: {conn_stats['active_connections']}")
-            
-            # QPS
-            if stats['qps']:
-                print(f"QPS: {stats['qps']['qps']:.2f}")
-            
-            # 慢查询
-            if stats['slow_queries']:
-                print(f"慢查询数: {stats['slow_queries']['slow_queries']}")
-                print(f"慢查询阈值: {stats['slow_queries']['slow_query_threshold']}秒")
-            
-            # 缓存命中率
-            if stats['cache_hit_rate']:
-                print(f"缓存命中率: {stats['cache_hit_rate']['cache_hit_rate']:.2f}%")
-            
-            # 表空间使用情况
-            if stats['tablespace_usage']:
-                print("\n表空间使用情况:")
-                for ts in stats['tablespace_usage']:
-                    print(f"  {ts['tablespace']}: {ts['used_mb']:.2f}MB/{ts['total_mb']:.2f}MB ({ts['usage_percent']:.2f}%)")
-            
-            # 复制状态
-            if stats['replication_status']:
-                print(f"\n复制状态: {stats['replication_status']['status']}")
-                if 'role' in stats['replication_status']:
-                    print(f"  角色: {stats['replication_status']['role']}")
+        # 慢查询
+        if stats['slow_queries']:
+            print(f"慢查询数: {stats['slow_queries']['slow_queries']}")
+            print(f"慢查询阈值: {stats['slow_queries']['slow_query_threshold']}秒")
+        
+        # 缓存命中率
+        if stats['cache_hit_rate']:
+            print(f"缓存命中率: {stats['cache_hit_rate']['cache_hit_rate']:.2f}%")
+        
+        # 表空间使用情况
+        if stats['tablespace_usage']:
+            print("\n表空间使用情况:")
+            for ts in stats['tablespace_usage']:
+                print(f"  {ts['tablespace']}: {ts['used_mb']:.2f}MB/{ts['total_mb']:.2f}MB ({ts['usage_percent']:.2f}%)")
+        
+        # 会话汇总
+        if stats['process_list']:
+            print(f"\n会话数: {stats['process_list']['total_sessions']} (运行超过{PROCESS_TIME_THRESHOLD}秒: {stats['process_list']['long_running']})")
         
-        # 检查阈值并生成告警
-        alerts = self.check_thresholds(stats)
-        if alerts:
-            print("\n=== 告警信息 ===")
-            for alert in alerts:
-                self.send_alert(alert)
-        else:
-            print("\n=== 告警信息 ===")
-            print("无告警")
+        # 复制状态
+        if stats['replication_status']:
+            print(f"\n复制状态: {stats['replication_status']['status']}")
+            if 'role' in stats['replication_status']:
+                print(f"  角色: {stats['replication_status']['role']}")
         
-        # 保存监控结果为JSON文件
-        self.save_stats_to_json(stats, alerts)
+        # Top SQL
+        print_top_sql(stats.get('top_sql'))
         
-        # 断开连接
-        self.disconnect()
+        # 阻塞链
+        print_blocking_chains(stats.get('blocking_chains'))
         
-        print(f"\n[INFO] 监控完成 - {time.strftime('%Y-%m-%d %H:%M:%S')}")
+        # 复制延迟
+        print_replication_lag(stats.get('replication_lag'))
 
 if __name__ == "__main__":
     monitor = OracleMonitor()
@@ -1,5 +1,6 @@
 #!/usr/bin/env python3
 import os
+import sys
 import json
 import time
 import logging
@@ -9,6 +10,12 @@ import concurrent.futures
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
 
+# 添加数据库目录到Python路径，以便导入公共模块
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from common.stats_codec import is_stats_file, read_stats_file, decode_stats
+from common.segment_store import SEGMENT_SUFFIX, list_segments, iter_segment_records
+from common.change_only import carry_forward
+
 # 加载配置文件
 load_dotenv()
 
@@ -23,6 +30,53 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# 阻塞链明细表的列，每个根阻塞会话一行
+BLOCKING_COLUMNS = (
+    'instance_name', 'timestamp', 'root_session', 'root_user', 'waiters',
+    'chain_depth', 'max_wait_seconds', 'is_deadlock', 'root_query'
+)
+
+def extract_blocking_rows(instance_name, timestamp, stats):
+    """将监控结果中的阻塞链转换为monitor_blocking表的行，没有阻塞时返回空列表"""
+    blocking = stats.get('blocking_chains')
+    if not blocking or not blocking.get('chains'):
+        return []
+    return [
+        (
+            instance_name, timestamp, str(chain['session']), chain.get('user'), chain['waiters'],
+            chain['chain_depth'], chain['max_wait_seconds'], 1 if chain['deadlock'] else 0, chain.get('query')
+        )
+        for chain in blocking['chains']
+    ]
+
+# 复制延迟明细表的列，每个副本一行，延迟单位为秒
+REPLICATION_COLUMNS = (
+    'instance_name', 'timestamp', 'monitor_time', 'replica', 'state', 'lag_seconds', 'write_lag_seconds',
+    'flush_lag_seconds', 'replay_lag_seconds', 'lag_bytes', 'lag_rate', 'trend'
+)
+
+def extract_replication_rows(instance_name, timestamp, monitor_time, stats):
+    """将监控结果中的复制延迟转换为monitor_replication表的行，没有副本时返回空列表"""
+    replication_lag = stats.get('replication_lag')
+    if not replication_lag or not replication_lag.get('replicas'):
+        return []
+    return [
+        (
+            instance_name, timestamp, monitor_time, str(replica['replica']), replica.get('state'), replica.get('lag_seconds'),
+            replica.get('write_lag'), replica.get('flush_lag'), replica.get('replay_lag'), replica.get('lag_bytes'),
+            replica.get('lag_rate'), replica.get('trend')
+        )
+        for replica in replication_lag['replicas']
+    ]
+
+# 各数据库设置、回滚和释放保存点的语句，不支持释放的为None
+SAVEPOINT_STATEMENTS = {
+    'mssql': ('SAVE TRANSACTION record_write', 'ROLLBACK TRANSACTION record_write', None),
+    'oracle': ('SAVEPOINT record_write', 'ROLLBACK TO SAVEPOINT record_write', None),
+    'dm': ('SAVEPOINT record_write', 'ROLLBACK TO SAVEPOINT record_write', None)
+}
+DEFAULT_SAVEPOINT_STATEMENTS = ('SAVEPOINT record_write', 'ROLLBACK TO SAVEPOINT record_write', 'RELEASE SAVEPOINT record_write')
+
 class DatabaseWriter:
     def __init__(self, db_type, db_config):
         self.db_type = db_type
@@ -137,6 +191,32 @@ class DatabaseWriter:
         except Exception as e:
             logger.error(f"断开数据库连接失败: {e}")
     
+    def savepoint(self, action):
+        """设置(set)、回滚到(rollback)或释放(release)单条记录的保存点，MongoDB没有事务，不做处理
+        
+        PostgreSQL和KingbaseES中语句出错后整个事务都不可用，必须回滚到保存点才能继续写入后面的记录。
+        """
+        if self.db_type == 'mongodb':
+            return
+        statements = dict(zip(('set', 'rollback', 'release'), SAVEPOINT_STATEMENTS.get(self.db_type, DEFAULT_SAVEPOINT_STATEMENTS)))
+        if statements[action]:
+            self.cursor.execute(statements[action])
+    
+    def insert_rows(self, table, columns, rows):
+        """批量写入明细表，按数据库类型生成占位符"""
+        if not rows:
+            return
+        if self.db_type == 'mongodb':
+            self.db[table].insert_many([{**dict(zip(columns, row)), 'created_at': datetime.now()} for row in rows])
+            return
+        if self.db_type == 'oracle':
+            placeholders = ', '.join(f':{i}' for i in range(1, len(columns) + 1))
+        elif self.db_type == 'mssql':
+            placeholders = ', '.join('?' for _ in columns)
+        else:
+            placeholders = ', '.join('%s' for _ in columns)
+        self.cursor.executemany(f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})", rows)
+    
     def create_tables(self):
         """创建数据库表结构"""
         try:
@@ -364,6 +444,39 @@ class DatabaseWriter:
                         created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
                     ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
                 ''')
+                self.cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS monitor_blocking (
+                        id INT AUTO_INCREMENT PRIMARY KEY,
+                        instance_name VARCHAR(255) NOT NULL,
+                        timestamp DATETIME NOT NULL,
+                        root_session VARCHAR(64) NOT NULL,
+                        root_user VARCHAR(255),
+                        waiters INT,
+                        chain_depth INT,
+                        max_wait_seconds DOUBLE,
+                        is_deadlock SMALLINT,
+                        root_query TEXT,
+                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+                ''')
+                self.cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS monitor_replication (
+                        id INT AUTO_INCREMENT PRIMARY KEY,
+                        instance_name VARCHAR(255) NOT NULL,
+                        timestamp DATETIME NOT NULL,
+                        monitor_time DOUBLE NOT NULL,
+                        replica VARCHAR(255) NOT NULL,
+                        state VARCHAR(50),
+                        lag_seconds DOUBLE,
+                        write_lag_seconds DOUBLE,
+                        flush_lag_seconds DOUBLE,
+                        replay_lag_seconds DOUBLE,
+                        lag_bytes BIGINT,
+                        lag_rate DOUBLE,
+                        trend VARCHAR(20),
+                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+                ''')
             
             elif self.db_type == 'postgresql':
                 self.cursor.execute('''
@@ -379,6 +492,39 @@ class DatabaseWriter:
                         created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
                     )
                 ''')
+                self.cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS monitor_blocking (
+                        id SERIAL PRIMARY KEY,
+                        instance_name VARCHAR(255) NOT NULL,
+                        timestamp TIMESTAMP NOT NULL,
+                        root_session VARCHAR(64) NOT NULL,
+                        root_user VARCHAR(255),
+                        waiters INTEGER,
+                        chain_depth INTEGER,
+                        max_wait_seconds DOUBLE PRECISION,
+                        is_deadlock SMALLINT,
+                        root_query TEXT,
+                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    )
+                ''')
+                self.cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS monitor_replication (
+                        id SERIAL PRIMARY KEY,
+                        instance_name VARCHAR(255) NOT NULL,
+                        timestamp TIMESTAMP NOT NULL,
+                        monitor_time DOUBLE PRECISION NOT NULL,
+                        replica VARCHAR(255) NOT NULL,
+                        state VARCHAR(50),
+                        lag_seconds DOUBLE PRECISION,
+                        write_lag_seconds DOUBLE PRECISION,
+                        flush_lag_seconds DOUBLE PRECISION,
+                        replay_lag_seconds DOUBLE PRECISION,
+                        lag_bytes BIGINT,
+                        lag_rate DOUBLE PRECISION,
+                        trend VARCHAR(20),
+                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    )
+                ''')
             
             elif self.db_type == 'oracle':
                 self.cursor.execute('''
@@ -394,6 +540,39 @@ class DatabaseWriter:
                         created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
                     )
                 ''')
+                self.cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS monitor_blocking (
+                        id NUMBER GENERATED BY DEFAULT ON NULL AS IDENTITY PRIMARY KEY,
+                        instance_name VARCHAR2(255) NOT NULL,
+                        timestamp TIMESTAMP NOT NULL,
+                        root_session VARCHAR2(64) NOT NULL,
+                        root_user VARCHAR2(255),
+                        waiters NUMBER,
+                        chain_depth NUMBER,
+                        max_wait_seconds NUMBER(15,3),
+                        is_deadlock NUMBER(1),
+                        root_query CLOB,
+                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    )
+                ''')
+                self.cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS monitor_replication (
+                        id NUMBER GENERATED BY DEFAULT ON NULL AS IDENTITY PRIMARY KEY,
+                        instance_name VARCHAR2(255) NOT NULL,
+                        timestamp TIMESTAMP NOT NULL,
+                        monitor_time NUMBER(15,3) NOT NULL,
+                        replica VARCHAR2(255) NOT NULL,
+                        state VARCHAR2(50),
+                        lag_seconds NUMBER(15,3),
+                        write_lag_seconds NUMBER(15,3),
+                        flush_lag_seconds NUMBER(15,3),
+                        replay_lag_seconds NUMBER(15,3),
+                        lag_bytes NUMBER,
+                        lag_rate NUMBER(15,4),
+                        trend VARCHAR2(20),
+                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    )
+                ''')
             
             elif self.db_type == 'mssql':
                 self.cursor.execute('''
@@ -410,6 +589,41 @@ class DatabaseWriter:
                         created_at DATETIME DEFAULT GETDATE()
                     )
                 ''')
+                self.cursor.execute('''
+                    IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='monitor_blocking' AND xtype='U')
+                    CREATE TABLE monitor_blocking (
+                        id INT IDENTITY(1,1) PRIMARY KEY,
+                        instance_name VARCHAR(255) NOT NULL,
+                        timestamp DATETIME NOT NULL,
+                        root_session VARCHAR(64) NOT NULL,
+                        root_user VARCHAR(255),
+                        waiters INT,
+                        chain_depth INT,
+                        max_wait_seconds FLOAT,
+                        is_deadlock SMALLINT,
+                        root_query TEXT,
+                        created_at DATETIME DEFAULT GETDATE()
+                    )
+                ''')
+                self.cursor.execute('''
+                    IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='monitor_replication' AND xtype='U')
+                    CREATE TABLE monitor_replication (
+                        id INT IDENTITY(1,1) PRIMARY KEY,
+                        instance_name VARCHAR(255) NOT NULL,
+                        timestamp DATETIME NOT NULL,
+                        monitor_time FLOAT NOT NULL,
+                        replica VARCHAR(255) NOT NULL,
+                        state VARCHAR(50),
+                        lag_seconds FLOAT,
+                        write_lag_seconds FLOAT,
+                        flush_lag_seconds FLOAT,
+                        replay_lag_seconds FLOAT,
+                        lag_bytes BIGINT,
+                        lag_rate FLOAT,
+                        trend VARCHAR(20),
+                        created_at DATETIME DEFAULT GETDATE()
+                    )
+                ''')
             
             # 提交事务
             if self.db_type != 'mongodb':
@@ -652,6 +866,12 @@ class DatabaseWriter:
                             alert_value, alert_threshold
                         ))
             
+            # 写入阻塞链明细
+            self.insert_rows('monitor_blocking', BLOCKING_COLUMNS, extract_blocking_rows(instance_name, timestamp, stats))
+            
+            # 写入各副本的复制延迟
+            self.insert_rows('monitor_replication', REPLICATION_COLUMNS, extract_replication_rows(instance_name, timestamp, monitor_time, stats))
+            
             # 提交事务
             if self.db_type != 'mongodb':
                 self.conn.commit()
@@ -665,7 +885,7 @@ class DatabaseWriter:
             return False
 
 def read_json_files(monitor_dir, processed_files=None):
-    """读取监控目录下的JSON文件，只处理新文件"""
+    """读取监控目录下的JSON文件（自动识别紧凑、缩进和zstd压缩格式），只处理新文件"""
     json_files = []
     processed_files_set = set(processed_files) if processed_files else set()
     
@@ -686,7 +906,7 @@ def read_json_files(monitor_dir, processed_files=None):
             for date_str, date_path in date_dirs:
                 # 遍历目录中的文件
                 for file in os.listdir(date_path):
-                    if file.endswith('.json'):
+                    if is_stats_file(file):
                         file_path = os.path.join(date_path, file)
                         
                         # 检查文件是否已处理
@@ -694,9 +914,7 @@ def read_json_files(monitor_dir, processed_files=None):
                             continue
                         
                         try:
-                            with open(file_path, 'r', encoding='utf-8') as f:
-                                data = json.load(f)
-                                json_files.append((file_path, data))
+                            json_files.append((file_path, read_stats_file(file_path)))
                         except Exception as e:
                             logger.error(f"读取JSON文件失败: {file_path} - {e}")
         
@@ -706,6 +924,51 @@ def read_json_files(monitor_dir, processed_files=None):
         logger.error(f"扫描监控目录失败: {e}")
         return []
 
+def get_date_dirs(monitor_dir):
+    """获取监控目录下的日期目录，按日期升序排列"""
+    date_dirs = []
+    if os.path.exists(monitor_dir):
+        for item in os.listdir(monitor_dir):
+            item_path = os.path.join(monitor_dir, item)
+            if os.path.isdir(item_path) and re.match(r'\d{4}-\d{2}-\d{2}', item):
+                date_dirs.append(item_path)
+    return sorted(date_dirs)
+
+def read_segment_records(monitor_dir, segment_offsets):
+    """从各段文件的检查点偏移量开始读取已提交的记录
+    
+    返回(记录列表, 记录位置)，记录为(记录ID, 数据)，记录ID格式为 段文件路径@起始偏移量；
+    记录位置按段文件分组，为[(记录ID, 结束偏移量)]，用于入库后推进检查点。
+    """
+    records = []
+    positions = {}
+    try:
+        for date_path in get_date_dirs(monitor_dir):
+            for segment_path in list_segments(date_path):
+                segment_key = os.path.relpath(segment_path, monitor_dir)
+                offset = segment_offsets.get(segment_key, 0)
+                if offset >= os.path.getsize(segment_path):
+                    continue
+                
+                try:
+                    for payload, start, end in iter_segment_records(segment_path, offset):
+                        record_id = f"{segment_path}@{start}"
+                        positions.setdefault(segment_key, []).append((record_id, end))
+                        try:
+                            records.append((record_id, decode_stats(payload)))
+                        except Exception as e:
+                            # 无法解码的记录不入库，但检查点照常越过它
+                            logger.error(f"解码段文件记录失败: {record_id} - {e}")
+                            records.append((record_id, None))
+                except Exception as e:
+                    logger.error(f"读取段文件失败: {segment_path} - {e}")
+        
+        logger.info(f"成功读取 {len(records)} 条新的段文件记录")
+        return records, positions
+    except Exception as e:
+        logger.error(f"扫描段文件失败: {e}")
+        return [], {}
+
 def load_config_from_file(config_file):
     """从配置文件加载配置"""
     try:
@@ -754,6 +1017,130 @@ def load_processed_files(monitor_dir, days=7):
     logger.debug(f"加载了 {len(processed_files)} 个已处理文件记录")
     return processed_files
 
+def get_segment_offsets_file(monitor_dir):
+    """获取段文件检查点的保存路径"""
+    return os.path.join(get_processed_files_dir(monitor_dir), 'segment_offsets.json')
+
+def load_segment_offsets(monitor_dir):
+    """加载各段文件已入库的字节偏移量，键为相对监控目录的段文件路径"""
+    file_path = get_segment_offsets_file(monitor_dir)
+    if not os.path.exists(file_path):
+        return {}
+    try:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except Exception as e:
+        logger.error(f"加载段文件检查点失败: {file_path} - {e}")
+        return {}
+
+def save_segment_offsets(segment_offsets, monitor_dir):
+    """保存段文件检查点，已删除的段文件对应的检查点一并清理"""
+    try:
+        processed_dir = get_processed_files_dir(monitor_dir)
+        if not os.path.exists(processed_dir):
+            os.makedirs(processed_dir)
+        
+        offsets = {
+            key: offset for key, offset in segment_offsets.items()
+            if os.path.exists(os.path.join(monitor_dir, key))
+        }
+        # 先写临时文件再替换，避免中断时检查点损坏
+        file_path = get_segment_offsets_file(monitor_dir)
+        tmp_path = file_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(offsets, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(tmp_path, file_path)
+        return True
+    except Exception as e:
+        logger.error(f"保存段文件检查点失败: {e}")
+        return False
+
+def get_record_segment(record_id):
+    """获取段文件记录ID（段文件路径@起始偏移量）所属的段文件路径，JSON文件返回None"""
+    segment_path, separator, offset = record_id.rpartition('@')
+    if separator and offset.isdigit() and segment_path.endswith(SEGMENT_SUFFIX):
+        return segment_path
+    return None
+
+def update_segment_offsets(segment_offsets, positions, committed_ids):
+    """按段文件顺序推进检查点，遇到未提交的记录即停止，保证该记录下次重新读取"""
+    for segment_key, segment_positions in positions.items():
+        for record_id, end in segment_positions:
+            if record_id not in committed_ids:
+                break
+            segment_offsets[segment_key] = end
+    return segment_offsets
+
+def get_carry_forward_file(monitor_dir):
+    """获取各实例片段最近值的保存路径"""
+    return os.path.join(get_processed_files_dir(monitor_dir), 'carry_forward.json')
+
+def load_carry_forward(monitor_dir):
+    """加载各实例按变化写入的片段最近一次的值：{实例名: {片段路径: 值}}"""
+    file_path = get_carry_forward_file(monitor_dir)
+    if not os.path.exists(file_path):
+        return {}
+    try:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except Exception as e:
+        logger.error(f"加载片段最近值失败: {file_path} - {e}")
+        return {}
+
+def save_carry_forward(last_values, monitor_dir):
+    """保存各实例片段最近一次的值（先写临时文件再替换）"""
+    try:
+        processed_dir = get_processed_files_dir(monitor_dir)
+        if not os.path.exists(processed_dir):
+            os.makedirs(processed_dir)
+        
+        file_path = get_carry_forward_file(monitor_dir)
+        tmp_path = file_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(last_values, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(tmp_path, file_path)
+        return True
+    except Exception as e:
+        logger.error(f"保存片段最近值失败: {e}")
+        return False
+
+def apply_carry_forward(records, last_values):
+    """按实例和监控时间顺序，用上次的值补全各记录中省略的未变化片段
+    
+    返回每条记录补全后的片段最近值[(记录ID, 实例名, 片段最近值)]，顺序与补全顺序一致；
+    不修改传入的last_values，入库后由select_carry_forward按提交情况选出要保存的值。
+    """
+    last_values = {instance: dict(values) for instance, values in last_values.items()}
+    valid_records = [(record_id, data) for record_id, data in records if isinstance(data, dict) and isinstance(data.get('stats'), dict)]
+    valid_records.sort(key=lambda record: (record[1].get('instance_name') or '', record[1].get('monitor_time') or 0))
+    
+    snapshots = []
+    for record_id, data in valid_records:
+        instance_name = data.get('instance_name') or ''
+        values = last_values.setdefault(instance_name, {})
+        missing = carry_forward(data['stats'], values)
+        if missing:
+            logger.warning(f"缺少片段的历史值，等待下一个关键帧: {instance_name} {data.get('timestamp')} - {', '.join(missing)}")
+        snapshots.append((record_id, instance_name, dict(values)))
+    return snapshots
+
+def select_carry_forward(last_values, snapshots, done_ids):
+    """按实例取连续完成的最后一条记录之后的片段最近值
+    
+    与段文件检查点一致：某条记录未完成时，该实例之后的记录下次会重新读取并从这里重新补全，
+    因此只推进到它之前。done_ids为已提交或不会再读取的记录ID。
+    """
+    selected = {instance: dict(values) for instance, values in last_values.items()}
+    stopped = set()
+    for record_id, instance_name, values in snapshots:
+        if instance_name in stopped:
+            continue
+        if record_id not in done_ids:
+            stopped.add(instance_name)
+            continue
+        selected[instance_name] = values
+    return selected
+
 def save_processed_files(processed_files, monitor_dir):
     """保存已处理的文件记录，按日期分文件存储"""
     try:
@@ -822,9 +1209,12 @@ def cleanup_expired_records(monitor_dir, days=7):
         logger.error(f"清理过期记录失败: {e}")
 
 def process_file(file_info):
-    """处理单个监控文件，返回处理后的数据"""
+    """处理单个监控文件（或段文件记录），返回处理后的数据"""
     file_path, data = file_info
     try:
+        if data is None:
+            raise ValueError("记录内容无法解码")
+        
         # 解析时间戳
         timestamp_str = data.get('timestamp', '')
         try:
@@ -916,6 +1306,8 @@ def process_file(file_info):
                 query_cache_hit_rate, tablespace_usage, replication_status
             ),
             'alerts': processed_alerts,
+            'blocking': extract_blocking_rows(instance_name, timestamp, stats),
+            'replication': extract_replication_rows(instance_name, timestamp, monitor_time, stats),
             'success': True
         }
     except Exception as e:
@@ -926,7 +1318,11 @@ def process_file(file_info):
         }
 
 def batch_write_to_db(processed_data_list, db_type, db_config):
-    """批量写入数据到数据库"""
+    """批量写入数据到数据库
+    
+    processed_data_list需按段文件中的记录顺序排列。段文件记录写入失败后，同一段文件中后面的记录本批次不再写入：
+    检查点停在失败的记录之前，下次从这里重新读取，后面的记录如果已经提交就会被重复写入。
+    """
     if not processed_data_list:
         return 0, 0
     
@@ -946,13 +1342,25 @@ def batch_write_to_db(processed_data_list, db_type, db_config):
         if db_type != 'mongodb':
             writer.conn.autocommit = False
         
+        # 写入成功、随事务一起提交的记录
+        written = []
+        # 本批次已有记录写入失败的段文件
+        blocked_segments = set()
+        
         # 处理主数据和告警数据
         for data in processed_data_list:
             if not data['success']:
                 failed_count += 1
                 continue
             
+            segment_path = get_record_segment(data['file_path'])
+            if segment_path in blocked_segments:
+                failed_count += 1
+                continue
+            
             try:
+                # 每条记录一个保存点，写入失败时只撤销这条记录
+                writer.savepoint('set')
                 # 写入主表
                 if db_type == 'mongodb':
                     # MongoDB写入方式
@@ -1066,18 +1474,42 @@ def batch_write_to_db(processed_data_list, db_type, db_config):
                                 ) VALUES (%s, %s, %s, %s, %s, %s, %s)
                             ''', alert)
                 
+                # 写入阻塞链明细
+                writer.insert_rows('monitor_blocking', BLOCKING_COLUMNS, data.get('blocking', []))
+                
+                # 写入各副本的复制延迟
+                writer.insert_rows('monitor_replication', REPLICATION_COLUMNS, data.get('replication', []))
+                
+                writer.savepoint('release')
+                written.append(data)
                 success_count += 1
             except Exception as e:
                 logger.error(f"写入数据失败: {data['file_path']} - {e}")
                 failed_count += 1
+                if segment_path:
+                    blocked_segments.add(segment_path)
+                    logger.warning(f"段文件中该记录之后的记录推迟到下次写入: {segment_path}")
+                try:
+                    writer.savepoint('rollback')
+                except Exception as rollback_error:
+                    # 无法回滚到保存点时整个事务都不能提交，交给外层回滚，本批次下次全部重试
+                    raise RuntimeError(f"回滚到保存点失败: {rollback_error}") from e
         
         # 提交事务
         if db_type != 'mongodb':
             writer.conn.commit()
         
+        # 只有实际提交的记录才算完成；写入失败的记录不推进检查点，下次重试，
+        # 无法解析的记录重试也不会成功，不阻塞检查点
+        for data in written:
+            data['committed'] = True
+        for data in processed_data_list:
+            if not data['success']:
+                data['committed'] = True
+        
         # 断开连接
         writer.disconnect()
-        
+    
     except Exception as e:
         logger.error(f"批量写入过程中发生错误: {e}")
         # 回滚事务
@@ -1096,6 +1528,32 @@ def batch_write_to_db(processed_data_list, db_type, db_config):
     
     return success_count, failed_count
 
+def process_records(records, max_workers):
+    """使用线程池并行处理监控文件和段文件记录，结果按records的顺序返回（段文件记录保持在段文件中的顺序）"""
+    processed_data_list = []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # 提交任务
+        futures = {
+            executor.submit(process_file, (file_path, data)): file_path
+            for file_path, data in records
+        }
+        
+        # 收集处理结果
+        for future in concurrent.futures.as_completed(futures):
+            file_path = futures[future]
+            try:
+                result = future.result()
+                processed_data_list.append(result)
+            except Exception as e:
+                logger.error(f"处理文件时发生异常: {file_path} - {e}")
+                processed_data_list.append({
+                    'file_path': file_path,
+                    'success': False
+                })
+    order = {file_path: index for index, (file_path, _) in enumerate(records)}
+    processed_data_list.sort(key=lambda data: order.get(data['file_path'], len(order)))
+    return processed_data_list
+
 def main():
     """主函数"""
     # 先加载配置文件以获取默认数据库类型
@@ -1174,16 +1632,19 @@ def main():
     if args.continuous:
         logger.info(f"启动持续监控模式，监控目录: {args.monitor_dir}，间隔: {args.interval}秒")
         
-        # 记录已处理的文件
+        # 记录已处理的文件和段文件检查点
         processed_files = set()
+        segment_offsets = load_segment_offsets(args.monitor_dir)
+        last_values = load_carry_forward(args.monitor_dir)
         
         try:
             while True:
                 # 读取JSON文件，只处理新文件
                 json_files = read_json_files(args.monitor_dir, processed_files)
+                # 读取段文件中检查点之后的记录
+                segment_records, segment_positions = read_segment_records(args.monitor_dir, segment_offsets)
                 
-                # 直接使用返回的新文件
-                new_files = json_files
+                new_files = json_files + segment_records
                 
                 if new_files:
                     logger.info(f"发现 {len(new_files)} 个新的监控文件")
@@ -1191,28 +1652,10 @@ def main():
                     # 写入数据
                     success_count = 0
                     failed_count = 0
-                    processed_data_list = []
                     
-                    # 使用线程池并行处理文件
-                    with concurrent.futures.ThreadPoolExecutor(max_workers=args.max_workers) as executor:
-                        # 提交任务
-                        futures = {
-                            executor.submit(process_file, (file_path, data)): file_path
-                            for file_path, data in new_files
-                        }
-                        
-                        # 收集处理结果
-                        for future in concurrent.futures.as_completed(futures):
-                            file_path = futures[future]
-                            try:
-                                result = future.result()
-                                processed_data_list.append(result)
-                            except Exception as e:
-                                logger.error(f"处理文件时发生异常: {file_path} - {e}")
-                                processed_data_list.append({
-                                    'file_path': file_path,
-                                    'success': False
-                                })
+                    # 补全未变化的片段，然后使用线程池并行处理文件
+                    carried_snapshots = apply_carry_forward(new_files, last_values)
+                    processed_data_list = process_records(new_files, args.max_workers)
                     
                     # 批量写入数据库
                     batch_success, batch_failed = batch_write_to_db(processed_data_list, db_type, db_config)
@@ -1220,10 +1663,22 @@ def main():
                     failed_count = batch_failed
                     
                     # 更新已处理文件集合
+                    segment_record_ids = {record_id for record_id, _ in segment_records}
                     for data in processed_data_list:
-                        if data['success']:
+                        if data['success'] and data['file_path'] not in segment_record_ids:
                             processed_files.add(data['file_path'])
                     
+                    # 片段最近值推进到各实例连续完成的最后一条记录，未提交的记录下次重新补全
+                    done_ids = {data['file_path'] for data in processed_data_list if data.get('committed') or data['file_path'] in processed_files}
+                    last_values = select_carry_forward(last_values, carried_snapshots, done_ids)
+                    save_carry_forward(last_values, args.monitor_dir)
+                    
+                    # 推进段文件检查点
+                    if segment_records:
+                        committed_ids = {data['file_path'] for data in processed_data_list if data.get('committed')}
+                        update_segment_offsets(segment_offsets, segment_positions, committed_ids)
+                        save_segment_offsets(segment_offsets, args.monitor_dir)
+                    
                     # 输出结果
                     logger.info(f"批次处理完成")
                     logger.info(f"总文件数: {len(new_files)}")
@@ -1235,7 +1690,7 @@ def main():
                 # 等待指定的时间间隔
                 logger.debug(f"等待 {args.interval} 秒后再次检查")
                 time.sleep(args.interval)
-                
+        
         except KeyboardInterrupt:
             logger.info("持续监控已手动停止")
         except Exception as e:
@@ -1247,13 +1702,11 @@ def main():
         
         # 读取JSON文件，只处理新文件
         json_files = read_json_files(args.monitor_dir, processed_files)
+        # 读取段文件中检查点之后的记录
+        segment_offsets = load_segment_offsets(args.monitor_dir)
+        segment_records, segment_positions = read_segment_records(args.monitor_dir, segment_offsets)
         
-        if not json_files:
-            logger.warning("没有找到监控JSON文件，退出脚本")
-            return
-        
-        # 直接使用返回的新文件
-        new_files = json_files
+        new_files = json_files + segment_records
         
         if not new_files:
             logger.info("没有发现新的监控文件，退出脚本")
@@ -1265,28 +1718,11 @@ def main():
         success_count = 0
         failed_count = 0
         processed_files_set = set(processed_files)
-        processed_data_list = []
         
-        # 使用线程池并行处理文件
-        with concurrent.futures.ThreadPoolExecutor(max_workers=args.max_workers) as executor:
-            # 提交任务
-            futures = {
-                executor.submit(process_file, (file_path, data)): file_path
-                for file_path, data in new_files
-            }
-            
-            # 收集处理结果
-            for future in concurrent.futures.as_completed(futures):
-                file_path = futures[future]
-                try:
-                    result = future.result()
-                    processed_data_list.append(result)
-                except Exception as e:
-                    logger.error(f"处理文件时发生异常: {file_path} - {e}")
-                    processed_data_list.append({
-                        'file_path': file_path,
-                        'success': False
-                    })
+        # 补全未变化的片段，然后使用线程池并行处理文件
+        last_values = load_carry_forward(args.monitor_dir)
+        carried_snapshots = apply_carry_forward(new_files, last_values)
+        processed_data_list = process_records(new_files, args.max_workers)
         
         # 批量写入数据库
         batch_success, batch_failed = batch_write_to_db(processed_data_list, db_type, db_config)
@@ -1294,14 +1730,25 @@ def main():
         failed_count = batch_failed
         
         # 更新已处理文件集合
+        segment_record_ids = {record_id for record_id, _ in segment_records}
         for data in processed_data_list:
-            if data['success']:
+            if data['success'] and data['file_path'] not in segment_record_ids:
                 processed_files_set.add(data['file_path'])
         
+        # 片段最近值推进到各实例连续完成的最后一条记录
+        done_ids = {data['file_path'] for data in processed_data_list if data.get('committed') or data['file_path'] in processed_files_set}
+        save_carry_forward(select_carry_forward(last_values, carried_snapshots, done_ids), args.monitor_dir)
+        
         # 保存已处理的文件记录
         if processed_files_set:
             save_processed_files(list(processed_files_set), args.monitor_dir)
         
+        # 推进并保存段文件检查点
+        if segment_records:
+            committed_ids = {data['file_path'] for data in processed_data_list if data.get('committed')}
+            update_segment_offsets(segment_offsets, segment_positions, committed_ids)
+            save_segment_offsets(segment_offsets, args.monitor_dir)
+        
         # 输出结果
         logger.info(f"监控数据入库完成")
         logger.info(f"总文件数: {len(new_files)}")
@@ -1,5 +1,6 @@
 #!/usr/bin/env python3
 import os
+import sys
 import time
 import json
 import logging
@@ -9,6 +10,10 @@ import concurrent.futures
 from datetime import datetime
 from dotenv import load_dotenv
 
+# 添加数据库目录到Python路径，以便导入公共模块
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from common.rule_engine import RuleEngine
+
 # 加载配置文件
 load_dotenv()
 
@@ -68,6 +73,11 @@ class DatabaseScheduler:
         self.config = self.load_config()
         self.db_instances = self.config.get('database_instances', [])
         self.concurrent_execution = self.config.get('concurrent_execution', True)
+        # 告警规则引擎，所有实例采集完成后统一求值
+        self.monitor_root_dir = os.path.join(os.path.dirname(__file__), 'monitor')
+        state_dir = os.path.join(self.monitor_root_dir, 'state')
+        os.makedirs(state_dir, exist_ok=True)
+        self.rule_engine = RuleEngine(state_dir)
     
     def load_config(self):
         """加载配置文件"""
@@ -117,7 +127,7 @@ class DatabaseScheduler:
         return True
     
     def run_monitor(self, db_instance):
-        """运行单个数据库监控"""
+        """采集单个数据库实例，返回(监控实例, 监控数据)，熔断或失败时监控数据为None"""
         db_type = db_instance['type']
         db_name = db_instance['name']
         db_config = db_instance['config']
@@ -140,24 +150,51 @@ class DatabaseScheduler:
             
             # 创建监控实例并传递配置和实例名称
             monitor = monitor_class(config=db_config, instance_name=db_name)
+            if db_instance.get('group'):
+                monitor.group = db_instance['group']
             
             # 确保统一监控目录存在，并按日期分目录
             import datetime
             current_date = datetime.datetime.now().strftime('%Y-%m-%d')
-            monitor_root_dir = os.path.join(os.path.dirname(__file__), 'monitor')
-            monitor_date_dir = os.path.join(monitor_root_dir, current_date)
+            monitor_date_dir = os.path.join(self.monitor_root_dir, current_date)
             if not os.path.exists(monitor_date_dir):
-                os.makedirs(monitor_date_dir)
+                os.makedirs(monitor_date_dir, exist_ok=True)
                 logger.info(f"创建监控目录: {monitor_date_dir}")
             
-            # 运行监控，传递统一的存储目录
-            monitor.run_monitor(monitor_dir=monitor_date_dir)
+            # 采集监控数据，传递统一的存储目录
+            stats = monitor.collect_sample(monitor_dir=monitor_date_dir)
             
-            logger.info(f"监控数据库实例完成: {db_name} ({db_type})")
-            return True
+            logger.info(f"采集数据库实例完成: {db_name} ({db_type})")
+            return monitor, stats
         except Exception as e:
             logger.error(f"监控数据库实例失败: {db_name} ({db_type}) - {e}")
-            return False
+            return None, None
+    
+    def publish_results(self, results):
+        """对所有实例的最新样本统一求值告警规则，然后保存各实例的监控结果
+        
+        单个实例生成样本失败时只跳过该实例的告警求值，求值失败时各实例按无告警保存，监控结果都不会丢失。
+        """
+        samples = []
+        for monitor, stats in results:
+            try:
+                samples.append(monitor.get_rule_sample(stats))
+            except Exception as e:
+                logger.error(f"生成告警样本失败，跳过告警求值: {monitor.instance_name} - {e}")
+        
+        start_time = time.time()
+        try:
+            alerts_by_instance = self.rule_engine.evaluate(samples)
+            logger.info(f"告警规则求值完成: {len(samples)} 个实例，耗时 {(time.time() - start_time) * 1000:.2f}ms")
+        except Exception as e:
+            logger.error(f"告警规则求值失败，本轮监控结果按无告警保存: {e}")
+            alerts_by_instance = {}
+        
+        for monitor, stats in results:
+            try:
+                monitor.publish(stats, alerts_by_instance.get(monitor.instance_name, []))
+            except Exception as e:
+                logger.error(f"保存监控结果失败: {monitor.instance_name} - {e}")
     
     def run_all_monitors(self):
         """运行所有数据库监控"""
@@ -166,6 +203,7 @@ class DatabaseScheduler:
         enabled_instances = [instance for instance in self.db_instances if instance.get('enabled', True)]
         logger.info(f"启用的实例数: {len(enabled_instances)}")
         
+        results = []
         if self.concurrent_execution:
             # 并发执行
             with concurrent.futures.ThreadPoolExecutor(max_workers=min(10, len(enabled_instances))) as executor:
@@ -174,13 +212,16 @@ class DatabaseScheduler:
                 for future in concurrent.futures.as_completed(futures):
                     instance = futures[future]
                     try:
-                        future.result()
+                        results.append(future.result())
                     except Exception as e:
                         logger.error(f"执行监控失败: {instance['name']} ({instance['type']}) - {e}")
         else:
             # 顺序执行
             for instance in enabled_instances:
-                self.run_monitor(instance)
+                results.append(self.run_monitor(instance))
+        
+        # 熔断中的实例已写入不可达标记，不参与告警求值
+        self.publish_results([(monitor, stats) for monitor, stats in results if stats is not None])
         
         logger.info("所有数据库监控执行完成")
     
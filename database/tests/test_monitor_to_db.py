@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'scheduler')))
+
+class FakeWriter:
+    """记录写入和提交的数据库写入器，主数据实例名为bad的记录写入失败"""
+    
+    instances = []
+    
+    def __init__(self, db_type, db_config):
+        self.db_type = db_type
+        self.pending = []
+        self.committed = []
+        self.mark = 0
+        self.conn = mock.Mock()
+        self.conn.commit.side_effect = lambda: self.committed.extend(self.pending)
+        self.cursor = mock.Mock()
+        self.cursor.execute.side_effect = self.execute
+        FakeWriter.instances.append(self)
+    
+    def connect(self):
+        return True
+    
+    def disconnect(self):
+        pass
+    
+    def execute(self, sql, params):
+        if params[0] == 'bad':
+            raise ValueError("数值超出范围")
+        self.pending.append(params[0])
+    
+    def savepoint(self, action):
+        if action == 'set':
+            self.mark = len(self.pending)
+        elif action == 'rollback':
+            del self.pending[self.mark:]
+    
+    def insert_rows(self, table, columns, rows):
+        pass
+
+def make_record(record_id, instance_name):
+    return {
+        'file_path': record_id,
+        'success': True,
+        'main_data': (instance_name,) + (0,) * 19,
+        'alerts': []
+    }
+
+def setUpModule():
+    # monitor_to_db导入时在当前目录创建日志文件，在临时目录中导入
+    global monitor_to_db, cwd, tmp_dir
+    cwd = os.getcwd()
+    tmp_dir = tempfile.TemporaryDirectory()
+    os.chdir(tmp_dir.name)
+    import monitor_to_db
+
+def tearDownModule():
+    os.chdir(cwd)
+    tmp_dir.cleanup()
+
+class BatchWriteTest(unittest.TestCase):
+    
+    def setUp(self):
+        FakeWriter.instances = []
+    
+    def test_failure_in_middle_of_segment_stops_that_segment(self):
+        segment_a = '/monitor/2026-01-01/a_000001.seg'
+        segment_b = '/monitor/2026-01-01/b_000001.seg'
+        batch = [
+            make_record(f'{segment_a}@0', 'a0'),
+            make_record(f'{segment_a}@20', 'bad'),
+            make_record(f'{segment_a}@40', 'a40'),
+            make_record(f'{segment_b}@0', 'b0'),
+            make_record('/monitor/2026-01-01/c_20260101_000000.json', 'c')
+        ]
+        with mock.patch.object(monitor_to_db, 'DatabaseWriter', FakeWriter):
+            success, failed = monitor_to_db.batch_write_to_db(batch, 'postgresql', {})
+        
+        self.assertEqual((success, failed), (3, 2))
+        # 失败记录之后同一段文件中的记录没有写入，其他段文件和JSON文件不受影响
+        self.assertEqual(FakeWriter.instances[0].committed, ['a0', 'b0', 'c'])
+        self.assertEqual([data['file_path'] for data in batch if data.get('committed')],
+                         [f'{segment_a}@0', f'{segment_b}@0', '/monitor/2026-01-01/c_20260101_000000.json'])
+        
+        # 检查点停在失败的记录之前，下次从这里重新读取时不会重复写入已提交的记录
+        positions = {
+            'a': [(f'{segment_a}@0', 20), (f'{segment_a}@20', 40), (f'{segment_a}@40', 60)],
+            'b': [(f'{segment_b}@0', 20)]
+        }
+        committed_ids = {data['file_path'] for data in batch if data.get('committed')}
+        offsets = monitor_to_db.update_segment_offsets({}, positions, committed_ids)
+        self.assertEqual(offsets, {'a': 20, 'b': 20})
+    
+    def test_process_records_keeps_segment_order(self):
+        records = [(f'/monitor/2026-01-01/a_000001.seg@{offset}', None) for offset in range(0, 200, 20)]
+        processed = monitor_to_db.process_records(records, 4)
+        self.assertEqual([data['file_path'] for data in processed], [record_id for record_id, _ in records])
+
+class CarryForwardTest(unittest.TestCase):
+    
+    def test_committed_keyframe_before_failed_delta(self):
+        records = [
+            ('k', {'instance_name': 'db1', 'monitor_time': 1, 'stats': {'tablespace_usage': [{'schema': 'new'}]}}),
+            ('d', {'instance_name': 'db1', 'monitor_time': 2, 'stats': {'unchanged': ['tablespace_usage']}}),
+            ('e', {'instance_name': 'db2', 'monitor_time': 1, 'stats': {'tablespace_usage': [{'schema': 'db2'}]}})
+        ]
+        last_values = {'db1': {'tablespace_usage': [{'schema': 'old'}]}}
+        snapshots = monitor_to_db.apply_carry_forward(records, last_values)
+        
+        # 关键帧已提交、之后的增量记录失败：保存关键帧之后的值，重新读取增量记录时用关键帧补全
+        selected = monitor_to_db.select_carry_forward(last_values, snapshots, {'k', 'e'})
+        self.assertEqual(selected['db1'], {'tablespace_usage': [{'schema': 'new'}]})
+        self.assertEqual(selected['db2'], {'tablespace_usage': [{'schema': 'db2'}]})
+        
+        # 第一条记录就失败时该实例保持原值
+        selected = monitor_to_db.select_carry_forward(last_values, snapshots, {'d', 'e'})
+        self.assertEqual(selected['db1'], {'tablespace_usage': [{'schema': 'old'}]})
+        self.assertEqual(last_values['db1'], {'tablespace_usage': [{'schema': 'old'}]})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -6,6 +6,9 @@ import subprocess
 import json
 from datetime import datetime
 
+from utils.agent import COLLECTORS, MonitorAgent, load_json, save_json
+from utils.loadtest import run_loadtest
+
 class MonitorManager:
     def __init__(self):
         self.scripts_dir = os.path.join(os.path.dirname(__file__), 'scripts')
@@ -16,112 +19,163 @@ class MonitorManager:
         os.makedirs(self.logs_dir, exist_ok=True)
         os.makedirs(self.data_dir, exist_ok=True)
         
-        # 监控脚本配置
-        self.monitor_scripts = {
-            'system': os.path.join(self.scripts_dir, 'system', 'system_monitor.py'),
-            'nginx': os.path.join(self.scripts_dir, 'nginx', 'nginx_monitor.py'),
-            'network': os.path.join(self.scripts_dir, 'network', 'network_monitor.py'),
-            'backend': os.path.join(self.scripts_dir, 'backend', 'backend_monitor.py')
-        }
+        # 所有采集器运行在同一个监控代理进程中，通过控制文件启用或停用单个采集器
+        self.control_file = os.path.join(self.logs_dir, 'agent_control.json')
+        self.state_file = os.path.join(self.logs_dir, 'agent_state.json')
         
         # 进程ID存储
         self.pids_file = os.path.join(self.logs_dir, 'monitor_pids.json')
         self.pids = {}
     
-    def start_monitor(self, monitor_type):
-        """启动指定类型的监控脚本"""
-        if monitor_type not in self.monitor_scripts:
-            print(f"错误: 未知的监控类型 '{monitor_type}'")
-            return False
-        
-        script_path = self.monitor_scripts[monitor_type]
-        if not os.path.exists(script_path):
-            print(f"错误: 监控脚本不存在: {script_path}")
-            return False
-        
-        # 检查脚本是否已经在运行
-        if monitor_type in self.pids and self.is_process_running(self.pids[monitor_type]):
-            print(f"监控 '{monitor_type}' 已经在运行")
-            return False
-        
-        # 启动脚本
-        print(f"启动监控: {monitor_type}")
-        log_file = os.path.join(self.logs_dir, f'{monitor_type}_monitor.log')
+    def get_enabled(self):
+        """获取控制文件中已启用的采集器"""
+        return load_json(self.control_file, {}).get('enabled', [])
+    
+    def set_enabled(self, enabled):
+        """按采集器的声明顺序写入启用列表"""
+        save_json(self.control_file, {'enabled': [name for name in COLLECTORS if name in enabled]})
+    
+    def is_agent_running(self):
+        """监控代理进程是否在运行"""
+        return 'agent' in self.pids and self.is_process_running(self.pids['agent'])
+    
+    def start_agent(self):
+        """启动监控代理进程（已在运行时不重复启动）"""
+        if self.is_agent_running():
+            return True
         
-        # 使用subprocess启动脚本，并将输出重定向到日志文件
+        log_file = os.path.join(self.logs_dir, 'agent.log')
         process = subprocess.Popen(
-            [sys.executable, script_path],
+            [sys.executable, os.path.abspath(__file__), 'agent'],
             stdout=open(log_file, 'a'),
-            stderr=open(log_file, 'a'),
-            cwd=os.path.dirname(script_path)
+            stderr=subprocess.STDOUT,
+            cwd=os.path.dirname(os.path.abspath(__file__))
         )
         
         # 存储进程ID
-        self.pids[monitor_type] = process.pid
+        self.pids['agent'] = process.pid
         self.save_pids()
-        print(f"监控 '{monitor_type}' 已启动，进程ID: {process.pid}")
+        print(f"监控代理已启动，进程ID: {process.pid}")
         return True
     
-    def stop_monitor(self, monitor_type):
-        """停止指定类型的监控脚本"""
-        if monitor_type not in self.pids:
-            print(f"监控 '{monitor_type}' 未运行")
+    def stop_process(self, name):
+        """停止pids中记录的进程（监控代理，或旧版本遗留的单个监控脚本进程）"""
+        pid = self.pids.get(name)
+        if pid is None:
             return False
-        
-        pid = self.pids[monitor_type]
         if not self.is_process_running(pid):
-            print(f"监控 '{monitor_type}' 进程不存在或已停止")
-            del self.pids[monitor_type]
+            del self.pids[name]
             self.save_pids()
             return False
         
-        # 停止进程
-        print(f"停止监控: {monitor_type}, 进程ID: {pid}")
+        print(f"停止进程: {name}, 进程ID: {pid}")
         try:
             os.kill(pid, 2)  # 发送SIGINT信号
-            # 等待进程终止
-            time.sleep(2)
+            # 等待进程终止（代理会等待正在进行的采集完成并写完数据）
+            for _ in range(20):
+                if not self.is_process_running(pid):
+                    break
+                time.sleep(0.5)
             if self.is_process_running(pid):
                 os.kill(pid, 9)  # 强制终止
         except Exception as e:
-            print(f"停止监控时发生错误: {e}")
+            print(f"停止进程时发生错误: {e}")
             return False
         
         # 从存储中删除进程ID
-        del self.pids[monitor_type]
+        del self.pids[name]
         self.save_pids()
+        return True
+    
+    def start_monitor(self, monitor_type):
+        """启用指定类型的采集器"""
+        if monitor_type not in COLLECTORS:
+            print(f"错误: 未知的监控类型 '{monitor_type}'")
+            return False
+        
+        enabled = self.get_enabled()
+        if monitor_type in enabled and self.is_agent_running():
+            print(f"监控 '{monitor_type}' 已经在运行")
+            return False
+        
+        print(f"启动监控: {monitor_type}")
+        if not self.is_agent_running():
+            # 代理未运行时，控制文件中残留的启用列表无效
+            enabled = []
+        self.set_enabled(enabled + [monitor_type])
+        self.start_agent()
+        print(f"监控 '{monitor_type}' 已启动")
+        return True
+    
+    def stop_monitor(self, monitor_type):
+        """停用指定类型的采集器，没有启用的采集器时停止监控代理"""
+        enabled = self.get_enabled()
+        if monitor_type not in enabled or not self.is_agent_running():
+            print(f"监控 '{monitor_type}' 未运行")
+            return False
+        
+        print(f"停止监控: {monitor_type}")
+        enabled.remove(monitor_type)
+        self.set_enabled(enabled)
+        if not enabled:
+            self.stop_process('agent')
         print(f"监控 '{monitor_type}' 已停止")
         return True
     
     def start_all(self):
-        """启动所有监控脚本"""
-        print("启动所有监控脚本...")
-        for monitor_type in self.monitor_scripts:
-            self.start_monitor(monitor_type)
-        print("所有监控脚本启动完成")
+        """启动所有采集器"""
+        print("启动所有监控...")
+        self.set_enabled(list(COLLECTORS))
+        self.start_agent()
+        print("所有监控启动完成")
     
     def stop_all(self):
-        """停止所有监控脚本"""
-        print("停止所有监控脚本...")
-        for monitor_type in list(self.pids.keys()):
-            self.stop_monitor(monitor_type)
-        print("所有监控脚本停止完成")
+        """停止所有采集器和监控代理"""
+        print("停止所有监控...")
+        self.set_enabled([])
+        for name in list(self.pids.keys()):
+            self.stop_process(name)
+        print("所有监控停止完成")
     
     def status(self):
-        """查看监控脚本状态"""
-        print("监控脚本状态:")
+        """查看各采集器状态"""
+        print("监控状态:")
         print("-" * 50)
         
         # 加载最新的进程ID
         self.load_pids()
         
-        for monitor_type in self.monitor_scripts:
-            if monitor_type in self.pids and self.is_process_running(self.pids[monitor_type]):
-                print(f"{monitor_type}: 运行中 (PID: {self.pids[monitor_type]})")
-            else:
+        if not self.is_agent_running():
+            print("监控代理: 未运行")
+            for monitor_type in COLLECTORS:
+                print(f"{monitor_type}: 未运行")
+            print("-" * 50)
+            return
+        
+        print(f"监控代理: 运行中 (PID: {self.pids['agent']})")
+        collectors = load_json(self.state_file, {}).get('collectors', {})
+        for monitor_type in COLLECTORS:
+            if monitor_type not in collectors:
                 print(f"{monitor_type}: 未运行")
+                continue
+            state = collectors[monitor_type]
+            line = f"{monitor_type}: 运行中 (间隔: {state['interval']:g}秒, 采集: {state['runs']}次, 失败: {state['errors']}次"
+            if state.get('last_tick'):
+                line += f", 最近采集: {state['last_tick']} 耗时{state['last_duration']}秒"
+            print(line + ")")
+            if state.get('last_error'):
+                print(f"  最近错误: {state['last_error']}")
         print("-" * 50)
     
+    def run_agent(self):
+        """在当前进程中运行监控代理（由start命令在后台启动）"""
+        MonitorAgent(self.logs_dir).run()
+    
+    def run_loadtest(self, argv):
+        """对后端应用监控的端点进行压测，报告保存到数据目录"""
+        from scripts.backend.backend_monitor import load_endpoints
+        run_loadtest(argv, load_endpoints(), self.data_dir)
+    
     def run_analysis(self):
         """运行监控数据分析"""
         analysis_script = os.path.join(self.scripts_dir, 'visualization', 'data_analyzer.py')
@@ -216,10 +270,18 @@ class MonitorManager:
             # 查看状态
             self.status()
         
+        elif command == 'agent':
+            # 运行监控代理（前台）
+            self.run_agent()
+        
         elif command == 'analyze':
             # 运行分析
             self.run_analysis()
         
+        elif command == 'loadtest':
+            # 压测后端应用端点
+            self.run_loadtest(sys.argv[2:])
+        
         elif command == 'help':
             # 显示帮助
             self.show_help()
@@ -232,10 +294,12 @@ class MonitorManager:
         """显示帮助信息"""
         print("Nginx服务器监控工具")
         print("用法:")
-        print("  python monitor.py start [monitor_type]    启动监控脚本")
-        print("  python monitor.py stop [monitor_type]     停止监控脚本")
-        print("  python monitor.py status                  查看监控脚本状态")
+        print("  python monitor.py start [monitor_type]    启动监控")
+        print("  python monitor.py stop [monitor_type]     停止监控")
+        print("  python monitor.py status                  查看各监控的运行状态")
+        print("  python monitor.py agent                   在前台运行监控代理（start命令会在后台启动）")
         print("  python monitor.py analyze                 运行监控数据分析")
+        print("  python monitor.py loadtest [options]      压测后端应用端点（python monitor.py loadtest --help查看参数）")
         print("  python monitor.py help                    显示帮助信息")
         print("\n监控类型:")
         print("  system        系统资源监控")
@@ -243,11 +307,12 @@ class MonitorManager:
         print("  network       网络性能监控")
         print("  backend       后端应用性能监控")
         print("\n示例:")
-        print("  python monitor.py start                  启动所有监控脚本")
-        print("  python monitor.py start nginx            只启动Nginx监控脚本")
-        print("  python monitor.py stop                   停止所有监控脚本")
-        print("  python monitor.py status                 查看所有监控脚本状态")
+        print("  python monitor.py start                  启动所有监控")
+        print("  python monitor.py start nginx            只启动Nginx监控")
+        print("  python monitor.py stop                   停止所有监控")
+        print("  python monitor.py status                 查看所有监控状态")
         print("  python monitor.py analyze                运行监控数据分析")
+        print("  python monitor.py loadtest --rate 200    以每秒200个请求压测后端应用端点")
 
 if __name__ == "__main__":
     manager = MonitorManager()
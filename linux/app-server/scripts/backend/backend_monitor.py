@@ -1,22 +1,42 @@
 #!/usr/bin/env python3
-import requests
 import time
-import json
 import os
-import subprocess
+import sys
+import json
 from datetime import datetime
-import threading
+
+# 添加app-server目录到Python路径，以便导入公共模块
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from utils.storage import MetricStore
+from utils.process import ProcessCollector
+from utils.http_probe import HttpProber
+
+# 默认监控端点，可根据实际情况修改，或通过BACKEND_ENDPOINTS_FILE指定JSON文件
+# 端点可选配置：headers、data（POST/PUT/PATCH以JSON发送）、timeout(秒)、
+# interval（探测间隔，秒，未配置时每次采集都探测）、keepalive（False时每次新建连接）
+DEFAULT_ENDPOINTS = [
+    {'url': 'http://localhost/api/health', 'method': 'GET', 'name': '健康检查'},
+    {'url': 'http://localhost/api/status', 'method': 'GET', 'name': '状态检查'}
+]
+
+def load_endpoints():
+    """读取监控端点配置"""
+    endpoints_file = os.getenv('BACKEND_ENDPOINTS_FILE')
+    if endpoints_file:
+        try:
+            with open(endpoints_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"读取端点配置失败，使用默认端点: {e}")
+    return DEFAULT_ENDPOINTS
 
 class BackendMonitor:
     def __init__(self, endpoints=None):
-        # 默认监控端点，可根据实际情况修改
-        if endpoints is None:
-            self.endpoints = [
-                {'url': 'http://localhost/api/health', 'method': 'GET', 'name': '健康检查'},
-                {'url': 'http://localhost/api/status', 'method': 'GET', 'name': '状态检查'}
-            ]
-        else:
-            self.endpoints = endpoints
+        # 监控端点，未传入时从BACKEND_ENDPOINTS_FILE读取，都没有时使用默认端点
+        self.endpoints = endpoints if endpoints is not None else load_endpoints()
+        
+        # 并发探测端点，在采集之间保持keep-alive连接
+        self.prober = HttpProber(self.endpoints)
         
         # 确保使用正确的路径
         base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
@@ -30,78 +50,24 @@ class BackendMonitor:
         os.makedirs(self.data_dir, exist_ok=True)
         os.makedirs(self.log_dir, exist_ok=True)
         print(f"目录创建成功: {os.path.exists(self.data_dir)}")
-    
-    def test_endpoint(self, endpoint):
-        """测试单个API端点"""
-        url = endpoint['url']
-        method = endpoint.get('method', 'GET')
-        name = endpoint.get('name', url)
-        data = endpoint.get('data', {})
-        headers = endpoint.get('headers', {})
         
-        try:
-            start_time = time.time()
-            if method.upper() == 'GET':
-                response = requests.get(url, headers=headers, timeout=10)
-            elif method.upper() == 'POST':
-                response = requests.post(url, json=data, headers=headers, timeout=10)
-            elif method.upper() == 'PUT':
-                response = requests.put(url, json=data, headers=headers, timeout=10)
-            elif method.upper() == 'DELETE':
-                response = requests.delete(url, headers=headers, timeout=10)
-            else:
-                return {
-                    'name': name,
-                    'url': url,
-                    'method': method,
-                    'success': False,
-                    'error': f'不支持的HTTP方法: {method}'
-                }
-            
-            end_time = time.time()
-            response_time = (end_time - start_time) * 1000  # 转换为毫秒
-            
-            return {
-                'name': name,
-                'url': url,
-                'method': method,
-                'status_code': response.status_code,
-                'response_time': response_time,
-                'success': 200 <= response.status_code < 300,
-                'content_length': len(response.content)
-            }
-        except Exception as e:
-            return {
-                'name': name,
-                'url': url,
-                'method': method,
-                'success': False,
-                'error': str(e)
-            }
+        # 监控数据按天追加写入JSONL文件
+        self.storage = MetricStore(self.data_dir, 'backend_metrics')
+        
+        # 后端应用进程：按pid文件、进程名（逗号分隔）或命令行正则查找，默认查找Python进程
+        self.process_collector = ProcessCollector(
+            names=[name.strip() for name in os.getenv('BACKEND_PROCESS_NAMES', 'python,python3').split(',') if name.strip()],
+            pid_file=os.getenv('BACKEND_PID_FILE'),
+            cmdline_pattern=os.getenv('BACKEND_CMDLINE_PATTERN')
+        )
     
     def test_all_endpoints(self):
-        """测试所有API端点"""
-        results = []
-        threads = []
-        thread_results = {}
-        
-        # 使用线程池并行测试多个端点
-        def test_with_thread(endpoint, index):
-            thread_results[index] = self.test_endpoint(endpoint)
-        
-        for i, endpoint in enumerate(self.endpoints):
-            thread = threading.Thread(target=test_with_thread, args=(endpoint, i))
-            threads.append(thread)
-            thread.start()
-        
-        # 等待所有线程完成
-        for thread in threads:
-            thread.join()
-        
-        # 按原始顺序收集结果
-        for i in range(len(self.endpoints)):
-            if i in thread_results:
-                results.append(thread_results[i])
+        """并发探测所有到期的API端点，汇总成功率、响应时间和各阶段耗时"""
+        try:
+            results = self.prober.run()
+        except Exception as e:
+            print(f"探测后端接口失败: {e}")
+            results = []
         
         # 计算汇总统计
         total_requests = len(results)
@@ -118,6 +84,12 @@ class BackendMonitor:
             max_response_time = 0
             min_response_time = 0
         
+        # 各阶段的平均耗时，复用连接的请求没有DNS、建连和TLS阶段，不计入这三项的平均值
+        phases = {}
+        for phase in ('dns_ms', 'connect_ms', 'tls_ms', 'ttfb_ms'):
+            values = [r['timings'][phase] for r in results if r.get('timings', {}).get(phase) is not None]
+            phases[phase] = round(sum(values) / len(values), 3) if values else None
+        
         return {
             'endpoints': results,
             'summary': {
@@ -126,24 +98,16 @@ class BackendMonitor:
                 'error_rate': error_rate,
                 'avg_response_time': avg_response_time,
                 'max_response_time': max_response_time,
-                'min_response_time': min_response_time
+                'min_response_time': min_response_time,
+                'reused_connections': len([r for r in results if r.get('reused')]),
+                'avg_phases': phases
             }
         }
     
     def get_backend_process_info(self):
-        """获取后端应用进程信息"""
+        """获取后端应用进程的资源使用情况"""
         try:
-            # 假设后端应用是Python应用，可根据实际情况修改
-            result = subprocess.run(['ps', '-ef', '|', 'grep', 'python'], 
-                                   shell=True, capture_output=True, text=True)
-            processes = []
-            for line in result.stdout.strip().split('\n'):
-                if 'python' in line and not 'grep' in line:
-                    processes.append(line.strip())
-            
-            return {
-                'processes': processes
-            }
+            return self.process_collector.collect()
         except Exception as e:
             print(f"获取后端应用进程信息失败: {e}")
         return {}
@@ -157,45 +121,13 @@ class BackendMonitor:
         }
         return metrics
     
+    def close(self):
+        """关闭探测器的连接和事件循环"""
+        self.prober.close()
+    
     def save_metrics(self, metrics):
-        """保存指标到文件"""
-        date_str = datetime.now().strftime('%Y-%m-%d')
-        file_path = os.path.join(self.data_dir, f'backend_metrics_{date_str}.json')
-        
-        print(f"保存路径: {file_path}")
-        print(f"目录是否存在: {os.path.exists(self.data_dir)}")
-        print(f"文件是否存在: {os.path.exists(file_path)}")
-        
-        try:
-            # 确保目录存在
-            if not os.path.exists(self.data_dir):
-                print(f"创建目录: {self.data_dir}")
-                os.makedirs(self.data_dir, exist_ok=True)
-                print(f"目录创建结果: {os.path.exists(self.data_dir)}")
-            
-            # 读取现有数据
-            existing_data = []
-            if os.path.exists(file_path):
-                try:
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        existing_data = json.load(f)
-                    print(f"读取现有数据成功，共 {len(existing_data)} 条")
-                except Exception as e:
-                    print(f"读取现有数据失败: {e}")
-            
-            # 添加新数据
-            existing_data.append(metrics)
-            print(f"添加新数据后，共 {len(existing_data)} 条")
-            
-            # 保存数据
-            print(f"开始保存数据到: {file_path}")
-            with open(file_path, 'w', encoding='utf-8') as f:
-                json.dump(existing_data, f, ensure_ascii=False, indent=2)
-            print("保存数据成功")
-        except Exception as e:
-            print(f"保存数据失败: {e}")
-            import traceback
-            traceback.print_exc()
+        """保存指标到文件（追加写入当天的JSONL文件，metrics可以是一条或一批指标）"""
+        self.storage.append(metrics)
     
     def run(self, interval=60):
         """运行监控"""
@@ -208,6 +140,8 @@ class BackendMonitor:
                 time.sleep(interval)
         except KeyboardInterrupt:
             print("后端应用性能监控已停止")
+        finally:
+            self.close()
 
 if __name__ == "__main__":
     # 默认配置，可根据实际情况修改
@@ -1,15 +1,18 @@
 #!/usr/bin/env python3
 import psutil
 import time
-import json
 import os
-import socket
-import requests
-import re
+import sys
 from datetime import datetime
 
+# 添加app-server目录到Python路径，以便导入公共模块
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from utils.storage import MetricStore
+from utils.probe import DEFAULT_PROBE_TARGETS, ProbeEngine, parse_targets
+from utils.netstat import summarize_tcp_sockets, KernelNetCounters
+
 class NetworkMonitor:
-    def __init__(self):
+    def __init__(self, targets=None):
         self.data_dir = os.path.join(os.path.dirname(__file__), '..', '..', 'monitor', 'data', 'network')
         self.log_dir = os.path.join(os.path.dirname(__file__), '..', '..', 'monitor', 'logs')
         
@@ -17,6 +20,15 @@ class NetworkMonitor:
         os.makedirs(self.data_dir, exist_ok=True)
         os.makedirs(self.log_dir, exist_ok=True)
         
+        # 监控数据按天追加写入JSONL文件
+        self.storage = MetricStore(self.data_dir, 'network_metrics')
+        
+        # 延迟探测目标（icmp:主机、tcp:主机:端口、http:URL，逗号分隔），所有目标并发探测
+        self.probe_engine = ProbeEngine(parse_targets(targets or os.getenv('NETWORK_PROBE_TARGETS', DEFAULT_PROBE_TARGETS)))
+        
+        # 内核网络协议栈计数器（重传、队列溢出、softnet丢包等），按采集周期计算增量
+        self.kernel_net_counters = KernelNetCounters()
+        
         # 存储上一次的网络I/O计数器
         self.previous_io_counters = psutil.net_io_counters(pernic=True)
         self.previous_time = time.time()
@@ -56,95 +68,44 @@ class NetworkMonitor:
         return network_io
     
     def get_network_connections(self):
-        """获取网络连接情况"""
-        connections = []
+        """获取TCP连接情况：各状态的连接数，以及连接最多的监听端口和对端网段"""
         try:
-            for conn in psutil.net_connections(kind='inet'):
-                if conn.status == 'ESTABLISHED':
-                    connections.append({
-                        'local_address': f"{conn.laddr.ip}:{conn.laddr.port}",
-                        'remote_address': f"{conn.raddr.ip}:{conn.raddr.port}" if conn.raddr else 'N/A',
-                        'status': conn.status,
-                        'pid': conn.pid
-                    })
+            summary = summarize_tcp_sockets()
+            if summary is None:
+                # 没有/proc/net/tcp的系统，只按状态计数
+                summary = {'total': 0, 'states': {}, 'listen_ports': [], 'remote_prefixes': []}
+                for conn in psutil.net_connections(kind='tcp'):
+                    summary['total'] += 1
+                    summary['states'][conn.status] = summary['states'].get(conn.status, 0) + 1
         except Exception as e:
             print(f"获取网络连接失败: {e}")
+            return {}
         
         return {
-            'total_connections': len(connections),
-            'established_connections': len([c for c in connections if c['status'] == 'ESTABLISHED']),
-            'connections': connections[:50]  # 只返回前50个连接，避免数据过多
+            'total_connections': summary['total'],
+            'established_connections': summary['states'].get('ESTABLISHED', 0),
+            'time_wait_connections': summary['states'].get('TIME_WAIT', 0),
+            'close_wait_connections': summary['states'].get('CLOSE_WAIT', 0),
+            'states': summary['states'],
+            'listen_ports': summary['listen_ports'],
+            'remote_prefixes': summary['remote_prefixes']
         }
     
-    def ping(self, host, count=5):
-        """测试网络延迟"""
+    def get_kernel_net_stats(self):
+        """获取内核网络协议栈计数器在本采集周期内的增量"""
         try:
-            import subprocess
-            import platform
-            
-            # 根据操作系统选择ping命令
-            param = '-n' if platform.system() == 'Windows' else '-c'
-            result = subprocess.run(['ping', param, str(count), host], 
-                                   capture_output=True, text=True)
-            
-            # 解析ping结果
-            if result.returncode == 0:
-                output = result.stdout
-                # 提取延迟信息
-                if platform.system() == 'Windows':
-                    # Windows格式: Average = 3ms
-                    avg_match = re.search(r'Average = (\d+)ms', output)
-                    if avg_match:
-                        avg_delay = int(avg_match.group(1))
-                    else:
-                        avg_delay = 0
-                else:
-                    # Linux格式: rtt min/avg/max/mdev = 0.056/0.068/0.082/0.010 ms
-                    rtt_match = re.search(r'rtt min/avg/max/mdev = ([\d.]+)/([\d.]+)/([\d.]+)/([\d.]+) ms', output)
-                    if rtt_match:
-                        avg_delay = float(rtt_match.group(2))
-                    else:
-                        avg_delay = 0
-                
-                return {
-                    'host': host,
-                    'success': True,
-                    'avg_delay': avg_delay,
-                    'output': output
-                }
-            else:
-                return {
-                    'host': host,
-                    'success': False,
-                    'error': result.stderr
-                }
+            return self.kernel_net_counters.collect()
         except Exception as e:
-            return {
-                'host': host,
-                'success': False,
-                'error': str(e)
-            }
+            print(f"获取内核网络计数器失败: {e}")
+        return {}
     
-    def test_website_response(self, url, timeout=5):
-        """测试网站响应时间"""
+    def probe_targets(self):
+        """并发探测所有目标的延迟、抖动和丢包率"""
         try:
-            start_time = time.time()
-            response = requests.get(url, timeout=timeout)
-            end_time = time.time()
-            response_time = (end_time - start_time) * 1000  # 转换为毫秒
-            
-            return {
-                'url': url,
-                'status_code': response.status_code,
-                'response_time': response_time,
-                'success': True
-            }
+            return self.probe_engine.run()
         except Exception as e:
-            return {
-                'url': url,
-                'success': False,
-                'error': str(e)
-            }
+            print(f"网络探测失败: {e}")
+        return []
     
     def collect_metrics(self):
         """收集所有网络指标"""
@@ -152,32 +113,14 @@ class NetworkMonitor:
             'timestamp': datetime.now().isoformat(),
             'network_io': self.get_network_io(),
             'network_connections': self.get_network_connections(),
-            'ping_google': self.ping('www.google.com'),
-            'ping_baidu': self.ping('www.baidu.com'),
-            'website_response': self.test_website_response('http://localhost')
+            'kernel_net': self.get_kernel_net_stats(),
+            'probes': self.probe_targets()
         }
         return metrics
     
     def save_metrics(self, metrics):
-        """保存指标到文件"""
-        date_str = datetime.now().strftime('%Y-%m-%d')
-        file_path = os.path.join(self.data_dir, f'network_metrics_{date_str}.json')
-        
-        # 读取现有数据
-        existing_data = []
-        if os.path.exists(file_path):
-            try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    existing_data = json.load(f)
-            except Exception as e:
-                pass
-        
-        # 添加新数据
-        existing_data.append(metrics)
-        
-        # 保存数据
-        with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump(existing_data, f, ensure_ascii=False, indent=2)
+        """保存指标到文件（追加写入当天的JSONL文件，metrics可以是一条或一批指标）"""
+        self.storage.append(metrics)
     
     def run(self, interval=60):
         """运行监控"""
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+import os
+import re
+
+from utils.sketch import CountMinSketch, SpaceSaving
+
+# Nginx预定义的combined日志格式
+COMBINED_LOG_FORMAT = '$remote_addr - $remote_user [$time_local] "$request" $status $body_bytes_sent "$http_referer" "$http_user_agent"'
+
+# 每次从日志文件读取的字节数
+READ_CHUNK_SIZE = 1024 * 1024
+
+# 记录已读取位置之前的字节数，用于识别copytruncate后又写入了超过原偏移的内容
+FINGERPRINT_SIZE = 64
+
+# 路径归一化规则：把路径中的ID、UUID、哈希等可变段替换为占位符，得到路由模板
+PATH_SEGMENT_RULES = [
+    (re.compile(r'^[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}$'), '{uuid}'),
+    (re.compile(r'^\d+$'), '{id}'),
+    (re.compile(r'^[0-9a-fA-F]{16,}$'), '{hash}'),
+    (re.compile(r'^[A-Za-z0-9_-]{32,}$'), '{token}')
+]
+
+def get_heavy_hitter_options():
+    """获取访问日志热点统计选项"""
+    return {
+        # 每个维度输出的热点条数
+        'top_n': int(os.getenv('NGINX_TOP_N', 10)),
+        # Space-Saving保留的候选键数量，决定固定内存的大小
+        'capacity': int(os.getenv('NGINX_HEAVY_HITTERS_CAPACITY', 1000)),
+        # Count-Min草图的宽度和深度
+        'cms_width': int(os.getenv('NGINX_CMS_WIDTH', 2048)),
+        'cms_depth': int(os.getenv('NGINX_CMS_DEPTH', 4))
+    }
+
+def normalize_path(request):
+    """从$request（如GET /api/users/123?x=1 HTTP/1.1）中提取方法和路由模板（GET /api/users/{id}）"""
+    parts = request.split(' ')
+    if len(parts) < 2:
+        return request[:100] or '-'
+    path = parts[1].split('?', 1)[0]
+    segments = []
+    for segment in path.split('/'):
+        for pattern, placeholder in PATH_SEGMENT_RULES:
+            if pattern.match(segment):
+                segment = placeholder
+                break
+        segments.append(segment)
+    return f"{parts[0]} {'/'.join(segments)}"
+
+class HeavyHitters:
+    """在固定内存中统计一个维度（路径、上游或客户端）的热点
+    
+    分别按请求数、错误数和累计请求时间用Space-Saving找出候选键，候选键的三项数值由同一个Count-Min草图估计，
+    无论有多少不同的键，内存只取决于capacity和草图大小。
+    """
+    
+    def __init__(self, options):
+        self.options = options
+        self.top_requests = SpaceSaving(options['capacity'])
+        self.top_errors = SpaceSaving(options['capacity'])
+        self.top_latency = SpaceSaving(options['capacity'])
+        # 每个键累计(请求数, 错误数, 请求时间)
+        self.totals = CountMinSketch(options['cms_width'], options['cms_depth'], size=3)
+    
+    def add(self, key, error, latency):
+        """记录一次请求，latency为请求时间(ms)，没有时为None"""
+        self.top_requests.add(key)
+        if error:
+            self.top_errors.add(key)
+        if latency:
+            self.top_latency.add(key, latency)
+        self.totals.add(key, 1, 1 if error else 0, latency or 0)
+    
+    def _entries(self, candidates):
+        """输出候选键的估计请求数、错误数和累计请求时间
+        
+        两种算法的估计值都只会偏大，键在Space-Saving中有计数器时取两者中较小的值。
+        """
+        entries = []
+        for key, _ in candidates:
+            estimates = self.totals.estimate(key)
+            requests, errors, latency = [
+                min(estimate, top.counters.get(key, estimate))
+                for estimate, top in zip(estimates, (self.top_requests, self.top_errors, self.top_latency))
+            ]
+            entries.append({'key': key, 'requests': requests, 'errors': errors, 'latency_ms': round(latency, 3)})
+        return entries
+    
+    def top(self):
+        """返回按请求数、错误数和累计请求时间排序的热点"""
+        top_n = self.options['top_n']
+        return {
+            'by_requests': self._entries(self.top_requests.top(top_n)),
+            'by_errors': self._entries(self.top_errors.top(top_n)),
+            'by_latency': self._entries(self.top_latency.top(top_n))
+        }
+
+def compile_log_format(log_format):
+    """根据Nginx的log_format生成日志解析正则
+    
+    每个变量编译为一个命名分组，匹配到下一个字面字符为止（如"$request"匹配到引号，
+    [$time_local]匹配到右方括号）；最后一个变量匹配到行尾。
+    """
+    parts = re.split(r'\$(\w+)', log_format)
+    pattern = '^'
+    names = set()
+    for index, part in enumerate(parts):
+        if index % 2 == 0:
+            pattern += re.escape(part)
+            continue
+        next_literal = parts[index + 1] if index + 1 < len(parts) else ''
+        # 同名变量出现多次时只捕获第一次
+        group = f'?P<{part}>' if part not in names else '?:'
+        names.add(part)
+        if next_literal:
+            pattern += f'({group}[^{re.escape(next_literal[0])}]*)'
+        else:
+            pattern += f'({group}.*)'
+    return re.compile(pattern + '$')
+
+class LogTailer:
+    """增量读取日志文件，只读取上次读取之后新写入的内容
+    
+    记录文件的inode和已读取的字节偏移：inode变化说明日志被logrotate重命名，先读完旧文件剩余内容再从头读取新文件；
+    文件变小，或已读取位置之前的内容与上次读取的不一致，说明日志被copytruncate清空后重新写入，从头读取。
+    start()从文件末尾开始，不处理历史日志。
+    不完整的最后一行留到下次读取。
+    """
+    
+    def __init__(self, path, chunk_size=READ_CHUNK_SIZE):
+        self.path = path
+        self.chunk_size = chunk_size
+        self.file = None
+        self.inode = None
+        self.offset = 0
+        self.fingerprint = b''
+    
+    def _open(self, from_end):
+        """打开日志文件，from_end为True时从文件末尾开始读取"""
+        self.file = open(self.path, 'rb')
+        stat = os.fstat(self.file.fileno())
+        self.inode = stat.st_ino
+        self.offset = stat.st_size if from_end else 0
+        self.fingerprint = self._read_fingerprint()
+    
+    def _read_fingerprint(self):
+        """读取已读取位置之前的最后若干字节"""
+        start = max(0, self.offset - FINGERPRINT_SIZE)
+        self.file.seek(start)
+        return self.file.read(self.offset - start)
+    
+    def _read_to_end(self):
+        """从当前偏移读取到文件末尾，按行返回（只在换行处推进偏移）"""
+        self.file.seek(self.offset)
+        pending = b''
+        while True:
+            chunk = self.file.read(self.chunk_size)
+            if not chunk:
+                break
+            data = pending + chunk
+            end = data.rfind(b'\n')
+            if end < 0:
+                pending = data
+                continue
+            pending = data[end + 1:]
+            self.offset += end + 1
+            self.fingerprint = (self.fingerprint + data[:end + 1])[-FINGERPRINT_SIZE:]
+            for line in data[:end].split(b'\n'):
+                yield line.decode('utf-8', errors='replace')
+    
+    def start(self):
+        """打开日志文件并定位到末尾，之后只读取新写入的日志；返回是否打开成功"""
+        try:
+            self._open(from_end=True)
+            return True
+        except OSError as e:
+            print(f"打开Nginx访问日志失败: {e}")
+            return False
+    
+    def read_lines(self):
+        """逐行返回上次读取之后新写入的日志"""
+        if self.file is None:
+            # 启动时日志文件不存在，之后新建的文件从头读取
+            try:
+                self._open(from_end=False)
+            except OSError:
+                return
+        
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            # 日志已被重命名、新文件尚未创建，继续读取旧文件
+            yield from self._read_to_end()
+            return
+        
+        if stat.st_ino != self.inode:
+            # 重命名轮转：读完旧文件中轮转前写入的内容，再从头读取新文件
+            yield from self._read_to_end()
+            self.close()
+            try:
+                self._open(from_end=False)
+            except OSError:
+                return
+        elif stat.st_size < self.offset or self._read_fingerprint() != self.fingerprint:
+            # copytruncate轮转：文件被清空后重新写入
+            self.offset = 0
+            self.fingerprint = b''
+        yield from self._read_to_end()
+    
+    def close(self):
+        """关闭日志文件"""
+        if self.file is not None:
+            self.file.close()
+            self.file = None
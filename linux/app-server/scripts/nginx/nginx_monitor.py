@@ -2,26 +2,48 @@
 import requests
 import re
 import time
-import json
 import os
+import sys
 from datetime import datetime
 import subprocess
 
+# 添加app-server目录到Python路径，以便导入公共模块
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from utils.storage import MetricStore
+from utils.sketch import DDSketch
+from utils.process import ProcessCollector
+from scripts.nginx.access_log import COMBINED_LOG_FORMAT, compile_log_format, LogTailer, HeavyHitters, get_heavy_hitter_options, normalize_path
+
 class NginxMonitor:
-    def __init__(self, stub_status_url='http://localhost/nginx_status', access_log_path='/var/log/nginx/access.log'):
+    def __init__(self, stub_status_url='http://localhost/nginx_status', access_log_path='/var/log/nginx/access.log', session=None, log_format=None):
         self.stub_status_url = stub_status_url
         self.access_log_path = access_log_path
+        # 访问日志格式，与nginx.conf中access_log使用的log_format一致，默认combined
+        self.log_format = log_format or os.getenv('NGINX_LOG_FORMAT', COMBINED_LOG_FORMAT)
+        self.log_parser = compile_log_format(self.log_format)
+        # 增量读取访问日志，每次只解析上次采集之后新写入的日志
+        self.log_tailer = LogTailer(self.access_log_path)
+        self.log_tailer.start()
+        # 按pid文件查找master及worker进程，pid文件不存在时按进程名查找
+        self.process_collector = ProcessCollector(names=['nginx'], pid_file=os.getenv('NGINX_PID_FILE', '/run/nginx.pid'))
+        # Nginx版本在运行期间不会变化，只在启动时获取一次
+        self.nginx_version = self.get_nginx_version()
+        # HTTP会话，由监控代理传入时与其他采集器共享连接池
+        self.session = session or requests.Session()
         self.data_dir = os.path.join(os.path.dirname(__file__), '..', '..', 'monitor', 'data', 'nginx')
         self.log_dir = os.path.join(os.path.dirname(__file__), '..', '..', 'monitor', 'logs')
         
         # 创建数据目录
         os.makedirs(self.data_dir, exist_ok=True)
         os.makedirs(self.log_dir, exist_ok=True)
+        
+        # 监控数据按天追加写入JSONL文件
+        self.storage = MetricStore(self.data_dir, 'nginx_metrics')
     
     def get_stub_status(self):
         """从Nginx stub_status模块获取状态信息"""
         try:
-            response = requests.get(self.stub_status_url, timeout=5)
+            response = self.session.get(self.stub_status_url, timeout=5)
             if response.status_code == 200:
                 status_text = response.text
                 # 解析stub_status返回的文本
@@ -42,84 +64,101 @@ class NginxMonitor:
             print(f"获取Nginx stub_status失败: {e}")
         return {}
     
-    def parse_access_log(self, lines=1000):
-        """解析Nginx访问日志"""
+    def parse_access_log(self):
+        """解析上次采集之后新写入的Nginx访问日志"""
         try:
-            # 使用tail命令获取最新的日志行
-            result = subprocess.run(['tail', '-n', str(lines), self.access_log_path], 
-                                   capture_output=True, text=True)
-            log_lines = result.stdout.strip().split('\n')
-            
-            # 解析日志
             status_codes = {}
-            request_times = []
             total_requests = 0
             error_requests = 0
+            unparsed_lines = 0
+            # 请求时间(ms)的分位数草图，需要log_format包含$request_time
+            request_times = DDSketch()
+            # 本周期内按路由模板、上游和客户端IP统计的热点，内存固定
+            heavy_hitter_options = get_heavy_hitter_options()
+            top_paths = HeavyHitters(heavy_hitter_options)
+            top_upstreams = HeavyHitters(heavy_hitter_options)
+            top_clients = HeavyHitters(heavy_hitter_options)
             
-            for line in log_lines:
-                if line:
-                    total_requests += 1
-                    # 解析状态码和请求时间（假设日志格式包含这两个字段）
-                    # 示例日志格式: 127.0.0.1 - - [05/Feb/2026:12:44:32 +0800] "GET / HTTP/1.1" 200 612 "-" "Mozilla/5.0"
-                    match = re.search(r'"\s+(\d+)\s+', line)
-                    if match:
-                        status_code = match.group(1)
-                        status_codes[status_code] = status_codes.get(status_code, 0) + 1
-                        if int(status_code) >= 400:
-                            error_requests += 1
-                    
-                    # 解析请求时间（如果日志格式包含）
-                    match_time = re.search(r'\s+(\d+\.\d+)\s+', line)
-                    if match_time:
-                        try:
-                            request_time = float(match_time.group(1))
-                            request_times.append(request_time)
-                        except Exception:
-                            pass
-            
-            # 计算请求时间统计
-            if request_times:
-                avg_request_time = sum(request_times) / len(request_times)
-                max_request_time = max(request_times)
-                min_request_time = min(request_times)
-            else:
-                avg_request_time = 0
-                max_request_time = 0
-                min_request_time = 0
+            for line in self.log_tailer.read_lines():
+                if not line:
+                    continue
+                match = self.log_parser.match(line)
+                if not match:
+                    unparsed_lines += 1
+                    continue
+                total_requests += 1
+                fields = match.groupdict()
+                
+                status_code = fields.get('status')
+                error = False
+                if status_code and status_code.isdigit():
+                    status_codes[status_code] = status_codes.get(status_code, 0) + 1
+                    if int(status_code) >= 400:
+                        error_requests += 1
+                        error = True
+                
+                request_time = None
+                try:
+                    request_time = float(fields['request_time']) * 1000
+                    request_times.add(request_time)
+                except (KeyError, TypeError, ValueError):
+                    pass
+                
+                if fields.get('request'):
+                    top_paths.add(normalize_path(fields['request']), error, request_time)
+                if fields.get('upstream_addr') and fields['upstream_addr'] != '-':
+                    # 重试多个上游时（如"10.0.0.1:80, 10.0.0.2:80"）计入最后一个
+                    top_upstreams.add(fields['upstream_addr'].split(',')[-1].strip(), error, request_time)
+                if fields.get('remote_addr'):
+                    top_clients.add(fields['remote_addr'], error, request_time)
             
             return {
                 'total_requests': total_requests,
                 'error_requests': error_requests,
                 'error_rate': error_requests / total_requests if total_requests > 0 else 0,
+                'unparsed_lines': unparsed_lines,
                 'status_codes': status_codes,
-                'avg_request_time': avg_request_time,
-                'max_request_time': max_request_time,
-                'min_request_time': min_request_time
+                'avg_request_time': request_times.avg or 0,
+                'max_request_time': request_times.max or 0,
+                'min_request_time': request_times.min or 0,
+                'request_time_p50': request_times.quantile(0.5),
+                'request_time_p95': request_times.quantile(0.95),
+                'request_time_p99': request_times.quantile(0.99),
+                # 草图可跨采集周期合并，用于计算任意时间段的分位数
+                'request_time_sketch': request_times.to_dict(),
+                'top_paths': top_paths.top(),
+                'top_upstreams': top_upstreams.top(),
+                'top_clients': top_clients.top()
             }
         except Exception as e:
             print(f"解析Nginx访问日志失败: {e}")
         return {}
     
+    def get_nginx_version(self):
+        """获取Nginx版本（nginx -v输出到stderr）"""
+        try:
+            result = subprocess.run(['nginx', '-v'], stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, timeout=5)
+            return result.stdout.strip()
+        except Exception as e:
+            print(f"获取Nginx版本失败: {e}")
+        return None
+    
     def get_nginx_process_info(self):
-        """获取Nginx进程信息"""
+        """获取Nginx master和worker进程的资源使用情况"""
         try:
-            # 使用ps命令获取Nginx进程信息
-            result = subprocess.run(['ps', '-ef', '|', 'grep', 'nginx'], 
-                                   shell=True, capture_output=True, text=True)
-            processes = []
-            for line in result.stdout.strip().split('\n'):
-                if 'nginx' in line and not 'grep' in line:
-                    processes.append(line.strip())
-            
-            # 获取Nginx版本
-            version_result = subprocess.run(['nginx', '-v'], 
-                                         capture_output=True, text=True, stderr=subprocess.STDOUT)
-            version = version_result.stdout.strip()
-            
-            return {
-                'processes': processes,
-                'version': version
-            }
+            process_info = self.process_collector.collect()
+            for process in process_info['processes']:
+                if 'master process' in process['cmdline']:
+                    process['role'] = 'master'
+                elif 'worker process' in process['cmdline']:
+                    process['role'] = 'worker'
+                elif 'cache' in process['cmdline']:
+                    process['role'] = 'cache'
+                else:
+                    process['role'] = None
+            process_info['workers'] = sum(1 for process in process_info['processes'] if process['role'] == 'worker')
+            process_info['version'] = self.nginx_version
+            return process_info
         except Exception as e:
             print(f"获取Nginx进程信息失败: {e}")
         return {}
@@ -135,25 +174,8 @@ class NginxMonitor:
         return metrics
     
     def save_metrics(self, metrics):
-        """保存指标到文件"""
-        date_str = datetime.now().strftime('%Y-%m-%d')
-        file_path = os.path.join(self.data_dir, f'nginx_metrics_{date_str}.json')
-        
-        # 读取现有数据
-        existing_data = []
-        if os.path.exists(file_path):
-            try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    existing_data = json.load(f)
-            except Exception as e:
-                pass
-        
-        # 添加新数据
-        existing_data.append(metrics)
-        
-        # 保存数据
-        with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump(existing_data, f, ensure_ascii=False, indent=2)
+        """保存指标到文件（追加写入当天的JSONL文件，metrics可以是一条或一批指标）"""
+        self.storage.append(metrics)
     
     def run(self, interval=60):
         """运行监控"""
@@ -1,10 +1,18 @@
 #!/usr/bin/env python3
 import psutil
 import time
-import json
 import os
+import sys
 from datetime import datetime
 
+# 添加app-server目录到Python路径，以便导入公共模块
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from utils.storage import MetricStore
+from utils.diskstats import DiskIOStats
+
+# /proc/stat中CPU时间的字段顺序（guest、guest_nice已计入user、nice，不参与合计）
+CPU_TIME_FIELDS = ('user', 'nice', 'system', 'idle', 'iowait', 'irq', 'softirq', 'steal')
+
 class SystemMonitor:
     def __init__(self):
         self.data_dir = os.path.join(os.path.dirname(__file__), '..', '..', 'monitor', 'data', 'system')
@@ -13,12 +21,73 @@ class SystemMonitor:
         # 创建数据目录
         os.makedirs(self.data_dir, exist_ok=True)
         os.makedirs(self.log_dir, exist_ok=True)
+        
+        # 监控数据按天追加写入JSONL文件
+        self.storage = MetricStore(self.data_dir, 'system_metrics')
+        
+        # 上一次采集时的CPU时间，CPU使用率按相邻两次采集之间的差值计算；
+        # 创建时先取一次基线，第一次采集即可得到有效值
+        self.prev_cpu_times = self.read_cpu_times()
+        self.prev_cpu_time = time.time()
+        if self.prev_cpu_times is None:
+            # 没有/proc/stat的系统，psutil同样以上次调用为起点计算
+            psutil.cpu_percent(interval=None, percpu=True)
+        
+        # 磁盘I/O速率同样按相邻两次读取/proc/diskstats的差值计算，创建时取基线
+        self.disk_io_stats = DiskIOStats()
+    
+    def read_cpu_times(self):
+        """读取/proc/stat中的累计CPU时间，返回{'cpu': [...], 'cpu0': [...], ...}，不支持时返回None"""
+        try:
+            with open('/proc/stat', 'r') as f:
+                lines = f.readlines()
+        except OSError:
+            return None
+        
+        cpu_times = {}
+        for line in lines:
+            if not line.startswith('cpu'):
+                continue
+            fields = line.split()
+            values = [int(value) for value in fields[1:len(CPU_TIME_FIELDS) + 1]]
+            # 旧内核没有steal等字段，补0
+            cpu_times[fields[0]] = values + [0] * (len(CPU_TIME_FIELDS) - len(values))
+        return cpu_times
+    
+    def calc_cpu_percent(self, prev, curr):
+        """根据两次采集的CPU时间计算各状态的占比(%)，返回(使用率, 各状态占比)"""
+        # CPU热插拔等情况下计数可能回退，按0处理
+        deltas = [max(0, c - p) for p, c in zip(prev, curr)]
+        total = sum(deltas)
+        if total == 0:
+            return 0.0, {field: 0.0 for field in CPU_TIME_FIELDS}
+        breakdown = {field: round(delta * 100 / total, 2) for field, delta in zip(CPU_TIME_FIELDS, deltas)}
+        idle = deltas[CPU_TIME_FIELDS.index('idle')] + deltas[CPU_TIME_FIELDS.index('iowait')]
+        return round((total - idle) * 100 / total, 2), breakdown
     
     def get_cpu_usage(self):
-        """获取CPU使用率"""
+        """获取CPU使用率（上一次采集到本次采集之间的平均值，不阻塞）"""
+        now = time.time()
+        curr = self.read_cpu_times()
+        if curr is None or self.prev_cpu_times is None:
+            per_core = psutil.cpu_percent(interval=None, percpu=True)
+            return {
+                'total': round(sum(per_core) / len(per_core), 2) if per_core else 0.0,
+                'per_core': per_core
+            }
+        
+        prev = self.prev_cpu_times
+        interval = now - self.prev_cpu_time
+        self.prev_cpu_times = curr
+        self.prev_cpu_time = now
+        
+        total, breakdown = self.calc_cpu_percent(prev['cpu'], curr['cpu'])
+        cores = sorted((name for name in curr if name != 'cpu' and name in prev), key=lambda name: int(name[3:]))
         return {
-            'total': psutil.cpu_percent(interval=1, percpu=False),
-            'per_core': psutil.cpu_percent(interval=1, percpu=True)
+            'total': total,
+            'per_core': [self.calc_cpu_percent(prev[name], curr[name])[0] for name in cores],
+            **breakdown,
+            'interval': round(interval, 3)
         }
     
     def get_memory_usage(self):
@@ -52,8 +121,19 @@ class SystemMonitor:
         return disk_info
     
     def get_disk_io(self):
-        """获取磁盘I/O情况"""
-        disk_io = psutil.disk_io_counters(perdisk=True)
+        """获取各磁盘上一次采集以来的IOPS、吞吐量、平均等待时间、队列深度和利用率
+        
+        不支持/proc/diskstats的系统退回psutil的累计计数器。
+        """
+        if self.disk_io_stats.available:
+            try:
+                disk_io = self.disk_io_stats.collect()
+                if disk_io is not None:
+                    return disk_io
+            except Exception as e:
+                print(f"获取磁盘I/O速率失败: {e}")
+        
+        disk_io = psutil.disk_io_counters(perdisk=True) or {}
         result = {}
         for disk, io in disk_io.items():
             result[disk] = {
@@ -97,25 +177,8 @@ class SystemMonitor:
         return metrics
     
     def save_metrics(self, metrics):
-        """保存指标到文件"""
-        date_str = datetime.now().strftime('%Y-%m-%d')
-        file_path = os.path.join(self.data_dir, f'system_metrics_{date_str}.json')
-        
-        # 读取现有数据
-        existing_data = []
-        if os.path.exists(file_path):
-            try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    existing_data = json.load(f)
-            except Exception as e:
-                pass
-        
-        # 添加新数据
-        existing_data.append(metrics)
-        
-        # 保存数据
-        with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump(existing_data, f, ensure_ascii=False, indent=2)
+        """保存指标到文件（追加写入当天的JSONL文件，metrics可以是一条或一批指标）"""
+        self.storage.append(metrics)
     
     def run(self, interval=60):
         """运行监控"""
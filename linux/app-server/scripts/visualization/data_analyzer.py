@@ -1,11 +1,16 @@
 #!/usr/bin/env python3
-import json
 import os
+import sys
 import pandas as pd
 import matplotlib.pyplot as plt
 from datetime import datetime
 import re
 
+# 添加app-server目录到Python路径，以便导入公共模块
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from utils.storage import list_metric_files, read_metric_file
+from utils.sketch import DDSketch
+
 # 设置matplotlib支持中文
 plt.rcParams['font.sans-serif'] = ['SimHei']  # 使用黑体字体
 plt.rcParams['axes.unicode_minus'] = False  # 解决负号显示问题
@@ -23,16 +28,12 @@ class DataAnalyzer:
         data_path = os.path.join(self.data_dir, data_type)
         data = []
         
-        if os.path.exists(data_path):
-            for file_name in os.listdir(data_path):
-                if file_name.endswith('.json'):
-                    file_path = os.path.join(data_path, file_name)
-                    try:
-                        with open(file_path, 'r', encoding='utf-8') as f:
-                            file_data = json.load(f)
-                            data.extend(file_data)
-                    except Exception as e:
-                        print(f"加载文件失败: {file_path} - {e}")
+        # 按文件名（即日期）顺序读取JSONL、zstd压缩的JSONL和旧版本的JSON数组文件
+        for file_path in list_metric_files(data_path):
+            try:
+                data.extend(read_metric_file(file_path))
+            except Exception as e:
+                print(f"加载文件失败: {file_path} - {e}")
         
         return data
     
@@ -68,11 +69,23 @@ class DataAnalyzer:
         memory_df = pd.DataFrame(memory_data)
         memory_df.set_index('timestamp', inplace=True)
         
+        # 提取各磁盘的利用率和平均等待时间
+        disk_data = []
+        for timestamp, devices in self.get_disk_rates(data):
+            for device, rates in devices.items():
+                disk_data.append({
+                    'timestamp': pd.to_datetime(timestamp),
+                    'device': device,
+                    'util_percent': rates.get('util_percent'),
+                    'await_ms': rates.get('await_ms')
+                })
+        disk_df = pd.DataFrame(disk_data, columns=['timestamp', 'device', 'util_percent', 'await_ms'])
+        
         # 绘图
-        plt.figure(figsize=(12, 8))
+        plt.figure(figsize=(12, 16))
         
         # CPU使用率图
-        plt.subplot(2, 1, 1)
+        plt.subplot(4, 1, 1)
         plt.plot(cpu_df.index, cpu_df['cpu_total'], label='CPU使用率')
         plt.title('CPU使用率趋势')
         plt.ylabel('使用率 (%)')
@@ -80,19 +93,75 @@ class DataAnalyzer:
         plt.legend()
         
         # 内存使用率图
-        plt.subplot(2, 1, 2)
+        plt.subplot(4, 1, 2)
         plt.plot(memory_df.index, memory_df['memory_percent'], label='内存使用率')
         plt.title('内存使用率趋势')
         plt.ylabel('使用率 (%)')
         plt.grid(True)
         plt.legend()
         
+        # 磁盘利用率图（旧版本的数据没有利用率）
+        plt.subplot(4, 1, 3)
+        for device, group in disk_df.groupby('device'):
+            plt.plot(group['timestamp'], group['util_percent'], label=device)
+        plt.title('磁盘利用率趋势')
+        plt.ylabel('利用率 (%)')
+        plt.grid(True)
+        if not disk_df.empty:
+            plt.legend()
+        
+        # 磁盘平均等待时间图
+        plt.subplot(4, 1, 4)
+        for device, group in disk_df.groupby('device'):
+            plt.plot(group['timestamp'], group['await_ms'], label=device)
+        plt.title('磁盘平均等待时间趋势')
+        plt.ylabel('时间 (ms)')
+        plt.grid(True)
+        if not disk_df.empty:
+            plt.legend()
+        
         plt.tight_layout()
         plt.savefig(os.path.join(self.output_dir, 'system_resources.png'))
         plt.close()
         
         print("系统资源分析完成，图表已保存到 system_resources.png")
     
+    def get_disk_rates(self, system_data):
+        """按时间顺序返回系统监控数据中各磁盘的I/O速率：[(时间, {设备: 速率})]
+        
+        新版本的数据已包含速率，设备名使用解析后的名称（如LVM卷名）；旧版本只有累计计数器，
+        按相邻两条数据的差值计算IOPS、吞吐量和平均等待时间。
+        """
+        disk_rates = []
+        previous = None
+        for data in system_data:
+            disk_io = data.get('disk_io') or {}
+            if 'devices' in disk_io:
+                disk_rates.append((data['timestamp'], {rates.get('name', name): rates for name, rates in disk_io['devices'].items()}))
+                previous = None
+                continue
+            
+            if previous is not None:
+                interval = (datetime.fromisoformat(data['timestamp']) - datetime.fromisoformat(previous['timestamp'])).total_seconds()
+                devices = {}
+                for name, curr in disk_io.items():
+                    prev = previous['disk_io'].get(name)
+                    if prev is None or interval <= 0:
+                        continue
+                    # 计数器重置（如重启）时差值按0处理
+                    delta = {key: max(0, curr[key] - prev[key]) for key in curr if key in prev}
+                    ios = delta['read_count'] + delta['write_count']
+                    devices[name] = {
+                        'read_iops': delta['read_count'] / interval,
+                        'write_iops': delta['write_count'] / interval,
+                        'read_bytes_per_sec': delta['read_bytes'] / interval,
+                        'write_bytes_per_sec': delta['write_bytes'] / interval,
+                        'await_ms': (delta['read_time'] + delta['write_time']) / ios if ios else 0.0
+                    }
+                disk_rates.append((data['timestamp'], devices))
+            previous = data
+        return disk_rates
+    
     def analyze_nginx_data(self):
         """分析Nginx性能数据"""
         data = self.load_data('nginx')
@@ -161,6 +230,22 @@ class DataAnalyzer:
         
         print("Nginx性能分析完成，图表已保存到 nginx_performance.png")
     
+    def get_probes(self, data):
+        """获取一条网络监控数据中的探测结果，兼容旧版本的ping_google/ping_baidu"""
+        if 'probes' in data and isinstance(data['probes'], list):
+            return data['probes']
+        probes = []
+        for key, target in (('ping_google', 'www.google.com'), ('ping_baidu', 'www.baidu.com')):
+            ping = data.get(key)
+            if isinstance(ping, dict):
+                probes.append({
+                    'type': 'icmp',
+                    'target': target,
+                    'avg_ms': ping.get('avg_delay') if ping.get('success') else None,
+                    'loss': 0.0 if ping.get('success') else 100.0
+                })
+        return probes
+    
     def analyze_network_data(self):
         """分析网络性能数据"""
         data = self.load_data('network')
@@ -181,19 +266,20 @@ class DataAnalyzer:
             # 假设eth0是主要网络接口，可根据实际情况修改
             eth0_io = network_io.get('eth0', {})
             
-            # 获取网络延迟
-            ping_google = row.get('ping_google', {})
-            ping_baidu = row.get('ping_baidu', {})
-            
-            network_data.append({
+            item = {
                 'timestamp': idx,
                 'bytes_sent_per_sec': eth0_io.get('bytes_sent_per_sec', 0),
-                'bytes_recv_per_sec': eth0_io.get('bytes_recv_per_sec', 0),
-                'ping_google_delay': ping_google.get('avg_delay', 0),
-                'ping_baidu_delay': ping_baidu.get('avg_delay', 0)
-            })
+                'bytes_recv_per_sec': eth0_io.get('bytes_recv_per_sec', 0)
+            }
+            # 获取各探测目标的延迟和丢包率
+            for probe in self.get_probes(row):
+                item[f"delay:{probe['target']}"] = probe.get('avg_ms')
+                item[f"loss:{probe['target']}"] = probe.get('loss')
+            network_data.append(item)
         network_df = pd.DataFrame(network_data)
         network_df.set_index('timestamp', inplace=True)
+        delay_columns = [column for column in network_df.columns if column.startswith('delay:')]
+        loss_columns = [column for column in network_df.columns if column.startswith('loss:')]
         
         # 绘图
         plt.figure(figsize=(12, 10))
@@ -214,21 +300,25 @@ class DataAnalyzer:
         plt.grid(True)
         plt.legend()
         
-        # Google延迟图
+        # 探测延迟图
         plt.subplot(2, 2, 3)
-        plt.plot(network_df.index, network_df['ping_google_delay'], label='Google延迟')
-        plt.title('Google网络延迟趋势')
+        for column in delay_columns:
+            plt.plot(network_df.index, network_df[column], label=column[len('delay:'):])
+        plt.title('网络延迟趋势')
         plt.ylabel('延迟 (ms)')
         plt.grid(True)
-        plt.legend()
+        if delay_columns:
+            plt.legend()
         
-        # 百度延迟图
+        # 探测丢包率图
         plt.subplot(2, 2, 4)
-        plt.plot(network_df.index, network_df['ping_baidu_delay'], label='百度延迟')
-        plt.title('百度网络延迟趋势')
-        plt.ylabel('延迟 (ms)')
+        for column in loss_columns:
+            plt.plot(network_df.index, network_df[column], label=column[len('loss:'):])
+        plt.title('网络丢包率趋势')
+        plt.ylabel('丢包率 (%)')
         plt.grid(True)
-        plt.legend()
+        if loss_columns:
+            plt.legend()
         
         plt.tight_layout()
         plt.savefig(os.path.join(self.output_dir, 'network_performance.png'))
@@ -316,6 +406,26 @@ class DataAnalyzer:
                     f.write('- **警告**: CPU使用率过高，可能是性能瓶颈\n')
                 if avg_memory > 80:
                     f.write('- **警告**: 内存使用率过高，可能是性能瓶颈\n')
+                
+                # 各磁盘的I/O：平均等待时间按请求数加权
+                disk_samples = {}
+                for _, devices in self.get_disk_rates(system_data):
+                    for device, rates in devices.items():
+                        disk_samples.setdefault(device, []).append(rates)
+                for device, samples in disk_samples.items():
+                    iops = [rates['read_iops'] + rates['write_iops'] for rates in samples]
+                    throughput = [rates['read_bytes_per_sec'] + rates['write_bytes_per_sec'] for rates in samples]
+                    avg_await = sum(rates['await_ms'] * count for rates, count in zip(samples, iops)) / sum(iops) if sum(iops) else 0.0
+                    line = (f'- 磁盘 {device}: 平均IOPS {sum(iops) / len(iops):.1f}，平均吞吐量 {sum(throughput) / len(throughput) / 1024 / 1024:.2f}MB/s，'
+                            f'平均等待时间 {avg_await:.2f}ms')
+                    utils = [rates['util_percent'] for rates in samples if rates.get('util_percent') is not None]
+                    if utils:
+                        line += f'，平均/最大利用率 {sum(utils) / len(utils):.1f}% / {max(utils):.1f}%'
+                    f.write(line + '\n')
+                    if utils and sum(utils) / len(utils) > 80:
+                        f.write(f'- **警告**: 磁盘 {device} 利用率过高，可能是I/O瓶颈\n')
+                    if avg_await > 50:
+                        f.write(f'- **警告**: 磁盘 {device} 平均等待时间过长，可能是I/O瓶颈\n')
             else:
                 f.write('- 没有系统资源监控数据\n')
             
@@ -329,10 +439,14 @@ class DataAnalyzer:
                 active_connections = []
                 error_rates = []
                 avg_request_times = []
+                # 合并各采集周期的请求时间草图，得到整个时间段的分位数
+                request_times = DDSketch()
                 for data in nginx_data:
                     active_connections.append(data.get('stub_status', {}).get('active_connections', 0))
                     error_rates.append(data.get('access_log_stats', {}).get('error_rate', 0))
                     avg_request_times.append(data.get('access_log_stats', {}).get('avg_request_time', 0))
+                    if data.get('access_log_stats', {}).get('request_time_sketch'):
+                        request_times.merge(DDSketch.from_dict(data['access_log_stats']['request_time_sketch']))
                 
                 avg_active_connections = sum(active_connections) / len(active_connections)
                 avg_error_rate = sum(error_rates) / len(error_rates)
@@ -341,6 +455,9 @@ class DataAnalyzer:
                 f.write(f'- 平均活跃连接数: {avg_active_connections:.2f}\n')
                 f.write(f'- 平均错误率: {avg_error_rate:.2f}%\n')
                 f.write(f'- 平均请求时间: {avg_req_time:.2f}ms\n')
+                if request_times.count:
+                    f.write(f'- 请求时间P50/P95/P99: {request_times.quantile(0.5):.2f}ms / '
+                            f'{request_times.quantile(0.95):.2f}ms / {request_times.quantile(0.99):.2f}ms\n')
                 
                 # 检查是否有异常
                 if avg_error_rate > 0.05:
@@ -358,14 +475,19 @@ class DataAnalyzer:
             if network_data:
                 # 计算平均值
                 ping_delays = []
+                losses = []
                 for data in network_data:
-                    ping_google = data.get('ping_google', {})
-                    if ping_google.get('success', False):
-                        ping_delays.append(ping_google.get('avg_delay', 0))
+                    for probe in self.get_probes(data):
+                        if probe.get('avg_ms') is not None:
+                            ping_delays.append(probe['avg_ms'])
+                        if probe.get('loss') is not None:
+                            losses.append(probe['loss'])
                 
                 if ping_delays:
                     avg_ping_delay = sum(ping_delays) / len(ping_delays)
                     f.write(f'- 平均网络延迟: {avg_ping_delay:.2f}ms\n')
+                    if losses:
+                        f.write(f'- 平均丢包率: {sum(losses) / len(losses):.2f}%\n')
                     
                     # 检查是否有异常
                     if avg_ping_delay > 100:
@@ -417,6 +539,8 @@ class DataAnalyzer:
                     f.write('- **系统资源**: CPU使用率过高，建议检查是否有进程占用过多CPU\n')
                 if max_memory > 90:
                     f.write('- **系统资源**: 内存使用率过高，建议检查是否有内存泄漏\n')
+                for device in sorted({device for _, devices in self.get_disk_rates(system_data) for device, rates in devices.items() if (rates.get('util_percent') or 0) > 90}):
+                    f.write(f'- **磁盘I/O**: 磁盘 {device} 利用率接近100%，建议检查I/O密集的进程（如iotop），或把日志写入等操作迁移到其他磁盘\n')
             
             # Nginx瓶颈
             if nginx_data:
@@ -426,7 +550,7 @@ class DataAnalyzer:
             
             # 网络瓶颈
             if network_data:
-                max_delay = max([d.get('ping_google', {}).get('avg_delay', 0) for d in network_data])
+                max_delay = max([probe.get('avg_ms') or 0 for d in network_data for probe in self.get_probes(d)], default=0)
                 if max_delay > 200:
                     f.write('- **网络**: 网络延迟过高，建议检查网络连接和带宽\n')
             
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+import os
+import json
+import time
+import signal
+import importlib
+import threading
+import concurrent.futures
+from datetime import datetime
+
+import requests
+
+from utils.writer import MetricWriter
+
+# 采集器插件：模块、类名、是否使用共享HTTP会话
+COLLECTORS = {
+    'system': {'module': 'scripts.system.system_monitor', 'class': 'SystemMonitor', 'http': False},
+    'nginx': {'module': 'scripts.nginx.nginx_monitor', 'class': 'NginxMonitor', 'http': True},
+    'network': {'module': 'scripts.network.network_monitor', 'class': 'NetworkMonitor', 'http': False},
+    'backend': {'module': 'scripts.backend.backend_monitor', 'class': 'BackendMonitor', 'http': False}
+}
+
+# 默认采集间隔(秒)，可通过环境变量MONITOR_INTERVAL_<类型>（如MONITOR_INTERVAL_NGINX）单独设置
+DEFAULT_INTERVAL = 60
+
+# 调度器最长休眠时间(秒)，保证及时响应启停命令
+CONTROL_POLL_INTERVAL = 1
+
+def get_interval(name):
+    """获取采集器的采集间隔"""
+    return float(os.getenv(f'MONITOR_INTERVAL_{name.upper()}', os.getenv('MONITOR_INTERVAL', DEFAULT_INTERVAL)))
+
+def next_aligned_tick(now, interval):
+    """返回now之后第一个按采集间隔对齐的时刻，间隔相同的采集器在同一时刻采样"""
+    return (int(now // interval) + 1) * interval
+
+def load_json(file_path, default):
+    """读取JSON文件，不存在或损坏时返回默认值"""
+    try:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+def save_json(file_path, data):
+    """写入JSON文件（先写临时文件再替换，读取方不会读到写了一半的文件）"""
+    tmp_path = f"{file_path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, file_path)
+
+class MonitorAgent:
+    """单进程监控代理，以插件方式承载所有采集器
+    
+    所有采集器共享一个调度器、一个HTTP会话和一个写入器。调度器按各采集器的间隔在对齐的时刻触发采集，
+    采集在线程池中执行，上一次采集未完成时跳过本次。启用哪些采集器由控制文件决定，
+    monitor.py修改控制文件后代理在一秒内生效；各采集器的运行状态写入状态文件供status命令读取。
+    """
+    
+    def __init__(self, logs_dir):
+        self.control_file = os.path.join(logs_dir, 'agent_control.json')
+        self.state_file = os.path.join(logs_dir, 'agent_state.json')
+        self.control_mtime = None
+        self.stop_event = threading.Event()
+        self.lock = threading.Lock()
+        
+        self.session = requests.Session()
+        self.writer = MetricWriter()
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=len(COLLECTORS), thread_name_prefix='collector')
+        
+        # 已启用的采集器：{名称: {'instance', 'interval', 'next_tick', 'future', 'status'}}
+        self.collectors = {}
+    
+    def create_collector(self, name):
+        """加载采集器插件并创建实例"""
+        plugin = COLLECTORS[name]
+        module = importlib.import_module(plugin['module'])
+        collector_class = getattr(module, plugin['class'])
+        return collector_class(session=self.session) if plugin['http'] else collector_class()
+    
+    def close_collector(self, name, collector):
+        """释放采集器持有的连接等资源（采集器提供close方法时），正在采集时等采集完成后再释放"""
+        close = getattr(collector['instance'], 'close', None)
+        if close is None:
+            return
+        
+        def run_close(_=None):
+            try:
+                close()
+            except Exception as e:
+                print(f"[{datetime.now()}] 关闭采集器 {name} 失败: {e}")
+        
+        if collector['future'] is not None and not collector['future'].done():
+            collector['future'].add_done_callback(run_close)
+        else:
+            run_close()
+    
+    def reload_control(self):
+        """控制文件变化时，按其中的启用列表加载或卸载采集器"""
+        try:
+            mtime = os.path.getmtime(self.control_file)
+        except OSError:
+            mtime = None
+        if mtime == self.control_mtime and self.control_mtime is not None:
+            return
+        self.control_mtime = mtime
+        
+        enabled = [name for name in load_json(self.control_file, {}).get('enabled', []) if name in COLLECTORS]
+        for name in list(self.collectors):
+            if name not in enabled:
+                print(f"[{datetime.now()}] 停止采集器: {name}")
+                with self.lock:
+                    collector = self.collectors.pop(name)
+                self.close_collector(name, collector)
+        
+        now = time.time()
+        for name in enabled:
+            if name in self.collectors:
+                continue
+            try:
+                instance = self.create_collector(name)
+            except Exception as e:
+                print(f"[{datetime.now()}] 加载采集器 {name} 失败: {e}")
+                continue
+            interval = get_interval(name)
+            with self.lock:
+                self.collectors[name] = {
+                    'instance': instance,
+                    'interval': interval,
+                    'next_tick': next_aligned_tick(now, interval),
+                    'future': None,
+                    'status': {'interval': interval, 'runs': 0, 'errors': 0, 'skipped': 0}
+                }
+            print(f"[{datetime.now()}] 启动采集器: {name}，间隔{interval:g}秒")
+        self.save_state()
+    
+    def run_collector(self, name, collector, tick):
+        """在线程池中执行一次采集，并把结果交给共享写入器"""
+        started = time.time()
+        status = collector['status']
+        try:
+            metrics = collector['instance'].collect_metrics()
+            # 记录对齐的采样时刻，便于关联不同采集器同一时刻的数据
+            metrics['tick'] = datetime.fromtimestamp(tick).isoformat()
+            self.writer.write(collector['instance'], metrics)
+            with self.lock:
+                status['runs'] += 1
+                status['last_error'] = None
+        except Exception as e:
+            print(f"[{datetime.now()}] 采集器 {name} 采集失败: {e}")
+            with self.lock:
+                status['errors'] += 1
+                status['last_error'] = str(e)
+        with self.lock:
+            status['last_tick'] = datetime.fromtimestamp(tick).isoformat()
+            status['last_duration'] = round(time.time() - started, 3)
+        self.save_state()
+    
+    def save_state(self):
+        """写入代理和各采集器的运行状态（调度线程和采集线程都会调用，加锁避免同时写文件）"""
+        with self.lock:
+            state = {
+                'pid': os.getpid(),
+                'updated_at': datetime.now().isoformat(),
+                'collectors': {
+                    name: {**collector['status'], 'next_tick': datetime.fromtimestamp(collector['next_tick']).isoformat()}
+                    for name, collector in self.collectors.items()
+                }
+            }
+            try:
+                save_json(self.state_file, state)
+            except Exception as e:
+                print(f"保存代理状态失败: {e}")
+    
+    def handle_signal(self, signum, frame):
+        """收到SIGINT/SIGTERM时停止调度"""
+        self.stop_event.set()
+    
+    def run(self):
+        """运行调度循环，直到收到停止信号或没有启用的采集器"""
+        signal.signal(signal.SIGINT, self.handle_signal)
+        signal.signal(signal.SIGTERM, self.handle_signal)
+        print(f"[{datetime.now()}] 监控代理已启动，进程ID: {os.getpid()}")
+        
+        try:
+            while not self.stop_event.is_set():
+                self.reload_control()
+                if not self.collectors:
+                    print(f"[{datetime.now()}] 没有启用的采集器，监控代理退出")
+                    break
+                
+                now = time.time()
+                submitted = False
+                for name, collector in self.collectors.items():
+                    if now < collector['next_tick']:
+                        continue
+                    tick = collector['next_tick']
+                    collector['next_tick'] = next_aligned_tick(now, collector['interval'])
+                    if collector['future'] is not None and not collector['future'].done():
+                        # 上一次采集还没有完成，跳过本次，避免同一采集器并发执行
+                        with self.lock:
+                            collector['status']['skipped'] += 1
+                        continue
+                    collector['future'] = self.executor.submit(self.run_collector, name, collector, tick)
+                    submitted = True
+                if submitted:
+                    self.save_state()
+                
+                next_tick = min(collector['next_tick'] for collector in self.collectors.values())
+                self.stop_event.wait(max(0, min(next_tick - time.time(), CONTROL_POLL_INTERVAL)))
+        finally:
+            self.executor.shutdown(wait=True)
+            for name, collector in self.collectors.items():
+                self.close_collector(name, collector)
+            self.writer.close()
+            self.session.close()
+            try:
+                os.remove(self.state_file)
+            except OSError:
+                pass
+            print(f"[{datetime.now()}] 监控代理已停止")
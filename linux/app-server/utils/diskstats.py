@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+import os
+import time
+
+DISKSTATS = '/proc/diskstats'
+
+SYS_BLOCK = '/sys/class/block'
+
+# /proc/diskstats中设备名之后各字段的含义（扇区固定为512字节）
+DISKSTATS_FIELDS = (
+    'reads', 'reads_merged', 'sectors_read', 'read_ms',
+    'writes', 'writes_merged', 'sectors_written', 'write_ms',
+    'in_flight', 'io_ms', 'weighted_io_ms',
+    # 4.18及以上内核
+    'discards', 'discards_merged', 'sectors_discarded', 'discard_ms',
+    # 5.5及以上内核
+    'flushes', 'flush_ms'
+)
+
+SECTOR_SIZE = 512
+
+def get_disk_io_options():
+    """获取磁盘I/O统计选项"""
+    return {
+        # 是否输出分区（默认只输出整块磁盘和device-mapper设备，与iostat一致）
+        'partitions': os.getenv('DISK_IO_PARTITIONS', '0').lower() in ('1', 'true', 'yes')
+    }
+
+def read_diskstats(path=DISKSTATS):
+    """读取/proc/diskstats，返回{设备名: {字段: 累计值}}，不支持时返回None"""
+    try:
+        with open(path, 'r') as f:
+            lines = f.read().splitlines()
+    except OSError:
+        return None
+    stats = {}
+    for line in lines:
+        fields = line.split()
+        if len(fields) < 14:
+            continue
+        stats[fields[2]] = dict(zip(DISKSTATS_FIELDS, (int(value) for value in fields[3:])))
+    return stats
+
+def _read_sys(*parts):
+    """读取/sys中的属性文件，不存在时返回None"""
+    try:
+        with open(os.path.join(SYS_BLOCK, *parts), 'r') as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+def resolve_device(name):
+    """识别设备类型和可读名称：device-mapper设备取/sys/block/dm-N/dm/name（如LVM卷vg-root），分区记录所属磁盘"""
+    dm_name = _read_sys(name, 'dm', 'name')
+    if dm_name:
+        return {'name': dm_name, 'type': 'dm'}
+    if _read_sys(name, 'partition') is not None:
+        parent = os.path.basename(os.path.dirname(os.path.realpath(os.path.join(SYS_BLOCK, name))))
+        return {'name': name, 'type': 'partition', 'parent': parent}
+    return {'name': name, 'type': 'disk'}
+
+def _delta(current, previous):
+    """计数器差值，计数器回绕或重置时返回0"""
+    return max(0, current - previous)
+
+def calc_disk_rates(prev, curr, interval):
+    """按iostat -x的方法由两次采样计算一个设备的速率和延迟"""
+    delta = {field: _delta(curr[field], prev[field]) for field in curr if field in prev and field != 'in_flight'}
+    reads = delta['reads']
+    writes = delta['writes']
+    rates = {
+        'read_iops': round(reads / interval, 2),
+        'write_iops': round(writes / interval, 2),
+        'read_bytes_per_sec': round(delta['sectors_read'] * SECTOR_SIZE / interval, 1),
+        'write_bytes_per_sec': round(delta['sectors_written'] * SECTOR_SIZE / interval, 1),
+        'read_merged_per_sec': round(delta['reads_merged'] / interval, 2),
+        'write_merged_per_sec': round(delta['writes_merged'] / interval, 2),
+        # 平均每个请求从提交到完成的时间(ms)，包括排队时间
+        'read_await_ms': round(delta['read_ms'] / reads, 3) if reads else 0.0,
+        'write_await_ms': round(delta['write_ms'] / writes, 3) if writes else 0.0,
+        'await_ms': round((delta['read_ms'] + delta['write_ms']) / (reads + writes), 3) if reads + writes else 0.0,
+        # 平均请求大小(KB)
+        'read_request_kb': round(delta['sectors_read'] * SECTOR_SIZE / 1024 / reads, 2) if reads else 0.0,
+        'write_request_kb': round(delta['sectors_written'] * SECTOR_SIZE / 1024 / writes, 2) if writes else 0.0,
+        # 平均队列深度（iostat的aqu-sz）
+        'queue_depth': round(delta['weighted_io_ms'] / (interval * 1000), 3),
+        # 设备忙的时间占比；能并行处理请求的设备（SSD、RAID、device-mapper）达到100%不一定已经饱和
+        'util_percent': round(min(100.0, delta['io_ms'] * 100 / (interval * 1000)), 2),
+        'in_flight': curr['in_flight']
+    }
+    if 'discards' in delta:
+        discards = delta['discards']
+        rates['discard_iops'] = round(discards / interval, 2)
+        rates['discard_await_ms'] = round(delta['discard_ms'] / discards, 3) if discards else 0.0
+    if 'flushes' in delta:
+        flushes = delta['flushes']
+        rates['flush_iops'] = round(flushes / interval, 2)
+        rates['flush_await_ms'] = round(delta['flush_ms'] / flushes, 3) if flushes else 0.0
+    return rates
+
+class DiskIOStats:
+    """按采集周期计算每个块设备的IOPS、吞吐量、平均等待时间、队列深度和利用率
+    
+    与iostat -x相同，由相邻两次读取/proc/diskstats的差值计算；创建时先取一次基线。
+    启动以来没有任何读写的设备（如未使用的loop设备）不输出。
+    """
+    
+    def __init__(self, options=None):
+        self.options = options or get_disk_io_options()
+        # 设备名 -> 类型和可读名称，设备第一次出现时解析
+        self.devices = {}
+        self.previous = read_diskstats()
+        self.previous_time = time.monotonic()
+    
+    @property
+    def available(self):
+        """系统是否支持/proc/diskstats"""
+        return self.previous is not None
+    
+    def collect(self):
+        """返回上一次采集以来各设备的I/O速率"""
+        now = time.monotonic()
+        current = read_diskstats()
+        if current is None:
+            return None
+        interval = now - self.previous_time
+        previous = self.previous or {}
+        self.previous = current
+        self.previous_time = now
+        if interval <= 0:
+            return None
+        
+        devices = {}
+        for name, stats in current.items():
+            if name not in previous or stats['reads'] + stats['writes'] == 0:
+                continue
+            if name not in self.devices:
+                self.devices[name] = resolve_device(name)
+            device = self.devices[name]
+            if device['type'] == 'partition' and not self.options['partitions']:
+                continue
+            devices[name] = {**device, **calc_disk_rates(previous[name], stats, interval)}
+        
+        # 已移除的设备不再缓存
+        self.devices = {name: device for name, device in self.devices.items() if name in current}
+        return {'interval': round(interval, 3), 'devices': devices}
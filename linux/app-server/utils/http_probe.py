@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+import os
+import ssl
+import json
+import time
+import socket
+import asyncio
+from urllib.parse import urljoin, urlsplit
+
+# 读取响应体时每次读取的字节数
+READ_CHUNK_SIZE = 64 * 1024
+
+# 没有响应体的状态码
+NO_BODY_STATUS = (204, 304)
+
+# 跟随Location的重定向状态码
+REDIRECT_STATUS = (301, 302, 303, 307, 308)
+
+def get_http_probe_options():
+    """获取后端接口探测选项"""
+    return {
+        # 同时进行的请求数上限
+        'concurrency': int(os.getenv('BACKEND_PROBE_CONCURRENCY', 10)),
+        # 单次请求超时(秒)，端点配置中的timeout优先
+        'timeout': float(os.getenv('BACKEND_PROBE_TIMEOUT', 10)),
+        # 每个主机保留的空闲连接数上限
+        'max_idle': int(os.getenv('BACKEND_PROBE_MAX_IDLE', 4)),
+        # 空闲连接的最长保留时间(秒)，超过后关闭重建
+        'idle_timeout': float(os.getenv('BACKEND_PROBE_IDLE_TIMEOUT', 300)),
+        # 最多跟随的重定向次数，0为不跟随，端点配置中的max_redirects优先
+        'max_redirects': int(os.getenv('BACKEND_PROBE_MAX_REDIRECTS', 5))
+    }
+
+def parse_endpoint(endpoint):
+    """补全端点配置：方法、名称、主机、端口、是否TLS和请求路径"""
+    url = urlsplit(endpoint['url'])
+    tls = url.scheme == 'https'
+    return {
+        **endpoint,
+        'method': endpoint.get('method', 'GET').upper(),
+        'name': endpoint.get('name', endpoint['url']),
+        'host': url.hostname,
+        'port': url.port or (443 if tls else 80),
+        'tls': tls,
+        'path': (url.path or '/') + (f'?{url.query}' if url.query else '')
+    }
+
+def redirect_endpoint(endpoint, status, location):
+    """生成重定向后的端点配置：相对地址按当前URL解析；303以及POST的301/302与requests一致改为不带请求体的GET"""
+    redirected = {**endpoint, 'url': urljoin(endpoint['url'], location)}
+    if status == 303 or (status in (301, 302) and endpoint['method'] == 'POST'):
+        redirected['method'] = 'GET'
+        redirected.pop('data', None)
+    return parse_endpoint(redirected)
+
+def build_request(endpoint, keepalive=True):
+    """生成HTTP/1.1请求报文，POST/PUT/PATCH以JSON发送端点配置中的data"""
+    host = endpoint['host'] if endpoint['port'] in (80, 443) else f"{endpoint['host']}:{endpoint['port']}"
+    headers = {
+        'Host': host,
+        'User-Agent': 'backend-monitor',
+        'Accept': '*/*',
+        'Connection': 'keep-alive' if keepalive else 'close'
+    }
+    body = b''
+    if endpoint['method'] in ('POST', 'PUT', 'PATCH'):
+        body = json.dumps(endpoint.get('data', {}), ensure_ascii=False).encode('utf-8')
+        headers['Content-Type'] = 'application/json'
+        headers['Content-Length'] = str(len(body))
+    headers.update(endpoint.get('headers', {}))
+    head = f"{endpoint['method']} {endpoint['path']} HTTP/1.1\r\n" + ''.join(f"{name}: {value}\r\n" for name, value in headers.items())
+    return (head + '\r\n').encode('latin-1') + body
+
+async def read_response(reader, status_line, method):
+    """读取状态行之后的响应头和响应体，返回(状态码, 响应体字节数, 连接是否可以复用, Location头)
+    
+    响应体只计数不保存；支持Content-Length、chunked和读到连接关闭三种方式。
+    """
+    parts = status_line.split()
+    if len(parts) < 2 or not parts[0].startswith(b'HTTP/'):
+        raise ValueError(f"无效的HTTP响应: {status_line[:50]!r}")
+    version = parts[0]
+    status = int(parts[1])
+    
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if not line:
+            raise ConnectionResetError("读取响应头时连接已关闭")
+        if line in (b'\r\n', b'\n'):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    
+    location = headers.get('location')
+    connection = headers.get('connection', '').lower()
+    keepalive = 'close' not in connection if version == b'HTTP/1.1' else 'keep-alive' in connection
+    
+    if method == 'HEAD' or status in NO_BODY_STATUS or 100 <= status < 200:
+        return status, 0, keepalive, location
+    
+    length = 0
+    if 'chunked' in headers.get('transfer-encoding', '').lower():
+        while True:
+            size = int((await reader.readline()).split(b';', 1)[0], 16)
+            if size == 0:
+                # 跳过trailer
+                while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                    pass
+                break
+            await reader.readexactly(size + 2)
+            length += size
+    elif 'content-length' in headers:
+        remaining = int(headers['content-length'])
+        while remaining > 0:
+            chunk = await reader.read(min(remaining, READ_CHUNK_SIZE))
+            if not chunk:
+                raise ConnectionResetError("读取响应体时连接已关闭")
+            remaining -= len(chunk)
+            length += len(chunk)
+    else:
+        # 没有长度信息，响应体到连接关闭为止
+        while True:
+            chunk = await reader.read(READ_CHUNK_SIZE)
+            if not chunk:
+                break
+            length += len(chunk)
+        keepalive = False
+    return status, length, keepalive, location
+
+class ConnectionPool:
+    """按(主机, 端口, 是否TLS)保留空闲的keep-alive连接
+    
+    连接属于创建它的事件循环，只能在同一个事件循环中复用。
+    """
+    
+    def __init__(self, max_idle=4, idle_timeout=300):
+        self.max_idle = max_idle
+        self.idle_timeout = idle_timeout
+        # {键: [(reader, writer, 放回时刻)]}
+        self.idle = {}
+    
+    def acquire(self, key):
+        """取出一个空闲连接，没有可用连接时返回None"""
+        connections = self.idle.get(key, [])
+        now = time.monotonic()
+        while connections:
+            reader, writer, released = connections.pop()
+            if now - released <= self.idle_timeout and not reader.at_eof() and not writer.is_closing():
+                return reader, writer
+            writer.close()
+        return None
+    
+    def release(self, key, reader, writer):
+        """把连接放回连接池，空闲连接已满时关闭"""
+        connections = self.idle.setdefault(key, [])
+        if len(connections) < self.max_idle:
+            connections.append((reader, writer, time.monotonic()))
+        else:
+            writer.close()
+    
+    def close(self):
+        """关闭所有空闲连接"""
+        for connections in self.idle.values():
+            for _, writer, _ in connections:
+                writer.close()
+        self.idle = {}
+
+class HttpClient:
+    """基于asyncio的HTTP/1.1客户端，通过连接池复用keep-alive连接，分阶段计时
+    
+    每次请求分别记录DNS解析、TCP建连、TLS握手、首字节时间（请求发出到收到响应状态行）和总时间(ms)，
+    复用连接时前三项为None；服务器已关闭的空闲连接在发送失败时换新连接重试。
+    端点配置keepalive为False时每次都新建连接。只能在同一个事件循环中使用。
+    """
+    
+    def __init__(self, max_idle=4, idle_timeout=300):
+        self.pool = ConnectionPool(max_idle, idle_timeout)
+        self.ssl_context = ssl.create_default_context()
+    
+    async def connect(self, endpoint, timings):
+        """新建连接，分别记录DNS解析、TCP建连和TLS握手的耗时"""
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        infos = await loop.getaddrinfo(endpoint['host'], endpoint['port'], type=socket.SOCK_STREAM)
+        address = infos[0][4][0]
+        timings['dns_ms'] = round((time.perf_counter() - started) * 1000, 3)
+        
+        started = time.perf_counter()
+        if endpoint['tls'] and not hasattr(asyncio.StreamWriter, 'start_tls'):
+            # Python 3.11之前不能在已建立的连接上升级TLS，建连时间中包含TLS握手
+            reader, writer = await asyncio.open_connection(address, endpoint['port'], ssl=self.ssl_context, server_hostname=endpoint['host'])
+            timings['connect_ms'] = round((time.perf_counter() - started) * 1000, 3)
+            return reader, writer
+        reader, writer = await asyncio.open_connection(address, endpoint['port'])
+        timings['connect_ms'] = round((time.perf_counter() - started) * 1000, 3)
+        
+        if endpoint['tls']:
+            started = time.perf_counter()
+            try:
+                await writer.start_tls(self.ssl_context, server_hostname=endpoint['host'])
+            except BaseException:
+                writer.close()
+                raise
+            timings['tls_ms'] = round((time.perf_counter() - started) * 1000, 3)
+        return reader, writer
+    
+    async def request(self, endpoint):
+        """发送一次请求，返回(状态码, 响应体字节数, 是否复用连接, 各阶段耗时, Location头)"""
+        keepalive = endpoint.get('keepalive', True)
+        key = (endpoint['host'], endpoint['port'], endpoint['tls'])
+        request = build_request(endpoint, keepalive)
+        while True:
+            timings = {'dns_ms': None, 'connect_ms': None, 'tls_ms': None, 'ttfb_ms': None, 'total_ms': None}
+            started = time.perf_counter()
+            connection = self.pool.acquire(key) if keepalive else None
+            reused = connection is not None
+            reader, writer = connection or await self.connect(endpoint, timings)
+            try:
+                sent = time.perf_counter()
+                writer.write(request)
+                await writer.drain()
+                status_line = await reader.readline()
+                if not status_line:
+                    raise ConnectionResetError("连接已被服务器关闭")
+            except (ConnectionError, OSError):
+                writer.close()
+                if reused:
+                    # 服务器已关闭空闲连接，换新连接重试
+                    continue
+                raise
+            except BaseException:
+                writer.close()
+                raise
+            timings['ttfb_ms'] = round((time.perf_counter() - sent) * 1000, 3)
+            try:
+                status, length, reusable, location = await read_response(reader, status_line, endpoint['method'])
+            except BaseException:
+                writer.close()
+                raise
+            timings['total_ms'] = round((time.perf_counter() - started) * 1000, 3)
+            if keepalive and reusable:
+                self.pool.release(key, reader, writer)
+            else:
+                writer.close()
+            return status, length, reused, timings, location
+    
+    async def fetch(self, endpoint, max_redirects=0):
+        """发送请求并跟随最多max_redirects次重定向
+        
+        返回(最终状态码, 响应体字节数, 是否复用连接, 各阶段耗时, 重定向次数, 最终URL)；
+        各阶段耗时为最后一次请求的耗时，total_ms为包括重定向在内的总耗时。
+        """
+        redirects = 0
+        total_ms = 0.0
+        while True:
+            status, length, reused, timings, location = await self.request(endpoint)
+            total_ms += timings['total_ms']
+            if status not in REDIRECT_STATUS or not location or redirects >= max_redirects:
+                timings['total_ms'] = round(total_ms, 3)
+                return status, length, reused, timings, redirects, endpoint['url']
+            endpoint = redirect_endpoint(endpoint, status, location)
+            redirects += 1
+    
+    def close(self):
+        """关闭所有空闲连接"""
+        self.pool.close()
+
+class HttpProber:
+    """基于asyncio的后端接口探测器，复用keep-alive连接，分阶段计时
+    
+    所有到期的端点在同一个事件循环中并发探测，同时进行的请求数受concurrency限制。事件循环和连接池在采集之间保留，
+    下一次采集直接复用上次的连接，不再重复DNS解析、TCP建连和TLS握手。各阶段耗时见HttpClient；
+    端点配置keepalive为False时每次都新建连接，用于持续测量建连开销。
+    端点配置interval（秒）时按对齐的时间片调度，每个时间片最多探测一次，未配置时每次采集都探测。
+    与requests一致默认跟随重定向（最多max_redirects次），以最终响应的状态码判断是否成功；
+    端点配置expect_status（状态码列表）时只有这些状态码算成功，否则2xx算成功。
+    """
+    
+    def __init__(self, endpoints, options=None):
+        self.endpoints = [parse_endpoint(endpoint) for endpoint in endpoints]
+        self.options = options or get_http_probe_options()
+        self.loop = asyncio.new_event_loop()
+        self.client = HttpClient(self.options['max_idle'], self.options['idle_timeout'])
+        # 各端点上次探测的时间片
+        self.last_slots = {}
+    
+    def due_endpoints(self, now):
+        """返回本次采集需要探测的端点"""
+        due = []
+        for index, endpoint in enumerate(self.endpoints):
+            interval = endpoint.get('interval')
+            if interval:
+                slot = int(now // interval)
+                if self.last_slots.get(index) == slot:
+                    continue
+                self.last_slots[index] = slot
+            due.append(endpoint)
+        return due
+    
+    def run(self):
+        """探测所有到期的端点，按配置顺序返回各端点的结果"""
+        endpoints = self.due_endpoints(time.time())
+        if not endpoints:
+            return []
+        return self.loop.run_until_complete(self._run_all(endpoints))
+    
+    async def _run_all(self, endpoints):
+        semaphore = asyncio.Semaphore(self.options['concurrency'])
+        return await asyncio.gather(*(self._probe(endpoint, semaphore) for endpoint in endpoints))
+    
+    async def _probe(self, endpoint, semaphore):
+        """探测一个端点"""
+        result = {'name': endpoint['name'], 'url': endpoint['url'], 'method': endpoint['method']}
+        async with semaphore:
+            try:
+                max_redirects = endpoint.get('max_redirects', self.options['max_redirects'])
+                outcome = await asyncio.wait_for(self.client.fetch(endpoint, max_redirects), endpoint.get('timeout', self.options['timeout']))
+            except asyncio.TimeoutError:
+                result.update({'success': False, 'error': 'timeout'})
+                return result
+            except Exception as e:
+                result.update({'success': False, 'error': f"{type(e).__name__}: {e}"})
+                return result
+        status, length, reused, timings, redirects, final_url = outcome
+        expect_status = endpoint.get('expect_status')
+        result.update({
+            'status_code': status,
+            'response_time': timings['total_ms'],
+            'success': status in expect_status if expect_status else 200 <= status < 300,
+            'content_length': length,
+            'reused': reused,
+            'timings': timings
+        })
+        if redirects:
+            result.update({'redirects': redirects, 'final_url': final_url})
+        return result
+    
+    def close(self):
+        """关闭空闲连接和事件循环"""
+        self.client.close()
+        # 让已关闭的连接完成清理
+        self.loop.run_until_complete(asyncio.sleep(0))
+        self.loop.close()
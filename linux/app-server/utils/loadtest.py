@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+import os
+import signal
+import asyncio
+import argparse
+import itertools
+from datetime import datetime
+
+from utils.agent import load_json, save_json
+from utils.sketch import HdrHistogram
+from utils.http_probe import HttpClient, parse_endpoint
+
+# 报告中输出的百分位
+REPORT_PERCENTILES = (50, 75, 90, 95, 99, 99.9, 99.99)
+
+# 开环模式未指定并发上限时，同时进行的请求数上限
+DEFAULT_OPEN_LOOP_CONCURRENCY = 1000
+
+# 闭环模式默认的并发数
+DEFAULT_CLOSED_LOOP_CONCURRENCY = 10
+
+def parse_loadtest_args(argv):
+    """解析loadtest命令的参数"""
+    parser = argparse.ArgumentParser(prog='monitor.py loadtest', description='对后端应用监控的端点进行压力测试')
+    parser.add_argument('--rate', type=float, help='开环模式：按固定速率发出请求（每秒请求数），不等待上一个请求完成')
+    parser.add_argument('--concurrency', type=int, help=f'闭环模式的并发数（默认{DEFAULT_CLOSED_LOOP_CONCURRENCY}）；开环模式下为同时进行的请求数上限（默认{DEFAULT_OPEN_LOOP_CONCURRENCY}）')
+    parser.add_argument('--duration', type=float, default=30, help='测试时长(秒)，不含预热，默认30')
+    parser.add_argument('--warmup', type=float, default=5, help='预热时长(秒)，预热期间的请求不计入结果，默认5')
+    parser.add_argument('--timeout', type=float, default=10, help='单次请求超时(秒)，端点配置中的timeout优先，默认10')
+    parser.add_argument('--url', action='append', help='压测的URL，可重复指定；未指定时使用后端应用监控的端点配置')
+    parser.add_argument('--expected-interval', type=float, help='闭环模式修正协调遗漏的期望间隔(ms)，默认取服务时间的中位数')
+    parser.add_argument('--baseline', help='作为基线的历史报告，输出各百分位的变化')
+    args = parser.parse_args(argv)
+    if args.rate is not None and args.rate <= 0:
+        parser.error('--rate必须大于0')
+    if args.concurrency is not None and args.concurrency <= 0:
+        parser.error('--concurrency必须大于0')
+    return {
+        'mode': 'open' if args.rate else 'closed',
+        'rate': args.rate,
+        'concurrency': args.concurrency or (DEFAULT_OPEN_LOOP_CONCURRENCY if args.rate else DEFAULT_CLOSED_LOOP_CONCURRENCY),
+        'duration': args.duration,
+        'warmup': args.warmup,
+        'timeout': args.timeout,
+        'urls': args.url,
+        'expected_interval_ms': args.expected_interval,
+        'baseline': args.baseline
+    }
+
+def summarize_histogram(histogram):
+    """把以微秒记录的直方图汇总为各百分位、最小/平均/最大值(ms)"""
+    if histogram.total_count == 0:
+        return None
+    summary = {'count': histogram.total_count, 'min': round(histogram.min / 1000, 3), 'mean': round(histogram.mean / 1000, 3)}
+    for percentile in REPORT_PERCENTILES:
+        summary[f'p{percentile:g}'] = round(histogram.value_at_percentile(percentile) / 1000, 3)
+    summary['max'] = round(histogram.max / 1000, 3)
+    return summary
+
+class EndpointStats:
+    """一个端点的压测结果：延迟和服务时间的直方图、状态码和错误计数"""
+    
+    def __init__(self):
+        # 延迟：从计划发出时刻到收到完整响应（开环模式），已修正协调遗漏
+        self.latency = HdrHistogram()
+        # 服务时间：从实际发出请求到收到完整响应
+        self.service_time = HdrHistogram()
+        self.status_codes = {}
+        self.errors = {}
+    
+    def merge(self, other):
+        """合并另一个端点的结果"""
+        self.latency.merge(other.latency)
+        self.service_time.merge(other.service_time)
+        for status, count in other.status_codes.items():
+            self.status_codes[status] = self.status_codes.get(status, 0) + count
+        for error, count in other.errors.items():
+            self.errors[error] = self.errors.get(error, 0) + count
+    
+    @property
+    def responses(self):
+        """收到响应的请求数"""
+        return sum(self.status_codes.values())
+    
+    def to_dict(self):
+        """输出汇总结果；超时的请求计入延迟和服务时间的直方图，同时单独计入错误"""
+        errors = sum(self.errors.values())
+        return {
+            'requests': self.responses + errors,
+            'responses': self.responses,
+            'errors': errors,
+            'status_codes': {str(status): count for status, count in sorted(self.status_codes.items())},
+            'error_types': self.errors,
+            'latency': summarize_histogram(self.latency),
+            'service_time': summarize_histogram(self.service_time)
+        }
+
+class LoadTest:
+    """基于asyncio的压测引擎，按顺序轮流请求各端点，复用keep-alive连接
+    
+    - 开环模式（指定rate）：按固定速率在计划时刻发出请求，不等待之前的请求完成；延迟从计划时刻算起，
+      服务端变慢或达到并发上限导致请求推迟发出时，推迟的时间计入延迟，不会出现协调遗漏
+    - 闭环模式：concurrency个工作协程各自连续发送请求；服务时间直接记录，
+      延迟按期望间隔修正协调遗漏（HdrHistogram.corrected_copy）
+    预热期间的请求不计入结果；收到SIGINT时提前结束并照常输出报告。
+    """
+    
+    def __init__(self, endpoints, options):
+        self.endpoints = [parse_endpoint(endpoint) for endpoint in endpoints]
+        self.options = options
+        self.stats = [EndpointStats() for _ in self.endpoints]
+        self.sequence = itertools.count()
+        self.stopping = False
+        # 开环模式下请求实际发出时刻相对计划时刻的最大延后(s)
+        self.max_send_lag = 0.0
+    
+    def run(self):
+        """运行压测，返回报告"""
+        started_at = datetime.now()
+        elapsed = asyncio.run(self._run())
+        return self.build_report(started_at, elapsed)
+    
+    def stop(self):
+        """提前结束压测"""
+        self.stopping = True
+    
+    async def _run(self):
+        """运行压测，返回计入结果的时长(秒)"""
+        loop = asyncio.get_running_loop()
+        try:
+            loop.add_signal_handler(signal.SIGINT, self.stop)
+        except (NotImplementedError, RuntimeError):
+            pass
+        self.client = HttpClient(max_idle=self.options['concurrency'], idle_timeout=float('inf'))
+        start = loop.time()
+        self.measure_start = start + self.options['warmup']
+        end = self.measure_start + self.options['duration']
+        try:
+            if self.options['mode'] == 'open':
+                await self._open_loop(start, end)
+            else:
+                await asyncio.gather(*(self._worker(end) for _ in range(self.options['concurrency'])))
+        finally:
+            self.client.close()
+            try:
+                loop.remove_signal_handler(signal.SIGINT)
+            except (NotImplementedError, RuntimeError):
+                pass
+        return max(0.0, min(loop.time(), end) - self.measure_start)
+    
+    def _next_endpoint(self):
+        """按顺序轮流选择端点"""
+        index = next(self.sequence) % len(self.endpoints)
+        return index, self.endpoints[index]
+    
+    async def _open_loop(self, start, end):
+        """开环模式：在计划时刻发出请求"""
+        loop = asyncio.get_running_loop()
+        interval = 1 / self.options['rate']
+        semaphore = asyncio.Semaphore(self.options['concurrency'])
+        pending = set()
+        for count in itertools.count():
+            intended = start + count * interval
+            if intended >= end or self.stopping:
+                break
+            delay = intended - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            task = asyncio.create_task(self._send(*self._next_endpoint(), intended, semaphore))
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+        if pending:
+            await asyncio.gather(*pending)
+    
+    async def _worker(self, end):
+        """闭环模式：连续发送请求，直到测试结束"""
+        loop = asyncio.get_running_loop()
+        while loop.time() < end and not self.stopping:
+            await self._send(*self._next_endpoint(), None, None)
+    
+    async def _send(self, index, endpoint, intended, semaphore):
+        """发送一次请求并记录结果；intended为开环模式下的计划发出时刻"""
+        loop = asyncio.get_running_loop()
+        if semaphore is not None:
+            await semaphore.acquire()
+        try:
+            sent = loop.time()
+            try:
+                status, _, _, _, _ = await asyncio.wait_for(self.client.request(endpoint), endpoint.get('timeout', self.options['timeout']))
+                error = None
+            except asyncio.TimeoutError:
+                error = 'timeout'
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+            finished = loop.time()
+        finally:
+            if semaphore is not None:
+                semaphore.release()
+        
+        scheduled = intended if intended is not None else sent
+        if scheduled < self.measure_start:
+            return
+        stats = self.stats[index]
+        if error is not None:
+            stats.errors[error] = stats.errors.get(error, 0) + 1
+            # 超时是最慢的结果，计入直方图才能反映真实的高百分位；连接被拒绝等快速失败只计入错误
+            if error != 'timeout':
+                return
+        else:
+            stats.status_codes[status] = stats.status_codes.get(status, 0) + 1
+        stats.service_time.record((finished - sent) * 1e6)
+        if intended is not None:
+            stats.latency.record((finished - intended) * 1e6)
+            self.max_send_lag = max(self.max_send_lag, sent - intended)
+    
+    def build_report(self, started_at, elapsed):
+        """汇总压测报告"""
+        if self.options['mode'] == 'closed':
+            # 闭环模式按期望间隔修正协调遗漏，期望间隔默认取全部端点服务时间的中位数
+            service_time = HdrHistogram()
+            for stats in self.stats:
+                service_time.merge(stats.service_time)
+            expected_interval = self.options['expected_interval_ms']
+            if expected_interval is None and service_time.total_count:
+                expected_interval = service_time.value_at_percentile(50) / 1000
+            for stats in self.stats:
+                stats.latency = stats.service_time.corrected_copy(expected_interval * 1000) if expected_interval else stats.service_time
+        else:
+            expected_interval = None
+        
+        total = EndpointStats()
+        for stats in self.stats:
+            total.merge(stats)
+        report = {
+            'started_at': started_at.isoformat(),
+            'mode': self.options['mode'],
+            'rate': self.options['rate'],
+            'concurrency': self.options['concurrency'],
+            'duration': round(elapsed, 3),
+            'warmup': self.options['warmup'],
+            'timeout': self.options['timeout'],
+            'expected_interval_ms': round(expected_interval, 3) if expected_interval else None,
+            'throughput': round(total.responses / elapsed, 2) if elapsed else None,
+            **total.to_dict(),
+            'endpoints': [
+                {'name': endpoint['name'], 'url': endpoint['url'], 'method': endpoint['method'], **stats.to_dict()}
+                for endpoint, stats in zip(self.endpoints, self.stats)
+            ],
+            # 完整的直方图，用于与之后的报告合并或比较
+            'histograms': {'latency': total.latency.to_dict(), 'service_time': total.service_time.to_dict()}
+        }
+        if self.options['mode'] == 'open':
+            report['max_send_lag_ms'] = round(self.max_send_lag * 1000, 3)
+        return report
+
+def save_report(report, data_dir):
+    """把压测报告写入数据目录，返回文件路径"""
+    report_dir = os.path.join(data_dir, 'loadtest')
+    os.makedirs(report_dir, exist_ok=True)
+    started_at = datetime.fromisoformat(report['started_at'])
+    report_file = os.path.join(report_dir, f"loadtest_{started_at.strftime('%Y%m%d_%H%M%S')}.json")
+    save_json(report_file, report)
+    return report_file
+
+def print_report(report, baseline=None):
+    """输出压测结果，提供基线报告时输出各百分位相对基线的变化"""
+    mode = f"开环 {report['rate']:g} 请求/秒" if report['mode'] == 'open' else f"闭环 {report['concurrency']} 并发"
+    print(f"压测模式: {mode}，时长: {report['duration']}秒")
+    print(f"请求: {report['requests']}，收到响应: {report['responses']}，错误: {report['errors']}，吞吐量: {report['throughput']} 请求/秒")
+    print(f"状态码: {report['status_codes']}")
+    if report['error_types']:
+        print(f"错误: {report['error_types']}")
+    if report.get('max_send_lag_ms'):
+        print(f"请求最大推迟发出: {report['max_send_lag_ms']}ms")
+    if report.get('expected_interval_ms'):
+        print(f"协调遗漏修正的期望间隔: {report['expected_interval_ms']}ms")
+    
+    for name in ('latency', 'service_time'):
+        summary = report[name]
+        if summary is None:
+            continue
+        base = (baseline or {}).get(name) or {}
+        print(f"\n{'延迟' if name == 'latency' else '服务时间'}(ms):")
+        for key, value in summary.items():
+            if key == 'count':
+                continue
+            line = f"  {key:>8}: {value:>10.3f}"
+            if base.get(key):
+                line += f"  基线 {base[key]:>10.3f}  变化 {(value - base[key]) * 100 / base[key]:+.1f}%"
+            print(line)
+
+def run_loadtest(argv, endpoints, data_dir):
+    """运行loadtest命令：压测、输出并保存报告"""
+    options = parse_loadtest_args(argv)
+    if options['urls']:
+        endpoints = [{'url': url} for url in options['urls']]
+    if not endpoints:
+        print("错误: 没有可压测的端点")
+        return None
+    
+    baseline = None
+    if options['baseline']:
+        baseline = load_json(options['baseline'], None)
+        if baseline is None:
+            print(f"读取基线报告失败: {options['baseline']}")
+    
+    print(f"开始压测 {len(endpoints)} 个端点，预热{options['warmup']:g}秒，测试{options['duration']:g}秒")
+    report = LoadTest(endpoints, options).run()
+    print_report(report, baseline)
+    report_file = save_report(report, data_dir)
+    print(f"\n压测报告已保存: {report_file}")
+    return report
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+import os
+import time
+import socket
+
+# /proc/net/tcp中的TCP状态编码
+TCP_STATES = {
+    '01': 'ESTABLISHED',
+    '02': 'SYN_SENT',
+    '03': 'SYN_RECV',
+    '04': 'FIN_WAIT1',
+    '05': 'FIN_WAIT2',
+    '06': 'TIME_WAIT',
+    '07': 'CLOSE',
+    '08': 'CLOSE_WAIT',
+    '09': 'LAST_ACK',
+    '0A': 'LISTEN',
+    '0B': 'CLOSING',
+    '0C': 'NEW_SYN_RECV'
+}
+
+# IPv4映射的IPv6地址（::ffff:a.b.c.d）在/proc/net/tcp6中的前缀
+IPV4_MAPPED_PREFIX = '0000000000000000FFFF0000'
+
+TCP_TABLES = ('/proc/net/tcp', '/proc/net/tcp6')
+
+def get_netstat_options():
+    """获取TCP连接统计选项"""
+    return {
+        # 输出连接数最多的监听端口和对端网段的数量
+        'top_n': int(os.getenv('NETWORK_SOCKET_TOP_N', 20))
+    }
+
+def _prefix_key(address_hex):
+    """从十六进制地址中取出对端网段的键（IPv4取/24，IPv6取/64），不做地址解码"""
+    if len(address_hex) == 8:
+        # IPv4按小端序存储，前三个字节在十六进制串的后6位
+        return ('4', address_hex[2:])
+    if address_hex.startswith(IPV4_MAPPED_PREFIX):
+        return ('4', address_hex[26:])
+    return ('6', address_hex[:16])
+
+def _format_prefix(key):
+    """将网段的键转换为可读的网段"""
+    family, value = key
+    if family == '4':
+        octets = bytes.fromhex(value)[::-1]
+        return f"{octets[0]}.{octets[1]}.{octets[2]}.0/24"
+    # IPv6每32位按小端序存储
+    raw = b''.join(bytes.fromhex(value[index:index + 8])[::-1] for index in range(0, 16, 8))
+    return f"{socket.inet_ntop(socket.AF_INET6, raw + bytes(8))}/64"
+
+def summarize_tcp_sockets(paths=TCP_TABLES, options=None):
+    """逐行扫描/proc/net/tcp和/proc/net/tcp6，按TCP状态、本地监听端口和对端网段汇总连接数
+    
+    不为每个套接字创建对象，只对字符串计数，地址只在输出时对排名靠前的网段解码；
+    不支持/proc/net/tcp的系统返回None。
+    """
+    options = options or get_netstat_options()
+    states = {}
+    # 本地端口 -> {状态: 数量}；输出时只保留处于监听状态的端口，即各服务端口上的入站连接
+    local_ports = {}
+    listen_ports = set()
+    # 对端网段 -> {状态: 数量}
+    remote_prefixes = {}
+    total = 0
+    found = False
+    
+    for path in paths:
+        try:
+            f = open(path, 'r')
+        except OSError:
+            continue
+        found = True
+        with f:
+            next(f, None)
+            for line in f:
+                fields = line.split(None, 4)
+                if len(fields) < 4:
+                    continue
+                state = TCP_STATES.get(fields[3], fields[3])
+                total += 1
+                states[state] = states.get(state, 0) + 1
+                local_port = int(fields[1].rsplit(':', 1)[1], 16)
+                if state == 'LISTEN':
+                    listen_ports.add(local_port)
+                    continue
+                port_states = local_ports.setdefault(local_port, {})
+                port_states[state] = port_states.get(state, 0) + 1
+                prefix_states = remote_prefixes.setdefault(_prefix_key(fields[2].rsplit(':', 1)[0]), {})
+                prefix_states[state] = prefix_states.get(state, 0) + 1
+    
+    if not found:
+        return None
+    
+    top_n = options['top_n']
+    ports = sorted(
+        ((port, port_states) for port, port_states in local_ports.items() if port in listen_ports),
+        key=lambda item: sum(item[1].values()), reverse=True
+    )[:top_n]
+    prefixes = sorted(remote_prefixes.items(), key=lambda item: sum(item[1].values()), reverse=True)[:top_n]
+    return {
+        'total': total,
+        'states': states,
+        'listen_ports': [{'port': port, 'total': sum(port_states.values()), 'states': port_states} for port, port_states in ports],
+        'remote_prefixes': [{'prefix': _format_prefix(key), 'total': sum(prefix_states.values()), 'states': prefix_states} for key, prefix_states in prefixes]
+    }
+
+# 从/proc/net/snmp和/proc/net/netstat中采集的计数器：{(表名, 计数器名): 输出名}
+KERNEL_NET_COUNTERS = {
+    ('Tcp', 'ActiveOpens'): 'active_opens',
+    ('Tcp', 'PassiveOpens'): 'passive_opens',
+    ('Tcp', 'AttemptFails'): 'attempt_fails',
+    ('Tcp', 'EstabResets'): 'estab_resets',
+    ('Tcp', 'InSegs'): 'in_segs',
+    ('Tcp', 'OutSegs'): 'out_segs',
+    ('Tcp', 'RetransSegs'): 'retrans_segs',
+    ('Tcp', 'InErrs'): 'in_errs',
+    ('Tcp', 'OutRsts'): 'out_rsts',
+    ('TcpExt', 'TCPTimeouts'): 'rto_timeouts',
+    ('TcpExt', 'TCPSynRetrans'): 'syn_retrans',
+    ('TcpExt', 'TCPFastRetrans'): 'fast_retrans',
+    ('TcpExt', 'TCPLostRetransmit'): 'lost_retransmit',
+    ('TcpExt', 'ListenOverflows'): 'listen_overflows',
+    ('TcpExt', 'ListenDrops'): 'listen_drops',
+    ('TcpExt', 'SyncookiesSent'): 'syncookies_sent',
+    ('TcpExt', 'SyncookiesRecv'): 'syncookies_recv',
+    ('TcpExt', 'SyncookiesFailed'): 'syncookies_failed',
+    ('TcpExt', 'TCPReqQFullDrop'): 'req_queue_full_drop',
+    ('TcpExt', 'TCPBacklogDrop'): 'backlog_drop',
+    ('TcpExt', 'TCPAbortOnTimeout'): 'abort_on_timeout',
+    ('TcpExt', 'TCPAbortOnMemory'): 'abort_on_memory',
+    ('Udp', 'InErrors'): 'udp_in_errors',
+    ('Udp', 'RcvbufErrors'): 'udp_rcvbuf_errors',
+    ('Udp', 'SndbufErrors'): 'udp_sndbuf_errors',
+    ('Udp', 'NoPorts'): 'udp_no_ports'
+}
+
+KERNEL_NET_TABLES = ('/proc/net/snmp', '/proc/net/netstat')
+
+SOFTNET_STAT = '/proc/net/softnet_stat'
+
+def read_kernel_net_counters(paths=KERNEL_NET_TABLES):
+    """读取内核网络协议栈计数器，每个文件只读取一次
+    
+    文件中每张表占两行：第一行为计数器名，第二行为对应的值。
+    """
+    counters = {}
+    for path in paths:
+        try:
+            with open(path, 'r') as f:
+                lines = f.read().splitlines()
+        except OSError:
+            continue
+        for header, values in zip(lines[::2], lines[1::2]):
+            table, _, names = header.partition(':')
+            for name, value in zip(names.split(), values.partition(':')[2].split()):
+                key = KERNEL_NET_COUNTERS.get((table, name))
+                if key is not None:
+                    counters[key] = int(value)
+    return counters
+
+def read_softnet_stat(path=SOFTNET_STAT):
+    """读取每个CPU的softnet统计：[(已处理包数, 积压队列满丢弃数, time_squeeze次数)]，按行对应在线CPU"""
+    try:
+        with open(path, 'r') as f:
+            lines = f.read().splitlines()
+    except OSError:
+        return None
+    stats = []
+    for line in lines:
+        fields = line.split()
+        if len(fields) >= 3:
+            stats.append(tuple(int(field, 16) for field in fields[:3]))
+    return stats
+
+def _delta(current, previous):
+    """计数器差值，计数器回绕或重置时返回0"""
+    return max(0, current - previous)
+
+class KernelNetCounters:
+    """按采集周期计算内核网络协议栈计数器的增量
+    
+    包括TCP重传和RTO超时、全连接队列溢出（ListenOverflows/ListenDrops）、SYN cookies、
+    UDP缓冲区错误，以及每个CPU的softnet积压丢包和time_squeeze。创建时先取一次基线。
+    """
+    
+    def __init__(self):
+        self.previous = read_kernel_net_counters()
+        self.previous_softnet = read_softnet_stat()
+        self.previous_time = time.time()
+    
+    def collect(self):
+        """返回上一次采集以来各计数器的增量"""
+        now = time.time()
+        current = read_kernel_net_counters()
+        softnet = read_softnet_stat()
+        interval = now - self.previous_time
+        
+        deltas = {key: _delta(value, self.previous[key]) for key, value in current.items() if key in self.previous}
+        out_segs = deltas.get('out_segs', 0)
+        result = {
+            'interval': round(interval, 3),
+            'counters': deltas,
+            # 重传报文占发送报文的比例(%)
+            'retransmit_rate': round(deltas.get('retrans_segs', 0) * 100 / out_segs, 3) if out_segs else 0.0
+        }
+        
+        if softnet is not None and self.previous_softnet is not None and len(softnet) == len(self.previous_softnet):
+            per_cpu = [
+                {
+                    'cpu': cpu,
+                    'processed': _delta(curr[0], prev[0]),
+                    'dropped': _delta(curr[1], prev[1]),
+                    'time_squeeze': _delta(curr[2], prev[2])
+                }
+                for cpu, (curr, prev) in enumerate(zip(softnet, self.previous_softnet))
+            ]
+            result['softnet'] = {
+                'dropped': sum(item['dropped'] for item in per_cpu),
+                'time_squeeze': sum(item['time_squeeze'] for item in per_cpu),
+                'per_cpu': per_cpu
+            }
+        
+        self.previous = current
+        self.previous_softnet = softnet
+        self.previous_time = now
+        return result
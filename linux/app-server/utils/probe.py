@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+import os
+import ssl
+import time
+import socket
+import struct
+import asyncio
+import itertools
+from urllib.parse import urlsplit
+
+# 默认探测目标
+DEFAULT_PROBE_TARGETS = 'icmp:www.google.com,icmp:www.baidu.com,http:http://localhost'
+
+# ICMP回显请求的类型
+ICMP_ECHO_REQUEST = 8
+ICMP_ECHO_REPLY = 0
+
+def get_probe_options():
+    """获取探测引擎选项"""
+    return {
+        # 每个目标每次采集的探测次数
+        'count': int(os.getenv('NETWORK_PROBE_COUNT', 5)),
+        # 同一目标相邻两次探测的间隔(秒)
+        'spacing': float(os.getenv('NETWORK_PROBE_SPACING', 0.1)),
+        # 单次探测超时(秒)
+        'timeout': float(os.getenv('NETWORK_PROBE_TIMEOUT', 1.0)),
+        # 同时进行的探测数上限
+        'concurrency': int(os.getenv('NETWORK_PROBE_CONCURRENCY', 200))
+    }
+
+def parse_targets(spec):
+    """解析探测目标配置
+    
+    多个目标以逗号分隔，每个目标为"类型:地址"：icmp:主机、tcp:主机:端口、http:URL（支持https）。
+    """
+    targets = []
+    for item in spec.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        kind, _, address = item.partition(':')
+        kind = kind.lower()
+        if kind == 'tcp':
+            host, _, port = address.rpartition(':')
+            targets.append({'type': 'tcp', 'target': address, 'host': host.strip('[]'), 'port': int(port)})
+        elif kind == 'http':
+            url = urlsplit(address)
+            targets.append({
+                'type': 'http',
+                'target': address,
+                'host': url.hostname,
+                'port': url.port or (443 if url.scheme == 'https' else 80),
+                'tls': url.scheme == 'https',
+                'path': (url.path or '/') + (f'?{url.query}' if url.query else '')
+            })
+        elif kind == 'icmp':
+            targets.append({'type': 'icmp', 'target': address, 'host': address})
+        else:
+            print(f"忽略无效的探测目标: {item}")
+    return targets
+
+def _checksum(data):
+    """计算ICMP校验和"""
+    if len(data) % 2:
+        data += b'\x00'
+    total = sum(struct.unpack(f'!{len(data) // 2}H', data))
+    total = (total >> 16) + (total & 0xffff)
+    total += total >> 16
+    return ~total & 0xffff
+
+def summarize_rtts(rtts, sent):
+    """汇总探测结果：最小/平均/最大延迟(ms)、抖动（相邻两次延迟差的平均值）和丢包率(%)"""
+    result = {'sent': sent, 'received': len(rtts), 'loss': round((sent - len(rtts)) * 100 / sent, 2) if sent else None}
+    if rtts:
+        result.update({
+            'min_ms': round(min(rtts), 3),
+            'avg_ms': round(sum(rtts) / len(rtts), 3),
+            'max_ms': round(max(rtts), 3),
+            'jitter_ms': round(sum(abs(b - a) for a, b in zip(rtts, rtts[1:])) / (len(rtts) - 1), 3) if len(rtts) > 1 else 0.0
+        })
+    else:
+        result.update({'min_ms': None, 'avg_ms': None, 'max_ms': None, 'jitter_ms': None})
+    return result
+
+class ProbeEngine:
+    """基于asyncio的并发探测引擎
+    
+    所有目标的所有探测在同一个事件循环中并发进行，同一目标的各次探测按固定间隔发出，每次探测都有超时，
+    一次采集的耗时约为(探测次数-1)×间隔+超时，与目标数量基本无关。支持三种探测：
+    - tcp：建立TCP连接的耗时
+    - http：建立连接、发送GET请求到收到响应状态行的耗时
+    - icmp：无特权的ICMP数据报套接字（需要net.ipv4.ping_group_range包含运行用户的组）
+    """
+    
+    def __init__(self, targets, options=None):
+        self.targets = targets
+        self.options = options or get_probe_options()
+        self.sequence = itertools.count(1)
+    
+    def run(self):
+        """探测所有目标，返回各目标的汇总结果"""
+        return asyncio.run(self._run_all())
+    
+    async def _run_all(self):
+        semaphore = asyncio.Semaphore(self.options['concurrency'])
+        return await asyncio.gather(*(self._probe_target(target, semaphore) for target in self.targets))
+    
+    async def _probe_target(self, target, semaphore):
+        """对一个目标连续探测count次"""
+        probe = {'tcp': self._probe_tcp, 'http': self._probe_http, 'icmp': self._probe_icmp}[target['type']]
+        rtts = []
+        errors = {}
+        status_code = None
+        # 每次采集只解析一次域名，延迟中不包含DNS解析时间
+        try:
+            address = await asyncio.wait_for(self._resolve(target['host']), self.options['timeout'])
+        except Exception as e:
+            address = None
+            errors[f"DNS解析失败: {type(e).__name__}: {e}"] = self.options['count']
+        if address:
+            # 各次探测按固定间隔发出，不等待上一次完成，超时的探测不会推迟后续探测
+            outcomes = await asyncio.gather(*(
+                self._probe_once(probe, target, address, index * self.options['spacing'], semaphore)
+                for index in range(self.options['count'])
+            ))
+            for rtt, status, error in outcomes:
+                if error is not None:
+                    errors[error] = errors.get(error, 0) + 1
+                    continue
+                rtts.append(rtt)
+                if status is not None:
+                    status_code = status
+        result = {'type': target['type'], 'target': target['target'], **summarize_rtts(rtts, self.options['count'])}
+        if target['type'] == 'http':
+            result['status_code'] = status_code
+        if errors:
+            result['errors'] = errors
+        return result
+    
+    async def _probe_once(self, probe, target, address, delay, semaphore):
+        """延迟delay秒后探测一次，返回(延迟ms, HTTP状态码, 错误)"""
+        await asyncio.sleep(delay)
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                status = await asyncio.wait_for(probe(target, address), self.options['timeout'])
+                return (time.perf_counter() - started) * 1000, status, None
+            except asyncio.TimeoutError:
+                return None, None, 'timeout'
+            except Exception as e:
+                return None, None, f"{type(e).__name__}: {e}"
+    
+    async def _resolve(self, host):
+        """解析主机的IPv4地址"""
+        loop = asyncio.get_running_loop()
+        infos = await loop.getaddrinfo(host, None, family=socket.AF_INET, type=socket.SOCK_STREAM)
+        return infos[0][4][0]
+    
+    async def _probe_tcp(self, target, address):
+        """TCP连接探测"""
+        _, writer = await asyncio.open_connection(address, target['port'])
+        writer.close()
+        return None
+    
+    async def _probe_http(self, target, address):
+        """HTTP探测，返回响应状态码"""
+        if target['tls']:
+            reader, writer = await asyncio.open_connection(address, target['port'], ssl=ssl.create_default_context(), server_hostname=target['host'])
+        else:
+            reader, writer = await asyncio.open_connection(address, target['port'])
+        try:
+            host = target['host'] if target['port'] in (80, 443) else f"{target['host']}:{target['port']}"
+            writer.write(f"GET {target['path']} HTTP/1.1\r\nHost: {host}\r\nUser-Agent: network-monitor\r\nConnection: close\r\n\r\n".encode('ascii'))
+            await writer.drain()
+            status_line = await reader.readline()
+            parts = status_line.split()
+            if len(parts) < 2 or not parts[0].startswith(b'HTTP/'):
+                raise ValueError(f"无效的HTTP响应: {status_line[:50]!r}")
+            return int(parts[1])
+        finally:
+            writer.close()
+    
+    async def _probe_icmp(self, target, address):
+        """ICMP回显探测
+        
+        优先使用无特权的数据报套接字（内核负责填写标识符，只收到本套接字的应答）；
+        系统未开放时，以root或CAP_NET_RAW运行可退回原始套接字。
+        """
+        loop = asyncio.get_running_loop()
+        try:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_ICMP)
+            raw = False
+        except PermissionError:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_RAW, socket.IPPROTO_ICMP)
+            raw = True
+        identifier = os.getpid() & 0xffff
+        sequence = next(self.sequence) & 0xffff
+        payload = struct.pack('!d', time.time())
+        header = struct.pack('!BBHHH', ICMP_ECHO_REQUEST, 0, 0, identifier, sequence)
+        packet = struct.pack('!BBHHH', ICMP_ECHO_REQUEST, 0, _checksum(header + payload), identifier, sequence) + payload
+        
+        sock.setblocking(False)
+        try:
+            sock.sendto(packet, (address, 0))
+            while True:
+                reply = await loop.sock_recv(sock, 1024)
+                if raw:
+                    # 原始套接字收到的数据包含IP头，并且会收到所有ICMP报文
+                    reply = reply[(reply[0] & 0x0f) * 4:]
+                if len(reply) < 8:
+                    continue
+                reply_type, _, _, reply_identifier, reply_sequence = struct.unpack('!BBHHH', reply[:8])
+                if reply_type == ICMP_ECHO_REPLY and reply_sequence == sequence and (not raw or reply_identifier == identifier):
+                    return None
+        finally:
+            sock.close()
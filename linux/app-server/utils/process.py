@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+import os
+import re
+
+import psutil
+
+class ProcessCollector:
+    """按进程名、命令行或pid文件查找进程，采集每个进程的资源使用情况
+    
+    配置了pid文件时以文件中的进程（如Nginx master）及其所有子进程为目标，否则按进程名或命令行匹配。
+    psutil.Process对象在采集之间缓存，cpu_percent和上下文切换次数按相邻两次采集的差值计算；
+    进程第一次出现时没有上一次的数据，这两项为None。
+    """
+    
+    def __init__(self, names=None, pid_file=None, cmdline_pattern=None):
+        self.names = set(names or [])
+        self.pid_file = pid_file
+        self.cmdline_pattern = re.compile(cmdline_pattern) if cmdline_pattern else None
+        # 已跟踪的进程：{pid: {'process': psutil.Process, 'ctx_switches': (自愿, 非自愿)}}
+        self.tracked = {}
+    
+    def read_pid_file(self):
+        """读取pid文件，文件不存在或内容无效时返回None"""
+        try:
+            with open(self.pid_file, 'r') as f:
+                return int(f.read().strip())
+        except (OSError, ValueError):
+            return None
+    
+    def find_processes(self):
+        """查找目标进程，返回psutil.Process列表"""
+        if self.pid_file:
+            pid = self.read_pid_file()
+            if pid is not None:
+                try:
+                    master = self.get_process(pid)
+                    return [master] + master.children(recursive=True)
+                except psutil.Error:
+                    pass
+        
+        processes = []
+        for process in psutil.process_iter(['name', 'cmdline']):
+            if process.pid == os.getpid():
+                continue
+            name = process.info['name'] or ''
+            cmdline = ' '.join(process.info['cmdline'] or [])
+            if name in self.names or (self.cmdline_pattern and self.cmdline_pattern.search(cmdline)):
+                processes.append(process)
+        return processes
+    
+    def get_process(self, pid):
+        """返回缓存的psutil.Process，pid被新进程复用时重新创建"""
+        entry = self.tracked.get(pid)
+        if entry is not None and entry['process'].is_running():
+            return entry['process']
+        return psutil.Process(pid)
+    
+    def collect(self):
+        """采集目标进程的CPU、内存、文件描述符、线程数和上下文切换"""
+        processes = []
+        tracked = {}
+        for found in self.find_processes():
+            entry = self.tracked.get(found.pid)
+            if entry is None or entry['process'] != found:
+                entry = {'process': found, 'ctx_switches': None}
+            process = entry['process']
+            try:
+                with process.oneshot():
+                    # 新跟踪的进程第一次调用cpu_percent只建立基线
+                    cpu_percent = process.cpu_percent(interval=None)
+                    ctx = process.num_ctx_switches()
+                    prev_ctx = entry['ctx_switches']
+                    info = {
+                        'pid': process.pid,
+                        'ppid': process.ppid(),
+                        'name': process.name(),
+                        'cmdline': ' '.join(process.cmdline())[:200],
+                        'cpu_percent': cpu_percent if prev_ctx is not None else None,
+                        'rss': process.memory_info().rss,
+                        'num_fds': process.num_fds() if hasattr(process, 'num_fds') else None,
+                        'num_threads': process.num_threads(),
+                        'ctx_switches_voluntary': ctx.voluntary - prev_ctx[0] if prev_ctx is not None else None,
+                        'ctx_switches_involuntary': ctx.involuntary - prev_ctx[1] if prev_ctx is not None else None
+                    }
+            except (psutil.NoSuchProcess, psutil.ZombieProcess):
+                continue
+            except psutil.AccessDenied as e:
+                print(f"没有权限读取进程信息: {process.pid} - {e}")
+                continue
+            entry['ctx_switches'] = (ctx.voluntary, ctx.involuntary)
+            tracked[process.pid] = entry
+            processes.append(info)
+        
+        # 已退出的进程不再跟踪
+        self.tracked = tracked
+        return {
+            'count': len(processes),
+            'total_cpu_percent': round(sum(info['cpu_percent'] or 0 for info in processes), 2),
+            'total_rss': sum(info['rss'] for info in processes),
+            'processes': processes
+        }
@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+import math
+import heapq
+
+class DDSketch:
+    """相对误差有界的分位数草图（DDSketch）
+    
+    数值按对数间隔分桶计数，任意分位数的相对误差不超过relative_accuracy，内存只与数值范围有关，
+    与样本数无关。相同精度的草图可以直接合并，便于把每分钟的草图汇总成任意时间段的分位数。
+    桶数超过max_bins时合并最小的桶，只损失低分位数的精度。
+    """
+    
+    def __init__(self, relative_accuracy=0.01, max_bins=2048):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.max_bins = max_bins
+        self.bins = {}
+        self.zero_count = 0
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+    
+    def add(self, value, count=1):
+        """加入一个样本（小于等于0的值计入零桶）"""
+        if value > 0:
+            key = math.ceil(math.log(value) / self.log_gamma)
+            self.bins[key] = self.bins.get(key, 0) + count
+            if len(self.bins) > self.max_bins:
+                self._collapse()
+        else:
+            self.zero_count += count
+        self.count += count
+        self.sum += value * count
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+    
+    def _collapse(self):
+        """桶数超过上限时，把最小的桶并入相邻的桶"""
+        keys = sorted(self.bins)
+        while len(keys) > self.max_bins:
+            lowest = keys.pop(0)
+            self.bins[keys[0]] += self.bins.pop(lowest)
+    
+    def merge(self, other):
+        """合并另一个相同精度的草图"""
+        if other.count == 0:
+            return
+        if not math.isclose(other.gamma, self.gamma):
+            raise ValueError("只能合并相同精度的DDSketch")
+        for key, count in other.bins.items():
+            self.bins[key] = self.bins.get(key, 0) + count
+        if len(self.bins) > self.max_bins:
+            self._collapse()
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.sum += other.sum
+        self.min = other.min if self.min is None else min(self.min, other.min)
+        self.max = other.max if self.max is None else max(self.max, other.max)
+    
+    def quantile(self, q):
+        """返回q分位数（0 <= q <= 1），没有样本时返回None"""
+        if self.count == 0:
+            return None
+        rank = q * (self.count - 1)
+        if rank < self.zero_count:
+            return min(0.0, self.max)
+        seen = self.zero_count
+        value = self.max
+        for key in sorted(self.bins):
+            seen += self.bins[key]
+            if seen > rank:
+                # 桶(gamma^(key-1), gamma^key]内相对误差最小的代表值
+                value = 2 * self.gamma ** key / (self.gamma + 1)
+                break
+        return min(max(value, self.min), self.max)
+    
+    @property
+    def avg(self):
+        """平均值，没有样本时返回None"""
+        return self.sum / self.count if self.count else None
+    
+    def to_dict(self):
+        """序列化为可写入JSON的字典"""
+        return {
+            'relative_accuracy': self.relative_accuracy,
+            'count': self.count,
+            'sum': self.sum,
+            'min': self.min,
+            'max': self.max,
+            'zero_count': self.zero_count,
+            'bins': {str(key): count for key, count in self.bins.items()}
+        }
+    
+    @classmethod
+    def from_dict(cls, data, max_bins=2048):
+        """从to_dict的结果恢复草图"""
+        sketch = cls(data['relative_accuracy'], max_bins)
+        sketch.count = data['count']
+        sketch.sum = data['sum']
+        sketch.min = data['min']
+        sketch.max = data['max']
+        sketch.zero_count = data['zero_count']
+        sketch.bins = {int(key): count for key, count in data['bins'].items()}
+        return sketch
+
+class CountMinSketch:
+    """Count-Min草图，在固定内存中估计任意键的累计值
+    
+    depth行、每行width个计数器，每个键在每行按不同的哈希落入一个计数器，估计值取各行的最小值。
+    估计值只会偏大，误差不超过总量的e/width（概率1-e^-depth）。
+    每个计数器可以同时累计size个值（如请求数、错误数、请求时间），每个键只需计算一次哈希。
+    """
+    
+    def __init__(self, width=2048, depth=4, size=1):
+        self.width = width
+        self.depth = depth
+        self.size = size
+        self.rows = [[[0] * size for _ in range(width)] for _ in range(depth)]
+    
+    def _counters(self, key):
+        """键在各行中对应的计数器"""
+        return [row[hash((index, key)) % self.width] for index, row in enumerate(self.rows)]
+    
+    def add(self, key, *values):
+        """累加键的值，不传值时第一个值加1"""
+        values = values or (1,)
+        for counter in self._counters(key):
+            for index, value in enumerate(values):
+                counter[index] += value
+    
+    def estimate(self, key):
+        """估计键的累计值，返回长度为size的列表"""
+        counters = self._counters(key)
+        return [min(counter[index] for counter in counters) for index in range(self.size)]
+
+class SpaceSaving:
+    """Space-Saving算法，在固定数量的计数器中找出累计值最大的键
+    
+    最多保留capacity个键；计数器已满时，新键替换累计值最小的键并继承其累计值，
+    因此累计值大于总量/capacity的键一定会被保留，估计值偏大的部分不超过被替换的最小值。
+    """
+    
+    def __init__(self, capacity=1000):
+        self.capacity = capacity
+        self.counters = {}
+        # (累计值, 键)的最小堆，计数器增加时压入新项，旧项在取最小值时惰性丢弃
+        self.heap = []
+    
+    def add(self, key, value=1):
+        """累加键的值"""
+        if value <= 0:
+            return
+        if key in self.counters:
+            self.counters[key] += value
+        elif len(self.counters) < self.capacity:
+            self.counters[key] = value
+        else:
+            # 替换当前累计值最小的键
+            while True:
+                count, evicted = heapq.heappop(self.heap)
+                if self.counters.get(evicted) == count:
+                    break
+            del self.counters[evicted]
+            self.counters[key] = count + value
+        heapq.heappush(self.heap, (self.counters[key], key))
+        if len(self.heap) > 4 * self.capacity:
+            # 丢弃过期项，避免堆无限增长
+            self.heap = [(count, key) for key, count in self.counters.items()]
+            heapq.heapify(self.heap)
+    
+    def top(self, n):
+        """返回累计值最大的n个键及其估计值"""
+        return heapq.nlargest(n, self.counters.items(), key=lambda item: item[1])
+
+class HdrHistogram:
+    """HDR直方图（High Dynamic Range Histogram），记录非负整数（如微秒）
+    
+    数值按2的幂分段，每段再线性细分，任意数值的相对误差不超过10^-significant_digits，
+    只保存非零的桶，内存与数值范围的对数成正比。相同精度的直方图可以直接合并。
+    支持按期望间隔修正协调遗漏（coordinated omission）：一次耗时远超期望间隔的请求，
+    意味着期间本应发出的请求被推迟了，按间隔补记这些请求本应观察到的延迟。
+    """
+    
+    def __init__(self, significant_digits=3):
+        self.significant_digits = significant_digits
+        # 每段的线性子桶数：能区分2×10^significant_digits个值的最小2的幂
+        sub_bucket_count = 2 ** math.ceil(math.log2(2 * 10 ** significant_digits))
+        self.sub_bucket_half_count_magnitude = sub_bucket_count.bit_length() - 2
+        self.sub_bucket_half_count = sub_bucket_count // 2
+        # {桶序号: 计数}
+        self.counts = {}
+        self.total_count = 0
+        self.sum = 0
+        self.min = None
+        self.max = None
+    
+    def _index(self, value):
+        """数值对应的桶序号（序号随数值单调递增）"""
+        bucket = max(0, value.bit_length() - self.sub_bucket_half_count_magnitude - 1)
+        return ((bucket + 1) << self.sub_bucket_half_count_magnitude) + (value >> bucket) - self.sub_bucket_half_count
+    
+    def _highest_equivalent(self, index):
+        """桶内的最大值"""
+        bucket = (index >> self.sub_bucket_half_count_magnitude) - 1
+        sub_bucket = (index & (self.sub_bucket_half_count - 1)) + self.sub_bucket_half_count
+        if bucket < 0:
+            bucket = 0
+            sub_bucket -= self.sub_bucket_half_count
+        return (sub_bucket << bucket) + (1 << bucket) - 1
+    
+    def record(self, value, count=1):
+        """记录一个数值（负数按0记录）"""
+        value = max(0, int(value))
+        index = self._index(value)
+        self.counts[index] = self.counts.get(index, 0) + count
+        self.total_count += count
+        self.sum += value * count
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+    
+    def record_corrected(self, value, expected_interval, count=1):
+        """记录一个数值，超过期望间隔时按间隔补记被推迟的请求本应观察到的延迟"""
+        self.record(value, count)
+        if expected_interval <= 0:
+            return
+        missing = value - expected_interval
+        while missing >= expected_interval:
+            self.record(missing, count)
+            missing -= expected_interval
+    
+    def corrected_copy(self, expected_interval):
+        """返回按期望间隔修正协调遗漏后的副本"""
+        corrected = HdrHistogram(self.significant_digits)
+        for index in sorted(self.counts):
+            corrected.record_corrected(min(self._highest_equivalent(index), self.max), expected_interval, self.counts[index])
+        return corrected
+    
+    def merge(self, other):
+        """合并另一个相同精度的直方图"""
+        if other.significant_digits != self.significant_digits:
+            raise ValueError("只能合并相同精度的HdrHistogram")
+        if other.total_count == 0:
+            return
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.total_count += other.total_count
+        self.sum += other.sum
+        self.min = other.min if self.min is None else min(self.min, other.min)
+        self.max = other.max if self.max is None else max(self.max, other.max)
+    
+    def value_at_percentile(self, percentile):
+        """返回百分位数（0-100），没有数据时返回None"""
+        if self.total_count == 0:
+            return None
+        target = max(1, math.ceil(percentile / 100 * self.total_count))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= target:
+                return min(self._highest_equivalent(index), self.max)
+        return self.max
+    
+    @property
+    def mean(self):
+        """平均值，没有数据时返回None"""
+        return self.sum / self.total_count if self.total_count else None
+    
+    def to_dict(self):
+        """序列化为可写入JSON的字典"""
+        return {
+            'significant_digits': self.significant_digits,
+            'total_count': self.total_count,
+            'sum': self.sum,
+            'min': self.min,
+            'max': self.max,
+            'counts': {str(index): count for index, count in self.counts.items()}
+        }
+    
+    @classmethod
+    def from_dict(cls, data):
+        """从to_dict的结果恢复直方图"""
+        histogram = cls(data['significant_digits'])
+        histogram.total_count = data['total_count']
+        histogram.sum = data['sum']
+        histogram.min = data['min']
+        histogram.max = data['max']
+        histogram.counts = {int(index): count for index, count in data['counts'].items()}
+        return histogram
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+import os
+import re
+import json
+from datetime import datetime
+
+# 可选依赖：zstandard用于压缩已结束日期的监控数据
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# 监控数据文件的扩展名（.json为旧版本按天写入的JSON数组）
+METRIC_FILE_SUFFIXES = ('.json', '.jsonl', '.jsonl.zst')
+
+def get_storage_options():
+    """获取监控数据的存储选项"""
+    return {
+        'compression': os.getenv('MONITOR_COMPRESSION', 'none').lower(),
+        'zstd_level': int(os.getenv('MONITOR_ZSTD_LEVEL', 3))
+    }
+
+class MetricStore:
+    """按天滚动的追加写JSONL存储
+    
+    每条监控数据为一行JSON，追加写入<prefix>_YYYY-MM-DD.jsonl，每批数据只写一次并fsync一次，
+    不再读取和重写当天的整个文件；进程在写入中途崩溃最多损坏最后一行。
+    日期变化时，如果启用了zstd压缩，已结束日期的文件被压缩为.jsonl.zst。
+    """
+    
+    def __init__(self, data_dir, prefix, options=None):
+        self.data_dir = data_dir
+        self.prefix = prefix
+        self.options = options or get_storage_options()
+        self.current_date = None
+        self.file_pattern = re.compile(rf'^{re.escape(prefix)}_(\d{{4}}-\d{{2}}-\d{{2}})\.jsonl$')
+        os.makedirs(self.data_dir, exist_ok=True)
+    
+    def file_path(self, date_str, suffix='.jsonl'):
+        """返回指定日期的数据文件路径"""
+        return os.path.join(self.data_dir, f'{self.prefix}_{date_str}{suffix}')
+    
+    def append(self, records):
+        """追加写入一条或一批监控数据"""
+        if isinstance(records, dict):
+            records = [records]
+        if not records:
+            return
+        
+        date_str = datetime.now().strftime('%Y-%m-%d')
+        if date_str != self.current_date:
+            # 启动或跨天时处理已结束日期的文件
+            self.current_date = date_str
+            self.compress_closed_days()
+        
+        data = ''.join(json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n' for record in records)
+        with open(self.file_path(date_str), 'a+b') as f:
+            # 上次写入中途崩溃时文件末尾可能是不完整的一行，先补换行，避免与新数据连成一行
+            if f.seek(0, os.SEEK_END) > 0:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b'\n':
+                    f.write(b'\n')
+            f.write(data.encode('utf-8'))
+            f.flush()
+            os.fsync(f.fileno())
+    
+    def compress_closed_days(self):
+        """将已结束日期的JSONL文件压缩为.jsonl.zst（需启用MONITOR_COMPRESSION=zstd）"""
+        if self.options['compression'] != 'zstd':
+            return
+        if zstandard is None:
+            print("未安装zstandard，已结束日期的监控数据不压缩")
+            return
+        
+        for file_name in sorted(os.listdir(self.data_dir)):
+            match = self.file_pattern.match(file_name)
+            if not match or match.group(1) >= self.current_date:
+                continue
+            source_path = os.path.join(self.data_dir, file_name)
+            target_path = self.file_path(match.group(1), '.jsonl.zst')
+            tmp_path = f"{target_path}.tmp"
+            try:
+                with open(source_path, 'rb') as f:
+                    raw = f.read()
+                with open(tmp_path, 'wb') as f:
+                    f.write(zstandard.ZstdCompressor(level=self.options['zstd_level']).compress(raw))
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, target_path)
+                os.remove(source_path)
+            except Exception as e:
+                print(f"压缩监控数据失败: {source_path} - {e}")
+
+def list_metric_files(data_path):
+    """按文件名顺序列出目录中的监控数据文件
+    
+    压缩完成后删除原文件前崩溃时，同一天会同时存在.jsonl和.jsonl.zst，此时只读取已完整写入的.jsonl.zst。
+    """
+    if not os.path.exists(data_path):
+        return []
+    file_names = set(os.listdir(data_path))
+    return [
+        os.path.join(data_path, file_name)
+        for file_name in sorted(file_names)
+        if file_name.endswith(METRIC_FILE_SUFFIXES)
+        and not (file_name.endswith('.jsonl') and f'{file_name}.zst' in file_names)
+    ]
+
+def read_metric_file(file_path):
+    """读取监控数据文件，返回数据列表（支持JSONL、zstd压缩的JSONL和旧版本的JSON数组）"""
+    if file_path.endswith('.json'):
+        with open(file_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    
+    with open(file_path, 'rb') as f:
+        raw = f.read()
+    if file_path.endswith('.zst'):
+        if zstandard is None:
+            raise RuntimeError("文件为zstd压缩格式，需要安装zstandard")
+        raw = zstandard.ZstdDecompressor().decompress(raw)
+    
+    records = []
+    for line in raw.decode('utf-8').splitlines():
+        if not line.strip():
+            continue
+        try:
+            records.append(json.loads(line))
+        except ValueError:
+            # 写入中途崩溃留下的不完整行
+            print(f"跳过不完整的数据行: {file_path}")
+    return records
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+import queue
+import threading
+
+class MetricWriter:
+    """共享的监控数据写入器，所有采集器的数据经同一个后台线程顺序写入
+    
+    采集线程只负责把数据放入队列，不会因为写文件而阻塞，也不会有多个线程同时写同一个文件。
+    """
+    
+    def __init__(self):
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self._run, name='metric-writer', daemon=True)
+        self.thread.start()
+    
+    def write(self, collector, metrics):
+        """提交一条监控数据，由写入线程调用采集器的save_metrics保存"""
+        self.queue.put((collector, metrics))
+    
+    def _run(self):
+        """写入线程：取出队列中已有的全部数据，按采集器分批保存，收到None时写完本批后退出"""
+        running = True
+        while running:
+            items = [self.queue.get()]
+            while True:
+                try:
+                    items.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            
+            # 同一采集器的多条数据合并为一批，一次写入、一次fsync
+            batches = {}
+            for item in items:
+                if item is None:
+                    running = False
+                    continue
+                collector, metrics = item
+                batches.setdefault(collector, []).append(metrics)
+            
+            for collector, records in batches.items():
+                try:
+                    collector.save_metrics(records)
+                except Exception as e:
+                    print(f"保存监控数据失败: {e}")
+    
+    def close(self):
+        """写完队列中剩余的数据后停止写入线程"""
+        self.queue.put(None)
+        self.thread.join()